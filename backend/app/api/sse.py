@@ -0,0 +1,25 @@
+"""
+Server-Sent Events helpers shared by the streaming endpoints
+"""
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+# Comment line sent on idle streams so proxies do not close them
+KEEP_ALIVE = ": keep-alive\n\n"
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, default=str)}\n\n"
+
+
+def event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    """Send formatted events unbuffered as text/event-stream"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,26 +1,84 @@
 """
 AI-powered endpoints for WAF analysis and recommendations
 """
-from fastapi import APIRouter, Depends, HTTPException
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
+from app.api.sse import KEEP_ALIVE, event_stream, sse_event
+from app.core.config import settings
 from app.core.security import get_current_user
-from app.core.ai_client import ai_client
+from app.core.ai_client import AIClient, AITimeoutError, get_ai_client
+from app.core.conversations import ConversationManager, get_conversation_manager
+from app.core.rate_limit import BULK, INTERACTIVE, AdmissionSlot, rate_limit
+from app.core.remediation_library import RemediationLibrary, get_remediation_library
+from app.core.jobs import (
+    AnalysisJobManager,
+    JobNotFoundError,
+    JobQueueFullError,
+    get_job_manager,
+)
+from app.repositories.assessments import AssessmentAccessDeniedError, AssessmentNotFoundError
+from app.repositories.conversations import ConversationNotFoundError
 
 router = APIRouter()
 
 
+def _sse_response(request: Request, chunks: AsyncIterator[str]) -> StreamingResponse:
+    """
+    Relay text chunks to the client as Server-Sent Events.
+    
+    The upstream generator is closed as soon as the client disconnects so an
+    abandoned stream stops pulling tokens from Gemini.
+    """
+    async def events() -> AsyncIterator[str]:
+        async with aclosing(chunks) as stream:
+            try:
+                async for chunk in stream:
+                    if await request.is_disconnected():
+                        return
+                    yield sse_event({"text": chunk})
+            except AITimeoutError as e:
+                yield sse_event({"detail": str(e)}, event="error")
+                return
+            except Exception as e:
+                yield sse_event({"detail": f"Generation failed: {str(e)}"}, event="error")
+                return
+        yield sse_event({}, event="done")
+    
+    return event_stream(events())
+
+
 class AnalyzeRequest(BaseModel):
-    """Request model for assessment analysis"""
-    pillar: str
-    responses: List[dict]
+    """
+    Request model for assessment analysis.
+    
+    With an assessment_id the result is also saved on that assessment, and
+    pillar/responses default to the stored ones.
+    """
+    pillar: Optional[str] = None
+    responses: Optional[List[dict]] = None
+    assessment_id: Optional[str] = None
+    bypass_cache: bool = False
 
 
 class ChatRequest(BaseModel):
-    """Request model for chat"""
+    """
+    Request model for chat.
+    
+    With a conversation_id the earlier turns are taken from the stored
+    conversation, and the exchange is added to it.
+    """
     message: str
     context: Optional[str] = None
+    conversation_id: Optional[str] = None
+
+
+class ConversationRequest(BaseModel):
+    """Request model for starting a conversation, optionally about an assessment"""
+    assessment_id: Optional[str] = None
 
 
 class RemediationRequest(BaseModel):
@@ -28,46 +86,202 @@ class RemediationRequest(BaseModel):
     control: str
     current_state: str
     cloud_provider: str = "gcp"
+    bypass_cache: bool = False
 
 
-@router.post("/analyze")
+@router.post(
+    "/analyze",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit(BULK, hold_slot=False))],
+)
 async def analyze_assessment(
     request: AnalyzeRequest,
+    response: Response,
     current_user: dict = Depends(get_current_user),
+    jobs: AnalysisJobManager = Depends(get_job_manager),
 ) -> dict:
     """
-    Analyze assessment responses using AI and generate recommendations.
+    Queue an AI analysis of assessment responses.
+    
+    Returns the job right away; poll GET /jobs/{job_id} or follow
+    GET /jobs/{job_id}/events for the result. Submitting identical input
+    again returns the same job.
     """
+    pillar, responses = request.pillar, request.responses
+    if request.assessment_id is not None:
+        try:
+            assessment = await jobs.get_repository().get_owned(
+                request.assessment_id, current_user["uid"]
+            )
+        except AssessmentNotFoundError:
+            raise HTTPException(status_code=404, detail="Assessment not found")
+        except AssessmentAccessDeniedError:
+            raise HTTPException(status_code=403, detail="Access denied")
+        pillar = pillar or assessment.pillar_id
+        if responses is None:
+            responses = assessment.responses
+    if not pillar or responses is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="pillar and responses are required without an assessment_id",
+        )
+    
     try:
-        result = await ai_client.analyze_assessment(
-            pillar=request.pillar,
-            responses=request.responses,
+        job, _ = await jobs.submit(
+            user_id=current_user["uid"],
+            pillar=pillar,
+            responses=responses,
+            assessment_id=request.assessment_id,
+            bypass_cache=request.bypass_cache,
+            stored_responses=request.responses is None,
         )
-        return result
-    except Exception as e:
+    except JobQueueFullError:
         raise HTTPException(
-            status_code=500,
-            detail=f"AI analysis failed: {str(e)}",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analysis queue is full, retry later",
+            headers={"Retry-After": "30"},
         )
+    if job.done:
+        response.status_code = status.HTTP_200_OK
+    response.headers["Location"] = f"{settings.API_V1_PREFIX}/ai/jobs/{job.id}"
+    return job.to_api()
 
 
-@router.post("/chat")
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+    jobs: AnalysisJobManager = Depends(get_job_manager),
+) -> dict:
+    """
+    Get the status and, once finished, the result of an analysis job.
+    """
+    try:
+        job = await jobs.get(job_id, current_user["uid"])
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_api()
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    http_request: Request,
+    current_user: dict = Depends(get_current_user),
+    jobs: AnalysisJobManager = Depends(get_job_manager),
+) -> StreamingResponse:
+    """
+    Stream an analysis job's progress as Server-Sent Events.
+    
+    Sends the current state and each status change as "progress" events;
+    the final state, once the job succeeds or fails, is sent as "done".
+    """
+    try:
+        await jobs.get(job_id, current_user["uid"])
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events() -> AsyncIterator[str]:
+        async with aclosing(jobs.watch(job_id)) as updates:
+            async for job in updates:
+                if await http_request.is_disconnected():
+                    return
+                if job is None:
+                    yield KEEP_ALIVE
+                    continue
+                yield sse_event(job.to_api(), event="done" if job.done else "progress")
+    
+    return event_stream(events())
+
+
+@router.post("/conversations", status_code=status.HTTP_201_CREATED)
+async def create_conversation(
+    request: ConversationRequest,
+    current_user: dict = Depends(get_current_user),
+    conversations: ConversationManager = Depends(get_conversation_manager),
+) -> dict:
+    """
+    Start a chat conversation.
+    
+    Pass its id as conversation_id to /chat or /chat/stream. Answers in a
+    conversation about an assessment draw on that assessment's scores.
+    """
+    try:
+        conversation = await conversations.create(current_user["uid"], request.assessment_id)
+    except AssessmentNotFoundError:
+        raise HTTPException(status_code=404, detail="Assessment not found")
+    except AssessmentAccessDeniedError:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return conversation.to_api()
+
+
+@router.get("/conversations/{conversation_id}")
+async def get_conversation(
+    conversation_id: str,
+    current_user: dict = Depends(get_current_user),
+    conversations: ConversationManager = Depends(get_conversation_manager),
+) -> dict:
+    """
+    Get a conversation: the summary of its earlier part and the recent turns.
+    """
+    try:
+        conversation = await conversations.get(conversation_id, current_user["uid"])
+    except ConversationNotFoundError:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation.to_api()
+
+
+@router.delete("/conversations/{conversation_id}")
+async def delete_conversation(
+    conversation_id: str,
+    current_user: dict = Depends(get_current_user),
+    conversations: ConversationManager = Depends(get_conversation_manager),
+) -> dict:
+    """
+    Delete a conversation.
+    """
+    try:
+        await conversations.delete(conversation_id, current_user["uid"])
+    except ConversationNotFoundError:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"message": "Conversation deleted successfully", "id": conversation_id}
+
+
+@router.post("/chat", dependencies=[Depends(rate_limit(INTERACTIVE))])
 async def chat(
     request: ChatRequest,
     current_user: dict = Depends(get_current_user),
+    ai_client: AIClient = Depends(get_ai_client),
+    conversations: ConversationManager = Depends(get_conversation_manager),
 ) -> dict:
     """
     Chat with the AI assistant about WAF best practices.
     """
     try:
-        response = await ai_client.chat(
-            message=request.message,
-            context=request.context,
-        )
+        if request.conversation_id is not None:
+            response = await conversations.reply(
+                request.conversation_id,
+                current_user["uid"],
+                message=request.message,
+                context=request.context,
+            )
+        else:
+            response = await ai_client.chat(
+                message=request.message,
+                context=request.context,
+            )
         return {
             "response": response,
             "user_message": request.message,
+            "conversation_id": request.conversation_id,
         }
+    except ConversationNotFoundError:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    except AITimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Chat failed: {str(e)}",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -75,23 +289,96 @@ async def chat(
         )
 
 
-@router.post("/remediation")
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    slot: AdmissionSlot = Depends(rate_limit(INTERACTIVE)),
+    current_user: dict = Depends(get_current_user),
+    ai_client: AIClient = Depends(get_ai_client),
+    conversations: ConversationManager = Depends(get_conversation_manager),
+) -> StreamingResponse:
+    """
+    Stream the AI assistant's answer as Server-Sent Events.
+    """
+    if request.conversation_id is None:
+        chunks = ai_client.stream_chat(message=request.message, context=request.context)
+    else:
+        try:
+            chunks = await conversations.stream_reply(
+                request.conversation_id,
+                current_user["uid"],
+                message=request.message,
+                context=request.context,
+            )
+        except ConversationNotFoundError:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    return slot.stream(_sse_response(http_request, chunks))
+
+
+@router.post("/remediation", dependencies=[Depends(rate_limit(INTERACTIVE))])
 async def generate_remediation(
     request: RemediationRequest,
     current_user: dict = Depends(get_current_user),
+    library: RemediationLibrary = Depends(get_remediation_library),
 ) -> dict:
     """
     Generate step-by-step remediation guidance for a control.
+    
+    Catalog controls with a generic current_state (e.g. "not implemented")
+    are answered from the pre-generated remediation library; a specific
+    current_state gets personalized guidance.
     """
     try:
-        result = await ai_client.generate_remediation_steps(
+        result = await library.remediate(
             control=request.control,
             current_state=request.current_state,
             cloud_provider=request.cloud_provider,
+            use_cache=not request.bypass_cache,
         )
         return result
+    except AITimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Remediation generation failed: {str(e)}",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Remediation generation failed: {str(e)}",
         )
+
+
+@router.post("/remediation/stream")
+async def generate_remediation_stream(
+    request: RemediationRequest,
+    http_request: Request,
+    slot: AdmissionSlot = Depends(rate_limit(INTERACTIVE)),
+    current_user: dict = Depends(get_current_user),
+    library: RemediationLibrary = Depends(get_remediation_library),
+) -> StreamingResponse:
+    """
+    Stream remediation guidance for a control as Server-Sent Events.
+    """
+    return slot.stream(_sse_response(
+        http_request,
+        library.stream(
+            control=request.control,
+            current_state=request.current_state,
+            cloud_provider=request.cloud_provider,
+            use_cache=not request.bypass_cache,
+        ),
+    ))
+
+
+@router.get("/cache/stats")
+async def cache_stats(
+    current_user: dict = Depends(get_current_user),
+    ai_client: AIClient = Depends(get_ai_client),
+) -> dict:
+    """
+    Hit/miss counters for the AI response cache.
+    """
+    if ai_client.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **ai_client.cache.stats()}
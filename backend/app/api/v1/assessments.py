@@ -1,15 +1,44 @@
 """
 Assessments API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
-from pydantic import BaseModel
-from datetime import datetime
+import re
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field
 
-from app.core.security import get_current_user, get_firestore_client
+from app.core.scoring import TooManyControlsError
+from app.core.security import get_current_user
+from app.repositories.assessments import (
+    AssessmentAccessDeniedError,
+    AssessmentConflictError,
+    AssessmentNotFoundError,
+    AssessmentRepository,
+    get_assessment_repository,
+)
+from app.repositories.pagination import InvalidPageTokenError
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_PAGE_TOKEN_HEADER = "X-Next-Page-Token"
+
+_FIELD_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated field projection"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    invalid = [name for name in names if not _FIELD_NAME_RE.match(name)]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid field names: {invalid}",
+        )
+    return names
+
 
 class AssessmentCreate(BaseModel):
     """Request model for creating an assessment"""
@@ -17,6 +46,35 @@ class AssessmentCreate(BaseModel):
     responses: List[dict]
 
 
+class AssessmentChanges(BaseModel):
+    """
+    Client-writable assessment fields.
+
+    Ownership, scores and timestamps are maintained by the server, so any
+    other field is rejected.
+    """
+    model_config = ConfigDict(populate_by_name=True, extra="forbid")
+
+    pillar_id: Optional[str] = Field(default=None, alias="pillarId")
+    responses: Optional[List[dict]] = None
+    status: Optional[str] = None
+
+    def to_document(self) -> dict:
+        """The fields that were set, under their Firestore names"""
+        return self.model_dump(by_alias=True, exclude_unset=True, exclude_none=True)
+
+
+class AssessmentPatch(BaseModel):
+    """A single assessment update within a batch"""
+    id: str
+    changes: AssessmentChanges
+
+
+class AssessmentBatchUpdate(BaseModel):
+    """Request model for updating many assessments at once"""
+    updates: List[AssessmentPatch] = Field(..., min_length=1, max_length=500)
+
+
 class AssessmentResponse(BaseModel):
     """Response model for assessment"""
     id: str
@@ -30,107 +88,157 @@ class AssessmentResponse(BaseModel):
 
 @router.get("/")
 async def list_assessments(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return, e.g. pillarId,status,score"
+    ),
     current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
 ) -> List[dict]:
-    """List all assessments for the current user"""
-    db = get_firestore_client()
-    assessments_ref = db.collection("assessments")
-    query = assessments_ref.where("userId", "==", current_user["uid"]).order_by(
-        "createdAt", direction="DESCENDING"
-    )
+    """
+    List the current user's assessments, newest first.
     
-    assessments = []
-    for doc in query.stream():
-        assessment = doc.to_dict()
-        assessment["id"] = doc.id
-        assessments.append(assessment)
+    Results are paginated; when more are available the token for the next
+    page is returned in the X-Next-Page-Token header.
+    """
+    try:
+        assessments, next_token = await repo.list_for_user(
+            current_user["uid"],
+            limit=limit,
+            page_token=page_token,
+            fields=_parse_fields(fields),
+        )
+    except InvalidPageTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid page token",
+        )
     
-    return assessments
+    if next_token:
+        response.headers[NEXT_PAGE_TOKEN_HEADER] = next_token
+    return [assessment.to_api() for assessment in assessments]
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_assessment(
     assessment: AssessmentCreate,
     current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
 ) -> dict:
     """Create a new assessment"""
-    db = get_firestore_client()
+    try:
+        created = await repo.create(
+            user_id=current_user["uid"],
+            pillar_id=assessment.pillar_id,
+            responses=assessment.responses,
+        )
+    except TooManyControlsError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     
-    now = datetime.utcnow().isoformat()
-    assessment_data = {
-        "pillarId": assessment.pillar_id,
-        "userId": current_user["uid"],
-        "responses": assessment.responses,
-        "status": "in_progress",
-        "score": None,
-        "createdAt": now,
-        "updatedAt": now,
+    return {
+        "message": "Assessment created successfully",
+        **created.to_api(),
     }
+
+
+@router.patch("/batch")
+async def update_assessments_batch(
+    batch: AssessmentBatchUpdate,
+    current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
+) -> dict:
+    """
+    Update many assessments in one request.
     
-    doc_ref = db.collection("assessments").add(assessment_data)
+    Assessments that do not exist or belong to another user are skipped and
+    reported in the results; all other updates are committed atomically.
+    Repeated IDs are merged in order.
+    """
+    updates: Dict[str, dict] = {}
+    for patch in batch.updates:
+        updates.setdefault(patch.id, {}).update(patch.changes.to_document())
+    
+    try:
+        results = await repo.update_many(current_user["uid"], updates)
+    except AssessmentConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="An assessment was modified concurrently; retry the batch",
+        )
+    except TooManyControlsError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     
     return {
-        "id": doc_ref[1].id,
-        "message": "Assessment created successfully",
-        **assessment_data,
+        "message": "Batch processed",
+        "updated": sum(1 for outcome in results.values() if outcome == "updated"),
+        "results": [
+            {"id": assessment_id, "status": outcome}
+            for assessment_id, outcome in results.items()
+        ],
     }
 
 
+@router.get("/summary")
+async def get_assessments_summary(
+    current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
+) -> dict:
+    """
+    Get dashboard totals for the current user's assessments.
+
+    Counts by status and per pillar, with average scores, read from a
+    summary kept up to date as assessments are created and updated.
+    """
+    summary = await repo.get_summary(current_user["uid"])
+    return summary.to_api()
+
+
 @router.get("/{assessment_id}")
 async def get_assessment(
     assessment_id: str,
     current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
 ) -> dict:
     """Get a specific assessment"""
-    db = get_firestore_client()
-    doc_ref = db.collection("assessments").document(assessment_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
+    try:
+        assessment = await repo.get_owned(assessment_id, current_user["uid"])
+    except AssessmentNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Assessment not found",
         )
-    
-    assessment = doc.to_dict()
-    
-    # Check ownership
-    if assessment.get("userId") != current_user["uid"]:
+    except AssessmentAccessDeniedError:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view this assessment",
         )
     
-    assessment["id"] = doc.id
-    return assessment
+    return assessment.to_api()
 
 
 @router.patch("/{assessment_id}")
 async def update_assessment(
     assessment_id: str,
-    updates: dict,
+    updates: AssessmentChanges,
     current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
 ) -> dict:
     """Update an assessment"""
-    db = get_firestore_client()
-    doc_ref = db.collection("assessments").document(assessment_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
+    try:
+        await repo.update(assessment_id, current_user["uid"], updates.to_document())
+    except AssessmentNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Assessment not found",
         )
-    
-    assessment = doc.to_dict()
-    
-    if assessment.get("userId") != current_user["uid"]:
+    except AssessmentAccessDeniedError:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to update this assessment",
         )
-    
-    updates["updatedAt"] = datetime.utcnow().isoformat()
-    doc_ref.update(updates)
+    except TooManyControlsError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     
     return {"message": "Assessment updated successfully", "id": assessment_id}
@@ -0,0 +1,83 @@
+"""
+Azure integration endpoints
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
+from typing import List, Optional, Set
+
+from app.core.advisor_sync import AdvisorSync, get_advisor_sync
+from app.core.azure_advisor import (
+    SUBSCRIPTION_ID_PATTERN,
+    AzureAdvisorError,
+    AzureCredentialsError,
+)
+from app.core.config import settings
+from app.core.security import get_current_user
+
+router = APIRouter()
+
+
+def _allowed_subscriptions(user_id: str) -> Set[str]:
+    """Subscription IDs (lowercase) the user may sync"""
+    mapping = settings.AZURE_ADVISOR_USER_SUBSCRIPTIONS
+    allowed = [*mapping.get(user_id, []), *mapping.get("*", [])]
+    if settings.AZURE_SUBSCRIPTION_ID:
+        allowed.append(settings.AZURE_SUBSCRIPTION_ID)
+    return {subscription_id.lower() for subscription_id in allowed}
+
+
+class AdvisorSyncRequest(BaseModel):
+    """Request model for an Advisor sync; defaults to AZURE_SUBSCRIPTION_ID"""
+    subscription_ids: Optional[List[str]] = None
+
+
+@router.post("/advisor/sync")
+async def sync_advisor(
+    request: Optional[AdvisorSyncRequest] = None,
+    current_user: dict = Depends(get_current_user),
+    advisor_sync: AdvisorSync = Depends(get_advisor_sync),
+) -> dict:
+    """
+    Sync Azure Advisor recommendations into the user's recommendations.
+
+    Only the default subscription and the ones AZURE_ADVISOR_USER_SUBSCRIPTIONS
+    allows the user may be synced.
+
+    Only recommendations that changed since the last sync are written;
+    ones Advisor no longer lists are marked completed. Returns the page and
+    recommendation counts, errors per subscription and category, and the
+    throughput.
+    """
+    subscription_ids = request.subscription_ids if request else None
+    if not subscription_ids:
+        subscription_ids = [settings.AZURE_SUBSCRIPTION_ID] if settings.AZURE_SUBSCRIPTION_ID else []
+    if not subscription_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="subscription_ids is required when AZURE_SUBSCRIPTION_ID is not set",
+        )
+    invalid = [s for s in subscription_ids if not SUBSCRIPTION_ID_PATTERN.match(s)]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid subscription IDs: {invalid}",
+        )
+    # Subscription IDs are GUIDs; one case for authorization and sync state
+    subscription_ids = [s.lower() for s in subscription_ids]
+    allowed = _allowed_subscriptions(current_user["uid"])
+    forbidden = [s for s in subscription_ids if s not in allowed]
+    if forbidden:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Not allowed to sync subscriptions: {forbidden}",
+        )
+
+    try:
+        return await advisor_sync.sync(current_user["uid"], subscription_ids)
+    except AzureCredentialsError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except AzureAdvisorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Azure Advisor sync failed: {str(e)}",
+        )
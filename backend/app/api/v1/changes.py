@@ -0,0 +1,57 @@
+"""
+Real-time change feed for the dashboard
+"""
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator
+
+from app.api.sse import KEEP_ALIVE, event_stream, sse_event
+from app.core.changes import ChangeFeed, TooManyConnectionsError, get_change_feed
+from app.core.config import settings
+from app.core.security import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/stream")
+async def stream_changes(
+    http_request: Request,
+    current_user: dict = Depends(get_current_user),
+    feed: ChangeFeed = Depends(get_change_feed),
+) -> StreamingResponse:
+    """
+    Stream changes to the current user's assessments and recommendations
+    as Server-Sent Events.
+
+    A "snapshot" event carries every document, keyed by collection. Each
+    "change" event then lists the documents of one collection that were
+    added, modified or removed; a modified document carries only the fields
+    it "set" and "unset". Fields in CHANGE_FEED_OMITTED_FIELDS (by default
+    assessment responses) are left out. A client that falls too far behind is sent a new
+    "snapshot" in place of the changes it missed. All of a user's open tabs
+    share one set of Firestore listeners.
+    """
+    user_id = current_user["uid"]
+    if feed.connections(user_id) >= feed.max_connections_per_user:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many open change feeds",
+        )
+
+    async def events() -> AsyncIterator[str]:
+        updates = feed.stream(user_id, heartbeat_seconds=settings.CHANGE_FEED_HEARTBEAT_SECONDS)
+        async with aclosing(updates) as stream:
+            try:
+                async for event in stream:
+                    if await http_request.is_disconnected():
+                        return
+                    if event is None:
+                        yield KEEP_ALIVE
+                        continue
+                    name, data = event
+                    yield sse_event(data, event=name)
+            except TooManyConnectionsError:
+                yield sse_event({"detail": "Too many open change feeds"}, event="error")
+
+    return event_stream(events())
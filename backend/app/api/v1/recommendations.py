@@ -1,95 +1,103 @@
 """
 Recommendations API endpoints
 """
-from fastapi import APIRouter, Depends
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status as http_status
+from typing import List, Optional
 
+from app.core.remediation_library import RemediationLibrary, get_remediation_library
 from app.core.security import get_current_user
+from app.repositories.pagination import InvalidPageTokenError
+from app.repositories.recommendations import (
+    VALID_STATUSES,
+    RecommendationStore,
+    get_recommendation_store,
+)
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 
 @router.get("/")
 async def list_recommendations(
-    pillar_id: str = None,
-    status: str = None,
+    response: Response,
+    pillar_id: Optional[str] = None,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    control_id: Optional[str] = None,
+    assessment_id: Optional[str] = None,
+    sort: str = Query("priority", pattern="^(priority|impact|effort)$"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
     current_user: dict = Depends(get_current_user),
+    store: RecommendationStore = Depends(get_recommendation_store),
 ) -> List[dict]:
-    """List recommendations, optionally filtered by pillar or status"""
-    # In production, fetch from Firestore or generate via AI
-    recommendations = [
-        {
-            "id": "rec-1",
-            "pillar_id": "security",
-            "control_id": "sec-3",
-            "title": "Enable VPC Service Controls",
-            "description": "Implement VPC Service Controls to create a security perimeter around GCP resources.",
-            "priority": "high",
-            "effort": "medium",
-            "impact": "high",
-            "status": "pending",
-        },
-        {
-            "id": "rec-2",
-            "pillar_id": "security",
-            "control_id": "sec-2",
-            "title": "Enable Customer-Managed Encryption Keys",
-            "description": "Use CMEK for sensitive data to maintain control over encryption keys.",
-            "priority": "medium",
-            "effort": "low",
-            "impact": "high",
-            "status": "pending",
-        },
-        {
-            "id": "rec-3",
-            "pillar_id": "cost-optimization",
-            "control_id": "cost-3",
-            "title": "Remove Unused Persistent Disks",
-            "description": "Identify and delete unattached persistent disks to reduce costs.",
-            "priority": "high",
-            "effort": "low",
-            "impact": "medium",
-            "status": "pending",
-        },
-    ]
+    """
+    List recommendations, optionally filtered by pillar, status, priority,
+    control or assessment and sorted by priority, impact or effort.
+    
+    When more results are available the token for the next page is returned
+    in the X-Next-Page-Token header.
+    """
+    filters = {
+        field: value
+        for field, value in {
+            "pillar_id": pillar_id,
+            "status": status,
+            "priority": priority,
+            "control_id": control_id,
+            "assessment_id": assessment_id,
+        }.items()
+        if value
+    }
     
-    # Apply filters
-    if pillar_id:
-        recommendations = [r for r in recommendations if r["pillar_id"] == pillar_id]
-    if status:
-        recommendations = [r for r in recommendations if r["status"] == status]
+    try:
+        recommendations, next_token = await store.list(
+            current_user["uid"],
+            filters,
+            sort_by=sort,
+            limit=limit,
+            page_token=page_token,
+        )
+    except InvalidPageTokenError:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="Invalid page token",
+        )
     
-    return recommendations
+    if next_token:
+        response.headers["X-Next-Page-Token"] = next_token
+    return [recommendation.to_api() for recommendation in recommendations]
 
 
 @router.get("/{recommendation_id}")
 async def get_recommendation(
     recommendation_id: str,
+    cloud_provider: str = "gcp",
     current_user: dict = Depends(get_current_user),
+    store: RecommendationStore = Depends(get_recommendation_store),
+    library: RemediationLibrary = Depends(get_remediation_library),
 ) -> dict:
-    """Get a specific recommendation with full details"""
-    # In production, fetch from Firestore
-    return {
-        "id": recommendation_id,
-        "pillar_id": "security",
-        "control_id": "sec-3",
-        "title": "Enable VPC Service Controls",
-        "description": "Implement VPC Service Controls to create a security perimeter around GCP resources.",
-        "priority": "high",
-        "effort": "medium",
-        "impact": "high",
-        "status": "pending",
-        "remediation_steps": [
-            "Define the service perimeter scope",
-            "Create an access policy",
-            "Configure allowed services",
-            "Test with dry-run mode",
-            "Enable enforcement",
-        ],
-        "resources": [
-            "https://cloud.google.com/vpc-service-controls/docs/overview",
-        ],
-    }
+    """
+    Get a specific recommendation with full details.
+    
+    A recommendation for a catalog control without its own remediation
+    steps gets the remediation library's steps for the cloud provider.
+    """
+    recommendation = await store.get(current_user["uid"], recommendation_id)
+    if recommendation is None:
+        raise HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND,
+            detail="Recommendation not found",
+        )
+    if recommendation.control_id and not recommendation.remediation_steps:
+        entry = await library.lookup(recommendation.control_id, cloud_provider)
+        if entry is not None and entry.steps:
+            recommendation = recommendation.model_copy(
+                update={"remediation_steps": entry.steps}
+            )
+    return recommendation.to_api()
 
 
 @router.patch("/{recommendation_id}/status")
@@ -97,13 +105,22 @@ async def update_recommendation_status(
     recommendation_id: str,
     status: str,
     current_user: dict = Depends(get_current_user),
+    store: RecommendationStore = Depends(get_recommendation_store),
 ) -> dict:
     """Update the status of a recommendation"""
-    valid_statuses = ["pending", "in_progress", "completed", "dismissed"]
-    if status not in valid_statuses:
-        return {"error": f"Invalid status. Must be one of: {valid_statuses}"}
+    if status not in VALID_STATUSES:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid status. Must be one of: {VALID_STATUSES}",
+        )
+    
+    recommendation = await store.update_status(current_user["uid"], recommendation_id, status)
+    if recommendation is None:
+        raise HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND,
+            detail="Recommendation not found",
+        )
     
-    # In production, update Firestore
     return {
         "id": recommendation_id,
         "status": status,
@@ -0,0 +1,164 @@
+"""
+Assessment resource inventory endpoints
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Iterator, List, Optional
+
+from app.core.resources import ResourceInventory, ResourceLimitError, get_resource_inventory
+from app.core.security import get_current_user
+from app.repositories.assessments import (
+    AssessmentAccessDeniedError,
+    AssessmentNotFoundError,
+    AssessmentRepository,
+    get_assessment_repository,
+)
+from app.repositories.pagination import InvalidPageTokenError, decode_page_token, encode_page_token
+
+router = APIRouter()
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+NEXT_PAGE_TOKEN_HEADER = "X-Next-Page-Token"
+
+TYPE_FILTER = Query([], alias="type", description="Resource types to match (any of them)")
+REGION_FILTER = Query([], alias="region", description="Regions to match (any of them)")
+TAG_FILTER = Query(
+    [], alias="tag", description='"key" or "key=value" tags that must all match'
+)
+
+
+async def _check_owned(assessment_id: str, user_id: str, repo: AssessmentRepository) -> None:
+    try:
+        await repo.get_owned(assessment_id, user_id)
+    except AssessmentNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Assessment not found",
+        )
+    except AssessmentAccessDeniedError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this assessment",
+        )
+
+
+@router.post("/{assessment_id}/resources")
+async def upload_resources(
+    assessment_id: str,
+    request: Request,
+    replace: bool = Query(False, description="Replace the whole inventory instead of adding to it"),
+    current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
+    inventory: ResourceInventory = Depends(get_resource_inventory),
+) -> dict:
+    """
+    Upload an assessment's cloud resources as NDJSON.
+
+    Each line is an object with externalId, type and optionally name,
+    region and tags. The body is indexed as it streams in; a resource whose
+    externalId is already indexed replaces it. Invalid lines, and lines over
+    RESOURCE_INGEST_MAX_LINE_BYTES, are rejected and reported by line number
+    without failing the upload.
+    """
+    await _check_owned(assessment_id, current_user["uid"], repo)
+    try:
+        return await inventory.ingest(assessment_id, request.stream(), replace=replace)
+    except ResourceLimitError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+
+@router.get("/{assessment_id}/resources")
+async def list_resources(
+    assessment_id: str,
+    types: List[str] = TYPE_FILTER,
+    regions: List[str] = REGION_FILTER,
+    tags: List[str] = TAG_FILTER,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
+    inventory: ResourceInventory = Depends(get_resource_inventory),
+) -> StreamingResponse:
+    """
+    Stream an assessment's resources matching the filters as NDJSON, in
+    upload order.
+
+    Results are paginated; when more are available the token for the next
+    page is returned in the X-Next-Page-Token header.
+    """
+    await _check_owned(assessment_id, current_user["uid"], repo)
+    after = None
+    if page_token:
+        try:
+            (after,) = decode_page_token(page_token, 1)
+        except InvalidPageTokenError:
+            after = None
+        if not isinstance(after, int) or isinstance(after, bool) or after < 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid page token",
+            )
+
+    headers = {}
+    chunks: Iterator[str] = iter(())
+    index = inventory.get(assessment_id)
+    if index is not None:
+        rows, next_after = index.page(types, regions, tags, after=after, limit=limit)
+        chunks = index.ndjson(rows)
+        if next_after is not None:
+            headers[NEXT_PAGE_TOKEN_HEADER] = encode_page_token(next_after)
+
+    async def lines() -> AsyncIterator[str]:
+        # Chunks take about a millisecond to format: serve them on the loop
+        # rather than handing each to a worker thread
+        for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+
+@router.get("/{assessment_id}/resources/facets")
+async def get_resource_facets(
+    assessment_id: str,
+    types: List[str] = TYPE_FILTER,
+    regions: List[str] = REGION_FILTER,
+    tags: List[str] = TAG_FILTER,
+    top: int = Query(20, ge=1, le=1000, description="Values returned per facet"),
+    current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
+    inventory: ResourceInventory = Depends(get_resource_inventory),
+) -> dict:
+    """
+    Count an assessment's resources per type, region, tag key and tag.
+
+    Counts are among the resources matching the filters, except that each
+    facet ignores its own filter so the other values of a filtered facet
+    keep their counts.
+    """
+    await _check_owned(assessment_id, current_user["uid"], repo)
+    index = inventory.get(assessment_id)
+    if index is None:
+        return {
+            "total": 0,
+            "matched": 0,
+            "facets": {"type": [], "region": [], "tag_key": [], "tag": []},
+        }
+    return index.facets(types, regions, tags, top=top)
+
+
+@router.delete("/{assessment_id}/resources")
+async def delete_resources(
+    assessment_id: str,
+    current_user: dict = Depends(get_current_user),
+    repo: AssessmentRepository = Depends(get_assessment_repository),
+    inventory: ResourceInventory = Depends(get_resource_inventory),
+) -> dict:
+    """Delete an assessment's resource inventory"""
+    await _check_owned(assessment_id, current_user["uid"], repo)
+    if not inventory.delete(assessment_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No resources uploaded for this assessment",
+        )
+    return {"message": "Resources deleted successfully", "id": assessment_id}
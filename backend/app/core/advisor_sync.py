@@ -0,0 +1,326 @@
+"""
+Azure Advisor sync: streams Advisor recommendations into the recommendation store
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from contextlib import aclosing
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.core.azure_advisor import (
+    ADVISOR_CATEGORIES,
+    AzureAdvisorClient,
+    get_advisor_client,
+)
+from app.core.coalesce import SingleFlight
+from app.core.config import settings
+from app.core.metrics import ADVISOR_ITEMS
+from app.repositories.advisor_sync import (
+    PageState,
+    PartitionKey,
+    SyncState,
+    SyncStateStore,
+    get_sync_state_store,
+)
+from app.repositories.recommendations import (
+    Recommendation,
+    RecommendationStore,
+    get_recommendation_store,
+)
+
+logger = logging.getLogger(__name__)
+
+SOURCE = "azure-advisor"
+
+# Advisor category -> WAF pillar
+CATEGORY_PILLARS = {
+    "Cost": "cost-optimization",
+    "Security": "security",
+    "HighAvailability": "reliability",
+    "OperationalExcellence": "operational-excellence",
+    "Performance": "performance-efficiency",
+}
+
+IMPACT_LEVELS = {"High": "high", "Medium": "medium", "Low": "low"}
+
+# Statuses a recommendation resolved in Azure is moved out of
+OPEN_STATUSES = ("pending", "in_progress")
+
+# Resolved recommendations updated at once
+RESOLVE_CONCURRENCY = 25
+
+
+def recommendation_id(user_id: str, advisor_id: str) -> str:
+    """Stable recommendation ID for a user's copy of an Advisor recommendation"""
+    digest = hashlib.sha256(f"{user_id}\n{advisor_id.lower()}".encode("utf-8")).hexdigest()
+    return f"azure-{digest[:24]}"
+
+
+def to_recommendation(
+    user_id: str, subscription_id: str, category: str, item: dict
+) -> Recommendation:
+    """
+    Map an Advisor recommendation resource onto the recommendation shape.
+
+    The status is left unset so a merge write keeps the user's status.
+    """
+    properties = item.get("properties") or {}
+    description = properties.get("shortDescription") or {}
+    impact = IMPACT_LEVELS.get(properties.get("impact"), "medium")
+    metadata = properties.get("resourceMetadata") or {}
+    link = properties.get("learnMoreLink")
+    return Recommendation(
+        id=recommendation_id(user_id, item["id"]),
+        pillar_id=CATEGORY_PILLARS.get(category, "operational-excellence"),
+        user_id=user_id,
+        title=description.get("problem") or item.get("name", ""),
+        description=description.get("solution") or "",
+        priority=impact,
+        impact=impact,
+        effort="medium",
+        resources=[link] if link else [],
+        source=SOURCE,
+        sourceId=item["id"],
+        cloudProvider="azure",
+        subscriptionId=subscription_id,
+        category=category,
+        impactedField=properties.get("impactedField"),
+        impactedValue=properties.get("impactedValue"),
+        resourceId=metadata.get("resourceId"),
+    )
+
+
+def fingerprint(recommendation: Recommendation) -> str:
+    """Hash of the synced fields; an unchanged recommendation is not written again"""
+    document = json.dumps(recommendation.to_document(merge=True), sort_keys=True, default=str)
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()[:16]
+
+
+class AdvisorSync:
+    """
+    Syncs a user's Azure Advisor recommendations into the recommendation store.
+
+    Each subscription and Advisor category is listed as its own page chain,
+    several at once over the client's pooled connections. Pages flow through
+    a bounded queue to a single writer that upserts in batches, so memory
+    stays flat however many recommendations a subscription has.
+
+    Syncs are incremental: each page is requested with the ETag it had at
+    the last sync, a page answered with 304 keeps the recommendations it
+    listed then, and a category whose pages are all unchanged is skipped.
+    Recommendations whose synced fields have not changed are not written
+    again. Recommendations that disappeared from a complete listing were
+    resolved in Azure and are marked completed.
+    """
+
+    def __init__(
+        self,
+        recommendations: RecommendationStore,
+        states: SyncStateStore,
+        concurrency: int = 8,
+        queue_pages: int = 16,
+        batch_size: int = 500,
+        get_client: Callable[[], AzureAdvisorClient] = get_advisor_client,
+    ):
+        self.recommendations = recommendations
+        self.states = states
+        self.concurrency = concurrency
+        self.queue_pages = queue_pages
+        self.batch_size = batch_size
+        self.get_client = get_client
+        # A second trigger while a sync runs waits for the running one
+        self._syncs = SingleFlight("advisor_sync")
+
+    async def sync(self, user_id: str, subscription_ids: Sequence[str]) -> dict:
+        """
+        Sync the user's recommendations for the given subscriptions.
+
+        Returns:
+            dict with the counts of pages and recommendations, per-category
+            errors and the throughput
+
+        Raises:
+            AzureCredentialsError: If no service principal is configured
+            AzureAdvisorError: If no access token can be obtained
+        """
+        key = tuple(sorted(set(subscription_ids)))
+        return await self._syncs.do(user_id, key, lambda: self._sync(user_id, key))
+
+    async def _sync(self, user_id: str, subscription_ids: Tuple[str, ...]) -> dict:
+        client = self.get_client()
+        # Fail fast on bad credentials instead of once per category
+        await client.access_token()
+        started = time.perf_counter()
+        partitions = [
+            (user_id, subscription_id, category)
+            for subscription_id in subscription_ids
+            for category in ADVISOR_CATEGORIES
+        ]
+        states = await self.states.get_many(partitions)
+        counts = dict.fromkeys(
+            ("pages", "not_modified", "fetched", "written", "unchanged", "resolved"), 0
+        )
+        errors: List[dict] = []
+        # Pages of changed recommendations, then (state, resolved IDs) once a
+        # category is complete; None after the last category
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_pages)
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(key: PartitionKey) -> None:
+            _, subscription_id, category = key
+            previous = states.get(key)
+            seen = previous.fingerprints if previous else {}
+            known = previous.pages if previous else []
+            fingerprints: Dict[str, str] = {}
+            page_states: List[PageState] = []
+            modified = False
+            try:
+                async with slots:
+                    pages = client.pages(
+                        subscription_id,
+                        category,
+                        known=[(page.etag, page.next_link) for page in known],
+                    )
+                    async with aclosing(pages) as stream:
+                        async for page in stream:
+                            if page.not_modified:
+                                # Lists what it did at the last sync
+                                counts["not_modified"] += 1
+                                cached = known[len(page_states)]
+                                page_states.append(cached)
+                                fingerprints.update(
+                                    (i, seen[i]) for i in cached.ids if i in seen
+                                )
+                                continue
+                            modified = True
+                            counts["pages"] += 1
+                            counts["fetched"] += len(page.items)
+                            ids = []
+                            changed = []
+                            for item in page.items:
+                                recommendation = to_recommendation(
+                                    user_id, subscription_id, category, item
+                                )
+                                ids.append(recommendation.id)
+                                value = fingerprint(recommendation)
+                                fingerprints[recommendation.id] = value
+                                if seen.get(recommendation.id) == value:
+                                    counts["unchanged"] += 1
+                                    continue
+                                if recommendation.id not in seen:
+                                    recommendation.status = "pending"
+                                changed.append(recommendation)
+                            page_states.append(
+                                PageState(etag=page.etag, next_link=page.next_link, ids=ids)
+                            )
+                            if changed:
+                                await queue.put(changed)
+            except Exception as e:
+                # The page ETags are dropped, so the next sync lists the
+                # category in full again
+                logger.warning("Advisor sync of %s/%s failed: %s", subscription_id, category, e)
+                errors.append(
+                    {"subscription_id": subscription_id, "category": category, "detail": str(e)}
+                )
+                if previous and previous.pages:
+                    await queue.put((previous.model_copy(update={"pages": []}), set()))
+                return
+            if not modified:
+                # Every page matched: the category is as the last sync left it
+                return
+            state = SyncState(
+                user_id=user_id,
+                subscription_id=subscription_id,
+                category=category,
+                pages=page_states,
+                fingerprints=fingerprints,
+            )
+            await queue.put((state, set(seen) - set(fingerprints)))
+
+        async def produce() -> None:
+            await asyncio.gather(*(fetch(key) for key in partitions))
+            await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            await self._write(user_id, queue, counts)
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+        elapsed = time.perf_counter() - started
+        ADVISOR_ITEMS.inc(counts["written"], outcome="written")
+        ADVISOR_ITEMS.inc(counts["unchanged"], outcome="unchanged")
+        ADVISOR_ITEMS.inc(counts["resolved"], outcome="resolved")
+        return {
+            "subscription_ids": list(subscription_ids),
+            "categories": len(partitions),
+            **counts,
+            "errors": errors,
+            "duration_seconds": round(elapsed, 3),
+            "items_per_second": round(counts["fetched"] / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+    async def _write(self, user_id: str, queue: asyncio.Queue, counts: Dict[str, int]) -> None:
+        """Drain the queue into batched upserts, recording each completed category"""
+        batch: List[Recommendation] = []
+
+        async def flush(size: int) -> None:
+            chunk = batch[:size]
+            del batch[:size]
+            counts["written"] += await self.recommendations.upsert_many(chunk, merge=True)
+
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                break
+            if isinstance(entry, list):
+                batch.extend(entry)
+                while len(batch) >= self.batch_size:
+                    await flush(self.batch_size)
+                continue
+            # A category is complete: its recommendations must be stored
+            # before its fingerprints are
+            state, resolved = entry
+            if batch:
+                await flush(len(batch))
+            counts["resolved"] += await self._resolve(user_id, resolved)
+            await self.states.put(state)
+        if batch:
+            await flush(len(batch))
+
+    async def _resolve(self, user_id: str, recommendation_ids: Set[str]) -> int:
+        """Mark open recommendations that Advisor no longer lists as completed"""
+
+        async def resolve(recommendation_id: str) -> bool:
+            recommendation = await self.recommendations.get(user_id, recommendation_id)
+            if recommendation is None or recommendation.status not in OPEN_STATUSES:
+                return False
+            await self.recommendations.update_status(user_id, recommendation_id, "completed")
+            return True
+
+        pending = sorted(recommendation_ids)
+        resolved = 0
+        for start in range(0, len(pending), RESOLVE_CONCURRENCY):
+            chunk = pending[start:start + RESOLVE_CONCURRENCY]
+            resolved += sum(await asyncio.gather(*(resolve(i) for i in chunk)))
+        return resolved
+
+
+_sync: Optional[AdvisorSync] = None
+
+
+def get_advisor_sync() -> AdvisorSync:
+    """Get the shared Advisor sync (FastAPI dependency)"""
+    global _sync
+    if _sync is None:
+        _sync = AdvisorSync(
+            get_recommendation_store(),
+            get_sync_state_store(),
+            concurrency=settings.AZURE_ADVISOR_CONCURRENCY,
+            queue_pages=settings.AZURE_ADVISOR_QUEUE_PAGES,
+            batch_size=settings.AZURE_ADVISOR_WRITE_BATCH_SIZE,
+        )
+    return _sync
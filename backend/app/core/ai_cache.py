@@ -0,0 +1,200 @@
+"""
+Content-addressed response cache for AI generations
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import firestore_operation
+
+if TYPE_CHECKING:
+    from google.cloud.firestore import AsyncClient
+
+
+def make_cache_key(model: str, template: str, template_version: str, inputs: dict) -> str:
+    """
+    Build a stable cache key from the model, prompt template and inputs.
+
+    Args:
+        model: Gemini model name
+        template: Prompt template name (e.g., "analyze", "remediation")
+        template_version: Version of the prompt template
+        inputs: Normalized prompt inputs
+
+    Returns:
+        Hex SHA-256 digest of the canonical JSON encoding
+    """
+    payload = json.dumps(
+        {"model": model, "template": template, "version": template_version, "inputs": inputs},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_text(value: str) -> str:
+    """Collapse whitespace so cosmetic differences share a cache entry"""
+    return " ".join(value.split())
+
+
+class SQLiteCacheBackend:
+    """Persistent cache backend stored in a local SQLite file"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = asyncio.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM ai_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def _set(self, key: str, value: dict, ttl_seconds: float) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO ai_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl_seconds),
+        )
+        self._conn.commit()
+
+    async def get(self, key: str) -> Optional[dict]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: dict, ttl_seconds: float) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, value, ttl_seconds)
+
+
+class FirestoreCacheBackend:
+    """
+    Persistent cache backend stored in a Firestore collection.
+
+    Entries carry an expiresAt timestamp so a Firestore TTL policy can
+    delete them; expired entries not deleted yet are ignored on read.
+    """
+
+    def __init__(self, db: "AsyncClient", collection: str = "aiCache"):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    @firestore_operation("ai_cache.get")
+    async def get(self, key: str) -> Optional[dict]:
+        doc = await self.collection.document(key).get()
+        if not doc.exists:
+            return None
+        entry = doc.to_dict()
+        expires_at = entry.get("expiresAt")
+        if not isinstance(expires_at, datetime) or expires_at < datetime.now(timezone.utc):
+            return None
+        return entry.get("value")
+
+    @firestore_operation("ai_cache.set")
+    async def set(self, key: str, value: dict, ttl_seconds: float) -> None:
+        await self.collection.document(key).set({
+            "value": value,
+            "expiresAt": datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds),
+        })
+
+
+class AIResponseCache:
+    """In-process LRU cache with TTL, optionally backed by a persistent store"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        backend: Optional[Any] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.backend_hits = 0
+
+    def _get_local(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the cached value, or None on a miss"""
+        value = self._get_local(key)
+        if value is None and self.backend is not None:
+            value = await self.backend.get(key)
+            if value is not None:
+                self.backend_hits += 1
+                self._set_local(key, value)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(value)
+
+    async def set(self, key: str, value: dict) -> None:
+        """Store a value locally and in the persistent backend, if any"""
+        self._set_local(key, dict(value))
+        if self.backend is not None:
+            await self.backend.set(key, value, self.ttl_seconds)
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "backend_hits": self.backend_hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def build_ai_cache() -> Optional[AIResponseCache]:
+    """Create the AI response cache from settings, or None if disabled"""
+    if not settings.AI_CACHE_ENABLED:
+        return None
+
+    backend = None
+    if settings.AI_CACHE_BACKEND == "sqlite":
+        backend = SQLiteCacheBackend(settings.AI_CACHE_SQLITE_PATH)
+    elif settings.AI_CACHE_BACKEND == "firestore":
+        from app.core.security import get_async_firestore_client
+
+        backend = FirestoreCacheBackend(
+            get_async_firestore_client(), settings.AI_CACHE_FIRESTORE_COLLECTION
+        )
+
+    return AIResponseCache(
+        max_entries=settings.AI_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.AI_CACHE_TTL_SECONDS,
+        backend=backend,
+    )
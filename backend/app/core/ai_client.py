@@ -1,35 +1,204 @@
 """
 Gemini AI client for WAF recommendations and analysis
 """
-import google.generativeai as genai
-from typing import List, Optional
+import asyncio
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 
+from app.core.ai_cache import build_ai_cache, make_cache_key, normalize_text
+from app.core.ai_providers import ANALYSIS, CHAT, REMEDIATION, build_router
+from app.core.analysis import ANALYSIS_RESPONSE_SCHEMA, AnalysisParseError, parse_analysis
 from app.core.config import settings
+from app.core.metrics import AI_CALLS, AI_LATENCY, AI_TOKENS, record_phase
+from app.core.prompts import TABLE_LEGEND, chunk_rows, encode_table, pack_texts
+
+# Bump a template's version whenever its prompt text changes so stale
+# cached responses are no longer served
+PROMPT_VERSIONS = {
+    "analyze": "4",
+    "remediation": "1",
+    "remediation_library": "1",
+}
+
+ANALYSIS_FORMAT = """Respond in JSON format:
+{
+    "score": <number>,
+    "summary": "<brief summary>",
+    "recommendations": [
+        {
+            "priority": "high|medium|low",
+            "title": "<recommendation title>",
+            "description": "<detailed description>",
+            "effort": "low|medium|high",
+            "impact": "low|medium|high",
+            "control_id": "<related control ID, if any>"
+        }
+    ],
+    "quick_wins": ["<quick win 1>", "<quick win 2>"],
+    "strategic_improvements": ["<improvement 1>", "<improvement 2>"]
+}
+"""
+
+# Constrains analysis output to JSON matching ANALYSIS_RESPONSE_SCHEMA
+ANALYSIS_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": ANALYSIS_RESPONSE_SCHEMA,
+}
+
+# Routing task of each operation (metrics label)
+OPERATION_TASKS = {
+    "chat": CHAT,
+    "chat_stream": CHAT,
+    "chat_summary": CHAT,
+    "analyze": ANALYSIS,
+    "analyze_chunk": ANALYSIS,
+    "analyze_merge": ANALYSIS,
+    "analyze_reduce": ANALYSIS,
+    "remediation": REMEDIATION,
+    "remediation_stream": REMEDIATION,
+    "remediation_library": REMEDIATION,
+}
+
+# How conversation roles are labelled in prompts
+ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+
+FINDINGS_FORMAT = (
+    "List the most important gaps and strengths as at most 8 short bullet points, "
+    "each naming the control IDs involved. Do not give an overall score."
+)
+
+
+class AITimeoutError(Exception):
+    """Raised when a Gemini call does not complete within the configured timeout"""
 
 
 class AIClient:
     """Client for Gemini AI interactions"""
     
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+        # Bounds the number of concurrent Gemini calls across all requests
+        # (hedged duplicates included)
+        self._semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
+        # Picks the model for each call; SDKs are loaded on first use
+        self.router = build_router(hedge_slots=self._semaphore)
+        self.cache = build_ai_cache()
     
-    async def analyze_assessment(
+    def _cache_key(self, template: str, inputs: dict) -> str:
+        """Cache key for a prompt template and its normalized inputs"""
+        models = self.router.signature(OPERATION_TASKS[template])
+        return make_cache_key(models, template, PROMPT_VERSIONS[template], inputs)
+    
+    def _record_call(self, operation: str, start: float, outcome: str, usage=None) -> None:
+        """Record latency, outcome and token usage of a Gemini call"""
+        elapsed = time.perf_counter() - start
+        AI_CALLS.inc(operation=operation, outcome=outcome)
+        AI_LATENCY.observe(elapsed, operation=operation)
+        record_phase("gemini", elapsed)
+        if usage is not None:
+            AI_TOKENS.inc(
+                getattr(usage, "prompt_token_count", 0) or 0, operation=operation, kind="prompt"
+            )
+            AI_TOKENS.inc(
+                getattr(usage, "candidates_token_count", 0) or 0, operation=operation, kind="response"
+            )
+    
+    async def _generate(
         self,
-        pillar: str,
-        responses: List[dict],
-    ) -> dict:
+        prompt: str,
+        operation: str,
+        generation_config: Optional[dict] = None,
+    ) -> str:
         """
-        Analyze assessment responses and generate recommendations.
+        Run a single generation on the provider the router picks for the
+        operation's task, without blocking the event loop.
+        
+        Waiting for a free slot in the concurrency pool counts towards the
+        timeout, so a saturated instance fails fast instead of queueing forever.
         
         Args:
-            pillar: WAF pillar name (e.g., "security", "reliability")
-            responses: List of assessment question responses
+            prompt: Full prompt text
+            operation: Metrics label for the call (e.g. "chat")
+            generation_config: Optional Gemini generation config, e.g. a
+                JSON response schema
             
         Returns:
-            dict with score, recommendations, and priorities
+            Generated response text
         """
-        prompt = f"""You are a cloud architecture expert specializing in the Well-Architected Framework.
+        async def call():
+            async with self._semaphore:
+                return await self.router.generate(
+                    OPERATION_TASKS[operation], prompt, generation_config
+                )
+        
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(call(), timeout=settings.AI_REQUEST_TIMEOUT_SECONDS)
+            text = response.text
+        except asyncio.TimeoutError:
+            self._record_call(operation, start, "timeout")
+            raise AITimeoutError(
+                f"Gemini call exceeded {settings.AI_REQUEST_TIMEOUT_SECONDS:g}s timeout"
+            )
+        except Exception:
+            self._record_call(operation, start, "error")
+            raise
+        self._record_call(operation, start, "ok", getattr(response, "usage_metadata", None))
+        return text
+    
+    async def _generate_stream(self, prompt: str, operation: str) -> AsyncIterator[str]:
+        """
+        Stream a Gemini generation chunk by chunk.
+        
+        The concurrency slot is held for the lifetime of the stream. Closing
+        the generator early (e.g. on client disconnect) cancels the upstream
+        call so abandoned streams stop consuming quota. The timeout applies
+        to the wait for each chunk rather than to the whole stream.
+        
+        Args:
+            prompt: Full prompt text
+            operation: Metrics label for the call (e.g. "chat_stream")
+            
+        Yields:
+            Text chunks as they are generated
+        """
+        timeout = settings.AI_REQUEST_TIMEOUT_SECONDS
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._record_call(operation, start, "timeout")
+            raise AITimeoutError(f"No Gemini slot available within {timeout:g}s")
+        
+        chunks = None
+        usage = None
+        outcome = "cancelled"
+        try:
+            chunks = self.router.stream(OPERATION_TASKS[operation], prompt)
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    break
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if chunk.text:
+                    yield chunk.text
+            outcome = "ok"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise AITimeoutError(f"Gemini stream stalled for more than {timeout:g}s")
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            if chunks is not None and hasattr(chunks, "aclose"):
+                await chunks.aclose()
+            self._semaphore.release()
+            self._record_call(operation, start, outcome, usage)
+    
+    def _analyze_prompt(self, pillar: str, table: str) -> str:
+        """Build the single-call analysis prompt"""
+        return f"""You are a cloud architecture expert specializing in the Well-Architected Framework.
 
 Analyze the following {pillar.upper()} pillar assessment responses and provide:
 1. An overall score (0-100)
@@ -37,53 +206,175 @@ Analyze the following {pillar.upper()} pillar assessment responses and provide:
 3. Quick wins that can be implemented immediately
 4. Long-term strategic improvements
 
-Assessment Responses:
-{responses}
+Assessment Responses ({TABLE_LEGEND}):
+{table}
 
-Respond in JSON format:
-{{
-    "score": <number>,
-    "summary": "<brief summary>",
-    "recommendations": [
-        {{
-            "priority": "high|medium|low",
-            "title": "<recommendation title>",
-            "description": "<detailed description>",
-            "effort": "low|medium|high",
-            "impact": "low|medium|high"
-        }}
-    ],
-    "quick_wins": ["<quick win 1>", "<quick win 2>"],
-    "strategic_improvements": ["<improvement 1>", "<improvement 2>"]
-}}
-"""
-        
-        response = self.model.generate_content(prompt)
+{ANALYSIS_FORMAT}"""
+    
+    def _analyze_chunk_prompt(self, pillar: str, table: str, part: int, parts: int) -> str:
+        """Build the map-step prompt for one chunk of a large assessment"""
+        return f"""You are a cloud architecture expert specializing in the Well-Architected Framework.
+
+Below is part {part} of {parts} of a {pillar.upper()} pillar assessment ({TABLE_LEGEND}):
+{table}
+
+{FINDINGS_FORMAT}"""
+    
+    def _merge_findings_prompt(self, pillar: str, findings: List[str]) -> str:
+        """Build the prompt that condenses findings from several chunks"""
+        sections = "\n\n".join(findings)
+        return f"""You are a cloud architecture expert specializing in the Well-Architected Framework.
+
+Below are findings from several parts of a {pillar.upper()} pillar assessment:
+
+{sections}
+
+Combine them. {FINDINGS_FORMAT}"""
+    
+    def _reduce_prompt(self, pillar: str, findings: List[str], total_responses: int) -> str:
+        """Build the reduce-step prompt that turns chunk findings into the analysis"""
+        sections = "\n\n".join(
+            f"Part {i}:\n{text}" for i, text in enumerate(findings, start=1)
+        )
+        return f"""You are a cloud architecture expert specializing in the Well-Architected Framework.
+
+A {pillar.upper()} pillar assessment of {total_responses} responses was reviewed in parts.
+Based on the findings from every part below, provide:
+1. An overall score (0-100)
+2. Top 3 prioritized recommendations
+3. Quick wins that can be implemented immediately
+4. Long-term strategic improvements
+
+{sections}
+
+{ANALYSIS_FORMAT}"""
+    
+    async def _generate_all(self, prompts: List[str], operation: str) -> List[str]:
+        """Run several generations concurrently; cancel the rest if one fails"""
+        tasks = [asyncio.ensure_future(self._generate(prompt, operation)) for prompt in prompts]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+    
+    @staticmethod
+    def _encode_responses(responses: List[dict]) -> List[str]:
+        """Split responses into budget-sized chunks and encode each as a table"""
+        chunks = chunk_rows(responses, settings.AI_PROMPT_TOKEN_BUDGET)
+        return [encode_table(chunk) for chunk in chunks]
+    
+    async def _map_reduce_analysis(self, pillar: str, tables: List[str], total_responses: int) -> str:
+        """
+        Analyze chunks concurrently, then merge their findings in one call.
         
-        # Parse the response (in production, add proper JSON parsing with error handling)
-        return {
-            "raw_response": response.text,
-            "pillar": pillar,
-        }
+        When the combined findings exceed the token budget they are first
+        condensed group by group, so the final prompt stays bounded.
+        """
+        findings = await self._generate_all(
+            [
+                self._analyze_chunk_prompt(pillar, table, i, len(tables))
+                for i, table in enumerate(tables, start=1)
+            ],
+            "analyze_chunk",
+        )
+        budget = settings.AI_PROMPT_TOKEN_BUDGET
+        groups = pack_texts(findings, budget)
+        # Stop once merging no longer shrinks the input (oversized findings)
+        while 1 < len(groups) < len(findings):
+            findings = await self._generate_all(
+                [self._merge_findings_prompt(pillar, group) for group in groups],
+                "analyze_merge",
+            )
+            groups = pack_texts(findings, budget)
+        return await self._generate(
+            self._reduce_prompt(pillar, findings, total_responses),
+            "analyze_reduce",
+            ANALYSIS_GENERATION_CONFIG,
+        )
     
-    async def generate_remediation_steps(
+    async def analyze_assessment(
         self,
-        control: str,
-        current_state: str,
-        cloud_provider: str = "gcp",
+        pillar: str,
+        responses: List[dict],
+        use_cache: bool = True,
     ) -> dict:
         """
-        Generate step-by-step remediation guidance for a specific control.
+        Analyze assessment responses and generate recommendations.
+        
+        Responses are encoded as a compact table. If that exceeds
+        AI_PROMPT_TOKEN_BUDGET, the responses are split into chunks that are
+        analyzed concurrently and merged in a final call.
         
         Args:
-            control: The control to remediate
-            current_state: Description of current implementation
-            cloud_provider: Target cloud provider
+            pillar: WAF pillar name (e.g., "security", "reliability")
+            responses: List of assessment question responses
+            use_cache: Serve identical earlier analyses from the cache
             
         Returns:
-            dict with remediation steps and code snippets
+            dict with the generated text ("raw_response") and the parsed
+            AssessmentAnalysis ("analysis"), which is None with a
+            "parse_error" if no usable JSON could be recovered
         """
-        prompt = f"""You are a cloud security expert. Generate step-by-step remediation guidance for:
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(
+                "analyze", {"pillar": pillar.strip().lower(), "responses": responses}
+            )
+            if use_cache:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+        
+        # Encoding thousands of responses takes milliseconds; keep it off the loop
+        tables = await asyncio.to_thread(self._encode_responses, responses)
+        if len(tables) == 1:
+            response_text = await self._generate(
+                self._analyze_prompt(pillar, tables[0]), "analyze", ANALYSIS_GENERATION_CONFIG
+            )
+        else:
+            response_text = await self._map_reduce_analysis(pillar, tables, len(responses))
+        
+        result = {
+            "raw_response": response_text,
+            "pillar": pillar,
+        }
+        if len(tables) > 1:
+            result["chunks"] = len(tables)
+        try:
+            result["analysis"] = parse_analysis(response_text).model_dump()
+        except AnalysisParseError as e:
+            # Keep the text for the caller but do not cache it, so the next
+            # request gets a fresh generation
+            result["analysis"] = None
+            result["parse_error"] = str(e)
+            return result
+        if cache_key is not None:
+            await self.cache.set(cache_key, result)
+        return result
+    
+    def _remediation_cache_key(
+        self,
+        control: str,
+        current_state: str,
+        cloud_provider: str,
+    ) -> Optional[str]:
+        """Cache key for remediation guidance, or None if caching is disabled"""
+        if self.cache is None:
+            return None
+        return self._cache_key(
+            "remediation",
+            {
+                "control": normalize_text(control),
+                "current_state": normalize_text(current_state),
+                "cloud_provider": cloud_provider.strip().lower(),
+            },
+        )
+    
+    def _remediation_prompt(self, control: str, current_state: str, cloud_provider: str) -> str:
+        """Build the remediation guidance prompt"""
+        return f"""You are a cloud security expert. Generate step-by-step remediation guidance for:
 
 Control: {control}
 Current State: {current_state}
@@ -97,38 +388,230 @@ Provide:
 
 Respond in a structured format suitable for a technical audience.
 """
+    
+    async def generate_library_remediation(
+        self, pillar: str, control_id: str, control_name: str, cloud_provider: str
+    ) -> str:
+        """
+        Generate generic remediation guidance for a catalog control, for the
+        remediation library.
+        
+        Args:
+            pillar: Pillar name
+            control_id: Catalog control ID
+            control_name: Catalog control name
+            cloud_provider: Target cloud provider
+            
+        Returns:
+            Guidance text starting with numbered steps
+        """
+        prompt = f"""You are a cloud security expert. Write reusable remediation guidance for a
+{pillar} control that is not implemented or only partially implemented:
+
+Control: {control_id} {control_name}
+Cloud Provider: {cloud_provider.upper()}
+
+Start with the remediation steps as a numbered list, one short imperative sentence per step.
+Then give:
+1. Relevant CLI commands or IaC snippets
+2. Verification steps to confirm the fix
+3. Estimated time to implement
+
+Respond in a structured format suitable for a technical audience.
+"""
+        return await self._generate(prompt, "remediation_library")
+    
+    async def generate_remediation_steps(
+        self,
+        control: str,
+        current_state: str,
+        cloud_provider: str = "gcp",
+        use_cache: bool = True,
+    ) -> dict:
+        """
+        Generate step-by-step remediation guidance for a specific control.
         
-        response = self.model.generate_content(prompt)
+        Args:
+            control: The control to remediate
+            current_state: Description of current implementation
+            cloud_provider: Target cloud provider
+            use_cache: Serve identical earlier guidance from the cache
+            
+        Returns:
+            dict with remediation steps and code snippets
+        """
+        cache_key = self._remediation_cache_key(control, current_state, cloud_provider)
+        if cache_key is not None and use_cache:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        prompt = self._remediation_prompt(control, current_state, cloud_provider)
+        remediation = await self._generate(prompt, "remediation")
         
-        return {
+        result = {
             "control": control,
             "cloud_provider": cloud_provider,
-            "remediation": response.text,
+            "remediation": remediation,
         }
+        if cache_key is not None:
+            await self.cache.set(cache_key, result)
+        return result
+    
+    def _chat_prompt(
+        self,
+        message: str,
+        context: Optional[str] = None,
+        summary: Optional[str] = None,
+        history: Sequence[Tuple[str, str]] = (),
+    ) -> str:
+        """Build the chat prompt from the system context, conversation and user message"""
+        system_context = """You are a helpful cloud architecture assistant specializing in the 
+Well-Architected Framework. Help users understand best practices across Security, Reliability, 
+Performance Efficiency, Cost Optimization, and Operational Excellence pillars."""
+        
+        full_prompt = f"{system_context}\n\n"
+        if context:
+            full_prompt += f"Context: {context}\n\n"
+        if summary:
+            full_prompt += f"Summary of the conversation so far: {summary}\n\n"
+        for role, text in history:
+            full_prompt += f"{ROLE_LABELS.get(role, role)}: {text}\n\n"
+        full_prompt += f"User: {message}"
+        return full_prompt
     
-    async def chat(self, message: str, context: Optional[str] = None) -> str:
+    async def chat(
+        self,
+        message: str,
+        context: Optional[str] = None,
+        summary: Optional[str] = None,
+        history: Sequence[Tuple[str, str]] = (),
+    ) -> str:
         """
         General chat interface for WAF-related questions.
         
         Args:
             message: User's question
             context: Optional context about current assessment
+            summary: Summary of earlier parts of the conversation
+            history: Recent (role, text) turns of the conversation, oldest first
             
         Returns:
             AI response string
         """
-        system_context = """You are a helpful cloud architecture assistant specializing in the 
-Well-Architected Framework. Help users understand best practices across Security, Reliability, 
-Performance Efficiency, Cost Optimization, and Operational Excellence pillars."""
+        prompt = self._chat_prompt(message, context, summary, history)
+        return await self._generate(prompt, "chat")
+    
+    async def summarize_conversation(
+        self, summary: str, history: Sequence[Tuple[str, str]]
+    ) -> str:
+        """
+        Fold turns into a conversation's rolling summary.
         
-        full_prompt = f"{system_context}\n\n"
-        if context:
-            full_prompt += f"Context: {context}\n\n"
-        full_prompt += f"User: {message}"
+        Only the previous summary and the new turns are sent, so the cost
+        does not grow with the length of the conversation.
+        
+        Args:
+            summary: Current summary ("" if there is none yet)
+            history: (role, text) turns to add to it, oldest first
+            
+        Returns:
+            The updated summary
+        """
+        turns = "\n\n".join(f"{ROLE_LABELS.get(role, role)}: {text}" for role, text in history)
+        prompt = f"""You maintain the running summary of a conversation between a user and a cloud
+architecture assistant. Update the summary with the new messages. Keep every fact, decision and
+open question that later answers may depend on (cloud providers, services, control IDs, scores,
+constraints), drop pleasantries, and use at most {settings.CHAT_SUMMARY_MAX_TOKENS * 3 // 4} words.
+
+Current summary:
+{summary or "(none)"}
+
+New messages:
+{turns}
+
+Respond with the updated summary only."""
+        generation_config = {"max_output_tokens": settings.CHAT_SUMMARY_MAX_TOKENS}
+        text = await self._generate(prompt, "chat_summary", generation_config=generation_config)
+        return text.strip()
+    
+    async def stream_remediation_steps(
+        self,
+        control: str,
+        current_state: str,
+        cloud_provider: str = "gcp",
+        use_cache: bool = True,
+    ) -> AsyncIterator[str]:
+        """
+        Stream remediation guidance for a control as it is generated.
+        
+        A cached answer is replayed as a single chunk; a fully streamed
+        answer is stored in the cache once generation completes.
+        
+        Args:
+            control: The control to remediate
+            current_state: Description of current implementation
+            cloud_provider: Target cloud provider
+            use_cache: Serve identical earlier guidance from the cache
+            
+        Yields:
+            Remediation text chunks
+        """
+        cache_key = self._remediation_cache_key(control, current_state, cloud_provider)
+        if cache_key is not None and use_cache:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                yield cached["remediation"]
+                return
+        
+        prompt = self._remediation_prompt(control, current_state, cloud_provider)
+        parts = []
+        async with aclosing(self._generate_stream(prompt, "remediation_stream")) as chunks:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
         
-        response = self.model.generate_content(full_prompt)
-        return response.text
+        if cache_key is not None:
+            await self.cache.set(
+                cache_key,
+                {
+                    "control": control,
+                    "cloud_provider": cloud_provider,
+                    "remediation": "".join(parts),
+                },
+            )
+    
+    async def stream_chat(
+        self,
+        message: str,
+        context: Optional[str] = None,
+        summary: Optional[str] = None,
+        history: Sequence[Tuple[str, str]] = (),
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat answer as it is generated.
+        
+        Args:
+            message: User's question
+            context: Optional context about current assessment
+            summary: Summary of earlier parts of the conversation
+            history: Recent (role, text) turns of the conversation, oldest first
+            
+        Yields:
+            Response text chunks
+        """
+        prompt = self._chat_prompt(message, context, summary, history)
+        async with aclosing(self._generate_stream(prompt, "chat_stream")) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+
+_ai_client: Optional[AIClient] = None
 
 
-# Singleton instance
-ai_client = AIClient()
+def get_ai_client() -> AIClient:
+    """Get the shared AI client (FastAPI dependency)"""
+    global _ai_client
+    if _ai_client is None:
+        _ai_client = AIClient()
+    return _ai_client
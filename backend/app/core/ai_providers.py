@@ -0,0 +1,376 @@
+"""
+AI model providers and latency-aware routing with hedged requests
+"""
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Type
+
+from app.core.config import settings
+from app.core.metrics import AI_HEDGES, AI_PROVIDER_CALLS, AI_PROVIDER_LATENCY
+
+# Tasks that can be routed to different providers
+CHAT = "chat"
+ANALYSIS = "analysis"
+REMEDIATION = "remediation"
+
+# Cost of a failed call, in seconds of latency, when ranking providers
+ERROR_PENALTY_SECONDS = 10.0
+
+
+class AIProvider(ABC):
+    """
+    A model backend.
+
+    Responses and stream chunks expose ``text`` and, optionally,
+    ``usage_metadata`` with prompt/candidates token counts, as the Gemini
+    SDK's do.
+    """
+
+    def __init__(self, name: str, model_name: str):
+        self.name = name
+        self.model_name = model_name
+
+    async def load(self) -> None:
+        """Prepare the client ahead of the first call (optional)"""
+
+    @abstractmethod
+    async def generate(self, prompt: str, generation_config: Optional[dict] = None) -> Any:
+        """Generate a complete response"""
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[Any]:
+        """Generate a response chunk by chunk (an async generator)"""
+
+
+class GeminiProvider(AIProvider):
+    """A Gemini model through the google-generativeai SDK"""
+
+    def __init__(self, name: str, model_name: str):
+        super().__init__(name, model_name)
+        # Created on first use; importing the Gemini SDK takes ~0.5s
+        self.model = None
+        self._model_lock = asyncio.Lock()
+
+    def _load_model(self):
+        """Import and configure the Gemini SDK and create the model"""
+        import google.generativeai as genai
+
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        return genai.GenerativeModel(self.model_name)
+
+    async def load(self) -> None:
+        """
+        Create the model. The SDK import runs in a worker thread so the first
+        AI request does not stall every other request on the event loop.
+        """
+        if self.model is None:
+            async with self._model_lock:
+                if self.model is None:
+                    self.model = await asyncio.to_thread(self._load_model)
+
+    async def generate(self, prompt: str, generation_config: Optional[dict] = None) -> Any:
+        await self.load()
+        return await self.model.generate_content_async(
+            prompt, generation_config=generation_config
+        )
+
+    async def stream(self, prompt: str) -> AsyncIterator[Any]:
+        await self.load()
+        response = await self.model.generate_content_async(prompt, stream=True)
+        chunks = response.__aiter__()
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # Cancels the upstream call when the consumer stops early
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+
+
+# Provider kinds usable in AI_PROVIDERS ("<kind>:<model>")
+PROVIDER_KINDS: Dict[str, Type[AIProvider]] = {
+    "gemini": GeminiProvider,
+}
+
+
+def build_provider(name: str, spec: str) -> AIProvider:
+    """
+    Create a provider from a "<kind>:<model>" spec, e.g. "gemini:gemini-1.5-pro".
+
+    Raises:
+        ValueError: If the kind is unknown or the model is missing
+    """
+    kind, _, model_name = spec.partition(":")
+    if kind not in PROVIDER_KINDS or not model_name:
+        raise ValueError(f"Invalid AI provider {name!r}: {spec!r}")
+    return PROVIDER_KINDS[kind](name, model_name)
+
+
+class ProviderStats:
+    """
+    Exponentially weighted latency and error rate of one provider.
+
+    The error rate also decays with time (halving every error_half_life
+    seconds): once a failing provider stops being picked it receives no
+    new samples, so without the decay it would never be tried again.
+    """
+
+    def __init__(
+        self,
+        alpha: float,
+        error_half_life: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self._clock = clock
+        self.latency: Optional[float] = None
+        self._error_rate = 0.0
+        self._error_rate_at = clock()
+
+    @property
+    def error_rate(self) -> float:
+        if self.error_half_life <= 0:
+            return self._error_rate
+        idle = max(self._clock() - self._error_rate_at, 0.0)
+        return self._error_rate * 0.5 ** (idle / self.error_half_life)
+
+    def observe(self, latency: float, ok: Optional[bool]) -> None:
+        """
+        Record a call.
+
+        Args:
+            latency: Seconds the call took (or ran before it was cancelled)
+            ok: Whether it succeeded; None for a cancelled call, which only
+                bounds the latency from below
+        """
+        self.latency = latency if self.latency is None else (
+            self.alpha * latency + (1 - self.alpha) * self.latency
+        )
+        if ok is not None:
+            error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_rate
+            self._error_rate, self._error_rate_at = error_rate, self._clock()
+
+    def score(self) -> float:
+        """Expected cost of a call; providers never observed score 0 so they get tried"""
+        return (self.latency or 0.0) + self.error_rate * ERROR_PENALTY_SECONDS
+
+
+class AIRouter:
+    """
+    Routes each task to the provider with the best recent latency and
+    error rate among those allowed for it.
+
+    If the chosen provider fails, the next one is tried at once. With a
+    hedge delay, a provider that has not answered (or, for streams, sent
+    its first chunk) within the delay gets a duplicate request sent to the
+    next provider; the first answer wins and the other call is cancelled.
+    A hedge takes a further slot of hedge_slots, the concurrency pool its
+    caller holds a slot of, and is not sent when none is free.
+    """
+
+    def __init__(
+        self,
+        providers: Dict[str, AIProvider],
+        routes: Optional[Dict[str, List[str]]] = None,
+        hedge_delay: float = 0.0,
+        ewma_alpha: float = 0.2,
+        error_half_life: float = 60.0,
+        hedge_slots: Optional[asyncio.Semaphore] = None,
+    ):
+        """
+        Args:
+            providers: Providers by name
+            routes: Provider names per task in order of preference; a task
+                without a route may use every provider
+            hedge_delay: Seconds before a hedged request is sent (0 disables)
+            ewma_alpha: Weight of the latest sample in the moving averages
+            error_half_life: Seconds for an idle provider's error rate to halve
+            hedge_slots: Concurrency pool hedges count against (None: no limit)
+
+        Raises:
+            ValueError: If a route names an unknown provider
+        """
+        routes = routes or {}
+        unknown = {name for names in routes.values() for name in names} - set(providers)
+        if unknown or not providers:
+            raise ValueError(f"Unknown AI providers in routes: {sorted(unknown)}")
+        self.providers = providers
+        self.routes = routes
+        self.hedge_delay = hedge_delay
+        self.hedge_slots = hedge_slots
+        self.stats = {name: ProviderStats(ewma_alpha, error_half_life) for name in providers}
+
+    def candidates(self, task: str) -> List[AIProvider]:
+        """Providers allowed for the task, best first (ties keep route order)"""
+        names = self.routes.get(task) or list(self.providers)
+        return sorted(
+            (self.providers[name] for name in names),
+            key=lambda provider: self.stats[provider.name].score(),
+        )
+
+    def signature(self, task: str) -> str:
+        """Models that may answer the task, for cache keys"""
+        names = self.routes.get(task) or list(self.providers)
+        return "+".join(self.providers[name].model_name for name in names)
+
+    async def load(self) -> None:
+        """Prepare every provider's client"""
+        await asyncio.gather(*(provider.load() for provider in self.providers.values()))
+
+    def _observe(self, provider: AIProvider, start: float, outcome: str) -> None:
+        elapsed = time.perf_counter() - start
+        AI_PROVIDER_CALLS.inc(provider=provider.name, outcome=outcome)
+        if outcome == "cancelled":
+            # Typically a hedging loser: slower than it was allowed to run
+            self.stats[provider.name].observe(elapsed, None)
+            return
+        AI_PROVIDER_LATENCY.observe(elapsed, provider=provider.name)
+        self.stats[provider.name].observe(elapsed, outcome == "ok")
+
+    async def _attempt(
+        self, provider: AIProvider, prompt: str, generation_config: Optional[dict]
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            response = await provider.generate(prompt, generation_config)
+        except asyncio.CancelledError:
+            self._observe(provider, start, "cancelled")
+            raise
+        except Exception:
+            self._observe(provider, start, "error")
+            raise
+        self._observe(provider, start, "ok")
+        return response
+
+    async def _race(
+        self,
+        task: str,
+        start_attempt: Callable[[AIProvider], Awaitable[Any]],
+        discard: Optional[Callable[[Any], None]] = None,
+    ) -> Any:
+        """
+        Run attempts against the task's candidates until one succeeds.
+
+        Args:
+            task: Task being routed
+            start_attempt: Creates the attempt coroutine for a provider
+            discard: Releases the result of an attempt that succeeded but
+                lost the race (e.g. closes a stream)
+
+        Returns:
+            The result of the winning attempt
+        """
+        waiting = self.candidates(task)
+        pending: Set[asyncio.Task] = set()
+        last_error: Optional[BaseException] = None
+        may_hedge = self.hedge_delay > 0
+        # Slots of hedge_slots taken for hedges, on top of the caller's
+        extra_slots = 0
+
+        def launch() -> None:
+            pending.add(asyncio.ensure_future(start_attempt(waiting.pop(0))))
+
+        def release(loser: asyncio.Task) -> None:
+            if loser.cancelled() or loser.exception() is not None:
+                return
+            if discard is not None:
+                discard(loser.result())
+
+        launch()
+        try:
+            while pending:
+                hedge = may_hedge and len(pending) == 1 and bool(waiting)
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    if self.hedge_slots is not None:
+                        if self.hedge_slots.locked():
+                            # The pool is full: keep waiting on the first call
+                            may_hedge = False
+                            continue
+                        await self.hedge_slots.acquire()
+                        extra_slots += 1
+                    AI_HEDGES.inc(task=task)
+                    launch()
+                    continue
+                winner = next((t for t in done if t.exception() is None), None)
+                for finished in done:
+                    if finished is not winner:
+                        last_error = finished.exception() or last_error
+                        release(finished)
+                if winner is not None:
+                    return winner.result()
+                if not pending and waiting:
+                    # Fail over to the next provider straight away
+                    launch()
+            raise last_error
+        finally:
+            for loser in pending:
+                loser.cancel()
+                loser.add_done_callback(release)
+            for _ in range(extra_slots):
+                self.hedge_slots.release()
+
+    async def generate(
+        self, task: str, prompt: str, generation_config: Optional[dict] = None
+    ) -> Any:
+        """Generate a response for the task on the best available provider"""
+        return await self._race(
+            task, lambda provider: self._attempt(provider, prompt, generation_config)
+        )
+
+    async def _first_chunk(self, provider: AIProvider, prompt: str):
+        """Open a stream and wait for its first chunk (None if it is empty)"""
+        stream = provider.stream(prompt)
+        start = time.perf_counter()
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException as e:
+            await stream.aclose()
+            self._observe(
+                provider, start, "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+            )
+            raise
+        self._observe(provider, start, "ok")
+        return stream, first
+
+    async def stream(self, task: str, prompt: str) -> AsyncIterator[Any]:
+        """
+        Stream a response for the task. Hedging and failover apply until the
+        first chunk arrives; after that the stream stays on that provider.
+        """
+        stream, first = await self._race(
+            task,
+            lambda provider: self._first_chunk(provider, prompt),
+            discard=lambda opened: asyncio.ensure_future(opened[0].aclose()),
+        )
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+
+def build_router(hedge_slots: Optional[asyncio.Semaphore] = None) -> AIRouter:
+    """Create the router from the AI_* settings"""
+    providers: Dict[str, AIProvider] = {"gemini": GeminiProvider("gemini", settings.GEMINI_MODEL)}
+    for name, spec in settings.AI_PROVIDERS.items():
+        providers[name] = build_provider(name, spec)
+    return AIRouter(
+        providers,
+        settings.AI_ROUTES,
+        hedge_delay=settings.AI_HEDGE_DELAY_SECONDS,
+        ewma_alpha=settings.AI_ROUTER_EWMA_ALPHA,
+        error_half_life=settings.AI_ROUTER_ERROR_HALF_LIFE_SECONDS,
+        hedge_slots=hedge_slots,
+    )
@@ -0,0 +1,285 @@
+"""
+Typed assessment analysis: response schema, tolerant parsing and repair
+"""
+import hashlib
+import json
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from app.repositories.recommendations import Recommendation
+
+LEVELS = ("low", "medium", "high")
+
+# Gemini response schema (OpenAPI subset) matching AssessmentAnalysis
+_LEVEL_SCHEMA = {"type": "string", "enum": list(LEVELS)}
+ANALYSIS_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer"},
+        "summary": {"type": "string"},
+        "recommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "priority": _LEVEL_SCHEMA,
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "effort": _LEVEL_SCHEMA,
+                    "impact": _LEVEL_SCHEMA,
+                    "control_id": {"type": "string"},
+                },
+                "required": ["priority", "title", "description", "effort", "impact"],
+            },
+        },
+        "quick_wins": {"type": "array", "items": {"type": "string"}},
+        "strategic_improvements": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["score", "summary", "recommendations"],
+}
+
+_DECODER = json.JSONDecoder()
+_CLOSERS = {"{": "}", "[": "]"}
+_REQUIRED_FIELDS = ANALYSIS_RESPONSE_SCHEMA["properties"]["recommendations"]["items"]["required"]
+_REQUIRED_ANALYSIS_FIELDS = ANALYSIS_RESPONSE_SCHEMA["required"]
+
+
+class AnalysisParseError(ValueError):
+    """Raised when generated text cannot be turned into an analysis"""
+
+
+class AnalysisRecommendation(BaseModel):
+    """One recommendation from an analysis"""
+
+    title: str
+    description: str = ""
+    priority: str = "medium"
+    effort: str = "medium"
+    impact: str = "medium"
+    control_id: Optional[str] = None
+
+    @field_validator("priority", "effort", "impact", mode="before")
+    @classmethod
+    def _normalize_level(cls, value) -> str:
+        level = str(value or "").strip().lower()
+        return level if level in LEVELS else "medium"
+
+    @field_validator("title", "description", mode="before")
+    @classmethod
+    def _strip(cls, value) -> str:
+        return " ".join(str(value or "").split())
+
+
+class AssessmentAnalysis(BaseModel):
+    """Structured result of an assessment analysis"""
+
+    score: Optional[int] = None
+    summary: str = ""
+    recommendations: List[AnalysisRecommendation] = Field(default_factory=list)
+    quick_wins: List[str] = Field(default_factory=list)
+    strategic_improvements: List[str] = Field(default_factory=list)
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def _clamp_score(cls, value) -> Optional[int]:
+        try:
+            return max(0, min(100, round(float(value))))
+        except (TypeError, ValueError):
+            return None
+
+    @field_validator("summary", mode="before")
+    @classmethod
+    def _summary(cls, value) -> str:
+        return value if isinstance(value, str) else ""
+
+    @field_validator("recommendations", mode="before")
+    @classmethod
+    def _drop_invalid_recommendations(cls, value) -> list:
+        # One malformed entry (e.g. cut off before its title) should not
+        # discard the rest of the analysis
+        if not isinstance(value, list):
+            return []
+        valid = []
+        for item in value:
+            try:
+                recommendation = AnalysisRecommendation.model_validate(item)
+            except ValidationError:
+                continue
+            if recommendation.title:
+                valid.append(recommendation)
+        return valid
+
+    @field_validator("quick_wins", "strategic_improvements", mode="before")
+    @classmethod
+    def _strings(cls, value) -> List[str]:
+        if not isinstance(value, list):
+            return []
+        return [item for item in value if isinstance(item, str) and item.strip()]
+
+
+def _repair(text: str) -> Tuple[str, bool]:
+    """repair_json, also reporting whether the text had to be completed"""
+    start = text.find("{")
+    if start < 0:
+        raise AnalysisParseError("No JSON object in response")
+    # Well-formed output (the normal case with a response schema) needs no scan
+    try:
+        _, end = _DECODER.raw_decode(text, start)
+        return text[start:end], False
+    except json.JSONDecodeError:
+        pass
+
+    out: List[str] = []
+    # Open containers, and for objects whether a key comes next
+    stack: List[str] = []
+    expecting_key: List[bool] = []
+    in_string = escape = string_is_key = in_literal = False
+    # Longest prefix that can be completed just by closing containers
+    safe_length, safe_stack = 0, []
+
+    def mark() -> None:
+        nonlocal safe_length, safe_stack
+        safe_length, safe_stack = len(out), list(stack)
+
+    for ch in text[start:]:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                out.append(ch)
+                if not string_is_key:
+                    mark()
+                continue
+            elif ch == "\n":
+                ch = "\\n"
+            out.append(ch)
+            continue
+
+        if in_literal and (ch.isspace() or ch in ",:]}"):
+            in_literal = False
+            mark()
+        if ch.isspace():
+            out.append(ch)
+        elif ch == '"':
+            in_string, string_is_key = True, bool(stack) and stack[-1] == "{" and expecting_key[-1]
+            out.append(ch)
+        elif ch in _CLOSERS:
+            stack.append(ch)
+            expecting_key.append(ch == "{")
+            out.append(ch)
+            mark()
+        elif ch in "}]":
+            if not stack:
+                break
+            while out and (out[-1].isspace() or out[-1] == ","):
+                out.pop()
+            out.append(_CLOSERS[stack.pop()])
+            expecting_key.pop()
+            mark()
+            if not stack:
+                return "".join(out), False
+        elif ch == ",":
+            if stack:
+                expecting_key[-1] = stack[-1] == "{"
+            out.append(ch)
+        elif ch == ":":
+            if stack:
+                expecting_key[-1] = False
+            out.append(ch)
+        else:
+            in_literal = True
+            out.append(ch)
+
+    if in_string and not string_is_key:
+        if escape:
+            out.pop()
+        out.append('"')
+        mark()
+    repaired = out[:safe_length]
+    while repaired and (repaired[-1].isspace() or repaired[-1] == ","):
+        repaired.pop()
+    repaired.extend(_CLOSERS[opener] for opener in reversed(safe_stack))
+    return "".join(repaired), True
+
+
+def repair_json(text: str) -> str:
+    """
+    Extract a JSON object from generated text, completing it if truncated.
+
+    Surrounding prose and code fences are dropped, trailing commas removed
+    and raw newlines inside strings escaped. When the output stops early
+    (e.g. at the token limit) it is cut back to the last complete value,
+    or an unterminated string value is closed, and the open arrays and
+    objects are closed. Runs in a single pass over the text.
+
+    Raises:
+        AnalysisParseError: If the text contains no JSON object
+    """
+    return _repair(text)[0]
+
+
+def parse_analysis(text: str) -> AssessmentAnalysis:
+    """
+    Parse generated analysis text into an AssessmentAnalysis.
+
+    A truncated response is accepted only if score, summary and the start
+    of the recommendations arrived before it was cut off.
+
+    Raises:
+        AnalysisParseError: If no usable JSON object can be recovered, or
+            the response was cut off before every required field
+    """
+    repaired, truncated = _repair(text)
+    try:
+        data = json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise AnalysisParseError(f"Invalid JSON in response: {e}") from e
+    if not isinstance(data, dict):
+        raise AnalysisParseError("Response is not a JSON object")
+    if truncated:
+        missing = [key for key in _REQUIRED_ANALYSIS_FIELDS if key not in data]
+        if missing:
+            raise AnalysisParseError(f"Response was cut off before {', '.join(missing)}")
+    recommendations = data.get("recommendations")
+    if truncated and isinstance(recommendations, list) and recommendations:
+        # The entry being written when the output stopped may have a
+        # cut-off title; keep it only if every required field arrived
+        last = recommendations[-1]
+        if not isinstance(last, dict) or not all(key in last for key in _REQUIRED_FIELDS):
+            recommendations.pop()
+    return AssessmentAnalysis.model_validate(data)
+
+
+def recommendation_id(user_id: str, scope: str, title: str) -> str:
+    """Stable ID so re-analyzing the same assessment updates, not duplicates"""
+    key = f"{user_id}\x00{scope}\x00{' '.join(title.lower().split())}"
+    return "ai-" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:24]
+
+
+def to_recommendations(
+    analysis: AssessmentAnalysis,
+    user_id: str,
+    pillar_id: str,
+    assessment_id: Optional[str] = None,
+) -> List[Recommendation]:
+    """Convert an analysis into Recommendation rows owned by the user"""
+    scope = assessment_id or f"pillar:{pillar_id}"
+    return [
+        Recommendation(
+            id=recommendation_id(user_id, scope, item.title),
+            pillar_id=pillar_id,
+            control_id=item.control_id,
+            assessment_id=assessment_id,
+            user_id=user_id,
+            title=item.title,
+            description=item.description,
+            priority=item.priority,
+            effort=item.effort,
+            impact=item.impact,
+        )
+        for item in analysis.recommendations
+    ]
@@ -0,0 +1,296 @@
+"""
+Azure Advisor REST client: service principal tokens and paginated
+recommendation listings over pooled HTTP connections
+"""
+import asyncio
+import logging
+import re
+import time
+from typing import AsyncIterator, Callable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import ADVISOR_PAGES
+
+logger = logging.getLogger(__name__)
+
+# Advisor recommendation categories; each is listed as its own page chain
+ADVISOR_CATEGORIES = (
+    "Cost",
+    "Security",
+    "HighAvailability",
+    "OperationalExcellence",
+    "Performance",
+)
+
+SUBSCRIPTION_ID_PATTERN = re.compile(r"^[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}$")
+
+MANAGEMENT_SCOPE = "https://management.azure.com/.default"
+
+# Throttling and transient server errors are retried
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class AzureAdvisorError(Exception):
+    """Raised when the Advisor or token endpoint fails"""
+
+
+class AzureCredentialsError(AzureAdvisorError):
+    """Raised when no service principal is configured"""
+
+
+class AdvisorPage:
+    """
+    One page of an Advisor recommendation listing.
+
+    A page whose ETag matched the one passed in has not_modified set and
+    no items; its next_link is the one it had when it was last fetched.
+    """
+
+    def __init__(
+        self,
+        items: List[dict],
+        etag: Optional[str] = None,
+        not_modified: bool = False,
+        next_link: Optional[str] = None,
+    ):
+        self.items = items
+        self.etag = etag
+        self.not_modified = not_modified
+        self.next_link = next_link
+
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """Seconds to wait from a Retry-After header (seconds form only)"""
+    try:
+        return max(float(value), 0.0) if value else default
+    except ValueError:
+        return default
+
+
+class AzureAdvisorClient:
+    """
+    Lists Azure Advisor recommendations for a service principal.
+
+    Every request shares one httpx.AsyncClient, so listings running
+    concurrently reuse pooled keep-alive connections. Access tokens are
+    cached until shortly before they expire. Throttled (429) and transient
+    server errors are retried, honouring Retry-After.
+    """
+
+    def __init__(
+        self,
+        tenant_id: str,
+        client_id: str,
+        client_secret: str,
+        login_url: str = "https://login.microsoftonline.com",
+        management_url: str = "https://management.azure.com",
+        api_version: str = "2023-01-01",
+        timeout_seconds: float = 30.0,
+        max_connections: int = 8,
+        max_attempts: int = 4,
+        retry_backoff_seconds: float = 1.0,
+        max_retry_wait_seconds: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.login_url = login_url.rstrip("/")
+        self.management_url = management_url.rstrip("/")
+        self.api_version = api_version
+        self.timeout_seconds = timeout_seconds
+        self.max_connections = max_connections
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_retry_wait_seconds = max_retry_wait_seconds
+        self._transport = transport
+        self._clock = clock
+        self._http: Optional[httpx.AsyncClient] = None
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.tenant_id and self.client_id and self.client_secret)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """The shared HTTP client, created on first use"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout_seconds,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self._transport,
+            )
+        return self._http
+
+    async def access_token(self, refresh: bool = False) -> str:
+        """
+        A management API access token, fetched once and shared until it
+        is within five minutes of expiring.
+
+        Raises:
+            AzureCredentialsError: If no service principal is configured
+            AzureAdvisorError: If the token endpoint rejects the request
+        """
+        if not self.configured:
+            raise AzureCredentialsError("Azure service principal is not configured")
+        async with self._token_lock:
+            if self._token and not refresh and self._clock() < self._token_expires_at:
+                return self._token
+            url = f"{self.login_url}/{self.tenant_id}/oauth2/v2.0/token"
+            data = {
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "scope": MANAGEMENT_SCOPE,
+            }
+            try:
+                response = await self.http.post(url, data=data)
+                response.raise_for_status()
+                body = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                raise AzureAdvisorError(f"Token request failed: {e}") from e
+            self._token = body["access_token"]
+            lifetime = float(body.get("expires_in", 3600))
+            self._token_expires_at = self._clock() + max(lifetime - 300, lifetime / 2)
+            return self._token
+
+    async def _get(self, url: str, params: Optional[dict], etag: Optional[str]) -> httpx.Response:
+        """GET a management API URL, retrying throttling and transient failures"""
+        refresh = refreshed = False
+        attempt = 0
+        while True:
+            attempt += 1
+            headers = {"Authorization": f"Bearer {await self.access_token(refresh=refresh)}"}
+            refresh = False
+            if etag:
+                headers["If-None-Match"] = etag
+            retry_after = None
+            try:
+                response = await self.http.get(url, params=params, headers=headers)
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code == 401 and not refreshed:
+                    # Revoked or rotated token: fetch a new one, once
+                    refresh = refreshed = True
+                    attempt -= 1
+                    continue
+                if response.status_code not in RETRYABLE_STATUSES:
+                    return response
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("retry-after")
+            if attempt >= self.max_attempts:
+                ADVISOR_PAGES.inc(outcome="failed")
+                raise AzureAdvisorError(f"Advisor request failed after {attempt} attempts: {error}")
+            ADVISOR_PAGES.inc(outcome="retried")
+            delay = parse_retry_after(retry_after, self.retry_backoff_seconds * 2 ** (attempt - 1))
+            logger.info("Retrying Advisor request in %.1fs (%s)", delay, error)
+            await asyncio.sleep(min(delay, self.max_retry_wait_seconds))
+
+    def _is_management_url(self, url: str) -> bool:
+        """Whether url has the same origin (scheme, host, port) as management_url"""
+        try:
+            target, management = httpx.URL(url), httpx.URL(self.management_url)
+        except (httpx.InvalidURL, TypeError):
+            return False
+        return (target.scheme, target.host, target.port) == (
+            management.scheme, management.host, management.port
+        )
+
+    async def pages(
+        self,
+        subscription_id: str,
+        category: str,
+        known: Sequence[Tuple[Optional[str], Optional[str]]] = (),
+    ) -> AsyncIterator[AdvisorPage]:
+        """
+        Page through a subscription's recommendations in one category.
+
+        Args:
+            subscription_id: Azure subscription ID
+            category: One of ADVISOR_CATEGORIES
+            known: (ETag, nextLink) of each page of the last listing. Each
+                page is requested with its ETag, and one that is unchanged
+                is returned as a not_modified page. Once a page links
+                elsewhere than it did, the rest are fetched unconditionally.
+
+        Raises:
+            AzureAdvisorError: If a page cannot be fetched, or a nextLink
+                points outside management_url
+        """
+        url: Optional[str] = (
+            f"{self.management_url}/subscriptions/{subscription_id}"
+            "/providers/Microsoft.Advisor/recommendations"
+        )
+        params: Optional[dict] = {
+            "api-version": self.api_version,
+            "$filter": f"Category eq '{category}'",
+        }
+        index = 0
+        while url:
+            etag, known_link = known[index] if index < len(known) else (None, None)
+            response = await self._get(url, params, etag)
+            if response.status_code == 304 and etag:
+                ADVISOR_PAGES.inc(outcome="not_modified")
+                next_link = known_link
+                yield AdvisorPage([], etag=etag, not_modified=True, next_link=next_link)
+            else:
+                if response.status_code != 200:
+                    raise AzureAdvisorError(
+                        f"Advisor listing failed: HTTP {response.status_code} "
+                        f"{response.text[:200]}"
+                    )
+                try:
+                    body = response.json()
+                except ValueError as e:
+                    raise AzureAdvisorError(
+                        f"Advisor listing returned invalid JSON: {e}"
+                    ) from e
+                ADVISOR_PAGES.inc(outcome="fetched")
+                # nextLink carries the api-version and continuation token
+                next_link = body.get("nextLink")
+                yield AdvisorPage(
+                    body.get("value", []), etag=response.headers.get("etag"), next_link=next_link
+                )
+            if next_link != known_link:
+                # The following pages are not the ones the ETags belong to
+                known = ()
+            url, params, index = next_link, None, index + 1
+            if url and not self._is_management_url(url):
+                # The bearer token must not be sent anywhere else
+                raise AzureAdvisorError("Advisor listing returned a nextLink to another host")
+
+    async def aclose(self) -> None:
+        """Close pooled connections"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+_client: Optional[AzureAdvisorClient] = None
+
+
+def get_advisor_client() -> AzureAdvisorClient:
+    """Get the shared Azure Advisor client"""
+    global _client
+    if _client is None:
+        _client = AzureAdvisorClient(
+            settings.AZURE_TENANT_ID,
+            settings.AZURE_CLIENT_ID,
+            settings.AZURE_CLIENT_SECRET,
+            login_url=settings.AZURE_LOGIN_URL,
+            management_url=settings.AZURE_MANAGEMENT_URL,
+            api_version=settings.AZURE_ADVISOR_API_VERSION,
+            timeout_seconds=settings.AZURE_REQUEST_TIMEOUT_SECONDS,
+            max_connections=settings.AZURE_ADVISOR_CONCURRENCY,
+        )
+    return _client
@@ -0,0 +1,168 @@
+"""
+Immutable WAF catalog (pillars and controls) with pre-serialized responses
+"""
+import hashlib
+import json
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from app.core.config import settings
+
+CATALOG_PATH = Path(__file__).resolve().parent.parent / "data" / "waf_catalog.json"
+
+
+def _freeze(value):
+    """Read-only deep copy: mappings become MappingProxyType, lists tuples"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    """json.dumps default for frozen mappings"""
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class CatalogEntry:
+    """A pre-serialized JSON body with its strong ETag"""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(",", ":"), default=_thaw).encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+
+
+class Catalog:
+    """
+    Pillars and controls indexed by id and slug.
+
+    Built once and never mutated: pillars and controls are deeply frozen
+    copies of the input, so the response bodies serialized up front (and
+    their ETags) always match them.
+    """
+
+    def __init__(self, pillars: List[dict]):
+        controls_by_pillar: Dict[str, Tuple[Mapping, ...]] = {}
+        controls_by_id: Dict[str, Tuple[str, Mapping]] = {}
+        pillar_list = []
+        index: Dict[str, str] = {}
+        for raw in pillars:
+            pillar = _freeze({key: value for key, value in raw.items() if key != "controls"})
+            pillar_id = pillar["id"]
+            controls_by_pillar[pillar_id] = _freeze(raw.get("controls", []))
+            for control in controls_by_pillar[pillar_id]:
+                controls_by_id[control["id"]] = (pillar_id, control)
+            pillar_list.append(pillar)
+            index[pillar_id] = pillar_id
+            index[pillar.get("slug", pillar_id)] = pillar_id
+
+        self.pillars: Tuple[Mapping, ...] = tuple(pillar_list)
+        self.controls_by_pillar: Mapping[str, Tuple[Mapping, ...]] = MappingProxyType(
+            controls_by_pillar
+        )
+        self._index = MappingProxyType(index)
+        self._controls_by_id = MappingProxyType(controls_by_id)
+        self._pillars_by_id = MappingProxyType({p["id"]: p for p in self.pillars})
+
+        self.pillars_entry = CatalogEntry(self.pillars)
+        self._pillar_entries = MappingProxyType(
+            {p["id"]: CatalogEntry(p) for p in self.pillars}
+        )
+        self._controls_entries = MappingProxyType(
+            {pid: CatalogEntry(controls) for pid, controls in controls_by_pillar.items()}
+        )
+
+    def resolve(self, id_or_slug: str) -> Optional[str]:
+        """Map a pillar id or slug to its id"""
+        return self._index.get(id_or_slug)
+
+    def get_pillar(self, id_or_slug: str) -> Optional[Mapping]:
+        """Look up a pillar by id or slug"""
+        pillar_id = self.resolve(id_or_slug)
+        return self._pillars_by_id[pillar_id] if pillar_id else None
+
+    def pillar_entry(self, id_or_slug: str) -> Optional[CatalogEntry]:
+        """Pre-serialized body for a single pillar"""
+        pillar_id = self.resolve(id_or_slug)
+        return self._pillar_entries[pillar_id] if pillar_id else None
+
+    def controls_entry(self, id_or_slug: str) -> Optional[CatalogEntry]:
+        """Pre-serialized body for a pillar's controls"""
+        pillar_id = self.resolve(id_or_slug)
+        return self._controls_entries[pillar_id] if pillar_id else None
+
+    def find_control(self, control_id: str) -> Optional[Tuple[str, Mapping]]:
+        """Return (pillar id, control) for a control id"""
+        return self._controls_by_id.get(control_id)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates
+    )
+
+
+def catalog_response(request: Request, entry: CatalogEntry, private: bool = False) -> Response:
+    """
+    Serve a pre-serialized catalog body with ETag and Cache-Control headers,
+    answering 304 when the client already has the current version.
+    """
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": (
+            f"{'private' if private else 'public'}, "
+            f"max-age={settings.CATALOG_CACHE_MAX_AGE_SECONDS}"
+        ),
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def load_catalog_file(path: Path = CATALOG_PATH) -> Catalog:
+    """Build the catalog from the bundled JSON data file"""
+    with open(path, encoding="utf-8") as f:
+        return Catalog(json.load(f)["pillars"])
+
+
+async def load_catalog_firestore(collection: str) -> Catalog:
+    """Build the catalog from a Firestore collection of pillar documents"""
+    from app.core.security import get_async_firestore_client
+
+    query = get_async_firestore_client().collection(collection).order_by("order")
+    pillars = []
+    async for doc in query.stream():
+        pillars.append({"id": doc.id, **doc.to_dict()})
+    return Catalog(pillars)
+
+
+_catalog: Optional[Catalog] = None
+
+
+async def load_catalog() -> Catalog:
+    """Load the catalog from the configured source (called at startup)"""
+    global _catalog
+    if settings.CATALOG_FIRESTORE_COLLECTION:
+        _catalog = await load_catalog_firestore(settings.CATALOG_FIRESTORE_COLLECTION)
+    else:
+        _catalog = load_catalog_file()
+    return _catalog
+
+
+def get_catalog() -> Catalog:
+    """Get the loaded catalog, falling back to the bundled data file"""
+    global _catalog
+    if _catalog is None:
+        _catalog = load_catalog_file()
+    return _catalog
@@ -0,0 +1,295 @@
+"""
+Per-user change feed: one Firestore listener per user and collection,
+fanned out as field-level deltas to every connected client
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CHANGE_FEED_CLIENTS, CHANGE_FEED_EVENTS, CHANGE_FEED_LISTENERS
+from app.core.security import get_firestore_client
+
+logger = logging.getLogger(__name__)
+
+# (event name, payload) as sent to clients
+Event = Tuple[str, dict]
+# (change type, document ID, document data) as received from a listener
+Change = Tuple[str, str, Optional[dict]]
+
+
+class TooManyConnectionsError(Exception):
+    """Raised when a user already has the maximum number of open feeds"""
+
+
+def document_delta(before: dict, after: dict) -> dict:
+    """
+    Top-level fields that differ between two versions of a document.
+
+    Returns:
+        {"set": changed or added fields, "unset": removed field names},
+        with empty parts omitted; {} if nothing changed
+    """
+    delta: Dict[str, Any] = {}
+    changed = {key: value for key, value in after.items() if before.get(key, delta) != value}
+    removed = sorted(key for key in before if key not in after)
+    if changed:
+        delta["set"] = changed
+    if removed:
+        delta["unset"] = removed
+    return delta
+
+
+class Subscription:
+    """One client connection: a bounded queue of events"""
+
+    def __init__(self, feed: "UserFeed", queue_size: int):
+        self.feed = feed
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, event: Event) -> None:
+        """
+        Queue an event without blocking the listener.
+
+        A client that falls behind gets the current state as one snapshot
+        in place of every delta it has not read yet, so memory per
+        connection stays bounded.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.feed.snapshot_event())
+            CHANGE_FEED_EVENTS.inc(event="resync")
+
+
+class UserFeed:
+    """A user's documents as last seen by the listeners, and their clients"""
+
+    def __init__(self, user_id: str, collections: List[str]):
+        self.user_id = user_id
+        self.collections = collections
+        self.documents: Dict[str, Dict[str, dict]] = {name: {} for name in collections}
+        self.subscriptions: Set[Subscription] = set()
+        self.unsubscribes: List[Callable[[], None]] = []
+        self.idle_timer: Optional[asyncio.TimerHandle] = None
+        # Starting the listeners, shared by the connections that arrive meanwhile
+        self.listening: Optional[asyncio.Future] = None
+        self._loaded: Set[str] = set()
+
+    @property
+    def ready(self) -> bool:
+        """Whether every listener has delivered its initial snapshot"""
+        return len(self._loaded) == len(self.collections)
+
+    def snapshot_event(self) -> Event:
+        return "snapshot", {
+            name: [{"id": doc_id, **data} for doc_id, data in documents.items()]
+            for name, documents in self.documents.items()
+        }
+
+    def _publish(self, event: Event) -> None:
+        CHANGE_FEED_EVENTS.inc(event=event[0])
+        for subscription in self.subscriptions:
+            subscription.offer(event)
+
+    def apply(self, collection: str, changes: List[Change]) -> None:
+        """Update the cached documents and send clients what changed"""
+        documents = self.documents[collection]
+        deltas = []
+        for kind, doc_id, data in changes:
+            if kind == "REMOVED":
+                if documents.pop(doc_id, None) is not None:
+                    deltas.append({"type": "removed", "id": doc_id})
+            elif doc_id in documents:
+                delta = document_delta(documents[doc_id], data)
+                documents[doc_id] = data
+                if delta:
+                    deltas.append({"type": "modified", "id": doc_id, **delta})
+            else:
+                documents[doc_id] = data
+                deltas.append({"type": "added", "id": doc_id, "set": data})
+
+        if collection not in self._loaded:
+            self._loaded.add(collection)
+            if self.ready:
+                self._publish(self.snapshot_event())
+        elif self.ready and deltas:
+            self._publish(("change", {"collection": collection, "changes": deltas}))
+
+
+class ChangeFeed:
+    """
+    Fans out Firestore changes to a user's open dashboards.
+
+    The first connection of a user starts one snapshot listener per
+    collection (filtered on userId); later connections share them. Each
+    client receives the full state once, then only the fields that change.
+    Listeners are kept for ``linger_seconds`` after the last client leaves
+    so a page reload does not pay for a new initial snapshot. Documents are
+    kept and sent without their ``omitted_fields`` (e.g. assessment
+    responses), which bounds the memory held per user.
+    """
+
+    def __init__(
+        self,
+        collections: List[str],
+        queue_size: int = 100,
+        linger_seconds: float = 30.0,
+        max_connections_per_user: int = 10,
+        omitted_fields: Optional[Dict[str, List[str]]] = None,
+        get_db: Callable = get_firestore_client,
+    ):
+        self.collections = collections
+        self.queue_size = queue_size
+        self.linger_seconds = linger_seconds
+        self.max_connections_per_user = max_connections_per_user
+        self.omitted_fields = {
+            name: frozenset(fields) for name, fields in (omitted_fields or {}).items()
+        }
+        self.get_db = get_db
+        self._feeds: Dict[str, UserFeed] = {}
+
+    def connections(self, user_id: str) -> int:
+        """Number of open feeds for the user on this instance"""
+        feed = self._feeds.get(user_id)
+        return len(feed.subscriptions) if feed else 0
+
+    def _listen(self, feed: UserFeed, loop: asyncio.AbstractEventLoop) -> None:
+        """Start the feed's listeners (blocking: run in a worker thread)"""
+        db = self.get_db()
+        for name in feed.collections:
+            def on_snapshot(
+                docs, changes, read_time, collection=name, omitted=self.omitted_fields.get(name)
+            ) -> None:
+                # Runs on the listener's thread; only plain data crosses over
+                plain = []
+                for change in changes:
+                    data = change.document.to_dict()
+                    if data is not None and omitted:
+                        data = {k: v for k, v in data.items() if k not in omitted}
+                    plain.append((change.type.name, change.document.id, data))
+                try:
+                    loop.call_soon_threadsafe(feed.apply, collection, plain)
+                except RuntimeError:
+                    # The event loop has shut down
+                    pass
+
+            watch = db.collection(name).where("userId", "==", feed.user_id).on_snapshot(on_snapshot)
+            feed.unsubscribes.append(watch.unsubscribe)
+            CHANGE_FEED_LISTENERS.inc()
+
+    async def _start(self, feed: UserFeed) -> None:
+        # Creating the client and the listeners blocks; keep it off the loop
+        try:
+            await asyncio.to_thread(self._listen, feed, asyncio.get_running_loop())
+        finally:
+            if self._feeds.get(feed.user_id) is not feed:
+                # Stopped (e.g. at shutdown) while starting
+                self._stop(feed)
+
+    async def _subscribe(self, user_id: str) -> Subscription:
+        if self.connections(user_id) >= self.max_connections_per_user:
+            raise TooManyConnectionsError(user_id)
+        feed = self._feeds.get(user_id)
+        if feed is None:
+            feed = self._feeds[user_id] = UserFeed(user_id, self.collections)
+            feed.listening = asyncio.ensure_future(self._start(feed))
+        if feed.idle_timer is not None:
+            feed.idle_timer.cancel()
+            feed.idle_timer = None
+        subscription = Subscription(feed, self.queue_size)
+        feed.subscriptions.add(subscription)
+        CHANGE_FEED_CLIENTS.inc()
+        if feed.ready:
+            subscription.offer(feed.snapshot_event())
+        # Otherwise the snapshot is sent to every client once it is loaded
+        try:
+            # Shielded: a client leaving does not cancel other clients' start
+            await asyncio.shield(feed.listening)
+        except BaseException:
+            feed.subscriptions.discard(subscription)
+            CHANGE_FEED_CLIENTS.dec()
+            if not feed.subscriptions:
+                self._stop(feed)
+            raise
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        feed = subscription.feed
+        feed.subscriptions.discard(subscription)
+        CHANGE_FEED_CLIENTS.dec()
+        if not feed.subscriptions and feed.idle_timer is None:
+            feed.idle_timer = asyncio.get_running_loop().call_later(
+                self.linger_seconds, self._close_idle, feed
+            )
+
+    def _close_idle(self, feed: UserFeed) -> None:
+        feed.idle_timer = None
+        if not feed.subscriptions and self._feeds.get(feed.user_id) is feed:
+            self._stop(feed)
+
+    def _stop(self, feed: UserFeed) -> None:
+        if self._feeds.get(feed.user_id) is feed:
+            del self._feeds[feed.user_id]
+        unsubscribes, feed.unsubscribes = feed.unsubscribes, []
+        for unsubscribe in unsubscribes:
+            try:
+                unsubscribe()
+            except Exception:
+                logger.exception("Failed to stop change listener for %s", feed.user_id)
+            CHANGE_FEED_LISTENERS.dec()
+
+    async def stream(
+        self, user_id: str, heartbeat_seconds: float = 15.0
+    ) -> AsyncIterator[Optional[Event]]:
+        """
+        Yield the user's current state as a "snapshot" event, then a
+        "change" event for each batch of changes.
+
+        None is yielded after heartbeat_seconds without events so callers
+        can send keep-alives.
+
+        Raises:
+            TooManyConnectionsError: If the user has too many open feeds
+        """
+        subscription = await self._subscribe(user_id)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(
+                        subscription.queue.get(), timeout=heartbeat_seconds
+                    )
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._unsubscribe(subscription)
+
+    def close(self) -> None:
+        """Stop every listener (at shutdown)"""
+        for feed in list(self._feeds.values()):
+            if feed.idle_timer is not None:
+                feed.idle_timer.cancel()
+            self._stop(feed)
+
+
+_feed: Optional[ChangeFeed] = None
+
+
+def get_change_feed() -> ChangeFeed:
+    """Get the shared change feed (FastAPI dependency)"""
+    global _feed
+    if _feed is None:
+        collections = ["assessments"]
+        # Recommendations kept in memory have no listener to attach to
+        if settings.RECOMMENDATIONS_BACKEND == "firestore":
+            collections.append("recommendations")
+        _feed = ChangeFeed(
+            collections,
+            queue_size=settings.CHANGE_FEED_QUEUE_SIZE,
+            linger_seconds=settings.CHANGE_FEED_LINGER_SECONDS,
+            max_connections_per_user=settings.CHANGE_FEED_MAX_CONNECTIONS_PER_USER,
+            omitted_fields=settings.CHANGE_FEED_OMITTED_FIELDS,
+        )
+    return _feed
@@ -0,0 +1,110 @@
+"""
+Single-flight coalescing of identical concurrent reads, with an optional
+micro-cache
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from app.core.metrics import COALESCED_CALLS
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Lets concurrent calls with the same key share one execution.
+
+    Keys are grouped by scope (normally the user ID) so a write can
+    invalidate everything read on the user's behalf. A call that started
+    before the scope was last invalidated is neither joined nor cached, so
+    a client always reads its own writes. With ``ttl_seconds`` > 0 results
+    are also kept for that long.
+
+    Shared results are returned to every caller as the same object and must
+    be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float = 0.0,
+        max_entries: int = 10000,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._flights: Dict[Tuple, Tuple[float, asyncio.Task]] = {}
+        self._cache: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._invalidated: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def _current(self, scope: Hashable, started_at: float) -> bool:
+        return started_at > self._invalidated.get(scope, float("-inf"))
+
+    async def do(self, scope: Hashable, key: Tuple, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run call, or share the result of an identical call in flight.
+
+        Args:
+            scope: Invalidation scope, e.g. the user ID
+            key: Identifies the read within the scope (hashable)
+            call: Performs the read
+
+        Returns:
+            The result of call; exceptions are shared the same way
+        """
+        if not self.enabled:
+            return await call()
+        full_key = (scope, *key)
+        now = time.monotonic()
+
+        cached = self._cache.get(full_key)
+        if cached is not None:
+            started_at, value = cached
+            if now - started_at < self.ttl_seconds and self._current(scope, started_at):
+                self._cache.move_to_end(full_key)
+                COALESCED_CALLS.inc(name=self.name, outcome="cached")
+                return value
+            del self._cache[full_key]
+
+        flight = self._flights.get(full_key)
+        if flight is not None and self._current(scope, flight[0]):
+            COALESCED_CALLS.inc(name=self.name, outcome="joined")
+            return await asyncio.shield(flight[1])
+
+        # A task, so one caller disconnecting does not cancel the others
+        task = asyncio.ensure_future(call())
+        self._flights[full_key] = (now, task)
+        task.add_done_callback(lambda done: self._finish(scope, full_key, now, done))
+        COALESCED_CALLS.inc(name=self.name, outcome="executed")
+        return await asyncio.shield(task)
+
+    def _finish(
+        self, scope: Hashable, full_key: Tuple, started_at: float, task: asyncio.Task
+    ) -> None:
+        flight = self._flights.get(full_key)
+        if flight is not None and flight[1] is task:
+            del self._flights[full_key]
+        # Retrieve the exception even if every caller went away
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self.ttl_seconds > 0 and self._current(scope, started_at):
+            self._cache[full_key] = (started_at, task.result())
+            self._cache.move_to_end(full_key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, scope: Hashable) -> None:
+        """
+        Stop sharing results and in-flight calls of the scope started before
+        now. Call after a write commits; stale entries are dropped on lookup.
+        """
+        if not self.enabled:
+            return
+        self._invalidated[scope] = time.monotonic()
+        self._invalidated.move_to_end(scope)
+        while len(self._invalidated) > self.max_entries:
+            self._invalidated.popitem(last=False)
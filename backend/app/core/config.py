@@ -1,7 +1,8 @@
 """
 Application configuration using Pydantic Settings
 """
-from typing import List
+from typing import Dict, List
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 
@@ -11,10 +12,183 @@ class Settings(BaseSettings):
     # Firebase
     FIREBASE_PROJECT_ID: str = ""
     FIREBASE_CREDENTIALS_PATH: str = ""
+    # Verify ID tokens locally against cached Google certificates
+    # (falls back to the Admin SDK when no project ID is configured)
+    AUTH_LOCAL_VERIFICATION: bool = True
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CERT_REFRESH_MARGIN_SECONDS: float = 300.0
+    # Reject tokens issued before the user's tokens were revoked; the
+    # revocation time is looked up through the Admin SDK and cached per user
+    AUTH_CHECK_REVOKED: bool = False
+    AUTH_REVOCATION_CACHE_SECONDS: float = 60.0
     
     # Gemini AI
     GEMINI_API_KEY: str = ""
     GEMINI_MODEL: str = "gemini-1.5-flash"
+    # Further models by provider name, as "<kind>:<model>"; the GEMINI_MODEL
+    # provider is always available as "gemini". E.g.
+    # {"pro": "gemini:gemini-1.5-pro"}
+    AI_PROVIDERS: Dict[str, str] = {}
+    # Providers each task (chat, analysis, remediation) may use, in order of
+    # preference, e.g. {"chat": ["gemini"], "analysis": ["pro", "gemini"]};
+    # a task without a route may use every provider. Within a route the
+    # provider with the best recent latency and error rate is tried first
+    AI_ROUTES: Dict[str, List[str]] = {}
+    # Also send a request to the next provider of the route when the first
+    # has not answered (streams: sent a chunk) within this time; 0 disables.
+    # Hedges count against AI_MAX_CONCURRENCY and are skipped when it is reached
+    AI_HEDGE_DELAY_SECONDS: float = 0.0
+    # Weight of the latest call in each provider's moving averages
+    AI_ROUTER_EWMA_ALPHA: float = 0.2
+    # A provider's error rate halves every this many seconds without calls,
+    # so a provider that failed is tried again once it has been idle a while
+    AI_ROUTER_ERROR_HALF_LIFE_SECONDS: float = 60.0
+    # Maximum number of Gemini calls in flight per instance
+    AI_MAX_CONCURRENCY: int = 16
+    # Per-call timeout for Gemini requests (seconds)
+    AI_REQUEST_TIMEOUT_SECONDS: float = 60.0
+    # Estimated tokens of assessment responses per prompt; larger
+    # assessments are analyzed in concurrent chunks and merged
+    AI_PROMPT_TOKEN_BUDGET: int = 6000
+    
+    # AI response cache
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_MAX_ENTRIES: int = 1024
+    AI_CACHE_TTL_SECONDS: float = 24 * 60 * 60
+    # "memory", "sqlite" or "firestore"
+    AI_CACHE_BACKEND: str = "memory"
+    AI_CACHE_SQLITE_PATH: str = "ai_cache.sqlite3"
+    AI_CACHE_FIRESTORE_COLLECTION: str = "aiCache"
+    
+    # Background analysis jobs
+    AI_JOBS_WORKERS: int = 4
+    # Jobs waiting for a worker before submissions are rejected with 503
+    # (0 for no limit)
+    AI_JOBS_QUEUE_SIZE: int = 256
+    AI_JOBS_MAX_ATTEMPTS: int = 3
+    AI_JOBS_RETRY_BACKOFF_SECONDS: float = 2.0
+    # A running job not finished within this time is picked up again
+    # (should exceed AI_REQUEST_TIMEOUT_SECONDS)
+    AI_JOBS_LEASE_SECONDS: float = 300.0
+    # "memory" or "firestore" (shared across instances, survives restarts)
+    AI_JOBS_BACKEND: str = "memory"
+    AI_JOBS_FIRESTORE_COLLECTION: str = "aiJobs"
+    
+    # Chat conversations: estimated tokens of recent turns sent verbatim
+    # with each message; once exceeded, the oldest turns are folded into
+    # the conversation's rolling summary in the background
+    CHAT_HISTORY_TOKEN_BUDGET: int = 1500
+    CHAT_SUMMARY_MAX_TOKENS: int = 400
+    # Estimated tokens of assessment facts added for a linked assessment
+    CHAT_FACTS_TOKEN_BUDGET: int = 500
+    # "memory" or "firestore" (shared across instances, survives restarts)
+    CONVERSATIONS_BACKEND: str = "memory"
+    CONVERSATIONS_FIRESTORE_COLLECTION: str = "conversations"
+    
+    # Remediation library: guidance for every catalog control and cloud
+    # provider, served when a request's current state is generic; other
+    # requests get a live generation. Entries are generated on first use
+    REMEDIATION_LIBRARY_ENABLED: bool = True
+    REMEDIATION_LIBRARY_PROVIDERS: List[str] = ["gcp", "azure", "aws"]
+    # Library entries generated at once while filling it
+    REMEDIATION_LIBRARY_CONCURRENCY: int = 2
+    # "memory" (lost at each restart) or "firestore" (generated once)
+    REMEDIATION_LIBRARY_BACKEND: str = "memory"
+    # Also fill the whole library in the background at startup (when
+    # GEMINI_API_KEY is set). Always done with the firestore backend, which
+    # only generates the entries not stored yet; with the memory backend
+    # every cold start would regenerate the library
+    REMEDIATION_LIBRARY_PREFILL: bool = False
+    REMEDIATION_LIBRARY_FIRESTORE_COLLECTION: str = "remediationLibrary"
+    
+    # AI admission control: per-user token buckets (sustained requests per
+    # minute and burst) for interactive calls and analysis submissions.
+    # Rates must be positive; set AI_RATE_LIMIT_ENABLED=false to turn the
+    # limits off
+    AI_RATE_LIMIT_ENABLED: bool = True
+    AI_RATE_LIMIT_INTERACTIVE_PER_MINUTE: float = Field(30, gt=0)
+    AI_RATE_LIMIT_INTERACTIVE_BURST: int = Field(10, ge=1)
+    AI_RATE_LIMIT_BULK_PER_MINUTE: float = Field(10, gt=0)
+    AI_RATE_LIMIT_BULK_BURST: int = Field(5, ge=1)
+    # "memory" or "firestore" (buckets shared across instances)
+    AI_RATE_LIMIT_BACKEND: str = "memory"
+    AI_RATE_LIMIT_FIRESTORE_COLLECTION: str = "rateLimits"
+    # AI requests and jobs in flight per instance; analysis jobs may use at
+    # most this share, keeping the rest for interactive requests
+    AI_ADMISSION_MAX_IN_FLIGHT: int = 32
+    AI_ADMISSION_BULK_SHARE: float = 0.5
+    
+    # Change feed (GET /api/v1/changes/stream): events buffered per client
+    # before a slow client is sent a fresh snapshot instead of deltas
+    CHANGE_FEED_QUEUE_SIZE: int = 100
+    CHANGE_FEED_HEARTBEAT_SECONDS: float = 15.0
+    # Listeners are kept this long after a user's last client disconnects
+    CHANGE_FEED_LINGER_SECONDS: float = 30.0
+    CHANGE_FEED_MAX_CONNECTIONS_PER_USER: int = 10
+    # Fields left out of the feed (and of the documents it keeps per user),
+    # by collection; clients fetch full documents through the API
+    CHANGE_FEED_OMITTED_FIELDS: Dict[str, List[str]] = {"assessments": ["responses"]}
+    
+    # Identical concurrent reads (same user and resource) share one
+    # Firestore call; results may also be reused for this many seconds
+    # (0 disables the micro-cache; other instances' writes can be missed
+    # for up to this long)
+    READ_COALESCING_ENABLED: bool = True
+    READ_CACHE_TTL_SECONDS: float = 0.0
+    
+    # WAF catalog: loaded from the bundled data file unless a Firestore
+    # collection of pillar documents is configured
+    CATALOG_FIRESTORE_COLLECTION: str = ""
+    CATALOG_CACHE_MAX_AGE_SECONDS: int = 300
+    
+    # Recommendations storage: "memory" (seeded with sample data) or "firestore"
+    RECOMMENDATIONS_BACKEND: str = "memory"
+    
+    # Azure Advisor sync (POST /api/v1/azure/advisor/sync): service principal
+    # credentials and the subscription synced by default
+    AZURE_TENANT_ID: str = ""
+    AZURE_CLIENT_ID: str = ""
+    AZURE_CLIENT_SECRET: str = ""
+    AZURE_SUBSCRIPTION_ID: str = ""
+    # Subscriptions each user may sync, keyed by Firebase UID; subscriptions
+    # under "*" may be synced by every user, as may AZURE_SUBSCRIPTION_ID.
+    # E.g. {"<uid>": ["<subscription ID>"], "*": ["<subscription ID>"]}
+    AZURE_ADVISOR_USER_SUBSCRIPTIONS: Dict[str, List[str]] = {}
+    # Overridable to run against a local stub server
+    AZURE_LOGIN_URL: str = "https://login.microsoftonline.com"
+    AZURE_MANAGEMENT_URL: str = "https://management.azure.com"
+    AZURE_ADVISOR_API_VERSION: str = "2023-01-01"
+    AZURE_REQUEST_TIMEOUT_SECONDS: float = 30.0
+    # Recommendation pages fetched at once: one page chain per subscription
+    # and Advisor category
+    AZURE_ADVISOR_CONCURRENCY: int = 8
+    # Fetched pages waiting to be written; bounds the memory a sync uses
+    AZURE_ADVISOR_QUEUE_PAGES: int = 16
+    # Recommendations per batched write (Firestore allows at most 500)
+    AZURE_ADVISOR_WRITE_BATCH_SIZE: int = 500
+    # "memory" or "firestore": page ETags and item fingerprints from the
+    # last sync, so unchanged recommendations are not written again
+    AZURE_ADVISOR_SYNC_BACKEND: str = "memory"
+    AZURE_ADVISOR_SYNC_FIRESTORE_COLLECTION: str = "advisorSync"
+    
+    # Resource inventory (/api/v1/assessments/{id}/resources): columnar
+    # indexes held in memory per instance, least recently used evicted once
+    # all assessments together exceed RESOURCE_INVENTORY_MAX_RESOURCES
+    RESOURCE_INVENTORY_MAX_RESOURCES: int = 2_000_000
+    RESOURCE_INVENTORY_MAX_PER_ASSESSMENT: int = 500_000
+    # NDJSON lines parsed before they are indexed together
+    RESOURCE_INGEST_BATCH_SIZE: int = 5000
+    # Longer NDJSON lines are rejected without being buffered
+    RESOURCE_INGEST_MAX_LINE_BYTES: int = 256 * 1024
+    
+    # Initialize Firestore, Gemini and auth clients in the background at
+    # startup instead of on the first request that needs them
+    STARTUP_WARMUP_ENABLED: bool = False
+    
+    # Instrumentation
+    METRICS_ENABLED: bool = True
+    # Adds a per-request Server-Timing header (auth/firestore/gemini breakdown)
+    SERVER_TIMING_ENABLED: bool = False
     
     # CORS
     CORS_ORIGINS: List[str] = [
@@ -0,0 +1,337 @@
+"""
+Chat conversations with bounded memory: a rolling summary, the recent
+turns and facts from the linked assessment
+"""
+import asyncio
+import logging
+import re
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from app.core.ai_client import AIClient, get_ai_client
+from app.core.catalog import Catalog, get_catalog
+from app.core.config import settings
+from app.core.metrics import CHAT_SUMMARIES
+from app.core.prompts import estimate_tokens
+from app.repositories.assessments import (
+    Assessment,
+    AssessmentAccessDeniedError,
+    AssessmentNotFoundError,
+    AssessmentRepository,
+    get_assessment_repository,
+)
+from app.repositories.conversations import (
+    ROLE_ASSISTANT,
+    ROLE_USER,
+    Conversation,
+    ConversationNotFoundError,
+    ConversationStore,
+    Turn,
+    get_conversation_store,
+)
+
+logger = logging.getLogger(__name__)
+
+# The last exchange is always sent verbatim, however long it is
+MIN_RECENT_TURNS = 2
+
+_WORD = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+_STOP_WORDS = frozenset({"a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with"})
+
+
+def _words(text: str) -> set:
+    return set(_WORD.findall(text.lower())) - _STOP_WORDS
+
+
+def recent_turns(turns: Sequence[Turn], token_budget: int) -> List[Turn]:
+    """The newest turns that fit the token budget (at least one), oldest first"""
+    kept: List[Turn] = []
+    used = 0
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn.text)
+        if kept and used + cost > token_budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def turns_to_fold(turns: Sequence[Turn], token_budget: int) -> int:
+    """
+    Number of oldest turns to fold into the summary.
+
+    0 while the turns fit the budget; otherwise enough to bring them
+    down to half of it, so the summary is updated once every few
+    exchanges rather than after each one. Whole exchanges are folded, so
+    the recent turns start with a user message.
+    """
+    costs = [estimate_tokens(turn.text) for turn in turns]
+    total = sum(costs)
+    if total <= token_budget:
+        return 0
+    foldable = len(turns) - MIN_RECENT_TURNS
+    count = 0
+    while count < foldable and total > token_budget // 2:
+        total -= costs[count]
+        count += 1
+    while count < foldable and turns[count].role != ROLE_USER:
+        count += 1
+    return count
+
+
+def assessment_facts(
+    assessment: Assessment,
+    message: str,
+    token_budget: int,
+    catalog: Optional[Catalog] = None,
+) -> str:
+    """
+    Compact facts about an assessment for a chat prompt.
+
+    Control scores are listed by how many words of the message they share
+    with the control's ID and name, then weakest first, until the token
+    budget is used.
+    """
+    catalog = catalog or get_catalog()
+
+    def control_name(control_id: str) -> str:
+        found = catalog.find_control(control_id)
+        return found[1].get("name", "") if found else ""
+
+    pillar = catalog.get_pillar(assessment.pillar_id) if assessment.pillar_id else None
+    header = f"Assessment of the {pillar['name'] if pillar else assessment.pillar_id} pillar"
+    if assessment.score is not None:
+        header += f", overall score {assessment.score}/100"
+    if assessment.status:
+        header += f", status {assessment.status}"
+
+    words = _words(message)
+    ranked = sorted(
+        assessment.control_scores.items(),
+        key=lambda item: (
+            -len(words & _words(f"{item[0]} {control_name(item[0])}")),
+            item[1],
+            item[0],
+        ),
+    )
+    lines = [header + ". Control scores:"]
+    used = estimate_tokens(lines[0])
+    for control_id, score in ranked:
+        line = f"- {control_id} {control_name(control_id)}: {score:g}/100"
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
+class ConversationManager:
+    """
+    Server-side chat sessions whose prompts stay the same size however
+    long the conversation runs.
+
+    Each prompt carries the rolling summary, the recent turns within
+    ``history_token_budget`` and facts from the linked assessment. Once
+    the stored turns exceed the budget, the oldest are folded into the
+    summary by a background call, off the path of the reply.
+    """
+
+    def __init__(
+        self,
+        store: ConversationStore,
+        history_token_budget: int = 1500,
+        facts_token_budget: int = 500,
+        get_client: Callable[[], AIClient] = get_ai_client,
+        get_repository: Callable[[], AssessmentRepository] = get_assessment_repository,
+    ):
+        self.store = store
+        self.history_token_budget = history_token_budget
+        self.facts_token_budget = facts_token_budget
+        self.get_client = get_client
+        self.get_repository = get_repository
+        self._folds: Dict[str, asyncio.Task] = {}
+
+    async def create(self, user_id: str, assessment_id: Optional[str] = None) -> Conversation:
+        """
+        Start a conversation, optionally about one of the user's assessments.
+
+        Raises:
+            AssessmentNotFoundError: If the assessment does not exist
+            AssessmentAccessDeniedError: If it belongs to another user
+        """
+        if assessment_id is not None:
+            await self.get_repository().get_owned(assessment_id, user_id)
+        conversation = Conversation(user_id=user_id, assessment_id=assessment_id)
+        await self.store.create(conversation)
+        return conversation
+
+    async def get(self, conversation_id: str, user_id: str) -> Conversation:
+        """
+        Fetch one of the user's conversations.
+
+        Raises:
+            ConversationNotFoundError: If it does not exist or belongs to another user
+        """
+        conversation = await self.store.get(conversation_id)
+        if conversation is None or conversation.user_id != user_id:
+            raise ConversationNotFoundError(conversation_id)
+        return conversation
+
+    async def delete(self, conversation_id: str, user_id: str) -> None:
+        """
+        Delete one of the user's conversations.
+
+        Raises:
+            ConversationNotFoundError: If it does not exist or belongs to another user
+        """
+        await self.get(conversation_id, user_id)
+        await self.store.delete(conversation_id)
+
+    async def _prompt_inputs(
+        self, conversation: Conversation, message: str, context: Optional[str]
+    ) -> dict:
+        """Keyword arguments for AIClient.chat/stream_chat"""
+        parts = [context] if context else []
+        if conversation.assessment_id is not None:
+            try:
+                assessment = await self.get_repository().get_owned(
+                    conversation.assessment_id, conversation.user_id
+                )
+            except (AssessmentNotFoundError, AssessmentAccessDeniedError):
+                # Deleted since the conversation started
+                assessment = None
+            if assessment is not None:
+                parts.append(assessment_facts(assessment, message, self.facts_token_budget))
+        # Turns beyond the budget are only there while a fold is pending
+        turns = recent_turns(conversation.turns, self.history_token_budget)
+        return {
+            "context": "\n\n".join(parts) or None,
+            "summary": conversation.summary or None,
+            "history": [(turn.role, turn.text) for turn in turns],
+        }
+
+    async def reply(
+        self,
+        conversation_id: str,
+        user_id: str,
+        message: str,
+        context: Optional[str] = None,
+    ) -> str:
+        """
+        Answer a message and record the exchange.
+
+        Raises:
+            ConversationNotFoundError: If the conversation does not exist or
+                belongs to another user
+        """
+        conversation = await self.get(conversation_id, user_id)
+        inputs = await self._prompt_inputs(conversation, message, context)
+        answer = await self.get_client().chat(message, **inputs)
+        await self._record(conversation_id, message, answer)
+        return answer
+
+    async def stream_reply(
+        self,
+        conversation_id: str,
+        user_id: str,
+        message: str,
+        context: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Prepare a streamed answer to a message.
+
+        The exchange is recorded once the answer is complete; an answer
+        abandoned midway is not.
+
+        Returns:
+            Response text chunks
+
+        Raises:
+            ConversationNotFoundError: If the conversation does not exist or
+                belongs to another user
+        """
+        conversation = await self.get(conversation_id, user_id)
+        inputs = await self._prompt_inputs(conversation, message, context)
+
+        async def chunks() -> AsyncIterator[str]:
+            parts = []
+            async with aclosing(self.get_client().stream_chat(message, **inputs)) as stream:
+                async for chunk in stream:
+                    parts.append(chunk)
+                    yield chunk
+            await self._record(conversation_id, message, "".join(parts))
+
+        return chunks()
+
+    async def _record(self, conversation_id: str, message: str, answer: str) -> None:
+        try:
+            conversation = await self.store.append(
+                conversation_id, [(ROLE_USER, message), (ROLE_ASSISTANT, answer)]
+            )
+        except ConversationNotFoundError:
+            # Deleted while the answer was generated
+            return
+        if turns_to_fold(conversation.turns, self.history_token_budget):
+            self._schedule_fold(conversation_id)
+
+    def _schedule_fold(self, conversation_id: str) -> None:
+        if conversation_id in self._folds:
+            return
+        task = asyncio.create_task(self._fold(conversation_id))
+        self._folds[conversation_id] = task
+        task.add_done_callback(lambda _: self._folds.pop(conversation_id, None))
+
+    async def _fold(self, conversation_id: str) -> None:
+        """
+        Summarize the oldest turns into the conversation's summary.
+
+        Only the previous summary and the folded turns are sent. A failed
+        fold is retried after the next message.
+        """
+        try:
+            conversation = await self.store.get(conversation_id)
+            if conversation is None:
+                return
+            count = turns_to_fold(conversation.turns, self.history_token_budget)
+            if not count:
+                return
+            folding = conversation.turns[:count]
+            summary = await self.get_client().summarize_conversation(
+                conversation.summary, [(turn.role, turn.text) for turn in folding]
+            )
+            folded = await self.store.fold(
+                conversation_id, summary, folding[-1].seq, conversation.summarized_through
+            )
+            CHAT_SUMMARIES.inc(outcome="folded" if folded else "conflict")
+        except Exception:
+            CHAT_SUMMARIES.inc(outcome="error")
+            logger.exception("Failed to summarize conversation %s", conversation_id)
+
+    async def join(self) -> None:
+        """Wait until pending summary updates on this instance have finished"""
+        while self._folds:
+            await asyncio.gather(*self._folds.values(), return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Cancel pending summary updates; they are redone after the next message"""
+        tasks = list(self._folds.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_manager: Optional[ConversationManager] = None
+
+
+def get_conversation_manager() -> ConversationManager:
+    """Get the shared conversation manager (FastAPI dependency)"""
+    global _manager
+    if _manager is None:
+        _manager = ConversationManager(
+            get_conversation_store(),
+            history_token_budget=settings.CHAT_HISTORY_TOKEN_BUDGET,
+            facts_token_budget=settings.CHAT_FACTS_TOKEN_BUDGET,
+        )
+    return _manager
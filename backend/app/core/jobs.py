@@ -0,0 +1,392 @@
+"""
+Background worker pool for AI assessment analysis
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.ai_cache import make_cache_key
+from app.core.ai_client import PROMPT_VERSIONS, AIClient, get_ai_client
+from app.core.analysis import AnalysisParseError, AssessmentAnalysis, to_recommendations
+from app.core.config import settings
+from app.core.metrics import AI_JOBS, AI_JOBS_QUEUED
+from app.core.rate_limit import BULK, AdmissionController, get_admission_controller
+from app.repositories.assessments import (
+    AssessmentAccessDeniedError,
+    AssessmentNotFoundError,
+    AssessmentRepository,
+    get_assessment_repository,
+)
+from app.repositories.jobs import (
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    AnalysisJob,
+    JobStore,
+    get_job_store,
+)
+from app.repositories.recommendations import RecommendationStore, get_recommendation_store
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """Raised when no more analysis jobs can be queued on this instance"""
+
+
+class JobNotFoundError(Exception):
+    """Raised when a job does not exist or belongs to another user"""
+
+
+def make_job_id(
+    user_id: str,
+    pillar: str,
+    responses: List[dict],
+    assessment_id: Optional[str] = None,
+) -> str:
+    """
+    Deterministic job ID for an analysis request.
+
+    Identical submissions from the same user map to the same job, so client
+    retries and double submits attach to the existing job instead of paying
+    for another Gemini call.
+    """
+    inputs = {
+        "user": user_id,
+        "assessment": assessment_id,
+        "pillar": pillar.strip().lower(),
+        "responses": responses,
+    }
+    return make_cache_key(settings.GEMINI_MODEL, "analyze", PROMPT_VERSIONS["analyze"], inputs)[:32]
+
+
+class AnalysisJobManager:
+    """
+    Runs analysis jobs on a bounded pool of worker tasks.
+
+    Job state lives in a JobStore; the in-process queue only carries job IDs.
+    A worker claims a job before running it, so a job enqueued more than once
+    (resubmission, recovery, another instance) still runs once at a time.
+    Failed attempts are retried with exponential backoff, and a job whose
+    worker died is picked up again once its lease expires.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int = 4,
+        queue_size: int = 256,
+        max_attempts: int = 3,
+        retry_backoff: float = 2.0,
+        lease_seconds: float = 300.0,
+        get_client: Callable[[], AIClient] = get_ai_client,
+        get_repository: Callable[[], AssessmentRepository] = get_assessment_repository,
+        get_recommendations: Callable[[], RecommendationStore] = get_recommendation_store,
+        get_admission: Callable[[], AdmissionController] = get_admission_controller,
+    ):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        self.get_client = get_client
+        self.get_repository = get_repository
+        self.get_recommendations = get_recommendations
+        self.get_admission = get_admission
+        self.queue_size = queue_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def start(self) -> None:
+        """Start the workers and re-enqueue jobs left unfinished by earlier runs"""
+        if self._tasks:
+            return
+        # Bound to the serving event loop; anything submitted earlier is
+        # still in the store and comes back through recovery
+        AI_JOBS_QUEUED.dec(self._queue.qsize())
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover()))
+
+    async def stop(self) -> None:
+        """
+        Cancel the workers.
+
+        Jobs interrupted mid-run keep their lease and are retried by the next
+        instance to start once it expires.
+        """
+        tasks = [*self._tasks, *self._retries]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._retries.clear()
+
+    async def join(self) -> None:
+        """Wait until every job queued on this instance has been processed"""
+        await self._queue.join()
+
+    def _enqueue(self, job_id: str) -> bool:
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            return False
+        AI_JOBS_QUEUED.inc()
+        return True
+
+    async def _recover(self) -> None:
+        try:
+            jobs = await self.store.list_recoverable()
+        except Exception as e:
+            logger.warning("Could not recover analysis jobs: %s", e)
+            return
+        for job in jobs:
+            if not self._enqueue(job.id):
+                logger.warning("Analysis queue full; %d jobs left for a later restart", len(jobs))
+                return
+
+    async def submit(
+        self,
+        user_id: str,
+        pillar: str,
+        responses: List[dict],
+        assessment_id: Optional[str] = None,
+        bypass_cache: bool = False,
+        stored_responses: bool = False,
+    ) -> Tuple[AnalysisJob, bool]:
+        """
+        Queue an analysis, or return the existing job for identical input.
+
+        A failed job is replaced by a fresh one, as is a succeeded job when
+        bypass_cache is set. With stored_responses, the responses are the
+        assessment's own: they only identify the job, and the worker reads
+        them from the assessment instead of the job document carrying a copy.
+
+        Returns:
+            (job, whether a new job was queued)
+
+        Raises:
+            JobQueueFullError: If the queue has no room for a new job
+        """
+        job_id = make_job_id(user_id, pillar, responses, assessment_id)
+        existing = await self.store.get(job_id)
+        if existing is not None and existing.status != JOB_FAILED:
+            if existing.status != JOB_SUCCEEDED or not bypass_cache:
+                # Re-enqueue work abandoned by a restarted instance; the
+                # claim makes this a no-op if someone is still running it
+                if self._abandoned(existing):
+                    self._enqueue(existing.id)
+                AI_JOBS.inc(event="deduplicated")
+                return existing, False
+
+        if self._queue.full():
+            AI_JOBS.inc(event="rejected")
+            raise JobQueueFullError()
+        job = AnalysisJob(
+            id=job_id,
+            user_id=user_id,
+            pillar=pillar,
+            responses=None if stored_responses and assessment_id is not None else responses,
+            assessment_id=assessment_id,
+            bypass_cache=bypass_cache,
+        )
+        stored = await self.store.create(job, replace=existing is not None)
+        if stored is not job:
+            # An identical submission was stored concurrently
+            AI_JOBS.inc(event="deduplicated")
+            return stored, False
+        if not self._enqueue(job.id):
+            await self._save(job.touch(status=JOB_FAILED, error="Analysis queue is full"))
+            AI_JOBS.inc(event="rejected")
+            raise JobQueueFullError()
+        AI_JOBS.inc(event="submitted")
+        return job, True
+
+    def _abandoned(self, job: AnalysisJob) -> bool:
+        """Whether an unfinished job appears to have been lost by its instance"""
+        if job.status == JOB_RUNNING:
+            return job.claimable(time.time())
+        age = datetime.utcnow() - datetime.fromisoformat(job.updated_at)
+        return job.status == JOB_QUEUED and age.total_seconds() > self.lease_seconds
+
+    async def get(self, job_id: str, user_id: str) -> AnalysisJob:
+        """
+        Fetch a job owned by the user.
+
+        Raises:
+            JobNotFoundError: If the job does not exist or is someone else's
+        """
+        job = await self.store.get(job_id)
+        if job is None or job.user_id != user_id:
+            raise JobNotFoundError(job_id)
+        return job
+
+    async def watch(
+        self, job_id: str, poll_interval: float = 15.0
+    ) -> AsyncIterator[Optional[AnalysisJob]]:
+        """
+        Yield the job's current state, then every change until it finishes.
+
+        Changes made by this instance's workers are delivered immediately; the
+        store is re-read every poll_interval to pick up progress made on other
+        instances. None is yielded for an interval without changes so callers
+        can send keep-alives.
+        """
+        updates: asyncio.Queue = asyncio.Queue()
+        self._watchers.setdefault(job_id, set()).add(updates)
+        try:
+            job = await self.store.get(job_id)
+            if job is None:
+                return
+            yield job
+            while not job.done:
+                try:
+                    latest = await asyncio.wait_for(updates.get(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    latest = await self.store.get(job_id) or job
+                if latest.updated_at == job.updated_at:
+                    yield None
+                    continue
+                job = latest
+                yield job
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(updates)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    async def _save(self, job: AnalysisJob) -> None:
+        await self.store.save(job)
+        for updates in self._watchers.get(job.id, ()):
+            updates.put_nowait(job)
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            AI_JOBS_QUEUED.dec()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Analysis job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await self.store.claim(job_id, self.lease_seconds)
+        if job is None:
+            return
+        for updates in self._watchers.get(job.id, ()):
+            updates.put_nowait(job)
+
+        try:
+            responses = job.responses
+            if responses is None:
+                assessment = await self.get_repository().get_owned(job.assessment_id, job.user_id)
+                responses = assessment.responses
+            # Waits while interactive requests need the capacity
+            async with self.get_admission().slot(BULK):
+                result = await self.get_client().analyze_assessment(
+                    pillar=job.pillar,
+                    responses=responses,
+                    use_cache=not job.bypass_cache,
+                )
+            if result.get("analysis") is None:
+                # Retried like a failed call: a new generation may parse
+                raise AnalysisParseError(result.get("parse_error") or "Unparseable analysis")
+            await self._store_recommendations(
+                job, AssessmentAnalysis.model_validate(result["analysis"])
+            )
+            if job.assessment_id is not None:
+                await self.get_repository().update(job.assessment_id, job.user_id, {
+                    "analysis": result,
+                    "analysisStatus": "completed",
+                    "analysisJobId": job.id,
+                    "analyzedAt": datetime.utcnow().isoformat(),
+                })
+        except (AssessmentNotFoundError, AssessmentAccessDeniedError):
+            # Deleted or reassigned since submission; retrying cannot help
+            await self._fail(job, "Assessment is no longer available")
+            return
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if job.attempts >= self.max_attempts:
+                await self._fail(job, error)
+                return
+            await self._save(job.touch(status=JOB_QUEUED, error=error, lease_expires_at=None))
+            self._retry_later(job.id, self.retry_backoff * 2 ** (job.attempts - 1))
+            AI_JOBS.inc(event="retried")
+            return
+
+        await self._save(job.touch(
+            status=JOB_SUCCEEDED, result=result, error=None, lease_expires_at=None
+        ))
+        AI_JOBS.inc(event="succeeded")
+
+    async def _store_recommendations(self, job: AnalysisJob, analysis: AssessmentAnalysis) -> None:
+        """
+        Upsert the analysis' recommendations for the job's user.
+
+        IDs are stable per assessment and title, so re-running an analysis
+        updates earlier rows; a status the user already set is kept.
+        """
+        recommendations = to_recommendations(
+            analysis, job.user_id, job.pillar, job.assessment_id
+        )
+        if not recommendations:
+            return
+        store = self.get_recommendations()
+        existing = await asyncio.gather(
+            *(store.get(job.user_id, recommendation.id) for recommendation in recommendations)
+        )
+        await store.upsert_many(
+            recommendation if previous is None
+            else recommendation.model_copy(update={"status": previous.status})
+            for recommendation, previous in zip(recommendations, existing)
+        )
+
+    async def _fail(self, job: AnalysisJob, error: str) -> None:
+        await self._save(job.touch(status=JOB_FAILED, error=error, lease_expires_at=None))
+        AI_JOBS.inc(event="failed")
+        if job.assessment_id is None:
+            return
+        try:
+            await self.get_repository().update(job.assessment_id, job.user_id, {
+                "analysisStatus": "failed",
+                "analysisJobId": job.id,
+            })
+        except Exception as e:
+            logger.warning("Could not mark assessment %s as failed: %s", job.assessment_id, e)
+
+    def _retry_later(self, job_id: str, delay: float) -> None:
+        async def requeue() -> None:
+            await asyncio.sleep(delay)
+            await self._queue.put(job_id)
+            AI_JOBS_QUEUED.inc()
+
+        task = asyncio.create_task(requeue())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+
+_manager: Optional[AnalysisJobManager] = None
+
+
+def get_job_manager() -> AnalysisJobManager:
+    """Get the shared analysis job manager (FastAPI dependency)"""
+    global _manager
+    if _manager is None:
+        _manager = AnalysisJobManager(
+            get_job_store(),
+            workers=settings.AI_JOBS_WORKERS,
+            queue_size=settings.AI_JOBS_QUEUE_SIZE,
+            max_attempts=settings.AI_JOBS_MAX_ATTEMPTS,
+            retry_backoff=settings.AI_JOBS_RETRY_BACKOFF_SECONDS,
+            lease_seconds=settings.AI_JOBS_LEASE_SECONDS,
+        )
+    return _manager
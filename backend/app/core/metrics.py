@@ -0,0 +1,370 @@
+"""
+Request-level performance instrumentation and Prometheus text exposition
+"""
+import bisect
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class for labelled metrics"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        # Layout: per-bucket counts, then +Inf count, then sum
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _samples(self) -> Iterator[str]:
+        for key, series in self._series.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative:g}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {series[-1]:g}"
+            yield f"{self.name}_count{labels} {cumulative:g}"
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "waflens_http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+)
+HTTP_LATENCY = registry.histogram(
+    "waflens_http_request_duration_seconds", "HTTP request latency", ["method", "route"]
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "waflens_http_requests_in_flight", "HTTP requests currently being served"
+)
+AUTH_LATENCY = registry.histogram(
+    "waflens_auth_verify_duration_seconds", "ID token verification latency"
+)
+FIRESTORE_CALLS = registry.counter(
+    "waflens_firestore_calls_total",
+    "Firestore operations by handler and outcome",
+    ["handler", "operation", "outcome"],
+)
+FIRESTORE_LATENCY = registry.histogram(
+    "waflens_firestore_call_duration_seconds",
+    "Firestore operation latency",
+    ["handler", "operation"],
+)
+AI_CALLS = registry.counter(
+    "waflens_ai_calls_total", "Gemini calls by operation and outcome", ["operation", "outcome"]
+)
+AI_LATENCY = registry.histogram(
+    "waflens_ai_call_duration_seconds", "Gemini call latency", ["operation"]
+)
+AI_TOKENS = registry.counter(
+    "waflens_ai_tokens_total", "Gemini tokens by operation and kind", ["operation", "kind"]
+)
+AI_PROVIDER_CALLS = registry.counter(
+    "waflens_ai_provider_calls_total",
+    "Calls to each AI provider by outcome (cancelled: lost a hedged race)",
+    ["provider", "outcome"],
+)
+AI_PROVIDER_LATENCY = registry.histogram(
+    "waflens_ai_provider_call_duration_seconds",
+    "AI provider latency (time to first chunk for streams)",
+    ["provider"],
+)
+AI_HEDGES = registry.counter(
+    "waflens_ai_hedged_requests_total", "Hedged requests sent to a second provider", ["task"]
+)
+REMEDIATION_LIBRARY = registry.counter(
+    "waflens_remediation_library_total",
+    "Remediation requests by source (library, built on first use, personalized)",
+    ["outcome"],
+)
+CHAT_SUMMARIES = registry.counter(
+    "waflens_chat_summaries_total",
+    "Conversation summary updates by outcome (folded, conflict, error)",
+    ["outcome"],
+)
+AI_ADMISSION = registry.counter(
+    "waflens_ai_admission_total", "AI admission decisions by lane", ["lane", "outcome"]
+)
+AI_IN_FLIGHT = registry.gauge(
+    "waflens_ai_in_flight", "AI requests and jobs holding an admission slot", ["lane"]
+)
+AI_JOBS = registry.counter(
+    "waflens_ai_jobs_total", "Analysis job lifecycle events", ["event"]
+)
+AI_JOBS_QUEUED = registry.gauge(
+    "waflens_ai_jobs_queued", "Analysis jobs waiting for a worker on this instance"
+)
+COALESCED_CALLS = registry.counter(
+    "waflens_coalesced_calls_total",
+    "Coalesced reads by outcome (executed, joined an identical call, cached)",
+    ["name", "outcome"],
+)
+ADVISOR_PAGES = registry.counter(
+    "waflens_azure_advisor_pages_total",
+    "Azure Advisor recommendation pages by outcome (fetched, not_modified, retried, failed)",
+    ["outcome"],
+)
+ADVISOR_ITEMS = registry.counter(
+    "waflens_azure_advisor_items_total",
+    "Synced Azure Advisor recommendations by outcome (written, unchanged, resolved)",
+    ["outcome"],
+)
+RESOURCES_INGESTED = registry.counter(
+    "waflens_resources_ingested_total",
+    "Uploaded inventory resources by outcome (indexed, rejected)",
+    ["outcome"],
+)
+CHANGE_FEED_LISTENERS = registry.gauge(
+    "waflens_change_feed_listeners", "Firestore snapshot listeners held by the change feed"
+)
+CHANGE_FEED_CLIENTS = registry.gauge(
+    "waflens_change_feed_clients", "Clients connected to the change feed"
+)
+CHANGE_FEED_EVENTS = registry.counter(
+    "waflens_change_feed_events_total", "Change feed events published by type", ["event"]
+)
+
+
+class RequestTimings:
+    """Per-request time spent in each phase, for the Server-Timing header"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.phases: Dict[str, List[float]] = {}
+
+    @property
+    def handler(self) -> str:
+        """Route template of the current request (e.g. /api/v1/assessments/{assessment_id})"""
+        route = self.scope.get("route")
+        template = getattr(route, "path_format", None)
+        if template is None:
+            return "unmatched"
+        # Routes of included routers may carry only their own template;
+        # restore the mount prefix from the matching leading path segments
+        path_parts = self.scope["path"].split("/")
+        template_parts = template.split("/")
+        prefix = "/".join(path_parts[:max(len(path_parts) - len(template_parts) + 1, 0)])
+        return prefix + template
+
+    def record(self, phase: str, seconds: float) -> None:
+        entry = self.phases.setdefault(phase, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def server_timing(self, total_seconds: float) -> str:
+        parts = [
+            f'{phase};dur={seconds * 1000:.1f};desc="{int(count)} call{"s" if count != 1 else ""}"'
+            for phase, (seconds, count) in self.phases.items()
+        ]
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "waflens_request_timings", default=None
+)
+
+
+def current_handler() -> str:
+    """Route template of the request being served, or "background" outside one"""
+    timings = _current_timings.get()
+    return timings.handler if timings is not None else "background"
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    """Attribute time to a phase of the current request, if any"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.record(phase, seconds)
+
+
+@contextmanager
+def track_firestore(operation: str) -> Iterator[None]:
+    """Count and time one Firestore operation against the current handler"""
+    handler = current_handler()
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        FIRESTORE_CALLS.inc(handler=handler, operation=operation, outcome=outcome)
+        FIRESTORE_LATENCY.observe(elapsed, handler=handler, operation=operation)
+        record_phase("firestore", elapsed)
+
+
+def firestore_operation(operation: str):
+    """Decorator form of track_firestore for async repository methods"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track_firestore(operation):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency, status counts and the
+    in-flight gauge, and optionally adding a Server-Timing header.
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(scope)
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((
+                        b"server-timing",
+                        timings.server_timing(time.perf_counter() - start).encode("latin-1"),
+                    ))
+                    headers.append((b"timing-allow-origin", b"*"))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = timings.handler
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status_code))
+            HTTP_LATENCY.observe(elapsed, method=scope["method"], route=route)
+            _current_timings.reset(token)
@@ -0,0 +1,136 @@
+"""
+Compact prompt encoding and token budgeting for assessment responses
+"""
+import json
+from typing import List, Sequence
+
+# Rough characters-per-token ratio for English text and tables; the
+# Gemini tokenizer would need a network round trip per prompt
+CHARS_PER_TOKEN = 4
+# Free-text answers longer than this are truncated
+MAX_CELL_CHARS = 500
+
+TABLE_LEGEND = (
+    'Columns are separated by "|"; within a value "\\|" is a literal "|" and "\\n" '
+    'a line break. Lines above the header apply to every row.'
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of tokens in a piece of text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _escape(text: str) -> str:
+    """Escape backslashes and the column separator"""
+    if "\\" in text:
+        text = text.replace("\\", "\\\\")
+    if "|" in text:
+        text = text.replace("|", "\\|")
+    return text
+
+
+def _cell(value) -> str:
+    """Render one value on a single line, escaped for the table"""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        text = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    else:
+        text = str(value)
+    if len(text) > MAX_CELL_CHARS:
+        text = text[:MAX_CELL_CHARS - 3] + "..."
+    text = _escape(text)
+    # Runs of spaces are collapsed; line breaks are kept, escaped
+    if "\n" in text or "\r" in text:
+        lines = (" ".join(line.split()) for line in text.splitlines())
+        return "\\n".join(line for line in lines if line)
+    return " ".join(text.split())
+
+
+def encode_table(rows: Sequence[dict]) -> str:
+    """
+    Encode a list of dicts as a pipe-separated table.
+
+    Keys are written once in the header rather than once per row, and a
+    column holding the same value in every row is written once above the
+    header as "key: value". Compared with the repr of the list this roughly
+    halves the prompt size of typical responses. Column names and values
+    are escaped, so a "|" or line break in either cannot shift the columns.
+
+    Args:
+        rows: Assessment responses (or any flat records)
+
+    Returns:
+        The encoded table, or "(none)" for no rows
+    """
+    if not rows:
+        return "(none)"
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    cells = [[_cell(row.get(column)) for column in columns] for row in rows]
+    names = [_cell(column) for column in columns]
+    constant = set()
+    if len(rows) > 1:
+        constant = {
+            i for i in range(len(columns)) if len({row[i] for row in cells}) == 1
+        }
+        if len(constant) == len(columns):
+            constant = set()
+    varying = [i for i in range(len(columns)) if i not in constant]
+
+    lines = [f"{names[i]}: {cells[0][i]}" for i in sorted(constant)]
+    lines.append("|".join(names[i] for i in varying))
+    lines.extend("|".join(row[i] for i in varying) for row in cells)
+    return "\n".join(lines)
+
+
+def chunk_rows(rows: Sequence[dict], token_budget: int) -> List[List[dict]]:
+    """
+    Split rows into consecutive chunks whose encoded tables fit a budget.
+
+    A single row larger than the budget still gets a chunk of its own.
+
+    Args:
+        rows: Records to split
+        token_budget: Estimated tokens allowed per encoded chunk
+
+    Returns:
+        Chunks in input order; one chunk if everything fits
+    """
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    available = token_budget - estimate_tokens("|".join(columns))
+    costs = [
+        sum(len(_cell(value)) + 1 for value in row.values()) // CHARS_PER_TOKEN + 1
+        for row in rows
+    ]
+    if sum(costs) <= available:
+        return [list(rows)]
+    chunks: List[List[dict]] = []
+    current: List[dict] = []
+    used = 0
+    for row, cost in zip(rows, costs):
+        if current and used + cost > available:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(row)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def pack_texts(texts: Sequence[str], token_budget: int) -> List[List[str]]:
+    """Group consecutive texts so each group's total fits a token budget"""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for text in texts:
+        cost = estimate_tokens(text)
+        if current and used + cost > token_budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,317 @@
+"""
+Admission control for AI endpoints: per-user token buckets and an
+instance-wide in-flight budget with priority lanes
+"""
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.core.config import settings
+from app.core.metrics import AI_ADMISSION, AI_IN_FLIGHT, firestore_operation
+from app.core.security import get_async_firestore_client, get_current_user
+
+if TYPE_CHECKING:
+    from google.cloud.firestore import AsyncClient
+
+# Chat and remediation: a user is waiting on the answer
+INTERACTIVE = "interactive"
+# Assessment analysis: queued and processed in the background
+BULK = "bulk"
+
+# Suggested wait after shedding load; slots free up within a Gemini call
+SHED_RETRY_AFTER_SECONDS = 1
+
+
+def take_token(
+    tokens: float,
+    updated_at: float,
+    now: float,
+    rate: float,
+    capacity: float,
+) -> Tuple[float, float]:
+    """
+    Refill a token bucket and try to take one token.
+
+    Args:
+        tokens: Tokens left at updated_at
+        updated_at: Time of the last update (epoch seconds)
+        now: Current time (epoch seconds)
+        rate: Tokens added per second
+        capacity: Bucket size (burst)
+
+    Returns:
+        (tokens left, seconds to wait; 0 if a token was taken)
+    """
+    tokens = min(capacity, tokens + max(now - updated_at, 0.0) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class RateLimitBackend(ABC):
+    """Storage for token buckets"""
+
+    @abstractmethod
+    async def acquire(self, key: str, rate: float, capacity: float) -> float:
+        """
+        Take a token from the bucket for key.
+
+        Returns:
+            0 if admitted, otherwise seconds until a token is available
+        """
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets for a single instance; least recently used keys are evicted"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, capacity: float) -> float:
+        now = time.time()
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens, wait = take_token(tokens, updated_at, now, rate, capacity)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class FirestoreRateLimitBackend(RateLimitBackend):
+    """
+    Buckets shared by every instance, one document per user and lane.
+
+    Each check is a read-modify-write transaction. Documents carry an
+    expiresAt timestamp so a Firestore TTL policy can delete idle buckets.
+    """
+
+    def __init__(self, db: "AsyncClient", collection: str = "rateLimits"):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    @firestore_operation("rate_limit.acquire")
+    async def acquire(self, key: str, rate: float, capacity: float) -> float:
+        from google.cloud.firestore import async_transactional
+
+        doc_ref = self.collection.document(key)
+
+        @async_transactional
+        async def apply(transaction) -> float:
+            snapshot = await doc_ref.get(transaction=transaction)
+            now = time.time()
+            tokens, updated_at = capacity, now
+            if snapshot.exists:
+                tokens, updated_at = snapshot.get("tokens"), snapshot.get("updatedAt")
+            tokens, wait = take_token(tokens, updated_at, now, rate, capacity)
+            # A bucket idle for this long is full again and can be dropped
+            idle = timedelta(seconds=capacity / rate)
+            transaction.set(doc_ref, {
+                "tokens": tokens,
+                "updatedAt": now,
+                "expiresAt": datetime.now(timezone.utc) + idle,
+            })
+            return wait
+
+        return await apply(self.db.transaction())
+
+
+class RateLimiter:
+    """Per-user token buckets, one per lane"""
+
+    def __init__(self, backend: RateLimitBackend, limits: Dict[str, Tuple[float, float]]):
+        """
+        Args:
+            backend: Bucket storage
+            limits: (requests per minute, burst) keyed by lane
+        """
+        self.backend = backend
+        self.limits = limits
+
+    async def check(self, user_id: str, lane: str) -> float:
+        """Take a token for the user; returns seconds to wait if none is left"""
+        per_minute, burst = self.limits[lane]
+        return await self.backend.acquire(f"{lane}:{user_id}", per_minute / 60, burst)
+
+
+class AdmissionController:
+    """
+    Instance-wide budget of AI requests in flight, split into lanes.
+
+    Interactive requests may use every slot; bulk work may use at most
+    ``bulk_share`` of them, so a backlog of analyses never leaves chat
+    without capacity.
+    """
+
+    def __init__(self, max_in_flight: int, bulk_share: float = 0.5):
+        self.max_in_flight = max_in_flight
+        self.bulk_limit = max(1, int(max_in_flight * bulk_share))
+        self._in_flight = {INTERACTIVE: 0, BULK: 0}
+        self._released = asyncio.Condition()
+
+    def _has_room(self, lane: str) -> bool:
+        if sum(self._in_flight.values()) >= self.max_in_flight:
+            return False
+        return lane != BULK or self._in_flight[BULK] < self.bulk_limit
+
+    def _take(self, lane: str) -> None:
+        self._in_flight[lane] += 1
+        AI_IN_FLIGHT.inc(lane=lane)
+
+    def try_acquire(self, lane: str) -> bool:
+        """Take a slot if one is free, without waiting"""
+        if not self._has_room(lane):
+            return False
+        self._take(lane)
+        return True
+
+    async def release(self, lane: str) -> None:
+        self._in_flight[lane] -= 1
+        AI_IN_FLIGHT.dec(lane=lane)
+        async with self._released:
+            self._released.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, lane: str) -> AsyncIterator[None]:
+        """Hold a slot, waiting for one to free up (for background work)"""
+        async with self._released:
+            await self._released.wait_for(lambda: self._has_room(lane))
+            self._take(lane)
+        try:
+            yield
+        finally:
+            await self.release(lane)
+
+
+class AdmissionSlot:
+    """An in-flight slot held by one request, released exactly once"""
+
+    def __init__(self, admission: AdmissionController, lane: str):
+        self.admission = admission
+        self.lane = lane
+        self.streaming = False
+        self._released = False
+
+    async def release(self) -> None:
+        if not self._released:
+            self._released = True
+            await self.admission.release(self.lane)
+
+    def stream(self, response: StreamingResponse) -> StreamingResponse:
+        """
+        Hold the slot until the response's stream has been sent.
+
+        Depending on the FastAPI version, dependency cleanup runs before or
+        after a streamed body is sent, so the release is tied to the stream
+        itself: when it ends or fails, or after the response otherwise.
+        """
+        self.streaming = True
+        body = response.body_iterator
+
+        async def guarded() -> AsyncIterator:
+            try:
+                async with aclosing(body) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+            finally:
+                await self.release()
+
+        response.body_iterator = guarded()
+        # Also covers a stream that never started (client gone before the body)
+        response.background = BackgroundTask(self.release)
+        return response
+
+
+_limiter: Optional[RateLimiter] = None
+_admission: Optional[AdmissionController] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the configured per-user rate limiter"""
+    global _limiter
+    if _limiter is None:
+        if settings.AI_RATE_LIMIT_BACKEND == "firestore":
+            backend = FirestoreRateLimitBackend(
+                get_async_firestore_client(), settings.AI_RATE_LIMIT_FIRESTORE_COLLECTION
+            )
+        else:
+            backend = InMemoryRateLimitBackend()
+        _limiter = RateLimiter(backend, {
+            INTERACTIVE: (
+                settings.AI_RATE_LIMIT_INTERACTIVE_PER_MINUTE,
+                settings.AI_RATE_LIMIT_INTERACTIVE_BURST,
+            ),
+            BULK: (settings.AI_RATE_LIMIT_BULK_PER_MINUTE, settings.AI_RATE_LIMIT_BULK_BURST),
+        })
+    return _limiter
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get the instance-wide AI admission controller"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController(
+            settings.AI_ADMISSION_MAX_IN_FLIGHT, settings.AI_ADMISSION_BULK_SHARE
+        )
+    return _admission
+
+
+def rate_limit(lane: str, hold_slot: bool = True):
+    """
+    Dependency factory enforcing admission control for an AI endpoint.
+
+    Rejects with 429 when the user's bucket for the lane is empty and with
+    503 when the instance has no free slot, both with Retry-After. The
+    dependency yields the AdmissionSlot (None without hold_slot), which is
+    released once the endpoint returns; a streaming endpoint passes its
+    response through slot.stream() to hold it until the stream is sent.
+
+    Args:
+        lane: INTERACTIVE or BULK
+        hold_slot: Also take an in-flight slot; off for endpoints that only
+            enqueue work
+    """
+    async def dependency(
+        current_user: dict = Depends(get_current_user),
+    ) -> AsyncIterator[Optional[AdmissionSlot]]:
+        if settings.AI_RATE_LIMIT_ENABLED:
+            wait = await get_rate_limiter().check(current_user["uid"], lane)
+            if wait > 0:
+                AI_ADMISSION.inc(lane=lane, outcome="rate_limited")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Rate limit exceeded",
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+        if not hold_slot:
+            AI_ADMISSION.inc(lane=lane, outcome="admitted")
+            yield None
+            return
+
+        admission = get_admission_controller()
+        if not admission.try_acquire(lane):
+            AI_ADMISSION.inc(lane=lane, outcome="shed")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="AI capacity exhausted, retry later",
+                headers={"Retry-After": str(SHED_RETRY_AFTER_SECONDS)},
+            )
+        AI_ADMISSION.inc(lane=lane, outcome="admitted")
+        slot = AdmissionSlot(admission, lane)
+        try:
+            yield slot
+        finally:
+            if not slot.streaming:
+                await slot.release()
+
+    return dependency
@@ -0,0 +1,338 @@
+"""
+Remediation library: generic guidance pre-generated for every catalog
+control and cloud provider
+"""
+import asyncio
+import logging
+import re
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.ai_client import PROMPT_VERSIONS, AIClient, get_ai_client
+from app.core.ai_providers import REMEDIATION
+from app.core.catalog import Catalog, get_catalog
+from app.core.coalesce import SingleFlight
+from app.core.config import settings
+from app.core.metrics import REMEDIATION_LIBRARY
+from app.core.rate_limit import BULK, AdmissionController, get_admission_controller
+from app.repositories.remediations import (
+    EntryKey,
+    RemediationEntry,
+    RemediationStore,
+    get_remediation_store,
+)
+
+logger = logging.getLogger(__name__)
+
+# Current states that say no more than "not done yet": the library's
+# generic guidance answers them as well as a personalized generation would
+GENERIC_STATES = frozenset({
+    "",
+    "no",
+    "none",
+    "partial",
+    "partially",
+    "missing",
+    "unknown",
+    "in progress",
+    "not started",
+    "not implemented",
+    "partially implemented",
+    "not configured",
+    "not enabled",
+    "not compliant",
+    "non compliant",
+    "noncompliant",
+    "needs improvement",
+})
+
+MAX_STEPS = 15
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_NUMBERED = re.compile(r"^\s*(?:#+\s*)?(?:\*\*)?(?:step\s*)?(\d+)[.):]\s*(?:\*\*)?\s*(.+)$", re.I)
+
+
+def is_generic_state(current_state: str) -> bool:
+    """Whether a current state carries no details to personalize guidance with"""
+    return _NON_WORD.sub(" ", current_state.lower()).strip() in GENERIC_STATES
+
+
+def extract_steps(text: str) -> List[str]:
+    """
+    The first numbered list of a guidance text, as plain step sentences.
+
+    Stops where the numbering restarts, so a later list (commands,
+    verification) is not mixed in.
+    """
+    steps: List[str] = []
+    previous = 0
+    for line in text.splitlines():
+        match = _NUMBERED.match(line)
+        if match is None:
+            continue
+        number = int(match.group(1))
+        if number <= previous or len(steps) >= MAX_STEPS:
+            break
+        previous = number
+        steps.append(match.group(2).replace("**", "").strip())
+    return steps
+
+
+class RemediationLibrary:
+    """
+    Serves remediation guidance from pre-generated library entries.
+
+    A background fill (started with the app when the store is persistent
+    or REMEDIATION_LIBRARY_PREFILL is set) generates an entry for every
+    catalog control and cloud provider that is missing or was written with
+    another prompt or model version. Requests for a catalog control whose current state is
+    generic are answered from the library (an entry still missing is
+    generated on first use); requests describing a specific state, or
+    bypassing the cache, get a live, personalized generation.
+    """
+
+    def __init__(
+        self,
+        store: RemediationStore,
+        providers: Sequence[str] = ("gcp", "azure", "aws"),
+        concurrency: int = 2,
+        enabled: bool = True,
+        get_client: Callable[[], AIClient] = get_ai_client,
+        get_catalog: Callable[[], Catalog] = get_catalog,
+        get_admission: Callable[[], AdmissionController] = get_admission_controller,
+    ):
+        self.store = store
+        self.providers = [provider.lower() for provider in providers]
+        self.concurrency = concurrency
+        self.enabled = enabled
+        self.get_client = get_client
+        self.get_catalog = get_catalog
+        self.get_admission = get_admission
+        # Entries known to be current, so lookups do not touch the store
+        self._entries: Dict[EntryKey, RemediationEntry] = {}
+        # Concurrent requests for a missing entry share one generation
+        self._builds = SingleFlight("remediation_library")
+        self._task: Optional[asyncio.Task] = None
+
+    def version(self) -> str:
+        """Version of newly generated entries: prompt version and models"""
+        signature = self.get_client().router.signature(REMEDIATION)
+        return f"{PROMPT_VERSIONS['remediation_library']}:{signature}"
+
+    def resolve_control(self, control: str) -> Optional[Tuple[str, dict]]:
+        """(pillar ID, catalog control) for a control ID or name, or None"""
+        catalog = self.get_catalog()
+        wanted = control.strip().lower()
+        found = catalog.find_control(wanted)
+        if found is not None:
+            return found
+        for pillar_id, controls in catalog.controls_by_pillar.items():
+            for candidate in controls:
+                if candidate.get("name", "").lower() == wanted:
+                    return pillar_id, candidate
+        return None
+
+    def _current(self, entry: RemediationEntry, control: dict) -> bool:
+        return entry.version == self.version() and entry.control_name == control.get("name", "")
+
+    async def lookup(self, control_id: str, cloud_provider: str) -> Optional[RemediationEntry]:
+        """The current library entry for a catalog control, without generating one"""
+        found = self.get_catalog().find_control(control_id)
+        if found is None:
+            return None
+        key = (control_id, cloud_provider.strip().lower())
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = (await self.store.get_many([key])).get(key)
+        if entry is None or not self._current(entry, found[1]):
+            return None
+        self._entries[key] = entry
+        return entry
+
+    async def _build(self, pillar_id: str, control: dict, cloud_provider: str) -> RemediationEntry:
+        pillar = self.get_catalog().get_pillar(pillar_id)
+        remediation = await self.get_client().generate_library_remediation(
+            pillar=pillar["name"] if pillar else pillar_id,
+            control_id=control["id"],
+            control_name=control.get("name", ""),
+            cloud_provider=cloud_provider,
+        )
+        entry = RemediationEntry(
+            control_id=control["id"],
+            cloud_provider=cloud_provider,
+            control_name=control.get("name", ""),
+            version=self.version(),
+            remediation=remediation,
+            steps=extract_steps(remediation),
+        )
+        await self.store.put(entry)
+        self._entries[entry.key] = entry
+        return entry
+
+    async def _build_once(
+        self, pillar_id: str, control: dict, cloud_provider: str
+    ) -> RemediationEntry:
+        return await self._builds.do(
+            cloud_provider,
+            (control["id"], self.version()),
+            lambda: self._build(pillar_id, control, cloud_provider),
+        )
+
+    async def _library_entry(
+        self, control: str, current_state: str, cloud_provider: str, use_cache: bool
+    ) -> Optional[RemediationEntry]:
+        """The library entry answering a request, or None for a personalized generation"""
+        provider = cloud_provider.strip().lower()
+        if (
+            self.enabled
+            and use_cache
+            and provider in self.providers
+            and is_generic_state(current_state)
+        ):
+            found = self.resolve_control(control)
+            if found is not None:
+                entry = await self.lookup(found[1]["id"], provider)
+                if entry is not None:
+                    REMEDIATION_LIBRARY.inc(outcome="library")
+                    return entry
+                REMEDIATION_LIBRARY.inc(outcome="built")
+                return await self._build_once(*found, provider)
+        REMEDIATION_LIBRARY.inc(outcome="personalized")
+        return None
+
+    async def remediate(
+        self,
+        control: str,
+        current_state: str,
+        cloud_provider: str = "gcp",
+        use_cache: bool = True,
+    ) -> dict:
+        """
+        Remediation guidance for a control, from the library when possible.
+
+        Returns:
+            dict with the control, cloud provider, guidance text and its
+            source ("library" or "generated"); library answers also list
+            the steps
+        """
+        entry = await self._library_entry(control, current_state, cloud_provider, use_cache)
+        if entry is not None:
+            return {
+                "control": control,
+                "cloud_provider": cloud_provider,
+                "remediation": entry.remediation,
+                "steps": entry.steps,
+                "source": "library",
+            }
+        result = await self.get_client().generate_remediation_steps(
+            control=control,
+            current_state=current_state,
+            cloud_provider=cloud_provider,
+            use_cache=use_cache,
+        )
+        return {**result, "source": "generated"}
+
+    async def stream(
+        self,
+        control: str,
+        current_state: str,
+        cloud_provider: str = "gcp",
+        use_cache: bool = True,
+    ) -> AsyncIterator[str]:
+        """Stream remediation guidance; a library answer is sent as one chunk"""
+        entry = await self._library_entry(control, current_state, cloud_provider, use_cache)
+        if entry is not None:
+            yield entry.remediation
+            return
+        chunks = self.get_client().stream_remediation_steps(
+            control=control,
+            current_state=current_state,
+            cloud_provider=cloud_provider,
+            use_cache=use_cache,
+        )
+        async with aclosing(chunks) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    async def fill(self) -> int:
+        """
+        Generate every missing or outdated library entry.
+
+        Runs in the bulk admission lane, so it yields to interactive AI
+        requests. The fill stops at the first failure (e.g. the model is
+        unavailable); entries still missing are generated on first use.
+
+        Returns:
+            The number of entries generated
+        """
+        catalog = self.get_catalog()
+        targets = [
+            (pillar_id, control, provider)
+            for pillar_id, controls in catalog.controls_by_pillar.items()
+            for control in controls
+            for provider in self.providers
+        ]
+        stored = await self.store.get_many([(c["id"], p) for _, c, p in targets])
+        missing = []
+        for pillar_id, control, provider in targets:
+            entry = stored.get((control["id"], provider))
+            if entry is not None and self._current(entry, control):
+                self._entries[entry.key] = entry
+            else:
+                missing.append((pillar_id, control, provider))
+
+        generated = 0
+
+        async def work() -> None:
+            nonlocal generated
+            while missing:
+                pillar_id, control, provider = missing.pop(0)
+                async with self.get_admission().slot(BULK):
+                    await self._build_once(pillar_id, control, provider)
+                generated += 1
+
+        workers = [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        except Exception as e:
+            logger.warning(
+                "Remediation library fill stopped after %d entries: %s", generated, e
+            )
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return generated
+
+    async def start(self) -> None:
+        """Fill the library in the background"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.fill())
+
+    async def join(self) -> None:
+        """Wait for the background fill to finish"""
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def stop(self) -> None:
+        """Cancel the background fill; the next start resumes where it stopped"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+_library: Optional[RemediationLibrary] = None
+
+
+def get_remediation_library() -> RemediationLibrary:
+    """Get the shared remediation library (FastAPI dependency)"""
+    global _library
+    if _library is None:
+        _library = RemediationLibrary(
+            get_remediation_store(),
+            providers=settings.REMEDIATION_LIBRARY_PROVIDERS,
+            concurrency=settings.REMEDIATION_LIBRARY_CONCURRENCY,
+            enabled=settings.REMEDIATION_LIBRARY_ENABLED,
+        )
+    return _library
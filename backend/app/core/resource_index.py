@@ -0,0 +1,424 @@
+"""
+Columnar, dictionary-encoded index of an assessment's cloud resources
+"""
+from json.encoder import encode_basestring_ascii
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# (external ID, name, type, region, tags) of one resource to index
+ResourceRow = Tuple[str, str, str, str, Dict[str, str]]
+
+
+class Vocabulary:
+    """
+    Dictionary encoding of strings to dense integer codes.
+
+    With casefold, values differing only in case share a code, which keeps
+    the spelling first seen.
+    """
+
+    def __init__(self, casefold: bool = False):
+        self.casefold = casefold
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _key(self, value: str) -> str:
+        return value.casefold() if self.casefold else value
+
+    def encode(self, value: str) -> int:
+        key = self._key(value)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> Optional[int]:
+        """The code of a value, or None if it was never encoded"""
+        return self._codes.get(self._key(value))
+
+
+class GrowableArray:
+    """A NumPy array appended to in batches, with amortized doubling"""
+
+    def __init__(self, dtype, capacity: int = 1024):
+        self._array = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values) -> None:
+        values = np.asarray(values, dtype=self._array.dtype)
+        end = self.size + len(values)
+        if end > len(self._array):
+            grown = np.empty(max(end, 2 * len(self._array)), dtype=self._array.dtype)
+            grown[:self.size] = self._array[:self.size]
+            self._array = grown
+        self._array[self.size:end] = values
+        self.size = end
+
+    def view(self) -> np.ndarray:
+        """The filled part (shares memory until the next extend)"""
+        return self._array[:self.size]
+
+    def replace(self, values: np.ndarray) -> None:
+        self._array = np.array(values, dtype=self._array.dtype)
+        self.size = len(values)
+
+    @property
+    def nbytes(self) -> int:
+        return self._array.nbytes
+
+
+class StringColumn:
+    """Strings packed into one UTF-8 buffer with end offsets, not one object each"""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._ends = GrowableArray(np.int64)
+
+    def extend(self, values: Sequence[str]) -> None:
+        encoded = [value.encode("utf-8") for value in values]
+        start = len(self._data)
+        self._data += b"".join(encoded)
+        self._ends.extend(start + np.cumsum([len(item) for item in encoded], dtype=np.int64))
+
+    def get_many(self, rows: np.ndarray) -> List[str]:
+        """The strings of the given rows"""
+        ends = self._ends.view()
+        starts = np.where(rows > 0, ends[rows - 1], 0).tolist()
+        data = self._data
+        return [
+            data[start:end].decode("utf-8") for start, end in zip(starts, ends[rows].tolist())
+        ]
+
+    def take(self, rows: np.ndarray) -> "StringColumn":
+        """A new column with only the given rows"""
+        column = StringColumn()
+        if len(rows):
+            column.extend(self.get_many(rows))
+        return column
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data) + self._ends.nbytes
+
+
+class ResourceIndex:
+    """
+    The resources of one assessment, stored column by column.
+
+    Type and region are dictionary-encoded into int32 columns. Tags are
+    stored as (row, key=value code) pairs sorted by row, so a tag filter is
+    one vectorized membership test and a row's tags are a slice. External
+    IDs and names are packed strings. No Python object is kept per
+    resource: filters and facet counts are NumPy operations on the columns.
+
+    Indexing a resource whose external ID is already indexed replaces it.
+    Replaced rows are masked out, and compacted away once they make up
+    half of the index. Each row carries an increasing sequence number, the
+    cursor of paginated listings (stable across compaction).
+    """
+
+    def __init__(self):
+        self.types = Vocabulary(casefold=True)
+        self.regions = Vocabulary(casefold=True)
+        self.tag_keys = Vocabulary(casefold=True)
+        # (key, value) pairs: tag keys are case-insensitive, values are not
+        self.tag_pairs = Vocabulary()
+        self._pair_keys = GrowableArray(np.int32)
+        self._pair_values: List[str] = []
+
+        self._external_ids = StringColumn()
+        self._names = StringColumn()
+        self._type_codes = GrowableArray(np.int32)
+        self._region_codes = GrowableArray(np.int32)
+        self._seqs = GrowableArray(np.int64)
+        self._live = GrowableArray(np.bool_)
+        self._tag_rows = GrowableArray(np.int32)
+        self._tag_codes = GrowableArray(np.int32)
+
+        # External ID -> row of its live version
+        self._rows: Dict[str, int] = {}
+        self._next_seq = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns"""
+        arrays = (
+            self._type_codes, self._region_codes, self._seqs, self._live,
+            self._tag_rows, self._tag_codes, self._pair_keys,
+        )
+        return (
+            sum(array.nbytes for array in arrays)
+            + self._external_ids.nbytes
+            + self._names.nbytes
+        )
+
+    def _pair_code(self, key: str, value: str) -> int:
+        key_code = self.tag_keys.encode(key)
+        code = self.tag_pairs.encode(f"{key.casefold()}\0{value}")
+        if code == self._pair_keys.size:
+            self._pair_keys.extend([key_code])
+            self._pair_values.append(value)
+        return code
+
+    def count_new(self, resources: Sequence[ResourceRow]) -> int:
+        """How many resources adding the batch would add (not replace)"""
+        return len({external_id for external_id, *_ in resources if external_id not in self._rows})
+
+    def add(self, resources: Sequence[ResourceRow]) -> int:
+        """
+        Index a batch of resources.
+
+        Returns:
+            The number of resources that replaced an indexed one
+        """
+        first_row = self._seqs.size
+        live = self._live.view()
+        batch_live = [True] * len(resources)
+        external_ids, names, type_codes, region_codes = [], [], [], []
+        tag_rows, tag_codes = [], []
+        replaced = 0
+        for offset, (external_id, name, type_, region, tags) in enumerate(resources):
+            row = first_row + offset
+            previous = self._rows.get(external_id)
+            if previous is not None:
+                if previous >= first_row:
+                    batch_live[previous - first_row] = False
+                else:
+                    live[previous] = False
+                replaced += 1
+            self._rows[external_id] = row
+            external_ids.append(external_id)
+            names.append(name)
+            type_codes.append(self.types.encode(type_))
+            region_codes.append(self.regions.encode(region))
+            for key, value in tags.items():
+                tag_rows.append(row)
+                tag_codes.append(self._pair_code(key, value))
+
+        self._external_ids.extend(external_ids)
+        self._names.extend(names)
+        self._type_codes.extend(type_codes)
+        self._region_codes.extend(region_codes)
+        self._seqs.extend(np.arange(self._next_seq, self._next_seq + len(resources)))
+        self._next_seq += len(resources)
+        self._live.extend(batch_live)
+        self._tag_rows.extend(tag_rows)
+        self._tag_codes.extend(tag_codes)
+        if self._seqs.size - len(self._rows) > max(len(self._rows), 1024):
+            self._compact()
+        return replaced
+
+    def _compact(self) -> None:
+        """Drop replaced rows and renumber the rest"""
+        live = self._live.view()
+        kept = np.flatnonzero(live)
+        renumbered = np.cumsum(live, dtype=np.int64) - 1
+        tag_rows = self._tag_rows.view()
+        tag_kept = live[tag_rows]
+        self._tag_codes.replace(self._tag_codes.view()[tag_kept])
+        self._tag_rows.replace(renumbered[tag_rows[tag_kept]])
+        for column in (self._type_codes, self._region_codes, self._seqs):
+            column.replace(column.view()[kept])
+        self._live.replace(np.ones(len(kept), dtype=np.bool_))
+        self._external_ids = self._external_ids.take(kept)
+        self._names = self._names.take(kept)
+        self._rows = {external_id: int(renumbered[row]) for external_id, row in self._rows.items()}
+
+    def _codes(self, vocabulary: Vocabulary, values: Sequence[str]) -> np.ndarray:
+        codes = [vocabulary.lookup(value) for value in values]
+        return np.array([code for code in codes if code is not None], dtype=np.int32)
+
+    def _tag_pair_codes(self, value: str) -> np.ndarray:
+        """Pair codes matching a "key" or "key=value" tag filter"""
+        key, separator, tag_value = value.partition("=")
+        key_code = self.tag_keys.lookup(key)
+        if key_code is None:
+            return np.empty(0, dtype=np.int32)
+        if separator:
+            code = self.tag_pairs.lookup(f"{key.casefold()}\0{tag_value}")
+            return np.array([] if code is None else [code], dtype=np.int32)
+        return np.flatnonzero(self._pair_keys.view() == key_code).astype(np.int32)
+
+    def _rows_with_tags(self, pair_codes: np.ndarray) -> np.ndarray:
+        """Mask of rows having any of the tag pairs"""
+        mask = np.zeros(self._seqs.size, dtype=np.bool_)
+        mask[self._tag_rows.view()[np.isin(self._tag_codes.view(), pair_codes)]] = True
+        return mask
+
+    def _filter_masks(
+        self, types: Sequence[str], regions: Sequence[str], tags: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        """
+        A row mask per filtered facet. Several values of a facet match any
+        of them; several tag filters must all match.
+        """
+        masks = {}
+        if types:
+            masks["type"] = np.isin(self._type_codes.view(), self._codes(self.types, types))
+        if regions:
+            masks["region"] = np.isin(
+                self._region_codes.view(), self._codes(self.regions, regions)
+            )
+        if tags:
+            mask = np.ones(self._seqs.size, dtype=np.bool_)
+            for tag in tags:
+                mask &= self._rows_with_tags(self._tag_pair_codes(tag))
+            masks["tag"] = mask
+        return masks
+
+    def _match(self, masks: Dict[str, np.ndarray], exclude: Optional[str] = None) -> np.ndarray:
+        mask = self._live.view().copy()
+        for facet, facet_mask in masks.items():
+            if facet != exclude:
+                mask &= facet_mask
+        return mask
+
+    def count(
+        self, types: Sequence[str] = (), regions: Sequence[str] = (), tags: Sequence[str] = ()
+    ) -> int:
+        """The number of resources matching the filters"""
+        return int(np.count_nonzero(self._match(self._filter_masks(types, regions, tags))))
+
+    def facets(
+        self,
+        types: Sequence[str] = (),
+        regions: Sequence[str] = (),
+        tags: Sequence[str] = (),
+        top: int = 20,
+    ) -> dict:
+        """
+        Resource counts per type, region, tag key and tag, among matches.
+
+        Each facet is counted without its own filter, so a client can show
+        how many resources the other values of a filtered facet would add.
+
+        Returns:
+            dict with the match count and, per facet, up to top
+            {"value", "count"} entries, largest first
+        """
+        masks = self._filter_masks(types, regions, tags)
+
+        def ranked(counts: np.ndarray, values: List[str]) -> List[dict]:
+            order = np.argsort(-counts, kind="stable")[:top]
+            # Resources without a region are counted under ""; not a value to filter by
+            return [
+                {"value": values[code], "count": int(counts[code])}
+                for code in order
+                if counts[code] and values[code]
+            ]
+
+        type_counts = np.bincount(
+            self._type_codes.view()[self._match(masks, "type")], minlength=len(self.types)
+        )
+        region_counts = np.bincount(
+            self._region_codes.view()[self._match(masks, "region")], minlength=len(self.regions)
+        )
+        tagged = self._tag_codes.view()[self._match(masks, "tag")[self._tag_rows.view()]]
+        tag_counts = np.bincount(tagged, minlength=len(self.tag_pairs))
+        key_counts = np.bincount(
+            self._pair_keys.view()[tagged], minlength=len(self.tag_keys)
+        )
+        return {
+            "total": len(self),
+            "matched": int(np.count_nonzero(self._match(masks))),
+            "facets": {
+                "type": ranked(type_counts, self.types.values),
+                "region": ranked(region_counts, self.regions.values),
+                "tag_key": ranked(key_counts, self.tag_keys.values),
+                "tag": ranked(tag_counts, self._pair_labels()),
+            },
+        }
+
+    def _pair_labels(self) -> List[str]:
+        keys = self.tag_keys.values
+        pair_keys = self._pair_keys.view()
+        return [f"{keys[pair_keys[code]]}={value}" for code, value in enumerate(self._pair_values)]
+
+    def page(
+        self,
+        types: Sequence[str] = (),
+        regions: Sequence[str] = (),
+        tags: Sequence[str] = (),
+        after: Optional[int] = None,
+        limit: int = 1000,
+    ) -> Tuple[np.ndarray, Optional[int]]:
+        """
+        Rows of one page of matching resources, in the order indexed.
+
+        Args:
+            after: Sequence number of the last resource of the previous page
+            limit: Maximum number of rows
+
+        Returns:
+            (rows, sequence number to pass as after for the next page, or
+            None on the last page)
+        """
+        seqs = self._seqs.view()
+        start = 0 if after is None else int(np.searchsorted(seqs, after, side="right"))
+        mask = self._match(self._filter_masks(types, regions, tags))
+        matches = np.flatnonzero(mask[start:])
+        rows = matches[:limit] + start
+        next_after = int(seqs[rows[-1]]) if len(matches) > limit else None
+        return rows, next_after
+
+    def ndjson(self, rows: np.ndarray, chunk_rows: int = 500) -> Iterator[str]:
+        """
+        Serialize rows as NDJSON lines, a chunk of lines at a time.
+
+        Lines are formatted from the columns directly, with each type,
+        region and tag JSON-encoded once. The columns are captured when this
+        is called, so resources indexed while the chunks are consumed do not
+        shift the rows; call it right after page().
+        """
+        tag_rows = self._tag_rows.view()
+        tag_starts = np.searchsorted(tag_rows, rows, side="left")
+        tag_ends = np.searchsorted(tag_rows, rows, side="right")
+        tag_codes = self._tag_codes.view()
+        type_codes = self._type_codes.view()
+        region_codes = self._region_codes.view()
+        types = [encode_basestring_ascii(value) for value in self.types.values]
+        regions = [
+            encode_basestring_ascii(value) if value else "null" for value in self.regions.values
+        ]
+        keys = [encode_basestring_ascii(value) for value in self.tag_keys.values]
+        pair_keys = self._pair_keys.view().tolist()
+        tags = [
+            f"{keys[key]}:{encode_basestring_ascii(value)}"
+            for key, value in zip(pair_keys, self._pair_values)
+        ]
+        external_ids = self._external_ids
+        names = self._names
+
+        def chunks() -> Iterator[str]:
+            for start in range(0, len(rows), chunk_rows):
+                chunk = rows[start:start + chunk_rows]
+                # Rows are ascending, so their tags are one slice
+                first = int(tag_starts[start])
+                codes = tag_codes[first:int(tag_ends[start + len(chunk) - 1])].tolist()
+                lines = []
+                for external_id, name, type_code, region_code, tag_start, tag_end in zip(
+                    external_ids.get_many(chunk),
+                    names.get_many(chunk),
+                    type_codes[chunk].tolist(),
+                    region_codes[chunk].tolist(),
+                    (tag_starts[start:start + len(chunk)] - first).tolist(),
+                    (tag_ends[start:start + len(chunk)] - first).tolist(),
+                ):
+                    row_tags = ",".join([tags[code] for code in codes[tag_start:tag_end]])
+                    lines.append(
+                        f'{{"externalId":{encode_basestring_ascii(external_id)},'
+                        f'"name":{encode_basestring_ascii(name)},'
+                        f'"type":{types[type_code]},"region":{regions[region_code]},'
+                        f'"tags":{{{row_tags}}}}}\n'
+                    )
+                yield "".join(lines)
+
+        return chunks()
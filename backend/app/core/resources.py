@@ -0,0 +1,277 @@
+"""
+Resource inventory: per-assessment columnar indexes of cloud resources,
+filled from NDJSON uploads
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Union
+
+from app.core.config import settings
+from app.core.metrics import RESOURCES_INGESTED
+
+if TYPE_CHECKING:
+    from app.core.resource_index import ResourceIndex, ResourceRow
+
+# Rejected lines reported back in detail; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+class LineTooLong:
+    """Stands in for an NDJSON line longer than the maximum, which is dropped"""
+
+    def __init__(self, size: int):
+        self.size = size
+
+
+class InvalidResourceError(Exception):
+    """Raised when an NDJSON line is not a valid resource"""
+
+
+class ResourceLimitError(Exception):
+    """Raised when an assessment would hold more resources than allowed"""
+
+
+def parse_tags(tags) -> Dict[str, str]:
+    """
+    Tags as a dict of strings.
+
+    Accepts an object, a list of "key=value" strings, or either of them
+    JSON-encoded in a string (the Data Connect Resource.tags column).
+    Keys are case-insensitive: the first spelling of a key wins.
+    """
+    if tags is None or tags == "":
+        return {}
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            raise InvalidResourceError("tags is not a JSON object or list")
+    if isinstance(tags, list):
+        pairs = []
+        for tag in tags:
+            if not isinstance(tag, str):
+                raise InvalidResourceError("tags entries must be \"key=value\" strings")
+            key, _, value = tag.partition("=")
+            pairs.append((key, value))
+    elif isinstance(tags, dict):
+        pairs = tags.items()
+    else:
+        raise InvalidResourceError("tags must be an object or a list")
+
+    parsed: Dict[str, str] = {}
+    seen = set()
+    for key, value in pairs:
+        key = str(key).strip()
+        if not key or "=" in key:
+            raise InvalidResourceError(f"Invalid tag key: {key!r}")
+        if key.casefold() not in seen:
+            seen.add(key.casefold())
+            parsed[key] = "" if value is None else str(value)
+    return parsed
+
+
+def parse_resource(line: bytes) -> "ResourceRow":
+    """
+    Parse one NDJSON line into a resource row.
+
+    Each line is an object with externalId and type, and optionally name
+    (defaults to externalId), region and tags.
+    """
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        raise InvalidResourceError(f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise InvalidResourceError("Expected a JSON object")
+    external_id = data.get("externalId")
+    type_ = data.get("type")
+    if not isinstance(external_id, str) or not external_id:
+        raise InvalidResourceError("externalId is required")
+    if not isinstance(type_, str) or not type_:
+        raise InvalidResourceError("type is required")
+    name = data.get("name") or external_id
+    region = data.get("region") or ""
+    if not isinstance(name, str) or not isinstance(region, str):
+        raise InvalidResourceError("name and region must be strings")
+    return external_id, name, type_, region, parse_tags(data.get("tags"))
+
+
+async def ndjson_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: int = 256 * 1024
+) -> AsyncIterator[Union[bytes, LineTooLong]]:
+    """
+    Split a byte stream into lines.
+
+    Only the unterminated tail of the stream is buffered, up to
+    max_line_bytes; a longer line is skipped and yielded as a LineTooLong.
+    """
+    pending = bytearray()
+    # Size of the current line once it is too long to buffer
+    oversized = 0
+    async for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            part = chunk[start:] if end < 0 else chunk[start:end]
+            if oversized:
+                oversized += len(part)
+            elif len(pending) + len(part) > max_line_bytes:
+                oversized = len(pending) + len(part)
+                pending.clear()
+            else:
+                pending += part
+            if end < 0:
+                break
+            yield LineTooLong(oversized) if oversized else bytes(pending)
+            pending.clear()
+            oversized = 0
+            start = end + 1
+    if oversized:
+        yield LineTooLong(oversized)
+    elif pending:
+        yield bytes(pending)
+
+
+class ResourceInventory:
+    """
+    Columnar resource indexes, one per assessment, held in memory.
+
+    Indexes are kept for the assessments used most recently while they
+    hold at most max_resources resources in total; an evicted or restarted
+    instance's inventory is rebuilt by uploading it again.
+    """
+
+    def __init__(
+        self,
+        max_resources: int = 2_000_000,
+        max_resources_per_assessment: int = 500_000,
+        batch_size: int = 5000,
+        max_line_bytes: int = 256 * 1024,
+    ):
+        self.max_resources = max_resources
+        self.max_resources_per_assessment = max_resources_per_assessment
+        self.batch_size = batch_size
+        self.max_line_bytes = max_line_bytes
+        self._indexes: "OrderedDict[str, ResourceIndex]" = OrderedDict()
+
+    def get(self, assessment_id: str) -> Optional["ResourceIndex"]:
+        """The assessment's index, or None if nothing was uploaded"""
+        index = self._indexes.get(assessment_id)
+        if index is not None:
+            self._indexes.move_to_end(assessment_id)
+        return index
+
+    def delete(self, assessment_id: str) -> bool:
+        """Drop the assessment's index; returns whether there was one"""
+        return self._indexes.pop(assessment_id, None) is not None
+
+    def _evict(self) -> None:
+        total = sum(len(index) for index in self._indexes.values())
+        while total > self.max_resources and len(self._indexes) > 1:
+            _, evicted = self._indexes.popitem(last=False)
+            total -= len(evicted)
+
+    async def ingest(
+        self, assessment_id: str, chunks: AsyncIterator[bytes], replace: bool = False
+    ) -> dict:
+        """
+        Index resources from an NDJSON byte stream, in batches.
+
+        Invalid or overlong lines are rejected and reported without failing
+        the upload. With replace the uploaded resources replace the whole
+        inventory, which is swapped in once the upload completes; otherwise
+        they are added to it (replacing resources with the same externalId)
+        as each batch is parsed, and batches indexed before a failure stay.
+
+        Returns:
+            dict with the counts of indexed, replaced and rejected
+            resources, the first errors, the index size and the throughput
+
+        Raises:
+            ResourceLimitError: If the assessment would exceed
+                max_resources_per_assessment resources; the batch that
+                would exceed it is not indexed
+        """
+        from app.core.resource_index import ResourceIndex
+
+        started = time.perf_counter()
+        index = ResourceIndex() if replace else self.get(assessment_id)
+        if index is None:
+            index = ResourceIndex()
+        if not replace:
+            self._indexes[assessment_id] = index
+
+        indexed = replaced = rejected = 0
+        errors: List[dict] = []
+        batch: List["ResourceRow"] = []
+
+        def reject(line_number: int, detail: str) -> None:
+            nonlocal rejected
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line_number, "detail": detail})
+
+        def flush() -> None:
+            nonlocal replaced
+            if len(index) + index.count_new(batch) > self.max_resources_per_assessment:
+                raise ResourceLimitError(
+                    f"An assessment can hold at most {self.max_resources_per_assessment} resources"
+                )
+            replaced += index.add(batch)
+            batch.clear()
+
+        try:
+            line_number = 0
+            async for line in ndjson_lines(chunks, self.max_line_bytes):
+                line_number += 1
+                if isinstance(line, LineTooLong):
+                    reject(line_number, f"Line exceeds {self.max_line_bytes} bytes")
+                    continue
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(parse_resource(line))
+                except InvalidResourceError as e:
+                    reject(line_number, str(e))
+                    continue
+                indexed += 1
+                if len(batch) >= self.batch_size:
+                    flush()
+            if batch:
+                flush()
+            if replace:
+                self._indexes[assessment_id] = index
+                self._indexes.move_to_end(assessment_id)
+        finally:
+            self._evict()
+        elapsed = time.perf_counter() - started
+        RESOURCES_INGESTED.inc(indexed, outcome="indexed")
+        RESOURCES_INGESTED.inc(rejected, outcome="rejected")
+        return {
+            "assessment_id": assessment_id,
+            "indexed": indexed,
+            "replaced": replaced,
+            "rejected": rejected,
+            "errors": errors,
+            "resources": len(index),
+            "index_bytes": index.nbytes,
+            "duration_seconds": round(elapsed, 3),
+            "resources_per_second": round(indexed / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+_inventory: Optional[ResourceInventory] = None
+
+
+def get_resource_inventory() -> ResourceInventory:
+    """Get the shared resource inventory (FastAPI dependency)"""
+    global _inventory
+    if _inventory is None:
+        _inventory = ResourceInventory(
+            max_resources=settings.RESOURCE_INVENTORY_MAX_RESOURCES,
+            max_resources_per_assessment=settings.RESOURCE_INVENTORY_MAX_PER_ASSESSMENT,
+            batch_size=settings.RESOURCE_INGEST_BATCH_SIZE,
+            max_line_bytes=settings.RESOURCE_INGEST_MAX_LINE_BYTES,
+        )
+    return _inventory
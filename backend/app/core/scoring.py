@@ -0,0 +1,207 @@
+"""
+Deterministic, vectorized scoring of assessment responses
+"""
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+# Credit for each answer; not_applicable answers are excluded from scoring
+RESPONSE_VALUES = {
+    "yes": 1.0,
+    "partial": 0.5,
+    "no": 0.0,
+    "not_applicable": math.nan,
+}
+# Pillar of controls outside the catalog in assessments without a pillar
+UNKNOWN_PILLAR = "unknown"
+# Distinct controls outside the catalog scored in one call
+MAX_UNKNOWN_CONTROLS = 1000
+
+
+class TooManyControlsError(ValueError):
+    """Raised when responses use more controls outside the catalog than allowed"""
+
+
+def _key(value) -> Optional[str]:
+    """A client-supplied ID as a string key, or None if it is not a scalar"""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    return str(value)
+
+
+class AssessmentScore(BaseModel):
+    """Scores (0-100) for one assessment"""
+    overall: Optional[float] = None
+    pillars: Dict[str, float] = {}
+    controls: Dict[str, float] = {}
+
+    def to_document(self) -> dict:
+        """Fields stored on the assessment document"""
+        return {
+            "score": None if self.overall is None else int(round(self.overall)),
+            "pillarScores": self.pillars,
+            "controlScores": self.controls,
+        }
+
+
+class ScoringEngine:
+    """
+    Turns response arrays into per-control, per-pillar and overall scores.
+
+    Each response is a dict with a "control_id" (or "controlId") and a
+    "response" of yes/no/partial/not_applicable. A control scores the mean
+    credit of its applicable answers; pillar and overall scores are the
+    weight-averaged scores of the controls that have applicable answers.
+    Controls missing from the catalog get weight 1.0 under the assessment's
+    pillar. IDs are compared as strings; responses whose control ID is not
+    a string or number are skipped.
+    """
+
+    def __init__(
+        self,
+        controls_by_pillar: Dict[str, List[dict]],
+        max_unknown_controls: int = MAX_UNKNOWN_CONTROLS,
+    ):
+        self.max_unknown_controls = max_unknown_controls
+        self.control_ids: List[str] = []
+        self.pillar_ids: List[str] = list(controls_by_pillar)
+        control_pillars = []
+        weights = []
+        for pillar_index, pillar_id in enumerate(self.pillar_ids):
+            for control in controls_by_pillar[pillar_id]:
+                self.control_ids.append(control["id"])
+                control_pillars.append(pillar_index)
+                weights.append(float(control.get("weight", 1.0)))
+        self._control_index = {control_id: i for i, control_id in enumerate(self.control_ids)}
+        self._pillar_index = {pillar_id: i for i, pillar_id in enumerate(self.pillar_ids)}
+        self._control_pillars = control_pillars
+        self._weights = weights
+
+    def score(self, pillar_id: str, responses: Sequence[dict]) -> AssessmentScore:
+        """Score a single assessment"""
+        return self.score_many([pillar_id], [responses])[0]
+
+    def score_many(
+        self,
+        pillar_ids: Sequence[str],
+        responses_list: Sequence[Sequence[dict]],
+    ) -> List[AssessmentScore]:
+        """
+        Score many assessments in one vectorized pass.
+
+        Args:
+            pillar_ids: Pillar of each assessment
+            responses_list: Response array of each assessment
+
+        Returns:
+            One AssessmentScore per assessment, in input order
+
+        Raises:
+            TooManyControlsError: If more than max_unknown_controls distinct
+                (pillar, control) pairs outside the catalog are used
+        """
+        # Imported here to keep numpy off the startup path
+        import numpy as np
+
+        pillar_index = dict(self._pillar_index)
+        pillar_names = list(self.pillar_ids)
+        control_ids = list(self.control_ids)
+        control_pillars = list(self._control_pillars)
+        weights = list(self._weights)
+        # Controls outside the catalog, keyed by (assessment pillar, control ID)
+        # so each assessment scores them under its own pillar
+        unknown: Dict[Tuple[str, str], int] = {}
+
+        # Flatten every (assessment, control, value) triple
+        assessment_idx: List[int] = []
+        control_idx: List[int] = []
+        values: List[float] = []
+        for a, (pillar_id, responses) in enumerate(zip(pillar_ids, responses_list)):
+            pillar_id = _key(pillar_id) or UNKNOWN_PILLAR
+            for response in responses or ():
+                if not isinstance(response, dict):
+                    continue
+                control_id = _key(response.get("control_id") or response.get("controlId"))
+                value = RESPONSE_VALUES.get(str(response.get("response", "")).strip().lower())
+                if control_id is None or value is None:
+                    continue
+                c = self._control_index.get(control_id)
+                if c is None:
+                    c = unknown.get((pillar_id, control_id))
+                if c is None:
+                    if len(unknown) >= self.max_unknown_controls:
+                        raise TooManyControlsError(
+                            f"At most {self.max_unknown_controls} controls outside the "
+                            "catalog can be scored at once"
+                        )
+                    if pillar_id not in pillar_index:
+                        pillar_index[pillar_id] = len(pillar_names)
+                        pillar_names.append(pillar_id)
+                    c = unknown[pillar_id, control_id] = len(control_ids)
+                    control_ids.append(control_id)
+                    control_pillars.append(pillar_index[pillar_id])
+                    weights.append(1.0)
+                assessment_idx.append(a)
+                control_idx.append(c)
+                values.append(value)
+
+        n_assessments = len(responses_list)
+        n_controls = len(control_ids)
+        n_pillars = len(pillar_names)
+        a_arr = np.array(assessment_idx, dtype=np.int64)
+        c_arr = np.array(control_idx, dtype=np.int64)
+        v_arr = np.array(values, dtype=np.float64)
+        applicable = ~np.isnan(v_arr)
+
+        # Mean credit per answered (assessment, control) pair; only pairs
+        # that occur are aggregated, so memory grows with the responses
+        pairs, pair_of = np.unique(
+            a_arr[applicable] * n_controls + c_arr[applicable], return_inverse=True
+        )
+        sums = np.bincount(pair_of, weights=v_arr[applicable], minlength=len(pairs))
+        counts = np.bincount(pair_of, minlength=len(pairs))
+        pair_scores = sums / np.maximum(counts, 1)
+        pair_assessments = pairs // n_controls if n_controls else pairs
+        pair_controls = pairs % n_controls if n_controls else pairs
+        pair_weights = np.array(weights, dtype=np.float64)[pair_controls]
+        pair_pillars = np.array(control_pillars, dtype=np.int64)[pair_controls]
+        weighted = pair_scores * pair_weights
+
+        # Weight-average answered controls into pillars and overall
+        pillar_keys, pillar_of = np.unique(
+            pair_assessments * n_pillars + pair_pillars, return_inverse=True
+        )
+        pillar_weight = np.bincount(pillar_of, weights=pair_weights, minlength=len(pillar_keys))
+        pillar_sum = np.bincount(pillar_of, weights=weighted, minlength=len(pillar_keys))
+        total_weight = np.bincount(pair_assessments, weights=pair_weights, minlength=n_assessments)
+        total_sum = np.bincount(pair_assessments, weights=weighted, minlength=n_assessments)
+
+        results = [AssessmentScore() for _ in range(n_assessments)]
+        for a, c, score in zip(
+            pair_assessments.tolist(), pair_controls.tolist(), pair_scores.tolist()
+        ):
+            results[a].controls[control_ids[c]] = round(score * 100, 2)
+        for key, weight, total in zip(
+            pillar_keys.tolist(), pillar_weight.tolist(), pillar_sum.tolist()
+        ):
+            if weight > 0:
+                a, p = divmod(key, n_pillars)
+                results[a].pillars[pillar_names[p]] = round(total / weight * 100, 2)
+        for a in range(n_assessments):
+            if total_weight[a] > 0:
+                results[a].overall = round(float(total_sum[a] / total_weight[a]) * 100, 2)
+        return results
+
+
+_engine = None
+
+
+def get_scoring_engine() -> ScoringEngine:
+    """Get the scoring engine built from the WAF control catalog"""
+    global _engine
+    if _engine is None:
+        from app.core.catalog import get_catalog
+
+        _engine = ScoringEngine(get_catalog().controls_by_pillar)
+    return _engine
@@ -1,40 +1,150 @@
 """
 Firebase Admin SDK initialization and authentication utilities
 """
-import firebase_admin
-from firebase_admin import auth, credentials, firestore
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from app.core.coalesce import SingleFlight
 from app.core.config import settings
+from app.core.metrics import AUTH_LATENCY, record_phase
+from app.core.token_verifier import (
+    CertificateStore,
+    FirebaseTokenVerifier,
+    TokenExpiredError,
+    TokenRevokedError,
+    TokenVerificationError,
+    fetch_google_certs,
+)
 
-# Initialize Firebase Admin SDK
+# Firebase Admin SDK and Firestore clients; the libraries are imported on
+# first use so instances that never reach Firestore start faster
 _firebase_app = None
 _db = None
+_async_db = None
+# Clients may be first created from worker threads (startup warm-up,
+# sync dependencies), so creation is serialized
+_init_lock = threading.RLock()
 
 
 def get_firebase_app():
     """Get or initialize Firebase Admin SDK"""
     global _firebase_app
-    if _firebase_app is None:
-        if settings.FIREBASE_CREDENTIALS_PATH:
-            cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
-            _firebase_app = firebase_admin.initialize_app(cred)
-        else:
-            # Use Application Default Credentials (ADC) in Cloud Run
-            _firebase_app = firebase_admin.initialize_app()
+    with _init_lock:
+        if _firebase_app is None:
+            import firebase_admin
+            from firebase_admin import credentials
+            
+            if settings.FIREBASE_CREDENTIALS_PATH:
+                cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
+                _firebase_app = firebase_admin.initialize_app(cred)
+            else:
+                # Use Application Default Credentials (ADC) in Cloud Run
+                _firebase_app = firebase_admin.initialize_app()
     return _firebase_app
 
 
 def get_firestore_client():
     """Get Firestore client"""
     global _db
-    if _db is None:
-        get_firebase_app()
-        _db = firestore.client()
+    with _init_lock:
+        if _db is None:
+            from firebase_admin import firestore
+            
+            get_firebase_app()
+            _db = firestore.client()
     return _db
 
 
+def get_async_firestore_client():
+    """
+    Get the shared async Firestore client.
+    
+    A single AsyncClient is reused for the life of the process so all requests
+    share its gRPC channel. Honours FIRESTORE_EMULATOR_HOST for local testing.
+    """
+    global _async_db
+    with _init_lock:
+        if _async_db is None:
+            from firebase_admin import firestore_async
+            
+            get_firebase_app()
+            _async_db = firestore_async.client()
+    return _async_db
+
+
+_token_verifier = None
+
+
+def get_token_verifier() -> Optional[FirebaseTokenVerifier]:
+    """
+    Get the local token verifier, or None when tokens must go through the
+    Admin SDK (local verification disabled, no project ID, or Auth emulator).
+    """
+    global _token_verifier
+    if (
+        not settings.AUTH_LOCAL_VERIFICATION
+        or not settings.FIREBASE_PROJECT_ID
+        or os.environ.get("FIREBASE_AUTH_EMULATOR_HOST")
+    ):
+        return None
+    if _token_verifier is None:
+        _token_verifier = FirebaseTokenVerifier(
+            project_id=settings.FIREBASE_PROJECT_ID,
+            cert_store=CertificateStore(
+                fetch_google_certs,
+                refresh_margin_seconds=settings.AUTH_CERT_REFRESH_MARGIN_SECONDS,
+            ),
+            cache_max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+            revocation_lookup=_tokens_revoked_before if settings.AUTH_CHECK_REVOKED else None,
+            revocation_cache_seconds=settings.AUTH_REVOCATION_CACHE_SECONDS,
+        )
+    return _token_verifier
+
+
+def _get_tokens_valid_after(uid: str) -> Optional[float]:
+    """A user's token revocation time via the Admin SDK (blocking)"""
+    from firebase_admin import auth
+
+    get_firebase_app()
+    try:
+        user = auth.get_user(uid)
+    except auth.UserNotFoundError as e:
+        raise TokenVerificationError(str(e))
+    if user.disabled:
+        raise TokenVerificationError("User is disabled")
+    valid_after = user.tokens_valid_after_timestamp
+    return valid_after / 1000 if valid_after else None
+
+
+async def _tokens_revoked_before(uid: str) -> Optional[float]:
+    return await asyncio.to_thread(_get_tokens_valid_after, uid)
+
+
+def _verify_with_admin_sdk(token: str) -> dict:
+    """Verify a token through the Admin SDK (blocking; run in a worker thread)"""
+    from firebase_admin import auth
+    
+    get_firebase_app()
+    try:
+        return auth.verify_id_token(token, check_revoked=settings.AUTH_CHECK_REVOKED)
+    except auth.ExpiredIdTokenError as e:
+        raise TokenExpiredError(str(e))
+    except auth.RevokedIdTokenError as e:
+        raise TokenRevokedError(str(e))
+    except (auth.InvalidIdTokenError, auth.UserDisabledError) as e:
+        raise TokenVerificationError(str(e))
+
+
+# Identical tokens verified concurrently share one Admin SDK call
+_admin_verifications = SingleFlight("auth")
+
 # Security scheme for JWT tokens
 security = HTTPBearer()
 
@@ -46,25 +156,41 @@ async def verify_firebase_token(
     Verify Firebase ID token from Authorization header.
     Returns the decoded token if valid, raises HTTPException otherwise.
     """
+    verifier = get_token_verifier()
+    start = time.perf_counter()
     try:
-        get_firebase_app()
-        decoded_token = auth.verify_id_token(credentials.credentials)
-        return decoded_token
-    except auth.InvalidIdTokenError:
+        if verifier is not None:
+            return await verifier.verify(credentials.credentials)
+        token = credentials.credentials
+        return await _admin_verifications.do(
+            hashlib.sha256(token.encode("utf-8")).hexdigest(),
+            (),
+            lambda: asyncio.to_thread(_verify_with_admin_sdk, token),
+        )
+    except TokenExpiredError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication token",
+            detail="Token has expired",
         )
-    except auth.ExpiredIdTokenError:
+    except TokenRevokedError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired",
+            detail="Token has been revoked",
+        )
+    except TokenVerificationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication token",
         )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Authentication failed: {str(e)}",
         )
+    finally:
+        elapsed = time.perf_counter() - start
+        AUTH_LATENCY.observe(elapsed)
+        record_phase("auth", elapsed)
 
 
 async def get_current_user(token: dict = Depends(verify_firebase_token)) -> dict:
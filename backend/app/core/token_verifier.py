@@ -0,0 +1,279 @@
+"""
+Local Firebase ID token verification with in-memory signing certificates
+and a verified-token cache
+"""
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.coalesce import SingleFlight
+
+GOOGLE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+)
+FIREBASE_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+# Fetches certificates, returning (kid -> PEM certificate, max-age seconds)
+CertFetcher = Callable[[], Awaitable[Tuple[Dict[str, str], float]]]
+# Looks up the epoch seconds before which a user's tokens are revoked (None
+# if they never were)
+RevocationLookup = Callable[[str], Awaitable[Optional[float]]]
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class TokenVerificationError(Exception):
+    """Raised when an ID token is malformed or its signature/claims are invalid"""
+
+
+class TokenExpiredError(TokenVerificationError):
+    """Raised when an ID token has expired"""
+
+
+class TokenRevokedError(TokenVerificationError):
+    """Raised when an ID token was issued before the user's tokens were revoked"""
+
+
+class _UnknownKeyError(TokenVerificationError):
+    """Raised when a token's kid is not in the current certificate set"""
+
+
+def parse_max_age(cache_control: str, default: float = 3600.0) -> float:
+    """Extract max-age (seconds) from a Cache-Control header value"""
+    match = _MAX_AGE_RE.search(cache_control or "")
+    return float(match.group(1)) if match else default
+
+
+async def fetch_google_certs(url: str = GOOGLE_CERTS_URL) -> Tuple[Dict[str, str], float]:
+    """Download Google's token signing certificates"""
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.json(), parse_max_age(response.headers.get("cache-control", ""))
+
+
+class CertificateStore:
+    """
+    Keeps signing certificates in memory and refreshes them ahead of expiry.
+
+    Certificates are considered fresh for the max-age advertised by the
+    certificate endpoint. Once inside the refresh margin, callers keep
+    using the current set while a single background refresh runs.
+    """
+
+    def __init__(
+        self,
+        fetcher: CertFetcher,
+        refresh_margin_seconds: float = 300.0,
+        min_refresh_interval_seconds: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._fetcher = fetcher
+        self._refresh_margin = refresh_margin_seconds
+        self._min_refresh_interval = min_refresh_interval_seconds
+        self._clock = clock
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._background: Optional[asyncio.Task] = None
+        self.refreshes = 0
+
+    async def refresh(self, force: bool = False) -> Dict[str, str]:
+        """
+        Fetch certificates, coalescing concurrent refreshes.
+
+        Args:
+            force: Refetch even if the current set is fresh (e.g. after key
+                rotation). Forced refetches are throttled so tokens with
+                bogus key ids cannot hammer the certificate endpoint.
+        """
+        async with self._lock:
+            now = self._clock()
+            # Another caller may have refreshed while we waited for the lock
+            if self._certs:
+                if not force and now < self._expires_at - self._refresh_margin:
+                    return self._certs
+                if force and now - self._fetched_at < self._min_refresh_interval:
+                    return self._certs
+            certs, max_age = await self._fetcher()
+            self._certs = certs
+            self._fetched_at = self._clock()
+            self._expires_at = self._fetched_at + max_age
+            self.refreshes += 1
+            return self._certs
+
+    async def get_certs(self) -> Dict[str, str]:
+        """Return current certificates, refreshing if expired or nearly so"""
+        now = self._clock()
+        if not self._certs or now >= self._expires_at:
+            return await self.refresh()
+        if now >= self._expires_at - self._refresh_margin:
+            if self._background is None or self._background.done():
+                self._background = asyncio.create_task(self.refresh())
+        return self._certs
+
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens locally and caches decoded claims until exp.
+
+    With a revocation lookup, tokens issued before their user's tokens were
+    revoked are rejected, cached or not. The revocation time of each user
+    is kept for revocation_cache_seconds, which bounds how long a revoked
+    token keeps working.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        cert_store: CertificateStore,
+        cache_max_entries: int = 10000,
+        clock_skew_seconds: int = 10,
+        clock: Callable[[], float] = time.time,
+        revocation_lookup: Optional[RevocationLookup] = None,
+        revocation_cache_seconds: float = 60.0,
+    ):
+        self.project_id = project_id
+        self.cert_store = cert_store
+        self.cache_max_entries = cache_max_entries
+        self.clock_skew_seconds = clock_skew_seconds
+        self._clock = clock
+        self._cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        # A page load sends the same new token on several requests at once
+        self._verifications = SingleFlight("auth")
+        self.revocation_lookup = revocation_lookup
+        self.revocation_cache_seconds = revocation_cache_seconds
+        # uid -> (looked up at, revoked before)
+        self._revocations: "OrderedDict[str, Tuple[float, Optional[float]]]" = OrderedDict()
+        self._revocation_lookups = SingleFlight("auth_revocation")
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _verify_sync(self, token: str, certs: Dict[str, str]) -> dict:
+        """CPU-bound signature and claim checks, run off the event loop"""
+        # Imported here (in the worker thread) to keep it off the startup path
+        from google.auth import jwt
+
+        try:
+            header = jwt.decode_header(token)
+        except ValueError as e:
+            raise TokenVerificationError(f"Malformed token: {e}")
+        if header.get("alg") != "RS256":
+            raise TokenVerificationError("Token has incorrect algorithm, expected RS256")
+        kid = header.get("kid")
+        if not kid:
+            raise TokenVerificationError("Token has no key id")
+        if kid not in certs:
+            raise _UnknownKeyError("Token signed with an unknown key")
+
+        try:
+            claims = jwt.decode(
+                token,
+                certs={kid: certs[kid]},
+                audience=self.project_id,
+                clock_skew_in_seconds=self.clock_skew_seconds,
+            )
+        except ValueError as e:
+            if "Token expired" in str(e):
+                raise TokenExpiredError(str(e))
+            raise TokenVerificationError(str(e))
+
+        if claims.get("iss") != FIREBASE_ISSUER_PREFIX + self.project_id:
+            raise TokenVerificationError("Token has incorrect issuer")
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise TokenVerificationError("Token has an invalid subject")
+        claims["uid"] = subject
+        return claims
+
+    def _cache_get(self, digest: str) -> Optional[dict]:
+        entry = self._cache.get(digest)
+        if entry is None:
+            return None
+        exp, claims = entry
+        if exp <= self._clock():
+            del self._cache[digest]
+            return None
+        self._cache.move_to_end(digest)
+        return claims
+
+    def _cache_set(self, digest: str, claims: dict) -> None:
+        self._cache[digest] = (float(claims["exp"]), claims)
+        self._cache.move_to_end(digest)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    async def verify(self, token: str) -> dict:
+        """
+        Verify an ID token, serving repeat tokens from the cache.
+
+        Args:
+            token: Encoded Firebase ID token
+
+        Returns:
+            Decoded token claims, including "uid"
+        """
+        digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        claims = self._cache_get(digest)
+        if claims is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            claims = await self._verifications.do(
+                digest, (), lambda: self._verify_uncached(token, digest)
+            )
+        if self.revocation_lookup is not None:
+            await self._check_revoked(claims)
+        return dict(claims)
+
+    async def _check_revoked(self, claims: dict) -> None:
+        uid = claims["uid"]
+        now = self._clock()
+        entry = self._revocations.get(uid)
+        if entry is None or now - entry[0] >= self.revocation_cache_seconds:
+            revoked_before = await self._revocation_lookups.do(
+                uid, (), lambda: self.revocation_lookup(uid)
+            )
+            entry = self._revocations[uid] = (now, revoked_before)
+        self._revocations.move_to_end(uid)
+        while len(self._revocations) > self.cache_max_entries:
+            self._revocations.popitem(last=False)
+        revoked_before = entry[1]
+        if revoked_before is not None and float(claims.get("iat", 0)) < revoked_before:
+            self.failures += 1
+            raise TokenRevokedError("Token has been revoked")
+
+    async def _verify_uncached(self, token: str, digest: str) -> dict:
+        certs = await self.cert_store.get_certs()
+        try:
+            try:
+                claims = await asyncio.to_thread(self._verify_sync, token, certs)
+            except _UnknownKeyError:
+                # Keys rotate: retry once with a fresh certificate set
+                certs = await self.cert_store.refresh(force=True)
+                claims = await asyncio.to_thread(self._verify_sync, token, certs)
+        except TokenVerificationError:
+            self.failures += 1
+            raise
+
+        self._cache_set(digest, claims)
+        return claims
+
+    def stats(self) -> dict:
+        """Verified-token cache counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "cached_tokens": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "cert_refreshes": self.cert_store.refreshes,
+        }
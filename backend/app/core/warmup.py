@@ -0,0 +1,66 @@
+"""
+Background warm-up of lazily initialized clients
+"""
+import asyncio
+import importlib
+import logging
+import time
+
+from app.core.ai_client import get_ai_client
+from app.core.security import get_async_firestore_client, get_token_verifier
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_auth() -> None:
+    verifier = get_token_verifier()
+    if verifier is None:
+        return
+    await asyncio.to_thread(importlib.import_module, "google.auth.jwt")
+    await verifier.cert_store.get_certs()
+
+
+async def _warm_firestore() -> None:
+    await asyncio.to_thread(get_async_firestore_client)
+
+
+async def _warm_scoring() -> None:
+    def build() -> None:
+        from app.core.scoring import get_scoring_engine
+
+        get_scoring_engine()
+
+    await asyncio.to_thread(build)
+
+
+async def _warm_gemini() -> None:
+    await get_ai_client().router.load()
+
+
+async def warm_up() -> None:
+    """
+    Initialize the clients that are otherwise created by the first request:
+    signing certificates, the Firestore client, the scoring engine and the
+    Gemini SDK.
+
+    Imports and client construction run in worker threads, so requests
+    keep being served meanwhile. A step that fails is logged and left to
+    initialize lazily on first use.
+    """
+    async def run(name: str, step) -> None:
+        start = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+        else:
+            logger.info("Warm-up step %s took %.0f ms", name, (time.perf_counter() - start) * 1000)
+
+    # Steps are independent, so a slow one (e.g. credential discovery)
+    # does not hold up the others
+    await asyncio.gather(
+        run("auth", _warm_auth),
+        run("firestore", _warm_firestore),
+        run("scoring", _warm_scoring),
+        run("gemini", _warm_gemini),
+    )
@@ -1,11 +1,53 @@
 """
 WAFLens API - FastAPI Backend
 """
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.v1 import pillars, assessments, recommendations, ai
+from app.api.v1 import pillars, assessments, recommendations, ai, changes, azure, resources
+from app.core.azure_advisor import get_advisor_client
+from app.core.catalog import load_catalog
+from app.core.changes import get_change_feed
 from app.core.config import settings
+from app.core.conversations import get_conversation_manager
+from app.core.jobs import get_job_manager
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.remediation_library import get_remediation_library
+from app.core.security import get_token_verifier
+from app.core.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load static data once before serving requests"""
+    await load_catalog()
+    jobs = get_job_manager()
+    await jobs.start()
+    library = get_remediation_library()
+    prefill = (
+        settings.REMEDIATION_LIBRARY_PREFILL or settings.REMEDIATION_LIBRARY_BACKEND == "firestore"
+    )
+    if settings.GEMINI_API_KEY and prefill:
+        # Filled in the background; entries requested earlier are generated
+        # on demand. Without a key each Gemini call would stall the event
+        # loop while the SDK looks for default credentials
+        await library.start()
+    warmup = None
+    if settings.STARTUP_WARMUP_ENABLED:
+        # Not awaited: the instance reports ready while clients initialize
+        warmup = asyncio.create_task(warm_up())
+    yield
+    if warmup is not None:
+        warmup.cancel()
+    get_change_feed().close()
+    await get_conversation_manager().stop()
+    await library.stop()
+    await jobs.stop()
+    await get_advisor_client().aclose()
+
 
 app = FastAPI(
     title="WAFLens API",
@@ -13,6 +55,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
+    lifespan=lifespan,
 )
 
 # CORS Configuration
@@ -22,13 +65,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Page-Token", "Server-Timing", "Location", "Retry-After"],
 )
 
+# Latency histograms, in-flight gauge and optional Server-Timing header
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
+
 # Include routers
 app.include_router(pillars.router, prefix="/api/v1/pillars", tags=["Pillars"])
 app.include_router(assessments.router, prefix="/api/v1/assessments", tags=["Assessments"])
 app.include_router(recommendations.router, prefix="/api/v1/recommendations", tags=["Recommendations"])
 app.include_router(ai.router, prefix="/api/v1/ai", tags=["AI"])
+app.include_router(changes.router, prefix="/api/v1/changes", tags=["Changes"])
+app.include_router(azure.router, prefix="/api/v1/azure", tags=["Azure"])
+app.include_router(resources.router, prefix="/api/v1/assessments", tags=["Resources"])
 
 
 @app.get("/", tags=["Health"])
@@ -41,3 +92,21 @@ async def root():
 async def health_check():
     """Health check endpoint for Cloud Run"""
     return {"status": "healthy"}
+
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    """Prometheus metrics in text exposition format"""
+    return Response(
+        content=registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@app.get("/health/auth", tags=["Health"])
+async def auth_health():
+    """Verified-token cache hit rate and certificate refresh counters"""
+    verifier = get_token_verifier()
+    if verifier is None:
+        return {"local_verification": False}
+    return {"local_verification": True, **verifier.stats()}
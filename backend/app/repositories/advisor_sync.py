@@ -0,0 +1,128 @@
+"""
+Azure Advisor sync state: page ETags and item fingerprints from the last sync
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.core.config import settings
+from app.core.metrics import firestore_operation
+from app.core.security import get_async_firestore_client
+
+if TYPE_CHECKING:
+    from google.cloud.firestore import AsyncClient
+
+# (user ID, subscription ID, Advisor category)
+PartitionKey = Tuple[str, str, str]
+
+
+class PageState(BaseModel):
+    """One page of the last listing, so it can be revalidated on its own"""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    # An unchanged page is answered with 304
+    etag: Optional[str] = None
+    # Link to the following page; None on the last page
+    next_link: Optional[str] = Field(default=None, alias="nextLink")
+    # Recommendation IDs the page listed
+    ids: List[str] = Field(default_factory=list)
+
+
+class SyncState(BaseModel):
+    """What the last completed sync of one subscription and category saw"""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    user_id: str = Field(alias="userId")
+    subscription_id: str = Field(alias="subscriptionId")
+    category: str
+    # Pages of the listing, in order
+    pages: List[PageState] = Field(default_factory=list)
+    # Recommendation ID -> fingerprint of its synced fields
+    fingerprints: Dict[str, str] = Field(default_factory=dict)
+    synced_at: str = Field(
+        default_factory=lambda: datetime.utcnow().isoformat(), alias="syncedAt"
+    )
+
+    @property
+    def key(self) -> PartitionKey:
+        return self.user_id, self.subscription_id, self.category
+
+    def to_document(self) -> dict:
+        """Serialize for Firestore"""
+        return self.model_dump(by_alias=True)
+
+
+class SyncStateStore(ABC):
+    """Storage interface for Advisor sync state"""
+
+    @abstractmethod
+    async def get_many(self, keys: Sequence[PartitionKey]) -> Dict[PartitionKey, SyncState]:
+        """Fetch the states that exist among keys"""
+
+    @abstractmethod
+    async def put(self, state: SyncState) -> None:
+        """Insert or replace a state"""
+
+
+class InMemorySyncStateStore(SyncStateStore):
+    """Process-local store; the first sync after a restart rewrites everything"""
+
+    def __init__(self):
+        self._states: Dict[PartitionKey, SyncState] = {}
+
+    async def get_many(self, keys: Sequence[PartitionKey]) -> Dict[PartitionKey, SyncState]:
+        return {key: self._states[key] for key in keys if key in self._states}
+
+    async def put(self, state: SyncState) -> None:
+        self._states[state.key] = state
+
+
+class FirestoreSyncStateStore(SyncStateStore):
+    """
+    Firestore-backed store, shared by every instance.
+
+    One document per user, subscription and category; its fingerprints
+    and page IDs take roughly 150 bytes per recommendation, far below the
+    document size limit for the few thousand recommendations a category
+    holds.
+    """
+
+    def __init__(self, db: "AsyncClient", collection: str = "advisorSync"):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    def _document(self, key: PartitionKey):
+        return self.collection.document(":".join(key))
+
+    @firestore_operation("advisor_sync.get_many")
+    async def get_many(self, keys: Sequence[PartitionKey]) -> Dict[PartitionKey, SyncState]:
+        states = {}
+        async for doc in self.db.get_all([self._document(key) for key in keys]):
+            if doc.exists:
+                state = SyncState(**doc.to_dict())
+                states[state.key] = state
+        return states
+
+    @firestore_operation("advisor_sync.put")
+    async def put(self, state: SyncState) -> None:
+        await self._document(state.key).set(state.to_document())
+
+
+_store: Optional[SyncStateStore] = None
+
+
+def get_sync_state_store() -> SyncStateStore:
+    """Get the configured Advisor sync state store"""
+    global _store
+    if _store is None:
+        if settings.AZURE_ADVISOR_SYNC_BACKEND == "firestore":
+            _store = FirestoreSyncStateStore(
+                get_async_firestore_client(), settings.AZURE_ADVISOR_SYNC_FIRESTORE_COLLECTION
+            )
+        else:
+            _store = InMemorySyncStateStore()
+    return _store
@@ -0,0 +1,409 @@
+"""
+Async Firestore data access for assessments
+"""
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.core.coalesce import SingleFlight
+from app.core.config import settings
+from app.core.metrics import firestore_operation
+from app.core.security import get_async_firestore_client
+from app.repositories.pagination import decode_page_token, encode_page_token
+from app.repositories.summaries import (
+    SUMMARY_VERSION,
+    AssessmentSummary,
+    contribution,
+    merge_deltas,
+    summary_deltas,
+    to_increments,
+)
+
+# Fields of an assessment that the per-user summary counts
+SUMMARY_FIELDS = ["userId", "pillarId", "status", "score"]
+
+# Firestore and NumPy are loaded with the first repository, not at import
+if TYPE_CHECKING:
+    from google.cloud.firestore import AsyncClient
+
+    from app.core.scoring import ScoringEngine
+
+
+class AssessmentNotFoundError(Exception):
+    """Raised when an assessment document does not exist"""
+
+
+class AssessmentAccessDeniedError(Exception):
+    """Raised when an assessment belongs to another user"""
+
+
+class AssessmentConflictError(Exception):
+    """Raised when an assessment changed between the ownership check and the write"""
+
+
+class Assessment(BaseModel):
+    """Assessment document as stored in Firestore"""
+
+    model_config = ConfigDict(populate_by_name=True, extra="allow")
+
+    id: str
+    pillar_id: Optional[str] = Field(default=None, alias="pillarId")
+    user_id: Optional[str] = Field(default=None, alias="userId")
+    responses: List[dict] = Field(default_factory=list)
+    status: Optional[str] = None
+    score: Optional[int] = None
+    pillar_scores: Dict[str, float] = Field(default_factory=dict, alias="pillarScores")
+    control_scores: Dict[str, float] = Field(default_factory=dict, alias="controlScores")
+    created_at: Optional[str] = Field(default=None, alias="createdAt")
+    updated_at: Optional[str] = Field(default=None, alias="updatedAt")
+
+    @classmethod
+    def from_snapshot(cls, doc) -> "Assessment":
+        """Build an assessment from a Firestore document snapshot"""
+        return cls(id=doc.id, **doc.to_dict())
+
+    def to_api(self) -> dict:
+        """Serialize using the Firestore (camelCase) field names"""
+        return self.model_dump(by_alias=True, exclude_unset=True)
+
+
+class AssessmentRepository:
+    """Async repository for the assessments collection"""
+
+    def __init__(
+        self,
+        db: "AsyncClient",
+        scoring_engine: "ScoringEngine",
+        collection: str = "assessments",
+        summaries_collection: str = "assessmentSummaries",
+    ):
+        self.db = db
+        self.scoring_engine = scoring_engine
+        self.collection = db.collection(collection)
+        self.summaries = db.collection(summaries_collection)
+        # Reads are coalesced per user; every write invalidates its users
+        self.reads = SingleFlight(
+            "assessments",
+            ttl_seconds=settings.READ_CACHE_TTL_SECONDS,
+            enabled=settings.READ_COALESCING_ENABLED,
+        )
+
+    def _invalidate(self, *user_ids: Optional[str]) -> None:
+        for user_id in user_ids:
+            if user_id:
+                self.reads.invalidate(user_id)
+
+    def _write_summaries(self, writer, deltas: Dict[str, dict]) -> None:
+        """Add summary counter changes to a batch or transaction"""
+        now = datetime.utcnow().isoformat()
+        for user_id, delta in deltas.items():
+            writer.set(
+                self.summaries.document(user_id),
+                {**to_increments(delta), "updatedAt": now},
+                merge=True,
+            )
+
+    async def list_for_user(
+        self,
+        user_id: str,
+        limit: int,
+        page_token: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Assessment], Optional[str]]:
+        """
+        List a page of a user's assessments, newest first.
+
+        Pages are ordered by (createdAt, document ID) descending so the cursor
+        is stable even when several assessments share a timestamp. Served by
+        the (userId, createdAt desc) composite index.
+
+        Args:
+            user_id: Owner of the assessments
+            limit: Maximum number of assessments to return
+            page_token: Token returned with the previous page, if any
+            fields: Optional projection; only these fields are read
+
+        Returns:
+            (assessments, next page token or None on the last page)
+
+        Raises:
+            InvalidPageTokenError: If page_token is malformed
+        """
+        key = ("list", limit, page_token, tuple(fields) if fields is not None else None)
+        return await self.reads.do(
+            user_id, key, lambda: self._list_for_user(user_id, limit, page_token, fields)
+        )
+
+    @firestore_operation("assessments.list")
+    async def _list_for_user(
+        self,
+        user_id: str,
+        limit: int,
+        page_token: Optional[str],
+        fields: Optional[List[str]],
+    ) -> Tuple[List[Assessment], Optional[str]]:
+        query = (
+            self.collection.where("userId", "==", user_id)
+            .order_by("createdAt", direction="DESCENDING")
+            .order_by("__name__", direction="DESCENDING")
+        )
+        if fields is not None:
+            # createdAt is always read so the next cursor can be built
+            query = query.select(sorted(set(fields) | {"createdAt"}))
+        if page_token:
+            created_at, assessment_id = decode_page_token(page_token, 2)
+            query = query.start_after({"createdAt": created_at, "__name__": assessment_id})
+        # Read one extra document to learn whether another page exists
+        query = query.limit(limit + 1)
+
+        docs = [doc async for doc in query.stream()]
+        next_token = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_token = encode_page_token(last.get("createdAt"), last.id)
+
+        assessments = []
+        for doc in docs:
+            data = doc.to_dict()
+            if fields is not None:
+                data = {key: value for key, value in data.items() if key in fields}
+            assessments.append(Assessment(id=doc.id, **data))
+        return assessments, next_token
+
+    @firestore_operation("assessments.create")
+    async def create(self, user_id: str, pillar_id: str, responses: List[dict]) -> Assessment:
+        """
+        Create a new in-progress assessment, scored from its responses.
+
+        The document and the owner's summary counters are written in one batch.
+        """
+        now = datetime.utcnow().isoformat()
+        data = {
+            "pillarId": pillar_id,
+            "userId": user_id,
+            "responses": responses,
+            "status": "in_progress",
+            **self.scoring_engine.score(pillar_id, responses).to_document(),
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        doc_ref = self.collection.document()
+        batch = self.db.batch()
+        batch.set(doc_ref, data)
+        self._write_summaries(batch, summary_deltas([(None, data)]))
+        try:
+            await batch.commit()
+        finally:
+            self._invalidate(user_id)
+        return Assessment(id=doc_ref.id, **data)
+
+    @firestore_operation("assessments.get")
+    async def get(self, assessment_id: str) -> Optional[Assessment]:
+        """Fetch an assessment by ID, or None if it does not exist"""
+        doc = await self.collection.document(assessment_id).get()
+        if not doc.exists:
+            return None
+        return Assessment.from_snapshot(doc)
+
+    @staticmethod
+    def _check_owner(snapshot, user_id: str) -> None:
+        """Raise if a snapshot is missing or owned by someone else"""
+        if not snapshot.exists:
+            raise AssessmentNotFoundError(snapshot.id)
+        if snapshot.get("userId") != user_id:
+            raise AssessmentAccessDeniedError(snapshot.id)
+
+    async def get_owned(self, assessment_id: str, user_id: str) -> Assessment:
+        """
+        Fetch an assessment and check that it belongs to the user.
+
+        Raises:
+            AssessmentNotFoundError: If the assessment does not exist
+            AssessmentAccessDeniedError: If it belongs to another user
+        """
+        return await self.reads.do(
+            user_id, ("get", assessment_id), lambda: self._get_owned(assessment_id, user_id)
+        )
+
+    @firestore_operation("assessments.get")
+    async def _get_owned(self, assessment_id: str, user_id: str) -> Assessment:
+        doc = await self.collection.document(assessment_id).get()
+        self._check_owner(doc, user_id)
+        return Assessment.from_snapshot(doc)
+
+    @firestore_operation("assessments.update")
+    async def update(self, assessment_id: str, user_id: str, updates: dict) -> None:
+        """
+        Apply a partial update to an assessment owned by the user.
+
+        The ownership check and the write run in a single transaction, so the
+        document cannot change hands (or be deleted) in between. Changing the
+        responses recomputes the stored scores. Changes to the status, pillar
+        or score are applied to the summary counters in the same transaction.
+
+        Raises:
+            AssessmentNotFoundError: If the assessment does not exist
+            AssessmentAccessDeniedError: If it belongs to another user
+        """
+        from google.cloud.firestore import async_transactional
+
+        doc_ref = self.collection.document(assessment_id)
+        updates = {**updates, "updatedAt": datetime.utcnow().isoformat()}
+
+        @async_transactional
+        async def apply(transaction) -> None:
+            snapshot = await doc_ref.get(transaction=transaction)
+            self._check_owner(snapshot, user_id)
+            changes = updates
+            if "responses" in updates:
+                score = self.scoring_engine.score(
+                    updates.get("pillarId", snapshot.get("pillarId")), updates["responses"]
+                )
+                changes = {**updates, **score.to_document()}
+            transaction.update(doc_ref, changes)
+            before = snapshot.to_dict()
+            self._write_summaries(
+                transaction, summary_deltas([(before, {**before, **changes})])
+            )
+
+        try:
+            await apply(self.db.transaction())
+        finally:
+            self._invalidate(user_id, updates.get("userId"))
+
+    @firestore_operation("assessments.update_many")
+    async def update_many(self, user_id: str, updates: Dict[str, dict]) -> Dict[str, str]:
+        """
+        Apply partial updates to many assessments in two round trips.
+
+        All documents are read with one batched get, then every update the
+        user owns is committed in one batched write. Each write carries a
+        last-update-time precondition, so a document modified after the
+        ownership check aborts the batch instead of being overwritten. The
+        summary counter changes of the whole batch are committed with it.
+
+        Args:
+            user_id: User making the changes
+            updates: Changes keyed by assessment ID (at most 500)
+
+        Returns:
+            Outcome per assessment ID: "updated", "not_found" or "forbidden"
+
+        Raises:
+            AssessmentConflictError: If a document changed concurrently
+        """
+        from google.api_core.exceptions import FailedPrecondition
+
+        refs = [self.collection.document(assessment_id) for assessment_id in updates]
+        snapshots = {doc.id: doc async for doc in self.db.get_all(refs)}
+
+        now = datetime.utcnow().isoformat()
+        batch = self.db.batch()
+        results = {}
+        changes: Dict[str, dict] = {}
+        for ref in refs:
+            snapshot = snapshots.get(ref.id)
+            try:
+                if snapshot is None:
+                    raise AssessmentNotFoundError(ref.id)
+                self._check_owner(snapshot, user_id)
+            except AssessmentNotFoundError:
+                results[ref.id] = "not_found"
+                continue
+            except AssessmentAccessDeniedError:
+                results[ref.id] = "forbidden"
+                continue
+            changes[ref.id] = {**updates[ref.id], "updatedAt": now}
+            results[ref.id] = "updated"
+
+        # Rescore every assessment whose responses changed in one pass
+        rescored = [
+            assessment_id for assessment_id, change in changes.items() if "responses" in change
+        ]
+        scores = self.scoring_engine.score_many(
+            [changes[i].get("pillarId", snapshots[i].get("pillarId")) for i in rescored],
+            [changes[i]["responses"] for i in rescored],
+        )
+        for assessment_id, score in zip(rescored, scores):
+            changes[assessment_id].update(score.to_document())
+
+        for assessment_id, change in changes.items():
+            batch.update(
+                self.collection.document(assessment_id),
+                change,
+                option=self.db.write_option(
+                    last_update_time=snapshots[assessment_id].update_time
+                ),
+            )
+        self._write_summaries(batch, summary_deltas(
+            (snapshots[i].to_dict(), {**snapshots[i].to_dict(), **change})
+            for i, change in changes.items()
+        ))
+
+        if "updated" in results.values():
+            try:
+                await batch.commit()
+            except FailedPrecondition as e:
+                raise AssessmentConflictError(str(e))
+            finally:
+                self._invalidate(user_id, *(change.get("userId") for change in changes.values()))
+        return results
+
+    async def get_summary(self, user_id: str) -> AssessmentSummary:
+        """
+        Get the dashboard summary of a user's assessments.
+
+        Normally a single document read. A missing summary (a user from before
+        summaries existed) or one in an older format is rebuilt from the
+        assessments in a transaction, so concurrent writes are not lost.
+        """
+        return await self.reads.do(user_id, ("summary",), lambda: self._get_summary(user_id))
+
+    @firestore_operation("assessments.summary")
+    async def _get_summary(self, user_id: str) -> AssessmentSummary:
+        snapshot = await self.summaries.document(user_id).get()
+        data = snapshot.to_dict() if snapshot.exists else {}
+        if data.get("version") == SUMMARY_VERSION:
+            return AssessmentSummary.from_document(data)
+        return AssessmentSummary.from_document(await self._rebuild_summary(user_id))
+
+    async def _rebuild_summary(self, user_id: str) -> dict:
+        """Recount a user's summary from their assessments"""
+        from google.cloud.firestore import async_transactional
+
+        summary_ref = self.summaries.document(user_id)
+        query = self.collection.where("userId", "==", user_id).select(SUMMARY_FIELDS)
+
+        @async_transactional
+        async def apply(transaction) -> dict:
+            # Reading the summary makes a concurrent increment retry the rebuild
+            snapshot = await summary_ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else {}
+            if data.get("version") == SUMMARY_VERSION:
+                return data
+            docs = [doc async for doc in query.stream(transaction=transaction)]
+            summary = {
+                "total": 0,
+                **merge_deltas(contribution(doc.to_dict()) for doc in docs),
+                "version": SUMMARY_VERSION,
+                "updatedAt": datetime.utcnow().isoformat(),
+            }
+            transaction.set(summary_ref, summary)
+            return summary
+
+        return await apply(self.db.transaction())
+
+
+_repository = None
+
+
+def get_assessment_repository() -> AssessmentRepository:
+    """Get the shared assessment repository (FastAPI dependency)"""
+    global _repository
+    if _repository is None:
+        from app.core.scoring import get_scoring_engine
+
+        _repository = AssessmentRepository(get_async_firestore_client(), get_scoring_engine())
+    return _repository
@@ -0,0 +1,267 @@
+"""
+Storage for AI chat conversations: a rolling summary plus the recent turns
+"""
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.core.config import settings
+from app.core.metrics import firestore_operation
+from app.core.security import get_async_firestore_client
+
+if TYPE_CHECKING:
+    from google.cloud.firestore import AsyncClient
+
+ROLE_USER = "user"
+ROLE_ASSISTANT = "assistant"
+
+
+class ConversationNotFoundError(Exception):
+    """Raised when a conversation does not exist or belongs to another user"""
+
+
+class Turn(BaseModel):
+    """One message of a conversation"""
+
+    # Position in the conversation, starting at 1
+    seq: int
+    role: str
+    text: str
+    at: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
+
+
+class Conversation(BaseModel):
+    """
+    A chat session.
+
+    Only turns not yet folded into the summary are kept, so the document
+    stays small however long the conversation runs.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    user_id: str = Field(alias="userId")
+    assessment_id: Optional[str] = Field(default=None, alias="assessmentId")
+    summary: str = ""
+    # Seq of the last turn covered by the summary
+    summarized_through: int = Field(default=0, alias="summarizedThrough")
+    turn_count: int = Field(default=0, alias="turnCount")
+    turns: List[Turn] = Field(default_factory=list)
+    created_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat(), alias="createdAt")
+    updated_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat(), alias="updatedAt")
+
+    def appended(self, messages: List[Tuple[str, str]]) -> "Conversation":
+        """Copy with (role, text) messages added as new turns"""
+        turns = [
+            Turn(seq=self.turn_count + i, role=role, text=text)
+            for i, (role, text) in enumerate(messages, start=1)
+        ]
+        return self.model_copy(update={
+            "turns": [*self.turns, *turns],
+            "turn_count": self.turn_count + len(turns),
+            "updated_at": datetime.utcnow().isoformat(),
+        })
+
+    def folded(self, summary: str, through: int) -> "Conversation":
+        """Copy with turns up to seq ``through`` replaced by the summary"""
+        return self.model_copy(update={
+            "summary": summary,
+            "summarized_through": through,
+            "turns": [turn for turn in self.turns if turn.seq > through],
+        })
+
+    def to_api(self) -> dict:
+        """Serialize for API responses"""
+        return self.model_dump(by_alias=True, exclude={"user_id"})
+
+    def to_document(self) -> dict:
+        """Serialize for Firestore"""
+        return self.model_dump(by_alias=True, exclude={"id"})
+
+
+class ConversationStore(ABC):
+    """Storage interface for conversations"""
+
+    @abstractmethod
+    async def create(self, conversation: Conversation) -> None:
+        """Store a new conversation"""
+
+    @abstractmethod
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        """Fetch a conversation, or None"""
+
+    @abstractmethod
+    async def append(
+        self, conversation_id: str, messages: List[Tuple[str, str]]
+    ) -> Conversation:
+        """
+        Atomically add (role, text) messages as the next turns.
+
+        Returns:
+            The updated conversation
+
+        Raises:
+            ConversationNotFoundError: If the conversation does not exist
+        """
+
+    @abstractmethod
+    async def fold(
+        self, conversation_id: str, summary: str, through: int, expected_through: int
+    ) -> bool:
+        """
+        Replace the summary and drop the turns it now covers.
+
+        Args:
+            conversation_id: Conversation to update
+            summary: Summary of every turn up to seq ``through``
+            through: Seq of the last turn the summary covers
+            expected_through: summarizedThrough the summary was built on
+
+        Returns:
+            False, leaving the conversation unchanged, if it is gone or was
+            summarized by someone else in the meantime
+        """
+
+    @abstractmethod
+    async def delete(self, conversation_id: str) -> None:
+        """Delete a conversation (no-op if it does not exist)"""
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local store; keeps the ``max_entries`` most recently used conversations"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+
+    def _put(self, conversation: Conversation) -> None:
+        self._conversations[conversation.id] = conversation
+        self._conversations.move_to_end(conversation.id)
+        while len(self._conversations) > self.max_entries:
+            self._conversations.popitem(last=False)
+
+    async def create(self, conversation: Conversation) -> None:
+        self._put(conversation)
+
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        return self._conversations.get(conversation_id)
+
+    async def append(
+        self, conversation_id: str, messages: List[Tuple[str, str]]
+    ) -> Conversation:
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            raise ConversationNotFoundError(conversation_id)
+        conversation = conversation.appended(messages)
+        self._put(conversation)
+        return conversation
+
+    async def fold(
+        self, conversation_id: str, summary: str, through: int, expected_through: int
+    ) -> bool:
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None or conversation.summarized_through != expected_through:
+            return False
+        self._conversations[conversation_id] = conversation.folded(summary, through)
+        return True
+
+    async def delete(self, conversation_id: str) -> None:
+        self._conversations.pop(conversation_id, None)
+
+
+class FirestoreConversationStore(ConversationStore):
+    """
+    Firestore-backed store shared by every instance.
+
+    Appends and folds run in transactions, so concurrent messages never
+    overwrite each other's turns.
+    """
+
+    def __init__(self, db: "AsyncClient", collection: str = "conversations"):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    @staticmethod
+    def _from_snapshot(doc) -> Conversation:
+        return Conversation(id=doc.id, **doc.to_dict())
+
+    @firestore_operation("conversations.create")
+    async def create(self, conversation: Conversation) -> None:
+        await self.collection.document(conversation.id).set(conversation.to_document())
+
+    @firestore_operation("conversations.get")
+    async def get(self, conversation_id: str) -> Optional[Conversation]:
+        doc = await self.collection.document(conversation_id).get()
+        if not doc.exists:
+            return None
+        return self._from_snapshot(doc)
+
+    @firestore_operation("conversations.append")
+    async def append(
+        self, conversation_id: str, messages: List[Tuple[str, str]]
+    ) -> Conversation:
+        from google.cloud.firestore import async_transactional
+
+        doc_ref = self.collection.document(conversation_id)
+
+        @async_transactional
+        async def apply(transaction) -> Conversation:
+            doc = await doc_ref.get(transaction=transaction)
+            if not doc.exists:
+                raise ConversationNotFoundError(conversation_id)
+            conversation = self._from_snapshot(doc).appended(messages)
+            transaction.update(doc_ref, conversation.to_document())
+            return conversation
+
+        return await apply(self.db.transaction())
+
+    @firestore_operation("conversations.fold")
+    async def fold(
+        self, conversation_id: str, summary: str, through: int, expected_through: int
+    ) -> bool:
+        from google.cloud.firestore import async_transactional
+
+        doc_ref = self.collection.document(conversation_id)
+
+        @async_transactional
+        async def apply(transaction) -> bool:
+            doc = await doc_ref.get(transaction=transaction)
+            if not doc.exists:
+                return False
+            conversation = self._from_snapshot(doc)
+            if conversation.summarized_through != expected_through:
+                return False
+            folded = conversation.folded(summary, through)
+            transaction.update(doc_ref, {
+                "summary": folded.summary,
+                "summarizedThrough": folded.summarized_through,
+                "turns": [turn.model_dump() for turn in folded.turns],
+            })
+            return True
+
+        return await apply(self.db.transaction())
+
+    @firestore_operation("conversations.delete")
+    async def delete(self, conversation_id: str) -> None:
+        await self.collection.document(conversation_id).delete()
+
+
+_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Get the configured conversation store"""
+    global _store
+    if _store is None:
+        if settings.CONVERSATIONS_BACKEND == "firestore":
+            _store = FirestoreConversationStore(
+                get_async_firestore_client(), settings.CONVERSATIONS_FIRESTORE_COLLECTION
+            )
+        else:
+            _store = InMemoryConversationStore()
+    return _store
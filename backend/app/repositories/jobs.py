@@ -0,0 +1,244 @@
+"""
+Storage for asynchronous AI analysis jobs
+"""
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.core.config import settings
+from app.core.metrics import firestore_operation
+from app.core.security import get_async_firestore_client
+
+if TYPE_CHECKING:
+    from google.cloud.firestore import AsyncClient
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+TERMINAL_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class AnalysisJob(BaseModel):
+    """An assessment analysis request and its outcome"""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: str
+    user_id: str = Field(alias="userId")
+    pillar: str
+    # None when the responses are read from the assessment at run time
+    responses: Optional[List[dict]] = None
+    assessment_id: Optional[str] = Field(default=None, alias="assessmentId")
+    bypass_cache: bool = Field(default=False, alias="bypassCache")
+    status: str = JOB_QUEUED
+    attempts: int = 0
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    # Epoch seconds after which a running job is presumed abandoned
+    lease_expires_at: Optional[float] = Field(default=None, alias="leaseExpiresAt")
+    created_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat(), alias="createdAt")
+    updated_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat(), alias="updatedAt")
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def claimable(self, now: float) -> bool:
+        """Whether a worker may start this job"""
+        if self.status == JOB_QUEUED:
+            return True
+        return self.status == JOB_RUNNING and (self.lease_expires_at or 0) <= now
+
+    def touch(self, **changes) -> "AnalysisJob":
+        """Copy with changes applied and updatedAt refreshed"""
+        return self.model_copy(update={**changes, "updated_at": datetime.utcnow().isoformat()})
+
+    def to_api(self) -> dict:
+        """Serialize for API responses and progress events"""
+        return self.model_dump(
+            by_alias=True,
+            exclude={"user_id", "responses", "bypass_cache", "lease_expires_at"},
+        )
+
+    def to_document(self) -> dict:
+        """Serialize for Firestore"""
+        return self.model_dump(by_alias=True, exclude={"id"})
+
+
+class JobStore(ABC):
+    """Storage interface for analysis jobs"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        """Fetch a job, or None"""
+
+    @abstractmethod
+    async def create(self, job: AnalysisJob, replace: bool = False) -> AnalysisJob:
+        """
+        Store a new job.
+
+        Args:
+            job: Job to store
+            replace: Overwrite an existing job with the same ID
+
+        Returns:
+            The stored job; when one already exists and replace is False,
+            the existing job
+        """
+
+    @abstractmethod
+    async def save(self, job: AnalysisJob) -> None:
+        """Overwrite a job's state"""
+
+    @abstractmethod
+    async def claim(self, job_id: str, lease_seconds: float) -> Optional[AnalysisJob]:
+        """
+        Atomically mark a queued (or abandoned) job as running.
+
+        Returns:
+            The claimed job with attempts incremented, or None if it is
+            missing, finished or being run by another worker
+        """
+
+    @abstractmethod
+    async def list_recoverable(self) -> List[AnalysisJob]:
+        """Jobs that are queued or whose running lease has expired"""
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local job store; keeps the most recent ``max_entries`` jobs"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+
+    def _put(self, job: AnalysisJob) -> None:
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        while len(self._jobs) > self.max_entries:
+            self._jobs.popitem(last=False)
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self._jobs.get(job_id)
+
+    async def create(self, job: AnalysisJob, replace: bool = False) -> AnalysisJob:
+        existing = self._jobs.get(job.id)
+        if existing is not None and not replace:
+            return existing
+        self._put(job)
+        return job
+
+    async def save(self, job: AnalysisJob) -> None:
+        self._put(job)
+
+    async def claim(self, job_id: str, lease_seconds: float) -> Optional[AnalysisJob]:
+        job = self._jobs.get(job_id)
+        now = time.time()
+        if job is None or not job.claimable(now):
+            return None
+        claimed = job.touch(
+            status=JOB_RUNNING, attempts=job.attempts + 1, lease_expires_at=now + lease_seconds
+        )
+        self._put(claimed)
+        return claimed
+
+    async def list_recoverable(self) -> List[AnalysisJob]:
+        now = time.time()
+        return [job for job in self._jobs.values() if job.claimable(now)]
+
+
+class FirestoreJobStore(JobStore):
+    """
+    Firestore-backed store shared by every instance.
+
+    Claims run in a transaction, so a job re-enqueued on several instances
+    (client retries, recovery after a restart) still runs once at a time.
+    """
+
+    def __init__(self, db: "AsyncClient", collection: str = "aiJobs"):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    @firestore_operation("jobs.get")
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        doc = await self.collection.document(job_id).get()
+        if not doc.exists:
+            return None
+        return AnalysisJob(id=doc.id, **doc.to_dict())
+
+    @firestore_operation("jobs.create")
+    async def create(self, job: AnalysisJob, replace: bool = False) -> AnalysisJob:
+        from google.api_core.exceptions import AlreadyExists
+
+        doc_ref = self.collection.document(job.id)
+        if replace:
+            await doc_ref.set(job.to_document())
+            return job
+        try:
+            await doc_ref.create(job.to_document())
+        except AlreadyExists:
+            doc = await doc_ref.get()
+            return AnalysisJob(id=doc.id, **doc.to_dict())
+        return job
+
+    @firestore_operation("jobs.save")
+    async def save(self, job: AnalysisJob) -> None:
+        await self.collection.document(job.id).set(job.to_document())
+
+    @firestore_operation("jobs.claim")
+    async def claim(self, job_id: str, lease_seconds: float) -> Optional[AnalysisJob]:
+        from google.cloud.firestore import async_transactional
+
+        doc_ref = self.collection.document(job_id)
+
+        @async_transactional
+        async def apply(transaction) -> Optional[AnalysisJob]:
+            doc = await doc_ref.get(transaction=transaction)
+            if not doc.exists:
+                return None
+            job = AnalysisJob(id=doc.id, **doc.to_dict())
+            now = time.time()
+            if not job.claimable(now):
+                return None
+            claimed = job.touch(
+                status=JOB_RUNNING,
+                attempts=job.attempts + 1,
+                lease_expires_at=now + lease_seconds,
+            )
+            transaction.set(doc_ref, claimed.to_document())
+            return claimed
+
+        return await apply(self.db.transaction())
+
+    @firestore_operation("jobs.list_recoverable")
+    async def list_recoverable(self) -> List[AnalysisJob]:
+        now = time.time()
+        jobs = []
+        for status in (JOB_QUEUED, JOB_RUNNING):
+            query = self.collection.where("status", "==", status)
+            async for doc in query.stream():
+                job = AnalysisJob(id=doc.id, **doc.to_dict())
+                if job.claimable(now):
+                    jobs.append(job)
+        return jobs
+
+
+_store: Optional[JobStore] = None
+
+
+def get_job_store() -> JobStore:
+    """Get the configured job store"""
+    global _store
+    if _store is None:
+        if settings.AI_JOBS_BACKEND == "firestore":
+            _store = FirestoreJobStore(
+                get_async_firestore_client(), settings.AI_JOBS_FIRESTORE_COLLECTION
+            )
+        else:
+            _store = InMemoryJobStore()
+    return _store
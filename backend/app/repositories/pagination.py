@@ -0,0 +1,34 @@
+"""
+Opaque cursor tokens for paginated queries
+"""
+import base64
+import binascii
+import json
+from typing import Any, List
+
+
+class InvalidPageTokenError(Exception):
+    """Raised when a page token cannot be decoded"""
+
+
+def encode_page_token(*values: Any) -> str:
+    """Encode the sort-key values of the last returned item as an opaque token"""
+    raw = json.dumps(list(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str, size: int) -> List[Any]:
+    """
+    Decode a page token into its sort-key values.
+
+    Raises:
+        InvalidPageTokenError: If the token is malformed or has the wrong arity
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeError):
+        raise InvalidPageTokenError(token)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidPageTokenError(token)
+    return values
@@ -0,0 +1,420 @@
+"""
+Recommendation storage with secondary indexes, sorting and cursor pagination
+"""
+import bisect
+import json
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime
+from itertools import combinations
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.core.coalesce import SingleFlight
+from app.core.config import settings
+from app.core.metrics import firestore_operation
+from app.core.security import get_async_firestore_client
+from app.repositories.pagination import (
+    InvalidPageTokenError,
+    decode_page_token,
+    encode_page_token,
+)
+
+if TYPE_CHECKING:
+    from google.cloud.firestore import AsyncClient
+
+SAMPLE_DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "sample_recommendations.json"
+
+# Rank 0 sorts first: most urgent, most impactful, least effort
+SORT_RANKS = {
+    "priority": {"critical": 0, "high": 1, "medium": 2, "low": 3},
+    "impact": {"high": 0, "medium": 1, "low": 2},
+    "effort": {"low": 0, "medium": 1, "high": 2},
+}
+
+# Filterable fields, all backed by an index
+INDEXED_FIELDS = ("pillar_id", "status", "priority", "control_id", "assessment_id")
+
+VALID_STATUSES = ["pending", "in_progress", "completed", "dismissed"]
+
+# Unowned recommendations (e.g. sample data) are visible to every user
+_SHARED_OWNER = ""
+
+
+class Recommendation(BaseModel):
+    """Recommendation document"""
+
+    model_config = ConfigDict(populate_by_name=True, extra="allow")
+
+    id: str
+    pillar_id: str = Field(alias="pillarId")
+    control_id: Optional[str] = Field(default=None, alias="controlId")
+    assessment_id: Optional[str] = Field(default=None, alias="assessmentId")
+    user_id: Optional[str] = Field(default=None, alias="userId")
+    title: str
+    description: str = ""
+    priority: str = "medium"
+    effort: str = "medium"
+    impact: str = "medium"
+    status: str = "pending"
+    remediation_steps: List[str] = Field(default_factory=list, alias="remediationSteps")
+    resources: List[str] = Field(default_factory=list)
+
+    def rank(self, sort_by: str) -> int:
+        """Numeric sort rank for priority, impact or effort"""
+        ranks = SORT_RANKS[sort_by]
+        return ranks.get(getattr(self, sort_by), len(ranks))
+
+    def to_api(self) -> dict:
+        """Serialize for API responses"""
+        return self.model_dump(exclude={"user_id"}, exclude_unset=True)
+
+    def to_document(self, merge: bool = False) -> dict:
+        """
+        Serialize for Firestore, including the rank fields used for sorting.
+
+        With merge only the fields set on this instance are included, so
+        the others keep their stored values.
+        """
+        document = self.model_dump(by_alias=True, exclude={"id"}, exclude_unset=merge)
+        for sort_by in SORT_RANKS:
+            if not merge or sort_by in self.model_fields_set:
+                document[f"{sort_by}Rank"] = self.rank(sort_by)
+        return document
+
+
+def composite_indexes(collection: str = "recommendations") -> List[dict]:
+    """
+    The Firestore composite indexes FirestoreRecommendationStore.list needs:
+    one per sort order and combination of filters.
+    """
+    indexes = []
+    for sort_by in SORT_RANKS:
+        for count in range(len(INDEXED_FIELDS) + 1):
+            for filtered in combinations(INDEXED_FIELDS, count):
+                fields = ["userId", *(Recommendation.model_fields[f].alias or f for f in filtered)]
+                indexes.append({
+                    "collectionGroup": collection,
+                    "queryScope": "COLLECTION",
+                    "fields": [
+                        *({"fieldPath": field, "order": "ASCENDING"} for field in fields),
+                        {"fieldPath": f"{sort_by}Rank", "order": "ASCENDING"},
+                    ],
+                })
+    return indexes
+
+
+class RecommendationStore(ABC):
+    """Storage interface for recommendations"""
+
+    @abstractmethod
+    async def list(
+        self,
+        user_id: str,
+        filters: Dict[str, str],
+        sort_by: str = "priority",
+        limit: int = 50,
+        page_token: Optional[str] = None,
+    ) -> Tuple[List[Recommendation], Optional[str]]:
+        """
+        List recommendations visible to a user.
+
+        Args:
+            user_id: Requesting user
+            filters: Exact-match filters keyed by INDEXED_FIELDS
+            sort_by: "priority", "impact" or "effort"
+            limit: Maximum number of results
+            page_token: Token returned with the previous page, if any
+
+        Returns:
+            (recommendations, next page token or None on the last page)
+
+        Raises:
+            InvalidPageTokenError: If page_token is malformed
+        """
+
+    @abstractmethod
+    async def get(self, user_id: str, recommendation_id: str) -> Optional[Recommendation]:
+        """Fetch a recommendation visible to the user, or None"""
+
+    @abstractmethod
+    async def update_status(
+        self,
+        user_id: str,
+        recommendation_id: str,
+        status: str,
+    ) -> Optional[Recommendation]:
+        """Set a recommendation's status; returns None if not found"""
+
+    @abstractmethod
+    async def upsert_many(
+        self, recommendations: Iterable[Recommendation], merge: bool = False
+    ) -> int:
+        """
+        Insert or replace recommendations; returns the number written.
+
+        With merge, fields not set on an instance (e.g. a status the user
+        changed) keep their stored values.
+        """
+
+
+class InMemoryRecommendationStore(RecommendationStore):
+    """
+    In-process store with a hash index per filterable field.
+
+    Filters intersect the matching id sets, smallest first, so combined
+    filters cost proportionally to the most selective one.
+
+    Records are keyed by (owner, id). A user changing a shared record gets
+    their own copy with the same id, which hides the shared one from them.
+    """
+
+    def __init__(self, recommendations: Iterable[Recommendation] = ()):
+        self._records: Dict[Tuple[str, str], Recommendation] = {}
+        self._indexes: Dict[str, Dict[Optional[str], Set[Tuple[str, str]]]] = {
+            field: defaultdict(set) for field in INDEXED_FIELDS + ("user_id",)
+        }
+        for recommendation in recommendations:
+            self._add(recommendation)
+
+    @classmethod
+    def from_file(cls, path: Path = SAMPLE_DATA_PATH) -> "InMemoryRecommendationStore":
+        """Seed a store from a JSON data file"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)["recommendations"]
+        return cls(Recommendation(**item) for item in data)
+
+    def _index_value(self, recommendation: Recommendation, field: str) -> Optional[str]:
+        value = getattr(recommendation, field)
+        if field == "user_id" and value is None:
+            return _SHARED_OWNER
+        return value
+
+    def _key(self, recommendation: Recommendation) -> Tuple[str, str]:
+        return self._index_value(recommendation, "user_id"), recommendation.id
+
+    def _add(self, recommendation: Recommendation) -> None:
+        key = self._key(recommendation)
+        self._remove(key)
+        self._records[key] = recommendation
+        for field, index in self._indexes.items():
+            index[self._index_value(recommendation, field)].add(key)
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        existing = self._records.pop(key, None)
+        if existing is None:
+            return
+        for field, index in self._indexes.items():
+            index[self._index_value(existing, field)].discard(key)
+
+    async def list(
+        self,
+        user_id: str,
+        filters: Dict[str, str],
+        sort_by: str = "priority",
+        limit: int = 50,
+        page_token: Optional[str] = None,
+    ) -> Tuple[List[Recommendation], Optional[str]]:
+        owner_index = self._indexes["user_id"]
+        own = owner_index.get(user_id, set())
+        # Shared records the user changed are replaced by their copies
+        copied = {(_SHARED_OWNER, i) for _, i in own}
+        candidate_sets = [own | (owner_index.get(_SHARED_OWNER, set()) - copied)]
+        for field, value in filters.items():
+            candidate_sets.append(self._indexes[field].get(value, set()))
+        candidate_sets.sort(key=len)
+        keys = {key[1]: key for key in set(candidate_sets[0]).intersection(*candidate_sets[1:])}
+
+        keyed = sorted((self._records[key].rank(sort_by), i) for i, key in keys.items())
+        start = 0
+        if page_token:
+            rank, last_id = decode_page_token(page_token, 2)
+            if not isinstance(rank, int) or not isinstance(last_id, str):
+                raise InvalidPageTokenError(page_token)
+            start = bisect.bisect_right(keyed, (rank, last_id))
+        page = keyed[start:start + limit]
+
+        next_token = None
+        if start + limit < len(keyed):
+            next_token = encode_page_token(*page[-1])
+        return [self._records[keys[i]] for _, i in page], next_token
+
+    async def get(self, user_id: str, recommendation_id: str) -> Optional[Recommendation]:
+        recommendation = self._records.get((user_id, recommendation_id))
+        if recommendation is None:
+            recommendation = self._records.get((_SHARED_OWNER, recommendation_id))
+        return recommendation
+
+    async def update_status(
+        self,
+        user_id: str,
+        recommendation_id: str,
+        status: str,
+    ) -> Optional[Recommendation]:
+        recommendation = await self.get(user_id, recommendation_id)
+        if recommendation is None:
+            return None
+        # Copy on write: a shared record stays unchanged for everyone else
+        updated = recommendation.model_copy(update={"status": status, "user_id": user_id})
+        self._add(updated)
+        return updated
+
+    async def upsert_many(
+        self, recommendations: Iterable[Recommendation], merge: bool = False
+    ) -> int:
+        count = 0
+        for recommendation in recommendations:
+            existing = self._records.get(self._key(recommendation))
+            if merge and existing is not None:
+                recommendation = existing.model_copy(
+                    update=recommendation.model_dump(exclude_unset=True)
+                )
+            self._add(recommendation)
+            count += 1
+        return count
+
+
+class FirestoreRecommendationStore(RecommendationStore):
+    """
+    Firestore-backed store.
+
+    Sorting uses the priorityRank/impactRank/effortRank fields written with
+    every document. Each filter combination needs a composite index on
+    (userId, filters..., <sort>Rank); all of them, as listed by
+    composite_indexes(), are declared in firestore.indexes.json.
+    """
+
+    def __init__(self, db: "AsyncClient", collection: str = "recommendations"):
+        self.db = db
+        self.collection = db.collection(collection)
+        # Reads are coalesced per user; every write invalidates its users
+        self.reads = SingleFlight(
+            "recommendations",
+            ttl_seconds=settings.READ_CACHE_TTL_SECONDS,
+            enabled=settings.READ_COALESCING_ENABLED,
+        )
+
+    async def list(
+        self,
+        user_id: str,
+        filters: Dict[str, str],
+        sort_by: str = "priority",
+        limit: int = 50,
+        page_token: Optional[str] = None,
+    ) -> Tuple[List[Recommendation], Optional[str]]:
+        key = ("list", tuple(sorted(filters.items())), sort_by, limit, page_token)
+        return await self.reads.do(
+            user_id, key, lambda: self._list(user_id, filters, sort_by, limit, page_token)
+        )
+
+    @firestore_operation("recommendations.list")
+    async def _list(
+        self,
+        user_id: str,
+        filters: Dict[str, str],
+        sort_by: str,
+        limit: int,
+        page_token: Optional[str],
+    ) -> Tuple[List[Recommendation], Optional[str]]:
+        rank_field = f"{sort_by}Rank"
+        query = self.collection.where("userId", "==", user_id)
+        for field, value in filters.items():
+            query = query.where(Recommendation.model_fields[field].alias or field, "==", value)
+        query = query.order_by(rank_field).order_by("__name__")
+        if page_token:
+            rank, last_id = decode_page_token(page_token, 2)
+            query = query.start_after({rank_field: rank, "__name__": last_id})
+        query = query.limit(limit + 1)
+
+        docs = [doc async for doc in query.stream()]
+        next_token = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_token = encode_page_token(docs[-1].get(rank_field), docs[-1].id)
+        return [Recommendation(id=doc.id, **doc.to_dict()) for doc in docs], next_token
+
+    async def get(self, user_id: str, recommendation_id: str) -> Optional[Recommendation]:
+        return await self.reads.do(
+            user_id, ("get", recommendation_id), lambda: self._get(user_id, recommendation_id)
+        )
+
+    @firestore_operation("recommendations.get")
+    async def _get(self, user_id: str, recommendation_id: str) -> Optional[Recommendation]:
+        doc = await self.collection.document(recommendation_id).get()
+        if not doc.exists or doc.get("userId") != user_id:
+            return None
+        return Recommendation(id=doc.id, **doc.to_dict())
+
+    @firestore_operation("recommendations.update_status")
+    async def update_status(
+        self,
+        user_id: str,
+        recommendation_id: str,
+        status: str,
+    ) -> Optional[Recommendation]:
+        from google.cloud.firestore import async_transactional
+
+        doc_ref = self.collection.document(recommendation_id)
+        changes = {"status": status, "updatedAt": datetime.utcnow().isoformat()}
+
+        # Read and write in one transaction so concurrent status changes
+        # are retried rather than rejected
+        @async_transactional
+        async def apply(transaction) -> Optional[Recommendation]:
+            doc = await doc_ref.get(transaction=transaction)
+            if not doc.exists or doc.get("userId") != user_id:
+                return None
+            transaction.update(doc_ref, changes)
+            return Recommendation(id=doc.id, **{**doc.to_dict(), **changes})
+
+        try:
+            return await apply(self.db.transaction())
+        finally:
+            self.reads.invalidate(user_id)
+
+    @firestore_operation("recommendations.upsert_many")
+    async def upsert_many(
+        self, recommendations: Iterable[Recommendation], merge: bool = False
+    ) -> int:
+        count = 0
+        batch = self.db.batch()
+        pending = 0
+        users = set()
+        try:
+            for recommendation in recommendations:
+                batch.set(
+                    self.collection.document(recommendation.id),
+                    recommendation.to_document(merge),
+                    merge=merge,
+                )
+                users.add(recommendation.user_id)
+                pending += 1
+                count += 1
+                # Firestore caps a batched write at 500 operations
+                if pending == 500:
+                    await batch.commit()
+                    batch = self.db.batch()
+                    pending = 0
+            if pending:
+                await batch.commit()
+        finally:
+            for user_id in users:
+                if user_id:
+                    self.reads.invalidate(user_id)
+        return count
+
+
+_store: Optional[RecommendationStore] = None
+
+
+def get_recommendation_store() -> RecommendationStore:
+    """Get the configured recommendation store (FastAPI dependency)"""
+    global _store
+    if _store is None:
+        if settings.RECOMMENDATIONS_BACKEND == "firestore":
+            _store = FirestoreRecommendationStore(get_async_firestore_client())
+        else:
+            _store = InMemoryRecommendationStore.from_file()
+    return _store
@@ -0,0 +1,111 @@
+"""
+Storage for the pre-generated remediation library
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.core.config import settings
+from app.core.metrics import firestore_operation
+from app.core.security import get_async_firestore_client
+
+if TYPE_CHECKING:
+    from google.cloud.firestore import AsyncClient
+
+# (control ID, cloud provider)
+EntryKey = Tuple[str, str]
+
+
+class RemediationEntry(BaseModel):
+    """Generic remediation guidance for one control on one cloud provider"""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    control_id: str = Field(alias="controlId")
+    cloud_provider: str = Field(alias="cloudProvider")
+    # The control name the guidance was written for; a renamed control is regenerated
+    control_name: str = Field(default="", alias="controlName")
+    # Prompt and model versions; entries from other versions are regenerated
+    version: str
+    remediation: str
+    steps: List[str] = Field(default_factory=list)
+    generated_at: str = Field(
+        default_factory=lambda: datetime.utcnow().isoformat(), alias="generatedAt"
+    )
+
+    @property
+    def key(self) -> EntryKey:
+        return self.control_id, self.cloud_provider
+
+    def to_document(self) -> dict:
+        """Serialize for Firestore"""
+        return self.model_dump(by_alias=True)
+
+
+class RemediationStore(ABC):
+    """Storage interface for remediation library entries"""
+
+    @abstractmethod
+    async def get_many(self, keys: Sequence[EntryKey]) -> Dict[EntryKey, RemediationEntry]:
+        """Fetch the entries that exist among keys"""
+
+    @abstractmethod
+    async def put(self, entry: RemediationEntry) -> None:
+        """Insert or replace an entry"""
+
+
+class InMemoryRemediationStore(RemediationStore):
+    """Process-local store; the library is regenerated after a restart"""
+
+    def __init__(self):
+        self._entries: Dict[EntryKey, RemediationEntry] = {}
+
+    async def get_many(self, keys: Sequence[EntryKey]) -> Dict[EntryKey, RemediationEntry]:
+        return {key: self._entries[key] for key in keys if key in self._entries}
+
+    async def put(self, entry: RemediationEntry) -> None:
+        self._entries[entry.key] = entry
+
+
+class FirestoreRemediationStore(RemediationStore):
+    """Firestore-backed store, so the library is generated once for every instance"""
+
+    def __init__(self, db: "AsyncClient", collection: str = "remediationLibrary"):
+        self.db = db
+        self.collection = db.collection(collection)
+
+    def _document(self, key: EntryKey):
+        control_id, cloud_provider = key
+        return self.collection.document(f"{cloud_provider}:{control_id}")
+
+    @firestore_operation("remediations.get_many")
+    async def get_many(self, keys: Sequence[EntryKey]) -> Dict[EntryKey, RemediationEntry]:
+        entries = {}
+        # One round trip for every key
+        async for doc in self.db.get_all([self._document(key) for key in keys]):
+            if doc.exists:
+                entry = RemediationEntry(**doc.to_dict())
+                entries[entry.key] = entry
+        return entries
+
+    @firestore_operation("remediations.put")
+    async def put(self, entry: RemediationEntry) -> None:
+        await self._document(entry.key).set(entry.to_document())
+
+
+_store: Optional[RemediationStore] = None
+
+
+def get_remediation_store() -> RemediationStore:
+    """Get the configured remediation library store"""
+    global _store
+    if _store is None:
+        if settings.REMEDIATION_LIBRARY_BACKEND == "firestore":
+            _store = FirestoreRemediationStore(
+                get_async_firestore_client(), settings.REMEDIATION_LIBRARY_FIRESTORE_COLLECTION
+            )
+        else:
+            _store = InMemoryRemediationStore()
+    return _store
@@ -0,0 +1,138 @@
+"""
+Per-user assessment aggregates for the dashboard, maintained incrementally
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+# Bump when the counters change shape; older documents are rebuilt on read
+SUMMARY_VERSION = 1
+
+
+def contribution(document: Optional[dict], sign: int = 1) -> dict:
+    """
+    What one assessment adds to its owner's summary.
+
+    Args:
+        document: Assessment fields (pillarId, status, score), or None
+        sign: 1 to add the assessment, -1 to remove it
+
+    Returns:
+        Nested counters in summary document layout
+    """
+    if document is None:
+        return {}
+    status = document.get("status") or "unknown"
+    delta = {"total": sign, "byStatus": {status: sign}}
+    pillar_id = document.get("pillarId")
+    if pillar_id:
+        pillar = {"count": sign, "byStatus": {status: sign}}
+        score = document.get("score")
+        if score is not None:
+            pillar["scoredCount"] = sign
+            pillar["scoreSum"] = sign * score
+        delta["pillars"] = {pillar_id: pillar}
+    return delta
+
+
+def merge_deltas(deltas: Iterable[dict]) -> dict:
+    """Add nested counters together, dropping the ones that cancel out"""
+    merged: dict = {}
+
+    def add(target: dict, source: dict) -> None:
+        for key, value in source.items():
+            if isinstance(value, dict):
+                add(target.setdefault(key, {}), value)
+            else:
+                target[key] = target.get(key, 0) + value
+
+    def prune(node: dict) -> dict:
+        pruned = {}
+        for key, value in node.items():
+            if isinstance(value, dict):
+                value = prune(value)
+                if value:
+                    pruned[key] = value
+            elif value:
+                pruned[key] = value
+        return pruned
+
+    for delta in deltas:
+        add(merged, delta)
+    return prune(merged)
+
+
+def summary_deltas(changes: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> Dict[str, dict]:
+    """
+    Summary changes caused by a set of assessment writes.
+
+    Args:
+        changes: (before, after) assessment documents; None for a document
+            that did not exist before or does not exist after
+
+    Returns:
+        Non-empty counter deltas keyed by the owning user ID
+    """
+    per_user: Dict[str, List[dict]] = {}
+    for before, after in changes:
+        for document, sign in ((before, -1), (after, 1)):
+            if document and document.get("userId"):
+                per_user.setdefault(document["userId"], []).append(contribution(document, sign))
+    deltas = {user_id: merge_deltas(parts) for user_id, parts in per_user.items()}
+    return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+
+def to_increments(delta: dict) -> dict:
+    """Turn counters into Firestore Increment transforms for a merge write"""
+    from google.cloud.firestore import Increment
+
+    return {
+        key: to_increments(value) if isinstance(value, dict) else Increment(value)
+        for key, value in delta.items()
+    }
+
+
+class PillarSummary(BaseModel):
+    """Rollup of one pillar's assessments"""
+
+    count: int = 0
+    by_status: Dict[str, int] = Field(default_factory=dict, alias="byStatus")
+    average_score: Optional[float] = Field(default=None, alias="averageScore")
+
+
+class AssessmentSummary(BaseModel):
+    """Rollup of a user's assessments"""
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    total: int = 0
+    by_status: Dict[str, int] = Field(default_factory=dict, alias="byStatus")
+    average_score: Optional[float] = Field(default=None, alias="averageScore")
+    pillars: Dict[str, PillarSummary] = Field(default_factory=dict)
+    updated_at: Optional[str] = Field(default=None, alias="updatedAt")
+
+    @classmethod
+    def from_document(cls, data: dict) -> "AssessmentSummary":
+        """Build the summary from stored counters, deriving the averages"""
+        pillars = {}
+        score_sum = scored = 0
+        for pillar_id, counters in (data.get("pillars") or {}).items():
+            pillar_scored = counters.get("scoredCount", 0)
+            pillar_sum = counters.get("scoreSum", 0)
+            score_sum += pillar_sum
+            scored += pillar_scored
+            pillars[pillar_id] = PillarSummary(
+                count=counters.get("count", 0),
+                byStatus={k: v for k, v in (counters.get("byStatus") or {}).items() if v},
+                averageScore=round(pillar_sum / pillar_scored, 1) if pillar_scored else None,
+            )
+        return cls(
+            total=data.get("total", 0),
+            byStatus={k: v for k, v in (data.get("byStatus") or {}).items() if v},
+            averageScore=round(score_sum / scored, 1) if scored else None,
+            pillars={pillar_id: p for pillar_id, p in sorted(pillars.items()) if p.count},
+            updatedAt=data.get("updatedAt"),
+        )
+
+    def to_api(self) -> dict:
+        return self.model_dump(by_alias=True)
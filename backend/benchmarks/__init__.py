@@ -0,0 +1,3 @@
+"""
+Load tests and micro-benchmarks for the WAFLens API
+"""
@@ -0,0 +1,183 @@
+"""
+Azure Advisor sync benchmark against a stub Advisor API.
+
+Runs a full sync, an unchanged re-sync and a sync after a share of the
+recommendations changed or was resolved, for each fetch concurrency, and
+reports pages, recommendations written and throughput. The stub (see
+benchmarks.fakes.FakeAdvisorAPI) runs in-process unless --serve starts it
+as a local HTTP server for the API itself to sync from.
+
+Usage (from backend/):
+    python -m benchmarks.advisor_sync --subscriptions 2 --per-category 1000
+    python -m benchmarks.advisor_sync --concurrency 1 4 10 --latency 0.1
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m benchmarks.advisor_sync \
+        --firestore emulator
+    python -m benchmarks.advisor_sync --serve 8081
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from typing import List, Optional
+
+import httpx
+
+from benchmarks.fakes import FakeAdvisorAPI
+from benchmarks.load import build_firestore
+from benchmarks.stats import format_table, write_json
+
+BENCH_USER = "bench-user"
+
+
+def subscription_ids(count: int) -> List[str]:
+    return [str(uuid.UUID(int=i + 1)) for i in range(count)]
+
+
+async def run(args: argparse.Namespace, concurrency: int) -> List[dict]:
+    """The four syncs for one fetch concurrency, each on fresh stores"""
+    from app.core.advisor_sync import AdvisorSync
+    from app.core.azure_advisor import AzureAdvisorClient
+    from app.repositories.advisor_sync import FirestoreSyncStateStore
+    from app.repositories.recommendations import FirestoreRecommendationStore
+
+    subscriptions = subscription_ids(args.subscriptions)
+    api = FakeAdvisorAPI(
+        subscriptions,
+        per_category=args.per_category,
+        page_size=args.page_size,
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    client = AzureAdvisorClient(
+        "bench-tenant",
+        "bench-client",
+        "bench-secret",
+        login_url="http://advisor",
+        management_url="http://advisor",
+        max_connections=concurrency,
+        retry_backoff_seconds=0.0,
+        transport=httpx.ASGITransport(app=api.app),
+    )
+    db = build_firestore(args)
+    # Separate collections per run, so emulator runs do not see each other
+    suffix = uuid.uuid4().hex[:8]
+    advisor_sync = AdvisorSync(
+        FirestoreRecommendationStore(db, f"benchRecommendations-{suffix}"),
+        FirestoreSyncStateStore(db, f"benchAdvisorSync-{suffix}"),
+        concurrency=concurrency,
+        queue_pages=args.queue_pages,
+        batch_size=args.batch_size,
+        get_client=lambda: client,
+    )
+
+    rows = []
+
+    async def sync(name: str) -> None:
+        report = await advisor_sync.sync(BENCH_USER, subscriptions)
+        rows.append({"name": name, "concurrency": concurrency, **report})
+        print(f"  {name} (concurrency {concurrency}): done", file=sys.stderr)
+
+    try:
+        await sync("full")
+        await sync("unchanged")
+        api.change(args.changed)
+        api.resolve(args.resolved)
+        await sync("changed")
+    finally:
+        await client.aclose()
+    for row in rows:
+        row["errors"] = len(row["errors"])
+    return rows
+
+
+async def serve(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    subscriptions = subscription_ids(args.subscriptions)
+    api = FakeAdvisorAPI(
+        subscriptions,
+        per_category=args.per_category,
+        page_size=args.page_size,
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    url = f"http://127.0.0.1:{args.serve}"
+    print(
+        f"Stub Advisor API on {url}\n"
+        f"  AZURE_LOGIN_URL={url} AZURE_MANAGEMENT_URL={url}\n"
+        f"  AZURE_ADVISOR_USER_SUBSCRIPTIONS='{json.dumps({'*': subscriptions})}'\n"
+        f"  subscription_ids: {subscriptions}",
+        file=sys.stderr,
+    )
+    config = uvicorn.Config(api.app, host="127.0.0.1", port=args.serve, log_level="warning")
+    await uvicorn.Server(config).serve()
+
+
+async def main(args: argparse.Namespace) -> int:
+    if args.serve:
+        await serve(args)
+        return 0
+
+    results = []
+    for concurrency in args.concurrency:
+        results.extend(await run(args, concurrency))
+
+    columns = [
+        "name", "concurrency", "pages", "not_modified", "fetched", "written", "unchanged",
+        "resolved", "errors", "duration_seconds", "items_per_second",
+    ]
+    print(format_table(results, columns))
+
+    if args.json:
+        await asyncio.to_thread(write_json, args.json, {"config": vars(args), "results": results})
+    return 1 if any(row["errors"] for row in results) else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--subscriptions", type=int, default=2)
+    parser.add_argument(
+        "--per-category", type=int, default=500,
+        help="Recommendations per subscription and Advisor category",
+    )
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Simulated seconds per Advisor page"
+    )
+    parser.add_argument(
+        "--throttle-rate", type=float, default=0.0,
+        help="Share of listing requests throttled with a 429",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 10],
+        help="Page chains fetched at once (one run each)",
+    )
+    parser.add_argument("--queue-pages", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--changed", type=float, default=0.05,
+        help="Share of recommendations changed before the last sync",
+    )
+    parser.add_argument(
+        "--resolved", type=float, default=0.02,
+        help="Share of recommendations resolved before the last sync",
+    )
+    parser.add_argument("--firestore", choices=["fake", "emulator"], default="fake")
+    parser.add_argument(
+        "--firestore-latency", type=float, default=0.002,
+        help="Simulated seconds per fake Firestore RPC",
+    )
+    parser.add_argument(
+        "--serve", type=int, metavar="PORT",
+        help="Only run the stub Advisor API as a local HTTP server on PORT",
+    )
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="Write results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
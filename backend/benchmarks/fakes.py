@@ -0,0 +1,671 @@
+"""
+In-process stand-ins for Firestore, Gemini, Firebase Auth and Azure Advisor
+used by the benchmarks
+"""
+import asyncio
+import copy
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import time
+import uuid
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, List, Optional
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+from app.core.ai_providers import AIProvider
+
+_update_clock = itertools.count(1)
+
+
+def _merge(target: dict, data: dict) -> dict:
+    """Apply a merge write: nested maps are merged and Increments added"""
+    from google.cloud.firestore import Increment
+
+    for key, value in data.items():
+        if isinstance(value, Increment):
+            target[key] = target.get(key, 0) + value.value
+        elif isinstance(value, dict):
+            current = target.get(key)
+            target[key] = _merge(current if isinstance(current, dict) else {}, value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+class FakeSnapshot:
+    """Subset of google.cloud.firestore.DocumentSnapshot"""
+
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[dict], update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str):
+        return self._data[field]
+
+
+class FakeDocumentReference:
+    """Subset of google.cloud.firestore.AsyncDocumentReference"""
+
+    def __init__(self, collection: "FakeCollection", document_id: str):
+        self.collection = collection
+        self.id = document_id
+
+    async def get(self, transaction=None, **kwargs) -> FakeSnapshot:
+        await self.collection.db.round_trip()
+        return self._snapshot()
+
+    def _snapshot(self) -> FakeSnapshot:
+        data = self.collection.docs.get(self.id)
+        return FakeSnapshot(self, copy.deepcopy(data), self.collection.update_times.get(self.id))
+
+    def _check_option(self, option) -> None:
+        if option is not None and self.collection.update_times.get(self.id) != option:
+            raise FailedPrecondition(f"Document {self.id} was modified")
+
+    def _set(self, data: dict, merge: bool = False) -> None:
+        before = copy.deepcopy(self.collection.docs.get(self.id))
+        if merge:
+            _merge(self.collection.docs.setdefault(self.id, {}), data)
+        else:
+            self.collection.docs[self.id] = _merge({}, data)
+        self.collection.update_times[self.id] = next(_update_clock)
+        self.collection.notify(self.id, before)
+
+    def _update(self, data: dict, option=None) -> None:
+        if self.id not in self.collection.docs:
+            raise KeyError(f"No document to update: {self.id}")
+        self._check_option(option)
+        before = copy.deepcopy(self.collection.docs[self.id])
+        self.collection.docs[self.id].update(copy.deepcopy(data))
+        self.collection.update_times[self.id] = next(_update_clock)
+        self.collection.notify(self.id, before)
+
+    async def create(self, data: dict) -> None:
+        await self.collection.db.round_trip()
+        if self.id in self.collection.docs:
+            raise AlreadyExists(f"Document already exists: {self.id}")
+        self._set(data)
+
+    async def set(self, data: dict, merge: bool = False) -> None:
+        await self.collection.db.round_trip()
+        self._set(data, merge)
+
+    async def update(self, data: dict, option=None) -> None:
+        await self.collection.db.round_trip()
+        self._update(data, option)
+
+    async def delete(self) -> None:
+        await self.collection.db.round_trip()
+        before = self.collection.docs.pop(self.id, None)
+        self.collection.update_times.pop(self.id, None)
+        self.collection.notify(self.id, before)
+
+
+class FakeQuery:
+    """
+    Subset of google.cloud.firestore.AsyncQuery: equality filters, ordering
+    (including __name__), projection, start_after cursors and limits.
+    """
+
+    def __init__(self, collection: "FakeCollection", filters=(), orders=(), limit=None,
+                 fields=None, cursor=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._fields = fields
+        self._cursor = cursor
+
+    def _copy(self, **changes) -> "FakeQuery":
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "fields": self._fields,
+            "cursor": self._cursor,
+            **changes,
+        }
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field: str, op: str, value) -> "FakeQuery":
+        if op != "==":
+            raise NotImplementedError(f"Unsupported operator: {op}")
+        return self._copy(filters=self._filters + ((field, value),))
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def select(self, fields) -> "FakeQuery":
+        return self._copy(fields=list(fields))
+
+    def start_after(self, values: dict) -> "FakeQuery":
+        return self._copy(cursor=values)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def matches(self, data: Optional[dict]) -> bool:
+        return data is not None and all(data.get(field) == value for field, value in self._filters)
+
+    def on_snapshot(self, callback) -> "FakeWatch":
+        """Listen to the query's filters; orders, cursors and limits are ignored"""
+        watch = FakeWatch(self, callback)
+        self._collection.watches.append(watch)
+        try:
+            # Like the real listener, the initial snapshot arrives asynchronously
+            asyncio.get_running_loop().call_soon(watch.initial)
+        except RuntimeError:
+            # Started from a worker thread: deliver it from there
+            watch.initial()
+        return watch
+
+    def _sort_key(self, document_id: str, data: dict) -> tuple:
+        return tuple(
+            document_id if field == "__name__" else data.get(field) for field, _ in self._orders
+        )
+
+    async def stream(self, transaction=None) -> AsyncIterator[FakeSnapshot]:
+        await self._collection.db.round_trip()
+        matches = [
+            (document_id, data)
+            for document_id, data in self._collection.docs.items()
+            if all(data.get(field) == value for field, value in self._filters)
+        ]
+        # Mixed directions are not needed by the repositories
+        descending = bool(self._orders) and self._orders[0][1] == "DESCENDING"
+        matches.sort(key=lambda item: self._sort_key(*item), reverse=descending)
+        if self._cursor is not None:
+            cursor = tuple(self._cursor[field] for field, _ in self._orders)
+            matches = [
+                item for item in matches
+                if (self._sort_key(*item) < cursor if descending else self._sort_key(*item) > cursor)
+            ]
+        if self._limit is not None:
+            matches = matches[:self._limit]
+        for document_id, data in matches:
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            reference = FakeDocumentReference(self._collection, document_id)
+            yield FakeSnapshot(
+                reference, copy.deepcopy(data), self._collection.update_times.get(document_id)
+            )
+
+
+class FakeWatch:
+    """
+    Subset of google.cloud.firestore.Watch. Callbacks run on the thread
+    that caused them (the event loop for writes) instead of a listener thread.
+    """
+
+    def __init__(self, query: FakeQuery, callback):
+        self.query = query
+        self.callback = callback
+        self.active = True
+
+    def _change(self, kind: str, document_id: str, data: dict) -> SimpleNamespace:
+        reference = FakeDocumentReference(self.query._collection, document_id)
+        return SimpleNamespace(
+            type=SimpleNamespace(name=kind),
+            document=FakeSnapshot(reference, copy.deepcopy(data)),
+        )
+
+    def initial(self) -> None:
+        if not self.active:
+            return
+        docs = self.query._collection.docs
+        changes = [
+            self._change("ADDED", document_id, data)
+            for document_id, data in docs.items()
+            if self.query.matches(data)
+        ]
+        self.callback([change.document for change in changes], changes, None)
+
+    def notify(self, document_id: str, before: Optional[dict], after: Optional[dict]) -> None:
+        was, now = self.query.matches(before), self.query.matches(after)
+        if now:
+            kind = "MODIFIED" if was else "ADDED"
+        elif was:
+            kind = "REMOVED"
+        else:
+            return
+        self.callback([], [self._change(kind, document_id, after if now else before)], None)
+
+    def unsubscribe(self) -> None:
+        self.active = False
+        if self in self.query._collection.watches:
+            self.query._collection.watches.remove(self)
+
+
+class FakeCollection(FakeQuery):
+    """Subset of google.cloud.firestore.AsyncCollectionReference"""
+
+    def __init__(self, db: "FakeFirestore", name: str):
+        super().__init__(self)
+        self.db = db
+        self.name = name
+        self.docs: Dict[str, dict] = {}
+        self.update_times: Dict[str, int] = {}
+        self.watches: List[FakeWatch] = []
+
+    def notify(self, document_id: str, before: Optional[dict]) -> None:
+        """Deliver a write to the listeners"""
+        after = self.docs.get(document_id)
+        for watch in list(self.watches):
+            watch.notify(document_id, before, after)
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        return FakeDocumentReference(self, document_id or uuid.uuid4().hex[:20])
+
+    async def add(self, data: dict):
+        reference = self.document()
+        await reference.set(data)
+        return None, reference
+
+
+class FakeWriteBatch:
+    """Subset of google.cloud.firestore.AsyncWriteBatch; commits atomically"""
+
+    def __init__(self, db: "FakeFirestore"):
+        self._db = db
+        self._writes: List[tuple] = []
+
+    def set(self, reference: FakeDocumentReference, data: dict, merge: bool = False) -> None:
+        self._writes.append(("set", reference, data, merge))
+
+    def update(self, reference: FakeDocumentReference, data: dict, option=None) -> None:
+        self._writes.append(("update", reference, data, option))
+
+    async def commit(self) -> None:
+        await self._db.round_trip()
+        for kind, reference, _, option in self._writes:
+            if kind == "update":
+                reference._check_option(option)
+        for kind, reference, data, extra in self._writes:
+            if kind == "set":
+                reference._set(data, merge=extra)
+            else:
+                reference._update(data)
+        self._writes = []
+
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    Transaction compatible with google.cloud.firestore.async_transactional.
+
+    Writes are buffered and applied on commit; the fake is single-process, so
+    there is no contention to retry.
+    """
+
+    _read_only = False
+    _max_attempts = 5
+    _id = b"fake-transaction"
+
+    def _clean_up(self) -> None:
+        self._writes = []
+
+    async def _begin(self, retry_id=None) -> None:
+        pass
+
+    async def _rollback(self) -> None:
+        self._writes = []
+
+    async def _commit(self) -> None:
+        await self.commit()
+
+
+class FakeFirestore:
+    """
+    In-memory subset of google.cloud.firestore.AsyncClient.
+
+    Every RPC awaits ``latency`` seconds so benchmarks can model network
+    round trips; with the default of 0 it still yields to the event loop.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._collections: Dict[str, FakeCollection] = {}
+
+    async def round_trip(self) -> None:
+        await asyncio.sleep(self.latency)
+
+    def collection(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(self, name)
+        return self._collections[name]
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def transaction(self, **kwargs) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    def write_option(self, last_update_time=None, **kwargs):
+        return last_update_time
+
+    async def get_all(self, references) -> AsyncIterator[FakeSnapshot]:
+        await self.round_trip()
+        for reference in references:
+            yield reference._snapshot()
+
+
+class FakeGeminiModel:
+    """
+    Stand-in for genai.GenerativeModel with a fixed response latency.
+
+    Streaming responses spread the latency evenly over ``stream_chunks`` chunks.
+    Requests for JSON output (a response schema) get ``json_response``.
+    """
+
+    def __init__(self, latency: float = 0.5, response_text: str = "", stream_chunks: int = 8):
+        self.latency = latency
+        self.stream_chunks = stream_chunks
+        self.response_text = response_text or (
+            "1. Enable multi-factor authentication for all privileged accounts.\n"
+            "2. Rotate service account keys and prefer workload identity.\n"
+            "3. Encrypt sensitive data with customer-managed keys.\n"
+        )
+        self.json_response = json.dumps({
+            "score": 68,
+            "summary": "Identity controls are solid; key management needs work.",
+            "recommendations": [
+                {
+                    "priority": "high",
+                    "title": "Rotate service account keys",
+                    "description": "Replace long-lived keys with workload identity.",
+                    "effort": "medium",
+                    "impact": "high",
+                    "control_id": "SEC-002",
+                },
+                {
+                    "priority": "medium",
+                    "title": "Encrypt sensitive data with customer-managed keys",
+                    "description": "Use Cloud KMS keys for regulated datasets.",
+                    "effort": "medium",
+                    "impact": "medium",
+                },
+            ],
+            "quick_wins": ["Enable MFA for all administrators"],
+            "strategic_improvements": ["Adopt organization policy constraints"],
+        })
+
+    def _usage(self, prompt: str, text: str) -> SimpleNamespace:
+        # Rough 4-characters-per-token estimate
+        return SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+        )
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, generation_config=None):
+        if stream:
+            return self._stream(prompt)
+        await asyncio.sleep(self.latency)
+        text = self.response_text
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            text = self.json_response
+        return SimpleNamespace(text=text, usage_metadata=self._usage(prompt, text))
+
+    async def _stream(self, prompt: str) -> AsyncIterator[SimpleNamespace]:
+        size = max(len(self.response_text) // self.stream_chunks, 1)
+        pieces = [
+            self.response_text[i:i + size] for i in range(0, len(self.response_text), size)
+        ]
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(self.latency / len(pieces))
+            usage = self._usage(prompt, self.response_text) if i == len(pieces) - 1 else None
+            yield SimpleNamespace(text=piece, usage_metadata=usage)
+
+
+def lognormal_latency(median: float, sigma: float = 0.0, seed: Optional[int] = None):
+    """
+    Latency sampler with a long right tail: the median is ``median`` and
+    about 1 call in 20 takes more than ``median * exp(1.645 * sigma)``.
+    With sigma 0 every call takes exactly ``median``.
+    """
+    rng = random.Random(seed)
+    return lambda: median * math.exp(rng.gauss(0.0, sigma)) if sigma else median
+
+
+class FakeProvider(AIProvider):
+    """
+    AI provider answering like FakeGeminiModel after a sampled latency.
+
+    ``latency`` is a number of seconds or a sampler such as
+    lognormal_latency(); for streams it is the time to the first chunk, the
+    remaining chunks following without delay. Calls fail with RuntimeError
+    at ``error_rate``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency=0.5,
+        error_rate: float = 0.0,
+        model_name: str = "",
+        seed: Optional[int] = None,
+    ):
+        super().__init__(name, model_name or f"fake-{name}")
+        self.sample = latency if callable(latency) else (lambda: latency)
+        self.error_rate = error_rate
+        self.model = FakeGeminiModel(latency=0.0)
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    async def _wait(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.sample())
+        if self._rng.random() < self.error_rate:
+            raise RuntimeError(f"{self.name} failed")
+
+    async def generate(self, prompt: str, generation_config: Optional[dict] = None):
+        await self._wait()
+        return await self.model.generate_content_async(prompt, generation_config=generation_config)
+
+    async def stream(self, prompt: str) -> AsyncIterator[SimpleNamespace]:
+        await self._wait()
+        async for chunk in await self.model.generate_content_async(prompt, stream=True):
+            yield chunk
+
+
+def fake_verify_firebase_token(uid: str = "bench-user"):
+    """
+    Dependency override for verify_firebase_token that skips verification.
+
+    The uid can be varied per request with an ``X-Bench-User`` header.
+    """
+    from fastapi import Request
+
+    async def verify(request: Request) -> dict:
+        return {"uid": request.headers.get("x-bench-user", uid)}
+
+    return verify
+
+
+class FakeTokenIssuer:
+    """
+    Signs Firebase-style ID tokens with a throwaway RSA key.
+
+    ``fetch_certs`` stands in for fetch_google_certs, so the real
+    FirebaseTokenVerifier can be benchmarked without network access.
+    """
+
+    def __init__(self, project_id: str = "waflens-bench", key_id: str = "bench-key"):
+        import datetime
+
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.x509.oid import NameOID
+        from google.auth import crypt
+
+        self.project_id = project_id
+        self.key_id = key_id
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "waflens-bench")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(minutes=5))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256())
+        )
+        self.certificate_pem = certificate.public_bytes(serialization.Encoding.PEM).decode()
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode()
+        self._signer = crypt.RSASigner.from_string(private_pem, key_id)
+
+    def mint(self, uid: str = "bench-user", lifetime: int = 3600, **claims) -> str:
+        """An ID token for uid; claims override the standard ones"""
+        from google.auth import jwt
+
+        issued_at = claims.pop("iat", int(time.time()))
+        payload = {
+            "iss": f"https://securetoken.google.com/{self.project_id}",
+            "aud": self.project_id,
+            "sub": uid,
+            "iat": issued_at,
+            "exp": issued_at + lifetime,
+            **claims,
+        }
+        return jwt.encode(self._signer, payload).decode("utf-8")
+
+    async def fetch_certs(self):
+        return {self.key_id: self.certificate_pem}, 3600.0
+
+
+class FakeAdvisorAPI:
+    """
+    Stub of the Azure AD token and Advisor recommendation endpoints.
+
+    ``app`` is an ASGI app: serve it with httpx.ASGITransport in-process,
+    or with uvicorn as a local stub server (AZURE_LOGIN_URL and
+    AZURE_MANAGEMENT_URL pointing at it). Listings are paged through
+    nextLink; each page carries an ETag that changes with its contents and
+    answers a matching If-None-Match with 304. A ``throttle_rate`` share of listing
+    requests is throttled with a 429.
+    """
+
+    def __init__(
+        self,
+        subscriptions: List[str],
+        per_category: int = 200,
+        page_size: int = 100,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        from app.core.azure_advisor import ADVISOR_CATEGORIES
+
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.requests = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._ids = itertools.count()
+        self.listings: Dict[tuple, List[dict]] = {
+            (subscription, category): [
+                self._item(subscription, category) for _ in range(per_category)
+            ]
+            for subscription in subscriptions
+            for category in ADVISOR_CATEGORIES
+        }
+        self.app = self._build()
+
+    def _item(self, subscription: str, category: str) -> dict:
+        number = next(self._ids)
+        resource = (
+            f"/subscriptions/{subscription}/resourceGroups/rg-{number % 20}"
+            f"/providers/Microsoft.Compute/virtualMachines/vm-{number}"
+        )
+        return {
+            "id": f"{resource}/providers/Microsoft.Advisor/recommendations/{uuid.UUID(int=number)}",
+            "name": str(uuid.UUID(int=number)),
+            "type": "Microsoft.Advisor/recommendations",
+            "properties": {
+                "category": category,
+                "impact": self._rng.choice(["High", "Medium", "Low"]),
+                "impactedField": "Microsoft.Compute/virtualMachines",
+                "impactedValue": f"vm-{number}",
+                "lastUpdated": "2025-01-01T00:00:00Z",
+                "shortDescription": {
+                    "problem": f"{category} issue on vm-{number}",
+                    "solution": f"Apply the {category} fix to vm-{number}",
+                },
+                "resourceMetadata": {"resourceId": resource},
+                "learnMoreLink": "https://aka.ms/advisor",
+            },
+        }
+
+    def change(self, fraction: float) -> int:
+        """Change the impact of a share of the recommendations; returns how many"""
+        changed = 0
+        for items in self.listings.values():
+            for item in self._rng.sample(items, int(len(items) * fraction)):
+                properties = item["properties"]
+                properties["impact"] = "High" if properties["impact"] != "High" else "Low"
+                changed += 1
+        return changed
+
+    def resolve(self, fraction: float) -> int:
+        """Drop a share of the recommendations, as Advisor does once they are fixed"""
+        resolved = 0
+        for items in self.listings.values():
+            count = int(len(items) * fraction)
+            del items[:count]
+            resolved += count
+        return resolved
+
+    def _build(self):
+        from fastapi import FastAPI, Request
+        from fastapi.responses import JSONResponse, Response
+
+        app = FastAPI()
+        category_filter = re.compile(r"Category eq '(\w+)'")
+
+        @app.post("/{tenant_id}/oauth2/v2.0/token")
+        async def token(tenant_id: str) -> dict:
+            return {"token_type": "Bearer", "access_token": f"fake-{tenant_id}", "expires_in": 3600}
+
+        @app.get("/subscriptions/{subscription_id}/providers/Microsoft.Advisor/recommendations")
+        async def recommendations(subscription_id: str, request: Request):
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            if self._rng.random() < self.throttle_rate:
+                self.throttled += 1
+                return Response(status_code=429, headers={"Retry-After": "0"})
+            match = category_filter.search(request.query_params.get("$filter", ""))
+            key = (subscription_id, match.group(1) if match else "")
+            if key not in self.listings:
+                return JSONResponse({"value": []})
+            skip = int(request.query_params.get("$skiptoken", 0))
+            items = self.listings[key]
+            body = {"value": items[skip:skip + self.page_size]}
+            if skip + self.page_size < len(items):
+                body["nextLink"] = str(
+                    request.url.include_query_params(**{"$skiptoken": skip + self.page_size})
+                )
+            digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8"))
+            etag = f'"{digest.hexdigest()[:16]}"'
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+            return JSONResponse(body, headers={"ETag": etag})
+
+        return app
@@ -0,0 +1,111 @@
+"""
+Import-time profile of the API entry point.
+
+Runs ``python -X importtime -c "import app.main"`` in fresh interpreters and
+reports the wall time of the import, the self time per top-level package
+and the direct imports with the largest cumulative cost. Heavy SDKs
+(Gemini, Firebase Admin, Firestore, NumPy) are expected to be absent: they
+load on first use or during the optional startup warm-up.
+
+Usage (from backend/):
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --module app.main --top 30 --runs 5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.stats import format_table
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Libraries that should stay off the startup path
+LAZY_MODULES = (
+    "google.generativeai",
+    "firebase_admin",
+    "google.cloud.firestore",
+    "numpy",
+    "google.auth.jwt",
+)
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _run(module: str, importtime: bool) -> subprocess.CompletedProcess:
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    args = [sys.executable]
+    if importtime:
+        args += ["-X", "importtime"]
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR)}
+    return subprocess.run(
+        args + ["-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Parse -X importtime output into rows of self/cumulative microseconds"""
+    rows = []
+    for line in stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            rows.append({
+                "module": match.group(4),
+                "depth": len(match.group(3)) // 2,
+                "self_ms": int(match.group(1)) / 1000,
+                "cumulative_ms": int(match.group(2)) / 1000,
+            })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    args = parser.parse_args(argv)
+
+    timings = [float(_run(args.module, importtime=False).stdout) for _ in range(args.runs)]
+    rows = parse_importtime(_run(args.module, importtime=True).stderr)
+
+    print(
+        f"import {args.module}: median {statistics.median(timings) * 1000:.0f} ms, "
+        f"min {min(timings) * 1000:.0f} ms over {args.runs} runs\n"
+    )
+    packages: Dict[str, float] = {}
+    for row in rows:
+        package = row["module"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + row["self_ms"]
+    by_package = sorted(
+        ({"package": name, "self_ms": ms} for name, ms in packages.items()),
+        key=lambda row: row["self_ms"],
+        reverse=True,
+    )
+    print(format_table(by_package[:args.top], ["package", "self_ms"]))
+
+    # Depth 1 rows are the imports triggered directly by the profiled module
+    direct = sorted(
+        (row for row in rows if row["depth"] == 1),
+        key=lambda row: row["cumulative_ms"],
+        reverse=True,
+    )
+    print()
+    print(format_table(direct[:args.top], ["module", "cumulative_ms", "self_ms"]))
+
+    loaded = {row["module"] for row in rows}
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    if eager:
+        print(f"\nImported eagerly (expected lazy): {', '.join(eager)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
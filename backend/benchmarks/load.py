@@ -0,0 +1,481 @@
+"""
+Load test driving every API router in-process at a fixed concurrency.
+
+Requests go through the full ASGI stack (middleware, dependencies,
+validation, repositories) with Firestore, Gemini and token verification
+replaced by the fakes in benchmarks.fakes, so runs are reproducible on a
+laptop or in CI. Each scenario reports throughput, p50/p95/p99 latency and the
+longest event-loop step, which exposes a synchronous call blocking the loop.
+
+Usage (from backend/):
+    python -m benchmarks.load --concurrency 32 --requests 2000
+    python -m benchmarks.load --scenarios assessments.list ai.chat --gemini-latency 0.8
+    python -m benchmarks.load --scenarios ai.chat --gemini-jitter 1.0 --providers 2 \
+        --hedge-delay 0.8
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import (
+    FakeFirestore,
+    FakeProvider,
+    fake_verify_firebase_token,
+    lognormal_latency,
+)
+from benchmarks.stats import BlockingCallMonitor, format_table, summarize, write_json
+
+RESPONSE_CHOICES = ("yes", "partial", "no", "not_applicable")
+PRIORITIES = ("critical", "high", "medium", "low")
+LEVELS = ("low", "medium", "high")
+RESOURCE_TYPES = (
+    "compute.googleapis.com/Instance",
+    "storage.googleapis.com/Bucket",
+    "sqladmin.googleapis.com/Instance",
+    "container.googleapis.com/Cluster",
+    "run.googleapis.com/Service",
+)
+RESOURCE_REGIONS = ("us-central1", "us-east1", "europe-west1", "asia-south1")
+
+
+@dataclass
+class BenchContext:
+    """Seeded ids the scenarios pick from"""
+    users: List[str]
+    assessments: Dict[str, List[str]]
+    recommendations: Dict[str, List[str]]
+    controls: Dict[str, List[str]]
+    rng: random.Random
+    conversations: Dict[str, str] = field(default_factory=dict)
+
+    def user(self) -> str:
+        return self.rng.choice(self.users)
+
+    def responses(self, pillar_id: str) -> List[dict]:
+        return [
+            {"control_id": control_id, "response": self.rng.choice(RESPONSE_CHOICES)}
+            for control_id in self.controls[pillar_id]
+        ]
+
+
+@dataclass
+class Scenario:
+    """One request shape; ``build`` returns (method, url, json body, user)"""
+    name: str
+    build: Callable[[BenchContext], tuple]
+
+
+def _assessment_create(ctx: BenchContext) -> tuple:
+    pillar_id = ctx.rng.choice(["security", "reliability"])
+    body = {"pillar_id": pillar_id, "responses": ctx.responses(pillar_id)}
+    return "POST", "/api/v1/assessments/", body, ctx.user()
+
+
+def _assessment_get(ctx: BenchContext) -> tuple:
+    user = ctx.user()
+    return "GET", f"/api/v1/assessments/{ctx.rng.choice(ctx.assessments[user])}", None, user
+
+
+def _assessment_update(ctx: BenchContext) -> tuple:
+    user = ctx.user()
+    assessment_id = ctx.rng.choice(ctx.assessments[user])
+    body = {"responses": ctx.responses("security"), "pillarId": "security"}
+    return "PATCH", f"/api/v1/assessments/{assessment_id}", body, user
+
+
+def _assessment_batch(ctx: BenchContext) -> tuple:
+    user = ctx.user()
+    ids = ctx.rng.sample(ctx.assessments[user], min(10, len(ctx.assessments[user])))
+    body = {"updates": [{"id": i, "changes": {"status": "in_progress"}} for i in ids]}
+    return "PATCH", "/api/v1/assessments/batch", body, user
+
+
+def _recommendation_get(ctx: BenchContext) -> tuple:
+    user = ctx.user()
+    return "GET", f"/api/v1/recommendations/{ctx.rng.choice(ctx.recommendations[user])}", None, user
+
+
+def _recommendation_status(ctx: BenchContext) -> tuple:
+    user = ctx.user()
+    recommendation_id = ctx.rng.choice(ctx.recommendations[user])
+    status = ctx.rng.choice(["pending", "in_progress", "completed"])
+    url = f"/api/v1/recommendations/{recommendation_id}/status?status={status}"
+    return "PATCH", url, None, user
+
+
+def _analyze(ctx: BenchContext) -> tuple:
+    user = ctx.user()
+    body = {
+        "assessment_id": ctx.rng.choice(ctx.assessments[user]),
+        "pillar": "security",
+        "responses": ctx.responses("security"),
+    }
+    return "POST", "/api/v1/ai/analyze", body, user
+
+
+def _chat(path: str) -> Callable[[BenchContext], tuple]:
+    def build(ctx: BenchContext) -> tuple:
+        body = {"message": f"How do I harden service accounts? ({ctx.rng.random():.6f})"}
+        return "POST", path, body, ctx.user()
+    return build
+
+
+def _conversation(ctx: BenchContext) -> tuple:
+    # Every request of a user continues the same, ever longer conversation
+    user = ctx.user()
+    body = {
+        "message": f"How do I harden service accounts? ({ctx.rng.random():.6f})",
+        "conversation_id": ctx.conversations[user],
+    }
+    return "POST", "/api/v1/ai/chat", body, user
+
+
+def _remediation(path: str, generic: bool = False) -> Callable[[BenchContext], tuple]:
+    def build(ctx: BenchContext) -> tuple:
+        body = {
+            "control": ctx.rng.choice(ctx.controls["security"]),
+            "current_state": f"Keys rotated every {ctx.rng.randint(30, 900)} days",
+        }
+        if generic:
+            # Answered from the remediation library
+            body["current_state"] = ctx.rng.choice(["Not implemented", "partial", "no"])
+            body["cloud_provider"] = ctx.rng.choice(["gcp", "azure", "aws"])
+        return "POST", path, body, ctx.user()
+    return build
+
+
+def _resources(path: str, filtered: bool = False) -> Callable[[BenchContext], tuple]:
+    # Every user's first assessment has an uploaded inventory
+    def build(ctx: BenchContext) -> tuple:
+        user = ctx.user()
+        url = f"/api/v1/assessments/{ctx.assessments[user][0]}/resources{path}"
+        if filtered:
+            url += f"?type={ctx.rng.choice(RESOURCE_TYPES)}&tag=env%3Dprod"
+        return "GET", url, None, user
+    return build
+
+
+def _get(path: str) -> Callable[[BenchContext], tuple]:
+    return lambda ctx: ("GET", path, None, ctx.user())
+
+
+SCENARIOS = [
+    Scenario("health", _get("/health")),
+    Scenario("pillars.list", _get("/api/v1/pillars/")),
+    Scenario("pillars.get", _get("/api/v1/pillars/security")),
+    Scenario("pillars.controls", _get("/api/v1/pillars/security/controls")),
+    Scenario("assessments.list", _get("/api/v1/assessments/?limit=20")),
+    Scenario("assessments.list_projected", _get("/api/v1/assessments/?limit=20&fields=score,status")),
+    Scenario("assessments.summary", _get("/api/v1/assessments/summary")),
+    Scenario("assessments.create", _assessment_create),
+    Scenario("assessments.get", _assessment_get),
+    Scenario("assessments.update", _assessment_update),
+    Scenario("assessments.batch", _assessment_batch),
+    Scenario("recommendations.list", _get("/api/v1/recommendations/?limit=20")),
+    Scenario("recommendations.filtered", _get("/api/v1/recommendations/?priority=high&sort=impact")),
+    Scenario("recommendations.get", _recommendation_get),
+    Scenario("recommendations.status", _recommendation_status),
+    Scenario("resources.list", _resources("?limit=1000")),
+    Scenario("resources.facets", _resources("/facets")),
+    Scenario("resources.facets_filtered", _resources("/facets", filtered=True)),
+    Scenario("ai.analyze", _analyze),
+    Scenario("ai.chat", _chat("/api/v1/ai/chat")),
+    Scenario("ai.chat_stream", _chat("/api/v1/ai/chat/stream")),
+    Scenario("ai.conversation", _conversation),
+    Scenario("ai.remediation", _remediation("/api/v1/ai/remediation")),
+    Scenario("ai.remediation_stream", _remediation("/api/v1/ai/remediation/stream")),
+    Scenario("ai.remediation_library", _remediation("/api/v1/ai/remediation", generic=True)),
+]
+
+
+def build_firestore(args: argparse.Namespace):
+    """In-memory fake, or a real client when running against the emulator"""
+    if args.firestore == "emulator":
+        if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            sys.exit("--firestore emulator requires FIRESTORE_EMULATOR_HOST")
+        from google.cloud.firestore import AsyncClient
+
+        return AsyncClient(project=os.environ.get("FIREBASE_PROJECT_ID", "waflens-bench"))
+    return FakeFirestore(latency=args.firestore_latency)
+
+
+async def resource_lines(user: str, count: int, rng: random.Random) -> AsyncIterator[bytes]:
+    """A synthetic NDJSON resource inventory"""
+    for i in range(count):
+        resource = {
+            "externalId": f"//cloud/{user}/resources/{i}",
+            "name": f"resource-{i}",
+            "type": rng.choice(RESOURCE_TYPES),
+            "region": rng.choice(RESOURCE_REGIONS),
+            "tags": {"env": rng.choice(["prod", "dev"]), "team": f"team-{rng.randrange(20)}"},
+        }
+        yield json.dumps(resource).encode("utf-8") + b"\n"
+
+
+async def seed(
+    args: argparse.Namespace, assessment_repo, recommendation_store, conversations
+) -> BenchContext:
+    """
+    Create the users, assessments, recommendations, resource inventories and
+    conversations the scenarios use
+    """
+    from app.core.catalog import get_catalog
+    from app.core.resources import get_resource_inventory
+    from app.repositories.recommendations import Recommendation
+
+    rng = random.Random(args.seed)
+    controls = {
+        pillar_id: [control["id"] for control in pillar_controls]
+        for pillar_id, pillar_controls in get_catalog().controls_by_pillar.items()
+    }
+    ctx = BenchContext(
+        users=[f"bench-user-{i}" for i in range(args.users)],
+        assessments={},
+        recommendations={},
+        controls=controls,
+        rng=rng,
+    )
+    for user in ctx.users:
+        created = []
+        for _ in range(args.assessments_per_user):
+            pillar_id = rng.choice(["security", "reliability"])
+            assessment = await assessment_repo.create(user, pillar_id, ctx.responses(pillar_id))
+            created.append(assessment.id)
+        ctx.assessments[user] = created
+
+        await get_resource_inventory().ingest(
+            created[0], resource_lines(user, args.resources_per_assessment, rng)
+        )
+
+        recommendations = [
+            Recommendation(
+                id=f"{user}-rec-{i}",
+                pillar_id=rng.choice(["security", "reliability"]),
+                control_id=rng.choice(controls["security"]),
+                user_id=user,
+                title=f"Recommendation {i}",
+                description="Generated for benchmarking",
+                priority=rng.choice(PRIORITIES),
+                effort=rng.choice(LEVELS),
+                impact=rng.choice(LEVELS),
+            )
+            for i in range(args.recommendations_per_user)
+        ]
+        await recommendation_store.upsert_many(recommendations)
+        ctx.recommendations[user] = [r.id for r in recommendations]
+
+        conversation = await conversations.create(user, rng.choice(created))
+        ctx.conversations[user] = conversation.id
+    return ctx
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    ctx: BenchContext,
+    total: int,
+    concurrency: int,
+    slow_step_threshold: float = 0.02,
+) -> Dict:
+    """Send ``total`` requests with ``concurrency`` workers and summarize them"""
+    requests = [scenario.build(ctx) for _ in range(total)]
+    latencies: List[float] = []
+    errors = 0
+    rejected = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal errors, rejected, next_index
+        while next_index < len(requests):
+            method, url, body, user = requests[next_index]
+            next_index += 1
+            start = time.perf_counter()
+            response = await client.request(
+                method, url, json=body, headers={"X-Bench-User": user}
+            )
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 500:
+                errors += 1
+            elif response.status_code >= 400:
+                # e.g. 409s from concurrent batch updates of the same documents
+                rejected += 1
+            # Requests that never suspend would otherwise run back to back in
+            # one loop step and be reported as blocking
+            await asyncio.sleep(0)
+
+    with BlockingCallMonitor(threshold=slow_step_threshold) as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    result = summarize(scenario.name, latencies, elapsed, errors)
+    result["rejected"] = rejected
+    result["max_step_ms"] = monitor.max_step * 1000
+    result["slow_steps"] = monitor.slow_steps
+    return result
+
+
+async def main(args: argparse.Namespace) -> int:
+    from app.main import app
+    from app.core.ai_client import get_ai_client
+    from app.core.ai_providers import AIRouter
+    from app.core.config import settings
+    from app.core.conversations import get_conversation_manager
+    from app.core.jobs import get_job_manager
+    from app.core.remediation_library import get_remediation_library
+    from app.core.scoring import get_scoring_engine
+    from app.core.security import verify_firebase_token
+    from app.repositories.assessments import AssessmentRepository, get_assessment_repository
+    from app.repositories.conversations import FirestoreConversationStore
+    from app.repositories.recommendations import (
+        FirestoreRecommendationStore,
+        get_recommendation_store,
+    )
+
+    db = build_firestore(args)
+    assessment_repo = AssessmentRepository(db, get_scoring_engine())
+    recommendation_store = FirestoreRecommendationStore(db)
+    app.dependency_overrides[verify_firebase_token] = fake_verify_firebase_token()
+    app.dependency_overrides[get_assessment_repository] = lambda: assessment_repo
+    app.dependency_overrides[get_recommendation_store] = lambda: recommendation_store
+    ai_client = get_ai_client()
+    ai_client.router = AIRouter(
+        {
+            f"fake{i}": FakeProvider(
+                f"fake{i}",
+                lognormal_latency(args.gemini_latency, args.gemini_jitter, seed=args.seed + i),
+            )
+            for i in range(args.providers)
+        },
+        hedge_delay=args.hedge_delay,
+        hedge_slots=ai_client.router.hedge_slots,
+    )
+    if not args.ai_cache:
+        ai_client.cache = None
+    # ai.analyze measures submission latency; queue every job rather than
+    # rejecting the backlog with 503s
+    settings.AI_JOBS_QUEUE_SIZE = 0
+    # A few simulated users exceed any realistic per-user limit
+    settings.AI_RATE_LIMIT_ENABLED = args.rate_limit
+    jobs = get_job_manager()
+    jobs.get_repository = lambda: assessment_repo
+    jobs.get_recommendations = lambda: recommendation_store
+    conversations = get_conversation_manager()
+    conversations.store = FirestoreConversationStore(db)
+    conversations.get_repository = lambda: assessment_repo
+
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    unknown = set(args.scenarios or ()) - {s.name for s in SCENARIOS}
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = []
+    async with app.router.lifespan_context(app):
+        ctx = await seed(args, assessment_repo, recommendation_store, conversations)
+        # Measure serving from a filled remediation library
+        await get_remediation_library().fill()
+        gc.freeze()
+        # Unhandled exceptions become 500s and count as errors
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in selected:
+                total = args.requests
+                if scenario.name.startswith("ai."):
+                    total = args.ai_requests or args.requests
+                # Warm up imports, caches and lazily built singletons
+                await run_scenario(client, scenario, ctx, min(args.concurrency, total), 1)
+                # Start every scenario from a clean heap so a full collection
+                # triggered by earlier garbage is not charged to it
+                gc.collect()
+                results.append(await run_scenario(
+                    client, scenario, ctx, total, args.concurrency,
+                    slow_step_threshold=args.max_step_ms / 1000,
+                ))
+                # Let queued analysis jobs and summaries finish before the next scenario
+                await jobs.join()
+                await conversations.join()
+                print(f"  {scenario.name}: done", file=sys.stderr)
+
+    columns = [
+        "name", "requests", "errors", "rejected", "throughput", "p50_ms", "p95_ms", "p99_ms",
+        "max_ms", "max_step_ms", "slow_steps",
+    ]
+    print(format_table(results, columns))
+
+    if args.json:
+        await asyncio.to_thread(write_json, args.json, {"config": vars(args), "results": results})
+
+    failed = [r["name"] for r in results if r["errors"]]
+    if args.fail_on_slow_steps:
+        failed += [r["name"] for r in results if r["slow_steps"]]
+    if failed:
+        print(f"\nFailed: {', '.join(sorted(set(failed)))}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument(
+        "--ai-requests", type=int, default=0,
+        help="Requests per AI scenario (defaults to --requests)",
+    )
+    parser.add_argument("--scenarios", nargs="*", help="Scenario names (default: all)")
+    parser.add_argument(
+        "--rate-limit", action="store_true",
+        help="Enforce per-user AI rate limits (429s count as rejected)",
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--assessments-per-user", type=int, default=50)
+    parser.add_argument("--recommendations-per-user", type=int, default=50)
+    parser.add_argument(
+        "--resources-per-assessment", type=int, default=5000,
+        help="Resources uploaded to each user's first assessment",
+    )
+    parser.add_argument("--firestore", choices=["fake", "emulator"], default="fake")
+    parser.add_argument(
+        "--firestore-latency", type=float, default=0.002,
+        help="Simulated seconds per fake Firestore RPC",
+    )
+    parser.add_argument(
+        "--gemini-latency", type=float, default=0.5,
+        help="Simulated median seconds per fake Gemini call",
+    )
+    parser.add_argument(
+        "--gemini-jitter", type=float, default=0.0,
+        help="Sigma of the log-normal Gemini latency (0 for a fixed latency)",
+    )
+    parser.add_argument(
+        "--providers", type=int, default=1, help="Fake AI providers behind the router"
+    )
+    parser.add_argument(
+        "--hedge-delay", type=float, default=0.0,
+        help="Seconds before a hedged request goes to another provider (0 disables)",
+    )
+    parser.add_argument("--ai-cache", action="store_true", help="Keep the AI response cache")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    parser.add_argument(
+        "--max-step-ms", type=float, default=20.0,
+        help="Event-loop steps longer than this count as blocking",
+    )
+    parser.add_argument(
+        "--fail-on-slow-steps", action="store_true",
+        help="Exit non-zero if any scenario blocks the event loop",
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,226 @@
+"""
+Micro-benchmarks for hot helpers on the request path.
+
+Covers ID token verification (cold and cached), response serialization,
+page tokens, AI cache keys, prompt encoding, analysis parsing and scoring. Results are per-call timings, so
+they are comparable across commits on the same machine.
+
+Usage (from backend/):
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter scoring --json micro.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fakes import FakeTokenIssuer
+from benchmarks.stats import format_table
+
+
+def measure(name: str, func: Callable[[], object], repeat: int = 5, min_time: float = 0.2) -> Dict:
+    """Best-of-``repeat`` time per call, auto-scaling the loop count"""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {
+        "name": name,
+        "loops": number,
+        "us_per_call": best * 1e6,
+        "calls_per_sec": 1 / best if best > 0 else float("inf"),
+    }
+
+
+def measure_async(name: str, func: Callable[[], object], calls: int = 2000) -> Dict:
+    """Time an async callable by awaiting it ``calls`` times in one event loop"""
+    async def run() -> float:
+        await func()
+        start = time.perf_counter()
+        for _ in range(calls):
+            await func()
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    per_call = elapsed / calls
+    return {
+        "name": name,
+        "loops": calls,
+        "us_per_call": per_call * 1e6,
+        "calls_per_sec": 1 / per_call if per_call > 0 else float("inf"),
+    }
+
+
+def _sample_responses(rng: random.Random, control_ids: List[str]) -> List[dict]:
+    return [
+        {"control_id": control_id, "response": rng.choice(["yes", "partial", "no", "not_applicable"])}
+        for control_id in control_ids
+    ]
+
+
+def bench_token_verification() -> List[Dict]:
+    from app.core.token_verifier import CertificateStore, FirebaseTokenVerifier
+
+    issuer = FakeTokenIssuer()
+    verifier = FirebaseTokenVerifier(issuer.project_id, CertificateStore(issuer.fetch_certs))
+    token = issuer.mint()
+
+    async def cached() -> None:
+        await verifier.verify(token)
+
+    certs = {issuer.key_id: issuer.certificate_pem}
+    return [
+        measure("auth.verify_signature", lambda: verifier._verify_sync(token, certs)),
+        measure_async("auth.verify_cached", cached),
+    ]
+
+
+def bench_serialization() -> List[Dict]:
+    from fastapi import Request
+
+    from app.core.catalog import catalog_response, get_catalog
+    from app.repositories.assessments import Assessment
+    from app.repositories.recommendations import InMemoryRecommendationStore
+
+    rng = random.Random(1)
+    control_ids = [c["id"] for c in get_catalog().controls_by_pillar["security"]]
+    documents = [
+        {
+            "pillarId": "security",
+            "userId": "bench-user",
+            "responses": _sample_responses(rng, control_ids),
+            "status": "in_progress",
+            "score": 50,
+            "pillarScores": {"security": 50.0},
+            "controlScores": {c: 50.0 for c in control_ids},
+            "createdAt": "2024-01-01T00:00:00",
+            "updatedAt": "2024-01-01T00:00:00",
+        }
+        for _ in range(50)
+    ]
+    assessments = [Assessment(id=f"a{i}", **doc) for i, doc in enumerate(documents)]
+    recommendations = list(InMemoryRecommendationStore.from_file()._records.values())
+    entry = get_catalog().pillars_entry
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    revalidation = Request({
+        "type": "http",
+        "method": "GET",
+        "headers": [(b"if-none-match", entry.etag.encode("latin-1"))],
+    })
+
+    return [
+        measure(
+            "serialize.assessment_page_parse_50",
+            lambda: [Assessment(id=f"a{i}", **doc) for i, doc in enumerate(documents)],
+        ),
+        measure(
+            "serialize.assessment_page_dump_50",
+            lambda: json.dumps([a.to_api() for a in assessments]),
+        ),
+        measure(
+            "serialize.recommendation_to_api",
+            lambda: [r.to_api() for r in recommendations],
+        ),
+        measure("serialize.catalog_response", lambda: catalog_response(request, entry)),
+        measure("serialize.catalog_not_modified", lambda: catalog_response(revalidation, entry)),
+    ]
+
+
+def bench_pagination() -> List[Dict]:
+    from app.repositories.pagination import decode_page_token, encode_page_token
+
+    token = encode_page_token("2024-01-01T00:00:00.000000", "abcdefghij0123456789")
+    return [
+        measure(
+            "pagination.encode",
+            lambda: encode_page_token("2024-01-01T00:00:00.000000", "abcdefghij0123456789"),
+        ),
+        measure("pagination.decode", lambda: decode_page_token(token, 2)),
+    ]
+
+
+def bench_ai_cache() -> List[Dict]:
+    from app.core.ai_cache import make_cache_key
+
+    rng = random.Random(2)
+    inputs = {"pillar": "security", "responses": _sample_responses(rng, [f"c{i}" for i in range(40)])}
+    return [
+        measure(
+            "ai_cache.make_key_40_responses",
+            lambda: make_cache_key("gemini-1.5-flash", "analyze", "1", inputs),
+        ),
+    ]
+
+
+def bench_prompts() -> List[Dict]:
+    from app.core.analysis import parse_analysis
+    from app.core.prompts import chunk_rows, encode_table
+
+    from benchmarks.fakes import FakeGeminiModel
+
+    analysis = FakeGeminiModel().json_response
+    truncated = analysis[:len(analysis) * 2 // 3]
+    rng = random.Random(4)
+    responses = _sample_responses(rng, [f"c{i}" for i in range(40)])
+    large = _sample_responses(rng, [f"c{i}" for i in range(5000)])
+    return [
+        measure("prompts.repr_40_responses", lambda: str(responses)),
+        measure("prompts.encode_table_40_responses", lambda: encode_table(responses)),
+        measure("prompts.chunk_5000_responses", lambda: chunk_rows(large, 6000), repeat=3),
+        measure("prompts.parse_analysis", lambda: parse_analysis(analysis)),
+        measure("prompts.parse_truncated_analysis", lambda: parse_analysis(truncated)),
+    ]
+
+
+def bench_scoring() -> List[Dict]:
+    from app.core.catalog import get_catalog
+    from app.core.scoring import ScoringEngine
+
+    engine = ScoringEngine(get_catalog().controls_by_pillar)
+    rng = random.Random(3)
+    control_ids = [c["id"] for c in get_catalog().controls_by_pillar["security"]]
+    single = _sample_responses(rng, control_ids)
+    pillars = ["security"] * 1000
+    many = [_sample_responses(rng, control_ids) for _ in pillars]
+    return [
+        measure("scoring.score_one", lambda: engine.score("security", single)),
+        measure("scoring.score_many_1000", lambda: engine.score_many(pillars, many), repeat=3),
+    ]
+
+
+GROUPS = {
+    "auth": bench_token_verification,
+    "serialize": bench_serialization,
+    "pagination": bench_pagination,
+    "ai_cache": bench_ai_cache,
+    "prompts": bench_prompts,
+    "scoring": bench_scoring,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--filter", nargs="*", choices=sorted(GROUPS), help="Groups to run")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for group, bench in GROUPS.items():
+        if args.filter and group not in args.filter:
+            continue
+        results.extend(bench())
+
+    print(format_table(results, ["name", "loops", "us_per_call", "calls_per_sec"]))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Latency statistics and report formatting shared by the benchmarks
+"""
+import asyncio
+import json
+import math
+import time
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return math.nan
+    rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def write_json(path: str, data) -> None:
+    """Save a report; run it with asyncio.to_thread from async code"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def summarize(name: str, latencies: List[float], elapsed: float, errors: int = 0) -> Dict:
+    """Throughput and latency percentiles (in milliseconds) for one run"""
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        "name": name,
+        "requests": count,
+        "errors": errors,
+        "throughput": count / elapsed if elapsed > 0 else math.nan,
+        "mean_ms": sum(ordered) / count * 1000 if count else math.nan,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000 if count else math.nan,
+    }
+
+
+def format_table(rows: List[Dict], columns: Sequence[str]) -> str:
+    """Render result rows as a fixed-width text table"""
+    def cell(value) -> str:
+        if isinstance(value, float):
+            return f"{value:,.2f}"
+        return str(value)
+
+    rendered = [[cell(row.get(column, "")) for column in columns] for row in rows]
+    widths = [
+        max([len(column)] + [len(values[i]) for values in rendered])
+        for i, column in enumerate(columns)
+    ]
+    lines = [
+        "  ".join(column.ljust(width) for column, width in zip(columns, widths)),
+        "  ".join("-" * width for width in widths),
+    ]
+    for values in rendered:
+        lines.append("  ".join(
+            value.ljust(width) if i == 0 else value.rjust(width)
+            for i, (value, width) in enumerate(zip(values, widths))
+        ))
+    return "\n".join(lines)
+
+
+class BlockingCallMonitor:
+    """
+    Times every event-loop callback while active.
+
+    A coroutine step that runs for long without awaiting (a synchronous SDK
+    call, heavy CPU work in a handler) stalls every other request on the
+    instance. This is the same measurement asyncio's debug mode makes for
+    ``slow_callback_duration``, without the rest of debug mode's overhead.
+    """
+
+    def __init__(self, threshold: float = 0.02):
+        self.threshold = threshold
+        self.max_step = 0.0
+        self.slow_steps = 0
+        self._original_run = None
+
+    def __enter__(self) -> "BlockingCallMonitor":
+        monitor = self
+        original_run = self._original_run = asyncio.Handle._run
+
+        def timed_run(handle):
+            start = time.perf_counter()
+            try:
+                return original_run(handle)
+            finally:
+                duration = time.perf_counter() - start
+                if duration > monitor.threshold:
+                    monitor.slow_steps += 1
+                if duration > monitor.max_step:
+                    monitor.max_step = duration
+
+        asyncio.Handle._run = timed_run
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        asyncio.Handle._run = self._original_run
@@ -0,0 +1,35 @@
+"""
+Shared fixtures: the API wired to in-memory fakes (see benchmarks.fakes)
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.scoring import get_scoring_engine
+from app.core.security import verify_firebase_token
+from app.main import app
+from app.repositories.assessments import AssessmentRepository, get_assessment_repository
+from benchmarks.fakes import FakeFirestore, fake_verify_firebase_token
+
+
+@pytest.fixture
+def db() -> FakeFirestore:
+    return FakeFirestore()
+
+
+@pytest.fixture
+def assessment_repo(db: FakeFirestore) -> AssessmentRepository:
+    return AssessmentRepository(db, get_scoring_engine())
+
+
+@pytest.fixture
+def client(assessment_repo: AssessmentRepository):
+    """
+    A test client authenticated as "test-user"; other users are selected
+    with an X-Bench-User header
+    """
+    app.dependency_overrides[verify_firebase_token] = fake_verify_firebase_token("test-user")
+    app.dependency_overrides[get_assessment_repository] = lambda: assessment_repo
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
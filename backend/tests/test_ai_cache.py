@@ -0,0 +1,45 @@
+"""
+AI response cache: local LRU/TTL and the Firestore backend
+"""
+from datetime import datetime, timezone
+
+from app.core.ai_cache import AIResponseCache, FirestoreCacheBackend, make_cache_key
+
+
+def test_cache_key_is_stable():
+    key = make_cache_key("m", "chat", "1", {"b": 1, "a": 2})
+    assert key == make_cache_key("m", "chat", "1", {"a": 2, "b": 1})
+    assert key != make_cache_key("m", "chat", "2", {"a": 2, "b": 1})
+
+
+async def test_local_entries_are_bounded():
+    cache = AIResponseCache(max_entries=2, ttl_seconds=60)
+    for key in "abc":
+        await cache.set(key, {"text": key})
+    assert await cache.get("a") is None
+    assert await cache.get("c") == {"text": "c"}
+
+
+async def test_firestore_entries_expire_at_a_timestamp(db):
+    backend = FirestoreCacheBackend(db, "aiCache")
+    await backend.set("k", {"text": "hi"}, ttl_seconds=60)
+    stored = (await db.collection("aiCache").document("k").get()).to_dict()
+    # A datetime, so a Firestore TTL policy can use the field
+    assert isinstance(stored["expiresAt"], datetime)
+    assert await backend.get("k") == {"text": "hi"}
+
+    await backend.set("gone", {"text": "old"}, ttl_seconds=-1)
+    assert await backend.get("gone") is None
+    assert await backend.get("missing") is None
+
+
+async def test_backend_fills_local_cache(db):
+    backend = FirestoreCacheBackend(db, "aiCache")
+    await backend.set("k", {"text": "hi"}, ttl_seconds=60)
+    cache = AIResponseCache(max_entries=10, ttl_seconds=60, backend=backend)
+    assert await cache.get("k") == {"text": "hi"}
+    assert await cache.get("k") == {"text": "hi"}
+    assert (cache.hits, cache.backend_hits) == (2, 1)
+    assert datetime.now(timezone.utc) < (
+        await db.collection("aiCache").document("k").get()
+    ).to_dict()["expiresAt"]
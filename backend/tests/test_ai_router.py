@@ -0,0 +1,77 @@
+"""
+AIRouter ranking, failover, error decay and hedging
+"""
+import asyncio
+
+import pytest
+
+from app.core.ai_providers import CHAT, AIRouter, ProviderStats
+from benchmarks.fakes import FakeProvider
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_error_rate_decays_while_idle():
+    clock = Clock()
+    stats = ProviderStats(alpha=0.5, error_half_life=60.0, clock=clock)
+    stats.observe(0.1, False)
+    assert stats.error_rate == pytest.approx(0.5)
+    clock.now = 60.0
+    assert stats.error_rate == pytest.approx(0.25)
+    clock.now = 600.0
+    assert stats.error_rate < 0.001
+    stats.observe(0.1, True)
+    assert stats.error_rate < 0.001
+
+
+async def test_fails_over_and_recovers_after_errors():
+    flaky = FakeProvider("flaky", latency=0.0, error_rate=1.0)
+    steady = FakeProvider("steady", latency=0.0)
+    router = AIRouter({"flaky": flaky, "steady": steady}, {CHAT: ["flaky", "steady"]})
+    clock = Clock()
+    router.stats["flaky"] = ProviderStats(0.2, error_half_life=60.0, clock=clock)
+
+    await router.generate(CHAT, "hello")
+    assert (flaky.calls, steady.calls) == (1, 1)
+    assert [p.name for p in router.candidates(CHAT)] == ["steady", "flaky"]
+    # Rank on the error penalty alone, not on measured latencies
+    router.stats["flaky"].latency = 0.1
+    router.stats["steady"].latency = 0.2
+    assert [p.name for p in router.candidates(CHAT)] == ["steady", "flaky"]
+
+    # Without new samples the penalty fades and the provider is tried again
+    clock.now = 3600.0
+    assert router.stats["flaky"].error_rate < 1e-6
+    assert [p.name for p in router.candidates(CHAT)] == ["flaky", "steady"]
+
+
+async def test_hedge_counts_against_the_concurrency_pool():
+    slow = FakeProvider("slow", latency=0.2)
+    fast = FakeProvider("fast", latency=0.0)
+    slots = asyncio.Semaphore(2)
+    router = AIRouter(
+        {"slow": slow, "fast": fast}, {CHAT: ["slow", "fast"]}, hedge_delay=0.01, hedge_slots=slots
+    )
+    async with slots:
+        await router.generate(CHAT, "hello")
+        assert (slow.calls, fast.calls) == (1, 1)
+        # The hedge's slot was given back
+        assert slots._value == 1
+
+
+async def test_no_hedge_when_the_pool_is_full():
+    slow = FakeProvider("slow", latency=0.05)
+    fast = FakeProvider("fast", latency=0.0)
+    slots = asyncio.Semaphore(1)
+    router = AIRouter(
+        {"slow": slow, "fast": fast}, {CHAT: ["slow", "fast"]}, hedge_delay=0.01, hedge_slots=slots
+    )
+    async with slots:
+        await router.generate(CHAT, "hello")
+    assert (slow.calls, fast.calls) == (1, 0)
@@ -0,0 +1,69 @@
+"""
+Analysis parsing and JSON repair
+"""
+import json
+
+import pytest
+
+from app.core.analysis import AnalysisParseError, parse_analysis, repair_json
+
+RECOMMENDATION = {
+    "priority": "High",
+    "title": "Enable MFA",
+    "description": "Require MFA for admins",
+    "effort": "low",
+    "impact": "high",
+}
+ANALYSIS = {"score": 72, "summary": "Mostly fine", "recommendations": [RECOMMENDATION]}
+
+
+def test_valid_analysis():
+    analysis = parse_analysis(json.dumps(ANALYSIS))
+    assert analysis.score == 72 and analysis.summary == "Mostly fine"
+    assert analysis.recommendations[0].priority == "high"
+
+
+def test_fenced_analysis_with_prose():
+    text = f"Here is the analysis:\n```json\n{json.dumps(ANALYSIS)}\n```\nThanks"
+    assert parse_analysis(text) == parse_analysis(json.dumps(ANALYSIS))
+
+
+def test_trailing_commas_and_raw_newlines():
+    text = '{"score": 50, "summary": "two\nlines", "recommendations": [],}'
+    assert json.loads(repair_json(text)) == {
+        "score": 50, "summary": "two\nlines", "recommendations": []
+    }
+    assert parse_analysis(text).summary == "two\nlines"
+
+
+def test_truncated_recommendation_is_dropped():
+    text = json.dumps(ANALYSIS)[:-2] + ', {"priority": "low", "title": "Rota'
+    analysis = parse_analysis(text)
+    assert [r.title for r in analysis.recommendations] == ["Enable MFA"]
+
+
+def test_truncated_string_value_is_closed():
+    assert json.loads(repair_json('{"score": 10, "summary": "cut off he')) == {
+        "score": 10, "summary": "cut off he"
+    }
+
+
+@pytest.mark.parametrize("text", [
+    '{"score": 8',
+    '{"score": 80, "summary": "Partial',
+    '{"score": 80, "summ',
+])
+def test_truncated_before_required_fields(text):
+    with pytest.raises(AnalysisParseError):
+        parse_analysis(text)
+
+
+def test_complete_analysis_without_recommendations_is_accepted():
+    # Only cut-off responses must carry every required field
+    assert parse_analysis('{"score": 90}').recommendations == []
+
+
+@pytest.mark.parametrize("text", ["no json here", "[1, 2, 3]", ""])
+def test_non_object_input(text):
+    with pytest.raises(AnalysisParseError):
+        parse_analysis(text)
@@ -0,0 +1,166 @@
+"""
+Azure Advisor paging, incremental sync and POST /api/v1/azure/advisor/sync
+authorization
+"""
+import httpx
+import pytest
+
+from app.core.advisor_sync import AdvisorSync, get_advisor_sync, recommendation_id
+from app.core.azure_advisor import AzureAdvisorClient, AzureAdvisorError
+from app.core.config import settings
+from app.main import app
+from app.repositories.advisor_sync import InMemorySyncStateStore
+from app.repositories.recommendations import InMemoryRecommendationStore
+from benchmarks.fakes import FakeAdvisorAPI
+
+SUBSCRIPTION = "00000000-0000-0000-0000-000000000001"
+OTHER_SUBSCRIPTION = "00000000-0000-0000-0000-000000000002"
+DEFAULT_SUBSCRIPTION = "00000000-0000-0000-0000-000000000003"
+
+
+def advisor_client(next_link: str, requested: list) -> AzureAdvisorClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        if request.url.path.endswith("/token"):
+            return httpx.Response(200, json={"access_token": "secret", "expires_in": 3600})
+        if "$skiptoken" in str(request.url):
+            return httpx.Response(200, json={"value": [{"id": "b"}]})
+        return httpx.Response(200, json={"value": [{"id": "a"}], "nextLink": next_link})
+
+    return AzureAdvisorClient(
+        "tenant",
+        "client",
+        "secret",
+        login_url="https://login.example",
+        management_url="https://management.example",
+        transport=httpx.MockTransport(handler),
+    )
+
+
+async def test_pages_follow_next_link_on_management_host():
+    requested = []
+    client = advisor_client("https://management.example:443/next?$skiptoken=1", requested)
+    pages = [page.items async for page in client.pages(SUBSCRIPTION, "Cost")]
+    assert pages == [[{"id": "a"}], [{"id": "b"}]]
+
+
+@pytest.mark.parametrize("next_link", [
+    "https://attacker.example/next?$skiptoken=1",
+    "http://management.example/next?$skiptoken=1",
+    "https://management.example:8443/next?$skiptoken=1",
+    "https://management.example.attacker.example/next?$skiptoken=1",
+])
+async def test_pages_refuse_next_link_to_other_origin(next_link):
+    requested = []
+    client = advisor_client(next_link, requested)
+    pages = []
+    with pytest.raises(AzureAdvisorError):
+        async for page in client.pages(SUBSCRIPTION, "Cost"):
+            pages.append(page.items)
+    assert pages == [[{"id": "a"}]]
+    assert next_link not in requested
+
+
+@pytest.fixture
+def advisor():
+    """An Advisor sync against the fake Advisor API, 3 pages per category"""
+    api = FakeAdvisorAPI([SUBSCRIPTION], per_category=5, page_size=2, seed=1)
+    client = AzureAdvisorClient(
+        "tenant",
+        "client",
+        "secret",
+        login_url="https://login.example",
+        management_url="https://management.example",
+        transport=httpx.ASGITransport(app=api.app),
+    )
+    store = InMemoryRecommendationStore()
+    sync = AdvisorSync(store, InMemorySyncStateStore(), get_client=lambda: client)
+    return api, sync, store
+
+
+def sync_id(item: dict) -> str:
+    return recommendation_id("alice", item["id"])
+
+
+async def test_unchanged_pages_are_not_fetched_again(advisor):
+    api, sync, store = advisor
+    first = await sync.sync("alice", [SUBSCRIPTION])
+    assert (first["pages"], first["written"], first["not_modified"]) == (15, 25, 0)
+
+    second = await sync.sync("alice", [SUBSCRIPTION])
+    assert (second["pages"], second["not_modified"], second["written"]) == (0, 15, 0)
+
+    # Only the last page of one category changes
+    api.listings[(SUBSCRIPTION, "Cost")][-1]["properties"]["shortDescription"]["problem"] = "x"
+    third = await sync.sync("alice", [SUBSCRIPTION])
+    assert (third["pages"], third["not_modified"]) == (1, 14)
+    assert (third["written"], third["unchanged"], third["resolved"]) == (1, 0, 0)
+
+    # The pages answered with 304 still count as listed
+    fourth = await sync.sync("alice", [SUBSCRIPTION])
+    assert (fourth["not_modified"], fourth["resolved"]) == (15, 0)
+
+
+async def test_changes_past_the_first_page_are_synced(advisor):
+    api, sync, store = advisor
+    await sync.sync("alice", [SUBSCRIPTION])
+    listing = api.listings[(SUBSCRIPTION, "Security")]
+    await store.update_status("alice", sync_id(listing[0]), "in_progress")
+    # Resolving the first recommendation shifts every page after it
+    del listing[0]
+    listing[-1]["properties"]["shortDescription"]["problem"] = "Changed"
+
+    result = await sync.sync("alice", [SUBSCRIPTION])
+    assert (result["pages"], result["resolved"], result["written"]) == (2, 1, 1)
+    assert result["not_modified"] == 12
+    moved = await store.get("alice", sync_id(listing[-1]))
+    assert moved.title == "Changed"
+
+
+class RecordingSync:
+    def __init__(self):
+        self.calls = []
+
+    async def sync(self, user_id, subscription_ids):
+        self.calls.append((user_id, subscription_ids))
+        return {"subscriptions": len(subscription_ids)}
+
+
+@pytest.fixture
+def advisor_sync(client, monkeypatch):
+    monkeypatch.setattr(settings, "AZURE_SUBSCRIPTION_ID", DEFAULT_SUBSCRIPTION)
+    monkeypatch.setattr(settings, "AZURE_ADVISOR_USER_SUBSCRIPTIONS", {"test-user": [SUBSCRIPTION]})
+    recording = RecordingSync()
+    app.dependency_overrides[get_advisor_sync] = lambda: recording
+    return recording
+
+
+def sync(client, subscription_ids, user="test-user"):
+    return client.post(
+        "/api/v1/azure/advisor/sync",
+        json={"subscription_ids": subscription_ids},
+        headers={"X-Bench-User": user},
+    )
+
+
+def test_sync_allowed_subscriptions(client, advisor_sync):
+    assert sync(client, [SUBSCRIPTION.upper(), DEFAULT_SUBSCRIPTION]).status_code == 200
+    assert client.post("/api/v1/azure/advisor/sync").status_code == 200
+    assert advisor_sync.calls == [
+        # Normalized once, for authorization and sync state alike
+        ("test-user", [SUBSCRIPTION, DEFAULT_SUBSCRIPTION]),
+        ("test-user", [DEFAULT_SUBSCRIPTION]),
+    ]
+
+
+def test_sync_rejects_other_subscriptions(client, advisor_sync):
+    assert sync(client, [SUBSCRIPTION, OTHER_SUBSCRIPTION]).status_code == 403
+    # Mapped subscriptions are per user
+    assert sync(client, [SUBSCRIPTION], user="mallory").status_code == 403
+    assert advisor_sync.calls == []
+
+
+def test_sync_subscriptions_shared_with_every_user(client, advisor_sync, monkeypatch):
+    monkeypatch.setattr(settings, "AZURE_ADVISOR_USER_SUBSCRIPTIONS", {"*": [OTHER_SUBSCRIPTION]})
+    assert sync(client, [OTHER_SUBSCRIPTION], user="mallory").status_code == 200
+    assert sync(client, [SUBSCRIPTION], user="mallory").status_code == 403
@@ -0,0 +1,121 @@
+"""
+AssessmentRepository.update_many and PATCH /api/v1/assessments/batch
+"""
+import pytest
+
+from app.repositories.assessments import AssessmentConflictError
+
+
+class RacingFirestore:
+    """Writes to a document right after update_many has read it"""
+
+    def __init__(self, db, collection: str, document_id: str):
+        self._db = db
+        self._collection = collection
+        self._document_id = document_id
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    async def get_all(self, references):
+        async for snapshot in self._db.get_all(references):
+            yield snapshot
+        await self._db.collection(self._collection).document(self._document_id).update(
+            {"status": "completed"}
+        )
+
+
+async def test_outcomes_per_assessment(assessment_repo):
+    repo = assessment_repo
+    mine = await repo.create("alice", "security", [])
+    theirs = await repo.create("bob", "security", [])
+    results = await repo.update_many("alice", {
+        mine.id: {"status": "completed", "responses": [{"control_id": "x", "response": "yes"}]},
+        theirs.id: {"status": "completed"},
+        "missing": {"status": "completed"},
+    })
+    assert results == {mine.id: "updated", theirs.id: "forbidden", "missing": "not_found"}
+    updated = await repo.get(mine.id)
+    assert updated.status == "completed" and updated.score == 100
+    assert (await repo.get(theirs.id)).status == "in_progress"
+
+
+async def test_nothing_to_update_writes_nothing(assessment_repo):
+    theirs = await assessment_repo.create("bob", "security", [])
+    results = await assessment_repo.update_many("alice", {theirs.id: {"status": "x"}})
+    assert results == {theirs.id: "forbidden"}
+    assert (await assessment_repo.get(theirs.id)).status == "in_progress"
+
+
+async def test_concurrent_change_aborts_the_whole_batch(db, assessment_repo):
+    first = await assessment_repo.create("alice", "security", [])
+    second = await assessment_repo.create("alice", "security", [])
+    assessment_repo.db = RacingFirestore(db, "assessments", second.id)
+    with pytest.raises(AssessmentConflictError):
+        await assessment_repo.update_many("alice", {
+            first.id: {"status": "archived"},
+            second.id: {"status": "archived"},
+        })
+    assessment_repo.db = db
+    # Neither update nor its summary counters were applied
+    assert (await assessment_repo.get(first.id)).status == "in_progress"
+    assert (await assessment_repo.get(second.id)).status == "completed"
+    summary = await assessment_repo.get_summary("alice")
+    assert "archived" not in summary.by_status
+
+
+def test_batch_endpoint_reports_conflicts(client, db, assessment_repo):
+    created = [
+        client.post("/api/v1/assessments/", json={"pillar_id": "security", "responses": []}).json()
+        for _ in range(2)
+    ]
+    ids = [assessment["id"] for assessment in created]
+    response = client.patch("/api/v1/assessments/batch", json={"updates": [
+        {"id": ids[0], "changes": {"status": "archived"}},
+        {"id": ids[0], "changes": {"status": "completed"}},
+        {"id": "missing", "changes": {"status": "archived"}},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated"] == 1
+    assert body["results"] == [
+        {"id": ids[0], "status": "updated"},
+        {"id": "missing", "status": "not_found"},
+    ]
+
+    assessment_repo.db = RacingFirestore(db, "assessments", ids[1])
+    response = client.patch(
+        "/api/v1/assessments/batch", json={"updates": [{"id": ids[1], "changes": {"status": "archived"}}]}
+    )
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("changes", [
+    {"userId": "mallory"},
+    {"score": 100},
+    {"pillarScores": {"security": 100.0}},
+    {"createdAt": "2000-01-01T00:00:00"},
+    {"analysis": {"summary": "forged"}},
+])
+def test_server_owned_fields_are_rejected(client, changes):
+    created = client.post(
+        "/api/v1/assessments/", json={"pillar_id": "security", "responses": []}
+    ).json()
+    single = client.patch(f"/api/v1/assessments/{created['id']}", json=changes)
+    batch = client.patch(
+        "/api/v1/assessments/batch", json={"updates": [{"id": created["id"], "changes": changes}]}
+    )
+    assert (single.status_code, batch.status_code) == (422, 422)
+    stored = client.get(f"/api/v1/assessments/{created['id']}").json()
+    assert stored["userId"] == "test-user" and stored["score"] == created["score"]
+
+
+def test_writable_fields_are_applied(client):
+    created = client.post(
+        "/api/v1/assessments/", json={"pillar_id": "security", "responses": []}
+    ).json()
+    response = client.patch(
+        f"/api/v1/assessments/{created['id']}", json={"status": "completed", "responses": []}
+    )
+    assert response.status_code == 200
+    assert client.get(f"/api/v1/assessments/{created['id']}").json()["status"] == "completed"
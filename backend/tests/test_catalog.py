@@ -0,0 +1,69 @@
+"""
+Catalog immutability and the pillar endpoints' ETag revalidation
+"""
+import pytest
+
+from app.core.catalog import Catalog
+
+PILLARS = [{
+    "id": "security",
+    "slug": "sec",
+    "name": "Security",
+    "tags": ["core"],
+    "controls": [{"id": "sec-1", "name": "IAM", "refs": [{"url": "https://example.com"}]}],
+}]
+
+
+def test_pillars_and_controls_are_frozen():
+    catalog = Catalog(PILLARS)
+    pillar = catalog.get_pillar("sec")
+    _, control = catalog.find_control("sec-1")
+    with pytest.raises(TypeError):
+        pillar["name"] = "changed"
+    with pytest.raises(TypeError):
+        control["name"] = "changed"
+    with pytest.raises(TypeError):
+        control["refs"][0]["url"] = "changed"
+    assert pillar["tags"] == ("core",)
+    assert catalog.controls_by_pillar["security"] == (control,)
+
+
+def test_entries_do_not_follow_changes_to_the_input():
+    pillars = [{**PILLARS[0], "controls": [dict(PILLARS[0]["controls"][0])]}]
+    catalog = Catalog(pillars)
+    body = catalog.controls_entry("security").body
+    pillars[0]["controls"][0]["name"] = "changed"
+    assert catalog.find_control("sec-1")[1]["name"] == "IAM"
+    assert catalog.controls_entry("security").body == body == (
+        b'[{"id":"sec-1","name":"IAM","refs":[{"url":"https://example.com"}]}]'
+    )
+
+
+@pytest.mark.parametrize("path", [
+    "/api/v1/pillars/",
+    "/api/v1/pillars/security",
+    "/api/v1/pillars/security/controls",
+])
+def test_matching_etag_is_not_modified(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        cached = client.get(path, headers={"If-None-Match": if_none_match})
+        assert cached.status_code == 304 and cached.content == b""
+        assert cached.headers["ETag"] == etag
+    assert client.get(path, headers={"If-None-Match": '"other"'}).content == first.content
+
+
+def test_controls_are_private_and_pillars_public(client):
+    assert client.get("/api/v1/pillars/").headers["Cache-Control"].startswith("public")
+    controls = client.get("/api/v1/pillars/security/controls")
+    assert controls.headers["Cache-Control"].startswith("private")
+
+
+@pytest.mark.parametrize("path", ["/api/v1/pillars/missing", "/api/v1/pillars/missing/controls"])
+def test_missing_pillar(client, path):
+    response = client.get(path, headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Pillar not found"}
@@ -0,0 +1,86 @@
+"""
+ChangeFeed listeners, deltas and omitted fields, against the fake Firestore
+"""
+import asyncio
+import threading
+from contextlib import aclosing
+
+from app.core.changes import ChangeFeed, document_delta
+
+
+def test_document_delta():
+    assert document_delta({"a": 1, "b": 2}, {"a": 1, "b": 3, "c": None}) == {
+        "set": {"b": 3, "c": None}
+    }
+    assert document_delta({"a": 1, "b": 2}, {"a": 1}) == {"unset": ["b"]}
+    assert document_delta({"a": 1}, {"a": 1}) == {}
+
+
+async def next_event(stream):
+    return await asyncio.wait_for(stream.__anext__(), 1)
+
+
+async def test_feed_omits_fields_and_sends_deltas(db):
+    assessments = db.collection("assessments")
+    await assessments.document("a1").set({"userId": "alice", "status": "in_progress", "responses": [1]})
+    await assessments.document("b1").set({"userId": "bob", "status": "in_progress"})
+    threads = []
+
+    def get_db():
+        threads.append(threading.current_thread())
+        return db
+
+    feed = ChangeFeed(["assessments"], omitted_fields={"assessments": ["responses"]}, get_db=get_db)
+    async with aclosing(feed.stream("alice")) as stream:
+        assert await next_event(stream) == (
+            "snapshot", {"assessments": [{"id": "a1", "userId": "alice", "status": "in_progress"}]}
+        )
+        # The client and listeners are created off the event loop thread
+        assert threads and threads[0] is not threading.main_thread()
+
+        await assessments.document("a1").update({"status": "completed", "responses": [1, 2]})
+        assert await next_event(stream) == ("change", {
+            "collection": "assessments",
+            "changes": [{"type": "modified", "id": "a1", "set": {"status": "completed"}}],
+        })
+        # A change to omitted fields only is not sent
+        await assessments.document("a1").update({"responses": []})
+        await assessments.document("a1").delete()
+        assert await next_event(stream) == ("change", {
+            "collection": "assessments", "changes": [{"type": "removed", "id": "a1"}],
+        })
+    feed.close()
+
+
+async def test_concurrent_connections_share_listeners(db):
+    starts = []
+
+    def get_db():
+        starts.append(1)
+        return db
+
+    feed = ChangeFeed(["assessments"], get_db=get_db)
+    first, second = feed.stream("alice"), feed.stream("alice")
+    events = await asyncio.gather(next_event(first), next_event(second))
+    assert events[0] == events[1] == ("snapshot", {"assessments": []})
+    assert len(starts) == 1 and feed.connections("alice") == 2
+    assert len(db.collection("assessments").watches) == 1
+    await first.aclose()
+    await second.aclose()
+    feed.close()
+    assert db.collection("assessments").watches == []
+
+
+async def test_failed_start_is_not_kept(db):
+    def get_db():
+        raise RuntimeError("no credentials")
+
+    feed = ChangeFeed(["assessments"], get_db=get_db)
+    stream = feed.stream("alice")
+    try:
+        await next_event(stream)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("expected the start to fail")
+    assert feed.connections("alice") == 0 and feed._feeds == {}
@@ -0,0 +1,120 @@
+"""
+SingleFlight joining, caching and read-your-writes invalidation
+"""
+import asyncio
+
+import pytest
+
+from app.core.coalesce import SingleFlight
+
+
+class Reads:
+    """A read that blocks until released and counts its executions"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        return {"call": call}
+
+
+async def settle() -> None:
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def test_concurrent_calls_join_one_flight():
+    flight, read = SingleFlight("test"), Reads()
+    first = asyncio.create_task(flight.do("alice", ("get", 1), read))
+    second = asyncio.create_task(flight.do("alice", ("get", 1), read))
+    other_key = asyncio.create_task(flight.do("alice", ("get", 2), read))
+    other_scope = asyncio.create_task(flight.do("bob", ("get", 1), read))
+    await settle()
+    read.release.set()
+
+    results = await asyncio.gather(first, second, other_key, other_scope)
+    assert read.calls == 3
+    assert results[0] is results[1]
+    assert results[2] != results[0] and results[3] != results[0]
+    # Without a TTL nothing outlives the flight
+    assert (await flight.do("alice", ("get", 1), read))["call"] == 4
+
+
+async def test_results_are_cached_for_the_ttl():
+    flight, read = SingleFlight("test", ttl_seconds=60), Reads()
+    read.release.set()
+    first = await flight.do("alice", ("get",), read)
+    assert await flight.do("alice", ("get",), read) is first
+    assert read.calls == 1
+
+
+async def test_flights_started_before_invalidate_are_not_joined():
+    flight, read = SingleFlight("test", ttl_seconds=60), Reads()
+    stale = asyncio.create_task(flight.do("alice", ("get",), read))
+    await settle()
+    flight.invalidate("alice")
+    fresh = asyncio.create_task(flight.do("alice", ("get",), read))
+    await settle()
+    assert read.calls == 2
+    read.release.set()
+    assert (await stale)["call"] == 1
+    assert (await fresh)["call"] == 2
+
+    # Only the flight started after the write was cached
+    assert (await flight.do("alice", ("get",), read))["call"] == 2
+    assert read.calls == 2
+
+
+async def test_invalidate_drops_cached_results_of_the_scope_only():
+    flight, read = SingleFlight("test", ttl_seconds=60), Reads()
+    read.release.set()
+    await flight.do("alice", ("get",), read)
+    await flight.do("bob", ("get",), read)
+    flight.invalidate("alice")
+    assert (await flight.do("alice", ("get",), read))["call"] == 3
+    assert (await flight.do("bob", ("get",), read))["call"] == 2
+
+
+async def test_exceptions_are_shared_and_not_cached():
+    flight = SingleFlight("test", ttl_seconds=60)
+    release = asyncio.Event()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        raise RuntimeError(f"failed {calls}")
+
+    callers = [asyncio.create_task(flight.do("alice", ("get",), failing)) for _ in range(3)]
+    await settle()
+    release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(r, RuntimeError) and str(r) == "failed 1" for r in results)
+
+    with pytest.raises(RuntimeError, match="failed 2"):
+        await flight.do("alice", ("get",), failing)
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight, read = SingleFlight("test"), Reads()
+    leaving = asyncio.create_task(flight.do("alice", ("get",), read))
+    staying = asyncio.create_task(flight.do("alice", ("get",), read))
+    await settle()
+    leaving.cancel()
+    await settle()
+    read.release.set()
+    assert (await staying)["call"] == 1
+    assert leaving.cancelled()
+
+
+async def test_disabled_runs_every_call():
+    flight, read = SingleFlight("test", ttl_seconds=60, enabled=False), Reads()
+    read.release.set()
+    await asyncio.gather(*(flight.do("alice", ("get",), read) for _ in range(3)))
+    assert read.calls == 3
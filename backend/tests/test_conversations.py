@@ -0,0 +1,158 @@
+"""
+Conversation history budgets, rolling summaries and ownership, against the
+fake Firestore
+"""
+import pytest
+
+from app.core.ai_client import get_ai_client
+from app.core.conversations import (
+    ConversationManager,
+    get_conversation_manager,
+    recent_turns,
+    turns_to_fold,
+)
+from app.repositories.conversations import (
+    ROLE_ASSISTANT,
+    ROLE_USER,
+    FirestoreConversationStore,
+    Turn,
+)
+
+# 10 estimated tokens each
+MESSAGE = "m" * 36
+
+
+def turns(*roles: str, text: str = MESSAGE):
+    return [Turn(seq=i, role=role, text=text) for i, role in enumerate(roles, start=1)]
+
+
+class FakeAIClient:
+    """Records the prompt inputs; answers and summaries are fixed strings"""
+
+    def __init__(self):
+        self.chats = []
+        self.summaries = []
+
+    async def chat(self, message, context=None, summary=None, history=()) -> str:
+        self.chats.append({"context": context, "summary": summary, "history": list(history)})
+        return "a" * len(MESSAGE)
+
+    async def summarize_conversation(self, summary, history) -> str:
+        self.summaries.append((summary, list(history)))
+        return f"summary {len(self.summaries)}"
+
+
+def test_recent_turns_fit_the_budget():
+    history = turns(ROLE_USER, ROLE_ASSISTANT, ROLE_USER, ROLE_ASSISTANT)
+    assert [t.seq for t in recent_turns(history, 25)] == [3, 4]
+    assert [t.seq for t in recent_turns(history, 100)] == [1, 2, 3, 4]
+    # The newest turn is kept however long it is
+    assert [t.seq for t in recent_turns(history, 1)] == [4]
+
+
+def test_turns_to_fold():
+    history = turns(*[ROLE_USER, ROLE_ASSISTANT] * 3)
+    assert turns_to_fold(history, 60) == 0
+    # Down to half the budget, in whole exchanges
+    assert turns_to_fold(history, 50) == 4
+    assert turns_to_fold(history, 55) == 4
+    # The last exchange always stays
+    assert turns_to_fold(history, 1) == 4
+
+
+def test_fold_does_not_split_an_exchange():
+    history = turns(ROLE_USER, ROLE_ASSISTANT, ROLE_ASSISTANT, ROLE_USER, ROLE_ASSISTANT)
+    # Two turns would do, but the third is still part of the first exchange
+    assert turns_to_fold(history, 45) == 3
+
+
+async def test_old_turns_are_folded_into_the_summary(db):
+    client = FakeAIClient()
+    store = FirestoreConversationStore(db)
+    conversations = ConversationManager(
+        store, history_token_budget=40, get_client=lambda: client
+    )
+    conversation = await conversations.create("alice")
+
+    for _ in range(3):
+        await conversations.reply(conversation.id, "alice", MESSAGE)
+    await conversations.join()
+
+    stored = await store.get(conversation.id)
+    assert (stored.summary, stored.summarized_through) == ("summary 1", 4)
+    assert [turn.seq for turn in stored.turns] == [5, 6] and stored.turn_count == 6
+    # Only the previous summary and the folded turns are summarized
+    assert client.summaries == [("", [(ROLE_USER, MESSAGE), (ROLE_ASSISTANT, "a" * 36)] * 2)]
+
+    await conversations.reply(conversation.id, "alice", MESSAGE)
+    prompt = client.chats[-1]
+    assert prompt["summary"] == "summary 1" and len(prompt["history"]) == 2
+
+    for _ in range(2):
+        await conversations.reply(conversation.id, "alice", MESSAGE)
+    await conversations.join()
+    stored = await store.get(conversation.id)
+    assert (stored.summary, stored.summarized_through) == ("summary 2", 8)
+    assert [turn.seq for turn in stored.turns] == [9, 10]
+    assert client.summaries[-1][0] == "summary 1" and len(client.summaries[-1][1]) == 4
+
+
+async def test_stale_fold_is_discarded(db):
+    store = FirestoreConversationStore(db)
+    conversations = ConversationManager(store, get_client=FakeAIClient)
+    conversation = await conversations.create("alice")
+    await store.append(conversation.id, [(ROLE_USER, "a"), (ROLE_ASSISTANT, "b")] * 2)
+
+    assert await store.fold(conversation.id, "first", 2, expected_through=0)
+    # Built on the summary before "first"
+    assert not await store.fold(conversation.id, "second", 4, expected_through=0)
+    stored = await store.get(conversation.id)
+    assert (stored.summary, [t.seq for t in stored.turns]) == ("first", [3, 4])
+    assert not await store.fold("missing", "x", 1, expected_through=0)
+
+
+@pytest.fixture
+def api(client, db, assessment_repo):
+    """The test client, with conversations in the fake Firestore and a fake AI client"""
+    ai = FakeAIClient()
+    conversations = ConversationManager(
+        FirestoreConversationStore(db),
+        get_client=lambda: ai,
+        get_repository=lambda: assessment_repo,
+    )
+    client.app.dependency_overrides[get_conversation_manager] = lambda: conversations
+    client.app.dependency_overrides[get_ai_client] = lambda: ai
+    return client
+
+
+def test_conversations_are_private(api):
+    created = api.post("/api/v1/ai/conversations", json={})
+    assert created.status_code == 201
+    path = f"/api/v1/ai/conversations/{created.json()['id']}"
+    chat = {"message": "hi", "conversation_id": created.json()["id"]}
+    other = {"X-Bench-User": "mallory"}
+
+    assert api.get(path, headers=other).status_code == 404
+    assert api.post("/api/v1/ai/chat", json=chat, headers=other).status_code == 404
+    assert api.post("/api/v1/ai/chat/stream", json=chat, headers=other).status_code == 404
+    assert api.delete(path, headers=other).status_code == 404
+
+    assert api.post("/api/v1/ai/chat", json=chat).status_code == 200
+    assert len(api.get(path).json()["turns"]) == 2
+    assert "userId" not in api.get(path).json()
+    assert api.delete(path).status_code == 200
+    assert api.get(path).status_code == 404
+
+
+def test_conversation_about_someone_elses_assessment(api):
+    assessment = api.post(
+        "/api/v1/assessments/", json={"pillar_id": "security", "responses": []}
+    ).json()
+    body = {"assessment_id": assessment["id"]}
+    assert api.post("/api/v1/ai/conversations", json=body).status_code == 201
+    forbidden = api.post(
+        "/api/v1/ai/conversations", json=body, headers={"X-Bench-User": "mallory"}
+    )
+    assert forbidden.status_code == 403
+    missing = api.post("/api/v1/ai/conversations", json={"assessment_id": "missing"})
+    assert missing.status_code == 404
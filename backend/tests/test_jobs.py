@@ -0,0 +1,236 @@
+"""
+Analysis jobs: deduplication, leases, retries and progress events, against
+the fake Firestore
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.jobs import AnalysisJobManager, get_job_manager, make_job_id
+from app.core.rate_limit import AdmissionController
+from app.core.security import verify_firebase_token
+from app.main import app
+from app.repositories.jobs import (
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    AnalysisJob,
+    FirestoreJobStore,
+)
+from app.repositories.recommendations import InMemoryRecommendationStore
+from benchmarks.fakes import fake_verify_firebase_token
+
+ANALYSIS = {
+    "score": 70,
+    "summary": "Fine",
+    "recommendations": [{"priority": "high", "title": "Enable MFA", "description": "Do it"}],
+}
+RESPONSES = [{"controlId": "sec-1", "response": "yes"}]
+
+
+class FakeAIClient:
+    """Fails the first ``failures`` calls, optionally holding each until released"""
+
+    def __init__(self, failures: int = 0, result: dict = None):
+        self.failures = failures
+        self.result = {"analysis": ANALYSIS} if result is None else result
+        self.calls = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def analyze_assessment(self, pillar, responses, use_cache=True) -> dict:
+        self.calls.append(responses)
+        await self.release.wait()
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("provider unavailable")
+        return self.result
+
+
+def manager(db, assessment_repo, client: FakeAIClient, **kwargs) -> AnalysisJobManager:
+    return AnalysisJobManager(
+        FirestoreJobStore(db),
+        **{"workers": 2, "retry_backoff": 0.01, **kwargs},
+        get_client=lambda: client,
+        get_repository=lambda: assessment_repo,
+        get_recommendations=lambda: InMemoryRecommendationStore([]),
+        get_admission=lambda: AdmissionController(4),
+    )
+
+
+async def finished(jobs: AnalysisJobManager, job_id: str) -> AnalysisJob:
+    async def wait() -> AnalysisJob:
+        while True:
+            job = await jobs.store.get(job_id)
+            if job.done:
+                return job
+            await asyncio.sleep(0.005)
+
+    return await asyncio.wait_for(wait(), 2)
+
+
+async def test_identical_submissions_share_a_job(db, assessment_repo):
+    jobs = manager(db, assessment_repo, FakeAIClient())
+    first, queued = await jobs.submit("alice", "Security", RESPONSES)
+    again, queued_again = await jobs.submit("alice", " security ", RESPONSES)
+    assert (queued, queued_again) == (True, False)
+    assert again.id == first.id == make_job_id("alice", "security", RESPONSES)
+
+    other_user, _ = await jobs.submit("bob", "security", RESPONSES)
+    other_input, _ = await jobs.submit("alice", "security", [])
+    assert len({first.id, other_user.id, other_input.id}) == 3
+
+
+async def test_assessment_jobs_read_the_stored_responses(db, assessment_repo):
+    client = FakeAIClient()
+    jobs = manager(db, assessment_repo, client)
+    assessment = await assessment_repo.create("alice", "security", RESPONSES)
+    job, _ = await jobs.submit(
+        "alice", "security", RESPONSES, assessment_id=assessment.id, stored_responses=True
+    )
+    stored = (await db.collection("aiJobs").document(job.id).get()).to_dict()
+    assert stored["responses"] is None and stored["assessmentId"] == assessment.id
+
+    await jobs.start()
+    try:
+        assert (await finished(jobs, job.id)).status == JOB_SUCCEEDED
+    finally:
+        await jobs.stop()
+    assert client.calls == [RESPONSES]
+    assert (await assessment_repo.get(assessment.id)).model_extra["analysisStatus"] == "completed"
+
+
+async def test_claims_are_exclusive_until_the_lease_expires(db):
+    store = FirestoreJobStore(db)
+    await store.create(AnalysisJob(id="j1", userId="alice", pillar="security"))
+
+    claimed = await store.claim("j1", lease_seconds=60)
+    assert (claimed.status, claimed.attempts) == (JOB_RUNNING, 1)
+    assert await store.claim("j1", lease_seconds=60) is None
+    assert await store.list_recoverable() == []
+
+    # The worker died: once its lease lapses the job is recovered
+    await store.save(claimed.touch(lease_expires_at=time.time() - 1))
+    assert [job.id for job in await store.list_recoverable()] == ["j1"]
+    reclaimed = await store.claim("j1", lease_seconds=60)
+    assert (reclaimed.status, reclaimed.attempts) == (JOB_RUNNING, 2)
+
+
+async def test_start_recovers_abandoned_jobs(db, assessment_repo):
+    store = FirestoreJobStore(db)
+    job = AnalysisJob(id="j1", userId="alice", pillar="security", responses=RESPONSES)
+    await store.create(job.touch(status=JOB_RUNNING, attempts=1, lease_expires_at=time.time() - 1))
+
+    jobs = manager(db, assessment_repo, FakeAIClient())
+    await jobs.start()
+    try:
+        recovered = await finished(jobs, "j1")
+    finally:
+        await jobs.stop()
+    assert (recovered.status, recovered.attempts) == (JOB_SUCCEEDED, 2)
+
+
+@pytest.mark.parametrize("failures, status, attempts", [
+    (2, JOB_SUCCEEDED, 3),
+    (3, JOB_FAILED, 3),
+])
+async def test_failed_attempts_are_retried(db, assessment_repo, failures, status, attempts):
+    jobs = manager(db, assessment_repo, FakeAIClient(failures=failures), max_attempts=3)
+    delays = []
+    retry_later = jobs._retry_later
+    jobs._retry_later = lambda job_id, delay: (delays.append(delay), retry_later(job_id, delay))
+
+    await jobs.start()
+    try:
+        job, _ = await jobs.submit("alice", "security", RESPONSES)
+        done = await finished(jobs, job.id)
+    finally:
+        await jobs.stop()
+    assert (done.status, done.attempts) == (status, attempts)
+    # Exponential backoff between attempts
+    assert delays == [0.01, 0.02]
+    assert (done.error is None) == (status == JOB_SUCCEEDED)
+
+
+async def test_unparseable_analysis_is_retried(db, assessment_repo):
+    client = FakeAIClient(result={"analysis": None, "parse_error": "Response was cut off"})
+    jobs = manager(db, assessment_repo, client, max_attempts=2)
+    await jobs.start()
+    try:
+        job, _ = await jobs.submit("alice", "security", RESPONSES)
+        done = await finished(jobs, job.id)
+    finally:
+        await jobs.stop()
+    assert (done.status, done.error, len(client.calls)) == (JOB_FAILED, "Response was cut off", 2)
+
+
+@pytest.fixture
+def api(db, assessment_repo):
+    """Install a job manager for the API; returns a factory taking the fake AI client"""
+    def install(client: FakeAIClient, **kwargs) -> AnalysisJobManager:
+        jobs = manager(db, assessment_repo, client, **kwargs)
+        app.dependency_overrides[get_job_manager] = lambda: jobs
+        return jobs
+
+    app.dependency_overrides[verify_firebase_token] = fake_verify_firebase_token("test-user")
+    try:
+        yield install
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def test_full_queue_is_rejected_with_503(api):
+    # Not started, so nothing drains the queue
+    api(FakeAIClient(), queue_size=1)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as http:
+        accepted = await http.post(
+            "/api/v1/ai/analyze", json={"pillar": "security", "responses": RESPONSES}
+        )
+        rejected = await http.post(
+            "/api/v1/ai/analyze", json={"pillar": "security", "responses": []}
+        )
+        duplicate = await http.post(
+            "/api/v1/ai/analyze", json={"pillar": "security", "responses": RESPONSES}
+        )
+    assert accepted.status_code == 202 and accepted.json()["status"] == JOB_QUEUED
+    assert rejected.status_code == 503 and rejected.headers["Retry-After"] == "30"
+    # Joining an existing job needs no room in the queue
+    assert duplicate.status_code == 202 and duplicate.json()["id"] == accepted.json()["id"]
+
+
+async def test_events_follow_the_job_until_done(api):
+    client = FakeAIClient(failures=1)
+    client.release.clear()
+    jobs = api(client)
+    await jobs.start()
+    try:
+        job, _ = await jobs.submit("test-user", "security", RESPONSES)
+
+        async def release() -> None:
+            while not (client.calls and jobs._watchers):
+                await asyncio.sleep(0.005)
+            client.release.set()
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app), base_url="http://test"
+        ) as http:
+            response, _ = await asyncio.wait_for(
+                asyncio.gather(http.get(f"/api/v1/ai/jobs/{job.id}/events"), release()), 2
+            )
+            forbidden = await http.get(
+                f"/api/v1/ai/jobs/{job.id}/events", headers={"X-Bench-User": "mallory"}
+            )
+    finally:
+        await jobs.stop()
+
+    events = [
+        line.removeprefix("event: ") for line in response.text.splitlines()
+        if line.startswith("event: ")
+    ]
+    # Running, queued again after the failed attempt, running again, done
+    assert events[-4:] == ["progress", "progress", "progress", "done"]
+    assert set(events[:-1]) == {"progress"}
+    assert '"status": "succeeded"' in response.text.split("event: done")[1]
+    assert forbidden.status_code == 404
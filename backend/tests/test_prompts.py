@@ -0,0 +1,86 @@
+"""
+Prompt table encoding, chunking and packing
+"""
+from app.core.prompts import (
+    CHARS_PER_TOKEN,
+    MAX_CELL_CHARS,
+    chunk_rows,
+    encode_table,
+    estimate_tokens,
+    pack_texts,
+)
+
+
+def test_columns_are_written_once():
+    rows = [
+        {"controlId": "sec-1", "response": "yes", "pillar": "security"},
+        {"controlId": "sec-2", "response": "no", "pillar": "security"},
+    ]
+    assert encode_table(rows) == "\n".join([
+        "pillar: security",
+        "controlId|response",
+        "sec-1|yes",
+        "sec-2|no",
+    ])
+    assert encode_table([]) == "(none)"
+
+
+def test_missing_and_structured_values():
+    rows = [{"a": 1, "b": {"x": [1, 2]}}, {"a": 2}]
+    assert encode_table(rows).splitlines() == ["a|b", '1|{"x":[1,2]}', "2|"]
+
+
+def test_separators_and_line_breaks_are_escaped():
+    rows = [
+        {"a|b": "yes | no", "notes": "first line\n  second   line\n\n", "path": "C:\\x"},
+        {"a|b": "n/a", "notes": "", "path": "C:\\x"},
+    ]
+    lines = encode_table(rows).splitlines()
+    assert lines == [
+        "path: C:\\\\x",
+        "a\\|b|notes",
+        "yes \\| no|first line\\nsecond line",
+        "n/a|",
+    ]
+    # Every row still has exactly one separator per column boundary
+    unescaped = [line.replace("\\\\", "").replace("\\|", "") for line in lines[1:]]
+    assert all(line.count("|") == 1 for line in unescaped)
+
+
+def test_column_names_are_escaped():
+    assert encode_table([{"multi\nline": 1}]) == "multi\\nline\n1"
+
+
+def test_long_values_are_truncated():
+    text = encode_table([{"notes": "x" * (MAX_CELL_CHARS * 2)}]).splitlines()[1]
+    assert len(text) == MAX_CELL_CHARS and text.endswith("...")
+
+
+def test_rows_fit_in_one_chunk_when_under_budget():
+    rows = [{"id": i} for i in range(10)]
+    assert chunk_rows(rows, 1000) == [rows]
+    assert chunk_rows([], 1000) == [[]]
+
+
+def test_chunks_keep_order_and_fit_the_budget():
+    rows = [{"id": f"control-{i:03d}", "response": "a" * 40} for i in range(100)]
+    budget = 200
+    chunks = chunk_rows(rows, budget)
+    assert len(chunks) > 1
+    assert [row for chunk in chunks for row in chunk] == rows
+    for chunk in chunks:
+        assert estimate_tokens(encode_table(chunk)) <= budget
+
+
+def test_oversized_row_gets_its_own_chunk():
+    big = {"id": "big", "response": "a" * (60 * CHARS_PER_TOKEN)}
+    small = {"id": "small", "response": "b"}
+    assert chunk_rows([small, big, small], 20) == [[small], [big], [small]]
+
+
+def test_pack_texts():
+    texts = ["a" * 40, "b" * 40, "c" * 40, "d" * 400]
+    # 11 estimated tokens each for the short texts
+    assert pack_texts(texts, 25) == [texts[:2], [texts[2]], [texts[3]]]
+    assert pack_texts(texts, 1000) == [texts]
+    assert pack_texts([], 10) == []
@@ -0,0 +1,158 @@
+"""
+Token buckets, admission lanes and the rate_limit dependency
+"""
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from pydantic import ValidationError
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core import rate_limit as rate_limit_module
+from app.core.config import Settings, settings
+from app.core.rate_limit import (
+    BULK,
+    INTERACTIVE,
+    AdmissionController,
+    AdmissionSlot,
+    InMemoryRateLimitBackend,
+    RateLimiter,
+    rate_limit,
+    take_token,
+)
+from app.core.security import get_current_user
+
+
+def test_take_token_refills_up_to_capacity():
+    assert take_token(0.0, 0.0, 100.0, rate=1.0, capacity=5) == (4.0, 0.0)
+    tokens, wait = take_token(0.5, 10.0, 10.0, rate=0.5, capacity=5)
+    assert tokens == 0.5 and wait == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("name, value", [
+    ("AI_RATE_LIMIT_INTERACTIVE_PER_MINUTE", "0"),
+    ("AI_RATE_LIMIT_BULK_PER_MINUTE", "-1"),
+    ("AI_RATE_LIMIT_BULK_BURST", "0"),
+])
+def test_rates_must_be_positive(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ValidationError, match=name):
+        Settings()
+
+
+async def test_in_memory_buckets_per_key():
+    backend = InMemoryRateLimitBackend()
+    assert [await backend.acquire("a", 1 / 60, 2) for _ in range(2)] == [0.0, 0.0]
+    assert await backend.acquire("a", 1 / 60, 2) > 0
+    assert await backend.acquire("b", 1 / 60, 2) == 0.0
+
+
+async def test_in_memory_buckets_evict_least_recently_used():
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    await backend.acquire("a", 1 / 60, 1)
+    await backend.acquire("b", 1 / 60, 1)
+    await backend.acquire("c", 1 / 60, 1)
+    # "a" was dropped, so it starts again with a full bucket
+    assert await backend.acquire("a", 1 / 60, 1) == 0.0
+
+
+async def test_admission_keeps_room_for_interactive():
+    admission = AdmissionController(max_in_flight=4, bulk_share=0.5)
+    assert [admission.try_acquire(BULK) for _ in range(3)] == [True, True, False]
+    assert [admission.try_acquire(INTERACTIVE) for _ in range(3)] == [True, True, False]
+    await admission.release(BULK)
+    assert admission.try_acquire(INTERACTIVE)
+
+
+async def test_admission_slot_waits_for_release():
+    admission = AdmissionController(max_in_flight=1)
+    assert admission.try_acquire(INTERACTIVE)
+
+    async def background():
+        async with admission.slot(BULK):
+            return True
+
+    task = asyncio.create_task(background())
+    await asyncio.sleep(0)
+    assert not task.done()
+    await admission.release(INTERACTIVE)
+    assert await asyncio.wait_for(task, 1)
+
+
+async def test_slot_released_once():
+    admission = AdmissionController(max_in_flight=1)
+    assert admission.try_acquire(INTERACTIVE)
+    slot = AdmissionSlot(admission, INTERACTIVE)
+    await slot.release()
+    await slot.release()
+    assert admission._in_flight[INTERACTIVE] == 0
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """A small app with plain and streaming endpoints behind rate_limit"""
+    admission = AdmissionController(max_in_flight=1)
+    limiter = RateLimiter(InMemoryRateLimitBackend(), {INTERACTIVE: (60, 2), BULK: (60, 2)})
+    monkeypatch.setattr(settings, "AI_RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit_module, "_admission", admission)
+    monkeypatch.setattr(rate_limit_module, "_limiter", limiter)
+
+    app = FastAPI()
+    app.dependency_overrides[get_current_user] = lambda: {"uid": "alice"}
+    in_flight_during_stream = []
+
+    @app.get("/plain", dependencies=[Depends(rate_limit(INTERACTIVE))])
+    async def plain():
+        return {"in_flight": admission._in_flight[INTERACTIVE]}
+
+    @app.get("/stream")
+    async def stream(slot: AdmissionSlot = Depends(rate_limit(INTERACTIVE))):
+        async def chunks():
+            for i in range(3):
+                await asyncio.sleep(0)
+                in_flight_during_stream.append(admission._in_flight[INTERACTIVE])
+                yield f"{i}\n"
+
+        return slot.stream(StreamingResponse(chunks(), media_type="text/plain"))
+
+    @app.get("/failing")
+    async def failing(slot: AdmissionSlot = Depends(rate_limit(INTERACTIVE))):
+        raise RuntimeError("boom")
+
+    return TestClient(app, raise_server_exceptions=False), admission, in_flight_during_stream
+
+
+def test_rate_limited_with_retry_after(limited):
+    client, admission, _ = limited
+    assert [client.get("/plain").status_code for _ in range(2)] == [200, 200]
+    response = client.get("/plain")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert admission._in_flight[INTERACTIVE] == 0
+
+
+def test_shed_when_no_slot_is_free(limited):
+    client, admission, _ = limited
+    assert admission.try_acquire(INTERACTIVE)
+    response = client.get("/plain")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    # The 503 did not take or release a slot
+    assert admission._in_flight[INTERACTIVE] == 1
+
+
+def test_slot_held_until_stream_is_sent(limited):
+    client, admission, in_flight_during_stream = limited
+    response = client.get("/stream")
+    assert response.status_code == 200
+    assert response.text == "0\n1\n2\n"
+    assert in_flight_during_stream == [1, 1, 1]
+    assert admission._in_flight[INTERACTIVE] == 0
+
+
+def test_slot_released_when_endpoint_fails(limited):
+    client, admission, _ = limited
+    assert client.get("/failing").status_code == 500
+    assert admission._in_flight[INTERACTIVE] == 0
+    assert client.get("/plain").json() == {"in_flight": 1}
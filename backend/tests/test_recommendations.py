@@ -0,0 +1,71 @@
+"""
+InMemoryRecommendationStore visibility, copy on write and pagination, and
+the Firestore indexes the store's queries need
+"""
+import json
+from pathlib import Path
+
+from app.repositories.recommendations import (
+    InMemoryRecommendationStore,
+    Recommendation,
+    composite_indexes,
+)
+
+INDEXES_PATH = Path(__file__).resolve().parents[2] / "firestore.indexes.json"
+
+
+def store() -> InMemoryRecommendationStore:
+    return InMemoryRecommendationStore([
+        Recommendation(id="shared-1", pillarId="security", title="Shared", priority="high"),
+        Recommendation(id="shared-2", pillarId="security", title="Shared", priority="low"),
+        Recommendation(id="own", pillarId="cost", title="Alice's", userId="alice"),
+    ])
+
+
+async def ids(store, user_id, **filters):
+    recommendations, _ = await store.list(user_id, filters)
+    return [r.id for r in recommendations]
+
+
+async def test_owned_records_are_private():
+    recommendations = store()
+    assert await ids(recommendations, "alice") == ["shared-1", "own", "shared-2"]
+    assert await ids(recommendations, "bob") == ["shared-1", "shared-2"]
+    assert await recommendations.get("bob", "own") is None
+    assert await recommendations.update_status("bob", "own", "completed") is None
+
+
+async def test_status_change_on_shared_record_is_per_user():
+    recommendations = store()
+    updated = await recommendations.update_status("alice", "shared-1", "completed")
+    assert updated.id == "shared-1" and updated.status == "completed"
+
+    assert (await recommendations.get("alice", "shared-1")).status == "completed"
+    assert (await recommendations.get("bob", "shared-1")).status == "pending"
+    assert await ids(recommendations, "alice") == ["shared-1", "own", "shared-2"]
+    assert await ids(recommendations, "alice", status="pending") == ["own", "shared-2"]
+    assert await ids(recommendations, "bob", status="pending") == ["shared-1", "shared-2"]
+
+    # Later changes update the user's copy
+    await recommendations.update_status("alice", "shared-1", "dismissed")
+    assert await ids(recommendations, "alice", status="dismissed") == ["shared-1"]
+    assert await ids(recommendations, "bob", status="dismissed") == []
+
+
+async def test_pages_skip_shared_records_replaced_by_copies():
+    recommendations = store()
+    await recommendations.update_status("alice", "shared-2", "in_progress")
+    first, token = await recommendations.list("alice", {}, limit=2)
+    rest, last = await recommendations.list("alice", {}, limit=2, page_token=token)
+    assert [r.id for r in first + rest] == ["shared-1", "own", "shared-2"]
+    assert rest[0].status == "in_progress" and last is None
+
+
+def test_every_query_shape_is_indexed():
+    lines = INDEXES_PATH.read_text(encoding="utf-8").splitlines()
+    declared = json.loads("\n".join(line for line in lines if not line.lstrip().startswith("//")))
+    needed = composite_indexes()
+    # One per sort order and subset of the filterable fields
+    assert len(needed) == 3 * 2 ** 5
+    missing = [index for index in needed if index not in declared["indexes"]]
+    assert missing == []
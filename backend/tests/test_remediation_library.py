@@ -0,0 +1,47 @@
+"""
+Remediation library startup: the full fill must not run on every cold start
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.remediation_library import get_remediation_library
+from app.main import app
+
+
+@pytest.mark.parametrize("backend, prefill, filled", [
+    ("memory", False, False),
+    ("memory", True, True),
+    ("firestore", False, True),
+])
+def test_library_fills_at_startup_only_when_persistent_or_asked(
+    monkeypatch, backend, prefill, filled
+):
+    library = get_remediation_library()
+    started = []
+
+    async def start():
+        started.append(True)
+
+    monkeypatch.setattr(library, "start", start)
+    monkeypatch.setattr(settings, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "REMEDIATION_LIBRARY_BACKEND", backend)
+    monkeypatch.setattr(settings, "REMEDIATION_LIBRARY_PREFILL", prefill)
+    with TestClient(app):
+        pass
+    assert bool(started) == filled
+
+
+def test_no_fill_without_api_key(monkeypatch):
+    library = get_remediation_library()
+    started = []
+
+    async def start():
+        started.append(True)
+
+    monkeypatch.setattr(library, "start", start)
+    monkeypatch.setattr(settings, "GEMINI_API_KEY", "")
+    monkeypatch.setattr(settings, "REMEDIATION_LIBRARY_PREFILL", True)
+    with TestClient(app):
+        pass
+    assert not started
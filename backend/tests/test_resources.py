@@ -0,0 +1,288 @@
+"""
+Resource inventory: NDJSON ingestion, the columnar index and the API
+"""
+import json
+import random
+
+import pytest
+
+from app.core.resource_index import ResourceIndex
+from app.core.resources import (
+    InvalidResourceError,
+    LineTooLong,
+    ResourceInventory,
+    ResourceLimitError,
+    ndjson_lines,
+    parse_resource,
+)
+from app.repositories.pagination import encode_page_token
+
+TYPES = ["compute.Instance", "storage.Bucket", "sql.Instance", "run.Service"]
+REGIONS = ["us-east1", "europe-west1", ""]
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(lines):
+    return [line async for line in lines]
+
+
+def ndjson(resources) -> bytes:
+    return b"".join(json.dumps(resource).encode() + b"\n" for resource in resources)
+
+
+def resource(i: int, **fields) -> dict:
+    return {"externalId": f"r{i}", "type": "compute.Instance", **fields}
+
+
+# Line splitting
+
+async def test_lines_split_across_chunks():
+    lines = await collect(ndjson_lines(stream(b'{"a":', b'1}\n{"b"', b":2}\n\n", b'{"c":3}')))
+    assert lines == [b'{"a":1}', b'{"b":2}', b"", b'{"c":3}']
+
+
+async def test_long_lines_are_not_buffered():
+    chunks = [b"x" * 40] * 5 + [b"x\nok\n", b"y" * 30]
+    lines = await collect(ndjson_lines(stream(*chunks), max_line_bytes=32))
+    assert isinstance(lines[0], LineTooLong) and lines[0].size == 201
+    assert lines[1] == b"ok"
+    assert lines[2] == b"y" * 30
+
+
+async def test_trailing_long_line():
+    lines = await collect(ndjson_lines(stream(b"a\n", b"b" * 10), max_line_bytes=4))
+    assert lines[0] == b"a" and isinstance(lines[1], LineTooLong)
+
+
+# Parsing
+
+def test_parse_resource_defaults_and_tags():
+    row = parse_resource(b'{"externalId":"a","type":"vm","tags":"{\\"Env\\":\\"prod\\",\\"env\\":\\"x\\"}"}')
+    assert row == ("a", "a", "vm", "", {"Env": "prod"})
+    assert parse_resource(b'{"externalId":"a","type":"vm","tags":["k=v","z"]}')[4] == {"k": "v", "z": ""}
+
+
+@pytest.mark.parametrize("line", [
+    b"{", b"[]", b'{"type":"x"}', b'{"externalId":"a"}', b'{"externalId":"a","type":"x","tags":5}',
+    b'{"externalId":"a","type":"x","region":3}', b'{"externalId":"a","type":"x","tags":{"a=b":"c"}}',
+])
+def test_parse_resource_rejects(line):
+    with pytest.raises(InvalidResourceError):
+        parse_resource(line)
+
+
+# Ingestion
+
+async def test_ingest_reports_rejected_lines_by_line_number():
+    inventory = ResourceInventory(max_line_bytes=200)
+    body = ndjson([resource(1)]) + b"\nnot json\n" + b"x" * 300 + b"\n" + ndjson([resource(2)])
+    report = await inventory.ingest("a1", stream(body))
+    assert (report["indexed"], report["rejected"], report["resources"]) == (2, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 4]
+    assert "exceeds 200 bytes" in report["errors"][1]["detail"]
+
+
+async def test_ingest_appends_or_replaces():
+    inventory = ResourceInventory(batch_size=2)
+    await inventory.ingest("a1", stream(ndjson(resource(i) for i in range(5))))
+    report = await inventory.ingest("a1", stream(ndjson(resource(i) for i in range(3, 7))))
+    assert (report["replaced"], report["resources"]) == (2, 7)
+    report = await inventory.ingest("a1", stream(ndjson([resource(9)])), replace=True)
+    assert report["resources"] == 1
+
+
+async def test_limit_is_checked_before_indexing():
+    inventory = ResourceInventory(max_resources_per_assessment=5, batch_size=3)
+    await inventory.ingest("a1", stream(ndjson(resource(i) for i in range(3))))
+    with pytest.raises(ResourceLimitError):
+        await inventory.ingest("a1", stream(ndjson(resource(i) for i in range(10, 20))))
+    # The batch that would exceed the limit was not indexed
+    assert len(inventory.get("a1")) == 3
+    # Replacing existing resources does not count against the limit
+    await inventory.ingest("a1", stream(ndjson(resource(i) for i in range(3))))
+    assert len(inventory.get("a1")) == 3
+
+
+async def test_failed_replace_keeps_the_previous_inventory():
+    inventory = ResourceInventory(max_resources_per_assessment=2)
+    await inventory.ingest("a1", stream(ndjson([resource(1)])))
+    with pytest.raises(ResourceLimitError):
+        await inventory.ingest("a1", stream(ndjson(resource(i) for i in range(5))), replace=True)
+    assert len(inventory.get("a1")) == 1
+
+
+async def test_least_recently_used_inventories_are_evicted():
+    inventory = ResourceInventory(max_resources=5)
+    for assessment_id in ("a1", "a2"):
+        await inventory.ingest(assessment_id, stream(ndjson(resource(i) for i in range(2))))
+    inventory.get("a1")
+    await inventory.ingest("a3", stream(ndjson(resource(i) for i in range(2))))
+    assert inventory.get("a2") is None
+    assert inventory.get("a1") is not None and inventory.get("a3") is not None
+
+
+async def test_eviction_runs_when_an_upload_fails():
+    inventory = ResourceInventory(max_resources=4, max_resources_per_assessment=4, batch_size=2)
+    await inventory.ingest("a1", stream(ndjson(resource(i) for i in range(3))))
+    with pytest.raises(ResourceLimitError):
+        await inventory.ingest("a2", stream(ndjson(resource(i) for i in range(6))))
+    assert inventory.get("a1") is None
+    assert len(inventory.get("a2")) == 4
+
+
+# Index queries, against a plain Python model
+
+@pytest.fixture(scope="module")
+def indexed():
+    rng = random.Random(3)
+    index, model = ResourceIndex(), {}
+    for _ in range(12):
+        batch = []
+        for _ in range(500):
+            i = rng.randrange(1500)
+            tags = {}
+            if rng.random() < 0.7:
+                tags["env"] = rng.choice(["prod", "dev"])
+            if rng.random() < 0.4:
+                tags["Team"] = rng.choice(["a", "b", "c"])
+            batch.append((f"r{i}", f"name {i} é", rng.choice(TYPES), rng.choice(REGIONS), tags))
+        index.add(batch)
+        for row in batch:
+            model.pop(row[0], None)
+            model[row[0]] = row
+    return index, model
+
+
+def matching(model, types=(), regions=(), tags=()):
+    def matches(row):
+        _, _, type_, region, row_tags = row
+        if types and type_.casefold() not in {t.casefold() for t in types}:
+            return False
+        if regions and region.casefold() not in {r.casefold() for r in regions}:
+            return False
+        folded = {key.casefold(): value for key, value in row_tags.items()}
+        for tag in tags:
+            key, separator, value = tag.partition("=")
+            if key.casefold() not in folded or (separator and folded[key.casefold()] != value):
+                return False
+        return True
+
+    return [row for row in model.values() if matches(row)]
+
+
+def test_replaced_rows_are_compacted(indexed):
+    index, model = indexed
+    assert len(index) == len(model)
+    assert index._seqs.size < 6000
+
+
+@pytest.mark.parametrize("query", [
+    {},
+    {"types": ["COMPUTE.instance"]},
+    {"regions": ["us-east1", "europe-west1"]},
+    {"tags": ["env=prod"]},
+    {"tags": ["env", "team=b"]},
+    {"types": ["run.Service"], "tags": ["Team"]},
+    {"tags": ["missing"]},
+])
+def test_count_matches_model(indexed, query):
+    index, model = indexed
+    assert index.count(**query) == len(matching(model, **query))
+
+
+def test_facets_ignore_their_own_filter(indexed):
+    index, model = indexed
+    facets = index.facets(types=["sql.Instance"], tags=["env=prod"])
+    assert facets["total"] == len(model)
+    assert facets["matched"] == len(matching(model, types=["sql.Instance"], tags=["env=prod"]))
+    types = {entry["value"]: entry["count"] for entry in facets["facets"]["type"]}
+    assert types["run.Service"] == len(matching(model, types=["run.Service"], tags=["env=prod"]))
+    tags = {entry["value"]: entry["count"] for entry in facets["facets"]["tag"]}
+    assert tags["env=dev"] == len(matching(model, types=["sql.Instance"], tags=["env=dev"]))
+    regions = [entry["value"] for entry in facets["facets"]["region"]]
+    assert "" not in regions
+
+
+def test_pages_cover_matches_in_order(indexed):
+    index, model = indexed
+    seen, after = [], None
+    while True:
+        rows, after = index.page(tags=["env"], after=after, limit=333)
+        seen += [json.loads(line) for chunk in index.ndjson(rows) for line in chunk.splitlines()]
+        if after is None:
+            break
+    expected = matching(model, tags=["env"])
+    assert [r["externalId"] for r in seen] == [row[0] for row in expected]
+    external_id, name, type_, region, tags = expected[0]
+    assert seen[0] == {
+        "externalId": external_id, "name": name, "type": type_,
+        "region": region or None, "tags": tags,
+    }
+
+
+# API
+
+def upload(client, assessment_id, body, **params):
+    return client.post(f"/api/v1/assessments/{assessment_id}/resources", content=body, params=params)
+
+
+@pytest.fixture
+def inventory(monkeypatch):
+    from app.core import resources
+
+    inventory = ResourceInventory()
+    monkeypatch.setattr(resources, "_inventory", inventory)
+    return inventory
+
+
+def test_api(client, inventory):
+    assessment_id = client.post(
+        "/api/v1/assessments/", json={"pillar_id": "security", "responses": []}
+    ).json()["id"]
+    body = ndjson(resource(i, region=REGIONS[i % 2], tags={"env": "prod"}) for i in range(30))
+    report = upload(client, assessment_id, body).json()
+    assert report["indexed"] == 30
+
+    url = f"/api/v1/assessments/{assessment_id}/resources"
+    facets = client.get(f"{url}/facets", params={"region": "us-east1"}).json()
+    assert facets["matched"] == 15
+
+    first = client.get(url, params={"region": ["us-east1"], "limit": 10})
+    assert first.headers["content-type"].startswith("application/x-ndjson")
+    assert len(first.text.splitlines()) == 10
+    rest = client.get(url, params={"limit": 10, "region": "us-east1",
+                                   "page_token": first.headers["X-Next-Page-Token"]})
+    assert len(rest.text.splitlines()) == 5 and "X-Next-Page-Token" not in rest.headers
+
+    assert client.delete(url).status_code == 200
+    assert client.get(url).text == ""
+    assert client.delete(url).status_code == 404
+
+
+@pytest.mark.parametrize("token", ["zzz", encode_page_token(-1), encode_page_token("1"),
+                                   encode_page_token(True), encode_page_token(1, 2)])
+def test_api_rejects_invalid_page_tokens(client, inventory, token):
+    assessment_id = client.post(
+        "/api/v1/assessments/", json={"pillar_id": "security", "responses": []}
+    ).json()["id"]
+    response = client.get(
+        f"/api/v1/assessments/{assessment_id}/resources", params={"page_token": token}
+    )
+    assert response.status_code == 400
+
+
+def test_api_limits_and_ownership(client, inventory):
+    inventory.max_resources_per_assessment = 3
+    assessment_id = client.post(
+        "/api/v1/assessments/", json={"pillar_id": "security", "responses": []}
+    ).json()["id"]
+    assert upload(client, assessment_id, ndjson(resource(i) for i in range(5))).status_code == 413
+    assert upload(client, "missing", b"").status_code == 404
+    response = client.get(
+        f"/api/v1/assessments/{assessment_id}/resources/facets", headers={"X-Bench-User": "other"}
+    )
+    assert response.status_code == 403
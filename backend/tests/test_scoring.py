@@ -0,0 +1,143 @@
+import math
+
+import pytest
+
+from app.core.scoring import UNKNOWN_PILLAR, ScoringEngine, TooManyControlsError
+
+CONTROLS = {
+    "security": [{"id": "sec-1", "weight": 2.0}, {"id": "sec-2"}],
+    "reliability": [{"id": "rel-1"}],
+}
+
+
+@pytest.fixture
+def engine() -> ScoringEngine:
+    return ScoringEngine(CONTROLS)
+
+
+def test_scores_are_weight_averaged(engine):
+    score = engine.score("security", [
+        {"control_id": "sec-1", "response": "yes"},
+        {"control_id": "sec-2", "response": "no"},
+        {"controlId": "rel-1", "response": "partial"},
+    ])
+    assert score.controls == {"sec-1": 100.0, "sec-2": 0.0, "rel-1": 50.0}
+    assert score.pillars == {"security": pytest.approx(66.67), "reliability": 50.0}
+    assert score.overall == pytest.approx(62.5)
+
+
+def test_not_applicable_answers_are_excluded(engine):
+    score = engine.score("security", [
+        {"control_id": "sec-1", "response": "not_applicable"},
+        {"control_id": "sec-2", "response": "Yes "},
+    ])
+    assert score.controls == {"sec-2": 100.0}
+    assert score.overall == 100.0
+
+
+def test_no_applicable_answers_has_no_score(engine):
+    score = engine.score("security", [{"control_id": "sec-1", "response": "not_applicable"}])
+    assert score.overall is None and score.pillars == {} and score.controls == {}
+
+
+def test_unknown_controls_score_under_the_assessment_pillar(engine):
+    score = engine.score("cost", [{"control_id": "cost-9", "response": "yes"}])
+    assert score.pillars == {"cost": 100.0}
+    # The catalog is not extended by scoring
+    assert "cost-9" not in engine.control_ids
+
+
+def test_score_many_matches_score(engine):
+    batches = [
+        ("security", [{"control_id": "sec-1", "response": "partial"}]),
+        ("reliability", [{"control_id": "rel-1", "response": "no"}]),
+        ("security", []),
+    ]
+    many = engine.score_many([p for p, _ in batches], [r for _, r in batches])
+    assert many == [engine.score(p, r) for p, r in batches]
+
+
+def test_unknown_controls_score_under_each_assessments_pillar(engine):
+    responses = [{"control_id": "custom-1", "response": "yes"}]
+    batches = [
+        ("security", responses),
+        ("reliability", responses),
+        ("cost", responses + [{"control_id": "rel-1", "response": "no"}]),
+    ]
+    many = engine.score_many([p for p, _ in batches], [r for _, r in batches])
+    assert many == [engine.score(p, r) for p, r in batches]
+    assert [score.pillars for score in many] == [
+        {"security": 100.0},
+        {"reliability": 100.0},
+        {"cost": 100.0, "reliability": 0.0},
+    ]
+
+
+def test_many_unknown_controls_are_aggregated_sparsely():
+    engine = ScoringEngine(CONTROLS, max_unknown_controls=100_000)
+    responses_list = [
+        [{"control_id": f"c{a}-{i}", "response": "partial"} for i in range(100)]
+        for a in range(500)
+    ]
+    scores = engine.score_many(["security"] * 500, responses_list)
+    assert all(len(score.controls) == 100 and score.overall == 50.0 for score in scores)
+
+
+def test_unknown_controls_are_capped(engine):
+    capped = ScoringEngine(CONTROLS, max_unknown_controls=2)
+    known = [{"control_id": "sec-1", "response": "yes"}] * 5
+    assert capped.score("security", known).overall == 100.0
+    with pytest.raises(TooManyControlsError):
+        capped.score("security", [
+            {"control_id": f"x{i}", "response": "yes"} for i in range(3)
+        ])
+
+
+def test_create_assessment_with_too_many_controls(client, monkeypatch):
+    from app.core.scoring import get_scoring_engine
+
+    monkeypatch.setattr(get_scoring_engine(), "max_unknown_controls", 1)
+    response = client.post("/api/v1/assessments/", json={
+        "pillar_id": "security",
+        "responses": [{"control_id": f"x{i}", "response": "yes"} for i in range(2)],
+    })
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("control_id, key", [(1, "1"), (2.5, "2.5"), ("sec-1", "sec-1")])
+def test_scalar_control_ids_are_strings(engine, control_id, key):
+    score = engine.score("security", [{"control_id": control_id, "response": "yes"}])
+    assert score.controls == {key: 100.0}
+
+
+@pytest.mark.parametrize("control_id", [["sec-1"], {"id": "sec-1"}, True])
+def test_non_scalar_control_ids_are_skipped(engine, control_id):
+    score = engine.score("security", [
+        {"control_id": control_id, "response": "yes"},
+        {"control_id": "sec-2", "response": "no"},
+    ])
+    assert score.controls == {"sec-2": 0.0}
+
+
+def test_missing_pillar_uses_fallback(engine):
+    score = engine.score(None, [{"control_id": "new-1", "response": "yes"}])
+    assert score.pillars == {UNKNOWN_PILLAR: 100.0}
+    assert not math.isnan(score.overall)
+
+
+def test_malformed_responses_are_ignored(engine):
+    score = engine.score("security", ["yes", None, {"response": "yes"}, {"control_id": "sec-1"}])
+    assert score.overall is None
+
+
+def test_create_assessment_with_odd_control_ids(client):
+    response = client.post("/api/v1/assessments/", json={
+        "pillar_id": "security",
+        "responses": [
+            {"control_id": 1, "response": "yes"},
+            {"control_id": ["x"], "response": "no"},
+            {"control_id": {"a": 1}, "response": "no"},
+        ],
+    })
+    assert response.status_code == 201, response.text
+    assert response.json()["score"] == 100
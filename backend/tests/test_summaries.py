@@ -0,0 +1,91 @@
+"""
+Incrementally maintained assessment summaries
+"""
+from app.repositories.summaries import SUMMARY_VERSION, merge_deltas, summary_deltas
+
+YES = [{"control_id": "sec-1", "response": "yes"}]
+NO = [{"control_id": "sec-1", "response": "no"}]
+
+
+def test_merge_deltas_drops_cancelled_counters():
+    merged = merge_deltas([
+        {"total": 1, "byStatus": {"draft": 1}},
+        {"total": -1, "byStatus": {"draft": -1, "completed": 1}},
+    ])
+    assert merged == {"byStatus": {"completed": 1}}
+
+
+def test_summary_deltas_move_between_users_and_statuses():
+    before = {"userId": "a", "pillarId": "security", "status": "in_progress", "score": 40}
+    after = {**before, "userId": "b", "status": "completed", "score": 80}
+    deltas = summary_deltas([(before, after), (None, {**before, "score": None})])
+    # Alice's new unscored assessment offsets all but the moved score
+    assert deltas["a"] == {"pillars": {"security": {"scoredCount": -1, "scoreSum": -40}}}
+    assert deltas["b"] == {
+        "total": 1,
+        "byStatus": {"completed": 1},
+        "pillars": {"security": {
+            "count": 1, "byStatus": {"completed": 1}, "scoredCount": 1, "scoreSum": 80,
+        }},
+    }
+
+
+async def _recounted(repo, user_id):
+    """The summary rebuilt from the assessments themselves"""
+    await repo.summaries.document(user_id).delete()
+    repo._invalidate(user_id)
+    return await repo.get_summary(user_id)
+
+
+async def test_summary_follows_writes(assessment_repo):
+    repo = assessment_repo
+    first = await repo.create("alice", "security", YES)
+    second = await repo.create("alice", "security", NO)
+    await repo.create("alice", "reliability", [])
+    await repo.create("bob", "security", YES)
+
+    summary = await repo.get_summary("alice")
+    assert summary.total == 3
+    assert summary.by_status == {"in_progress": 3}
+    assert summary.average_score == 50.0
+    assert summary.pillars["security"].count == 2
+    assert summary.pillars["reliability"].average_score is None
+
+    await repo.update(first.id, "alice", {"status": "completed"})
+    await repo.update(second.id, "alice", {"responses": YES})
+    await repo.update_many("alice", {first.id: {"status": "archived"}, second.id: {"responses": NO}})
+
+    summary = await repo.get_summary("alice")
+    assert summary.by_status == {"archived": 1, "in_progress": 2}
+    assert summary.average_score == 50.0
+    assert summary == (await _recounted(repo, "alice")).model_copy(
+        update={"updated_at": summary.updated_at}
+    )
+    assert (await repo.get_summary("bob")).total == 1
+
+
+async def test_missing_or_outdated_summary_is_rebuilt(assessment_repo):
+    repo = assessment_repo
+    await repo.create("alice", "security", YES)
+    await repo.summaries.document("alice").set({"total": 99, "version": SUMMARY_VERSION - 1})
+    repo._invalidate("alice")
+    summary = await repo.get_summary("alice")
+    assert summary.total == 1
+    stored = (await repo.summaries.document("alice").get()).to_dict()
+    assert stored["version"] == SUMMARY_VERSION
+
+
+def test_summary_endpoint(client):
+    for pillar_id in ("security", "security", "reliability"):
+        client.post("/api/v1/assessments/", json={"pillar_id": pillar_id, "responses": YES})
+    client.post(
+        "/api/v1/assessments/",
+        json={"pillar_id": "security", "responses": NO},
+        headers={"X-Bench-User": "someone-else"},
+    )
+    summary = client.get("/api/v1/assessments/summary").json()
+    assert summary["total"] == 3
+    assert summary["averageScore"] == 100.0
+    assert {p: s["count"] for p, s in summary["pillars"].items()} == {
+        "reliability": 1, "security": 2,
+    }
@@ -0,0 +1,208 @@
+"""
+FirebaseTokenVerifier against tokens minted with local throwaway keys
+"""
+import time
+
+import pytest
+
+from app.core.token_verifier import (
+    CertificateStore,
+    FirebaseTokenVerifier,
+    TokenExpiredError,
+    TokenRevokedError,
+    TokenVerificationError,
+)
+from benchmarks.fakes import FakeTokenIssuer
+
+PROJECT_ID = "waflens-test"
+
+
+@pytest.fixture(scope="module")
+def issuer() -> FakeTokenIssuer:
+    return FakeTokenIssuer(PROJECT_ID, key_id="key-1")
+
+
+@pytest.fixture(scope="module")
+def rotated_issuer() -> FakeTokenIssuer:
+    return FakeTokenIssuer(PROJECT_ID, key_id="key-2")
+
+
+class Certs:
+    """A certificate endpoint whose published keys can be rotated"""
+
+    def __init__(self, *issuers: FakeTokenIssuer):
+        self.issuers = list(issuers)
+        self.fetches = 0
+
+    async def __call__(self):
+        self.fetches += 1
+        return {issuer.key_id: issuer.certificate_pem for issuer in self.issuers}, 3600.0
+
+
+def make_verifier(certs: Certs, **kwargs) -> FirebaseTokenVerifier:
+    store = CertificateStore(certs, min_refresh_interval_seconds=0.0)
+    return FirebaseTokenVerifier(PROJECT_ID, store, **kwargs)
+
+
+async def test_valid_token(issuer):
+    verifier = make_verifier(Certs(issuer))
+    claims = await verifier.verify(issuer.mint("alice"))
+    assert claims["uid"] == "alice"
+    assert claims["aud"] == PROJECT_ID
+
+
+async def test_repeat_tokens_are_served_from_cache(issuer):
+    certs = Certs(issuer)
+    verifier = make_verifier(certs)
+    token = issuer.mint("alice")
+    await verifier.verify(token)
+    await verifier.verify(token)
+    stats = verifier.stats()
+    assert (stats["hits"], stats["misses"], stats["cached_tokens"]) == (1, 1, 1)
+    assert certs.fetches == 1
+
+
+async def test_expired_token(issuer):
+    verifier = make_verifier(Certs(issuer))
+    token = issuer.mint("alice", lifetime=60, iat=int(time.time()) - 3600)
+    with pytest.raises(TokenExpiredError):
+        await verifier.verify(token)
+
+
+async def test_cached_tokens_are_kept_until_exp(issuer):
+    now = [time.time()]
+    verifier = make_verifier(Certs(issuer), clock=lambda: now[0])
+    token = issuer.mint("alice", lifetime=60)
+    await verifier.verify(token)
+    await verifier.verify(token)
+    now[0] += 120
+    await verifier.verify(token)
+    stats = verifier.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+async def test_wrong_audience(issuer):
+    verifier = make_verifier(Certs(issuer))
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify(issuer.mint("alice", aud="other-project"))
+
+
+async def test_wrong_issuer(issuer):
+    verifier = make_verifier(Certs(issuer))
+    token = issuer.mint("alice", iss="https://securetoken.google.com/other-project")
+    with pytest.raises(TokenVerificationError, match="issuer"):
+        await verifier.verify(token)
+
+
+async def test_missing_subject(issuer):
+    verifier = make_verifier(Certs(issuer))
+    with pytest.raises(TokenVerificationError, match="subject"):
+        await verifier.verify(issuer.mint(""))
+
+
+async def test_unknown_key_id(issuer, rotated_issuer):
+    certs = Certs(issuer)
+    verifier = make_verifier(certs)
+    with pytest.raises(TokenVerificationError, match="unknown key"):
+        await verifier.verify(rotated_issuer.mint("alice"))
+    # One forced refresh to look for the key, then the failure
+    assert certs.fetches == 2
+    assert verifier.stats()["failures"] == 1
+
+
+async def test_bad_signature(issuer):
+    # Same key id, different private key
+    impostor = FakeTokenIssuer(PROJECT_ID, key_id=issuer.key_id)
+    verifier = make_verifier(Certs(issuer))
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify(impostor.mint("alice"))
+
+
+async def test_tampered_token(issuer):
+    verifier = make_verifier(Certs(issuer))
+    header, payload, signature = issuer.mint("alice").split(".")
+    forged = issuer.mint("mallory").split(".")[1]
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify(".".join([header, forged, signature]))
+    with pytest.raises(TokenVerificationError, match="Malformed"):
+        await verifier.verify("not-a-token")
+
+
+async def test_key_rotation_refreshes_certificates(issuer, rotated_issuer):
+    certs = Certs(issuer)
+    verifier = make_verifier(certs)
+    await verifier.verify(issuer.mint("alice"))
+    certs.issuers = [issuer, rotated_issuer]
+    claims = await verifier.verify(rotated_issuer.mint("bob"))
+    assert claims["uid"] == "bob"
+    assert certs.fetches == 2
+    assert verifier.stats()["cert_refreshes"] == 2
+
+
+async def test_certificates_refresh_ahead_of_expiry(issuer):
+    now = [1000.0]
+    certs = Certs(issuer)
+    store = CertificateStore(certs, refresh_margin_seconds=300.0, clock=lambda: now[0])
+    await store.get_certs()
+    now[0] += 3600 - 100
+    # Inside the refresh margin: current certificates, refreshed in the background
+    assert await store.get_certs()
+    await store._background
+    assert certs.fetches == 2
+
+
+async def test_revoked_token(issuer):
+    revoked_before = {}
+
+    async def lookup(uid):
+        return revoked_before.get(uid)
+
+    now = [time.time()]
+    verifier = make_verifier(
+        Certs(issuer), clock=lambda: now[0], revocation_lookup=lookup, revocation_cache_seconds=60
+    )
+    token = issuer.mint("alice", iat=int(now[0]) - 10)
+    assert (await verifier.verify(token))["uid"] == "alice"
+
+    revoked_before["alice"] = now[0] - 5
+    # The revocation time is cached for revocation_cache_seconds
+    await verifier.verify(token)
+    now[0] += 61
+    with pytest.raises(TokenRevokedError):
+        await verifier.verify(token)
+    # Tokens issued after the revocation, and other users, still verify
+    assert await verifier.verify(issuer.mint("alice"))
+    assert await verifier.verify(issuer.mint("bob"))
+
+
+async def test_revocation_not_checked_without_lookup(issuer):
+    verifier = make_verifier(Certs(issuer))
+    assert await verifier.verify(issuer.mint("alice", iat=0, lifetime=10 ** 10))
+
+
+@pytest.mark.parametrize("revoked, status, detail", [
+    (False, 200, None),
+    (True, 401, "Token has been revoked"),
+])
+def test_api_rejects_revoked_tokens(monkeypatch, issuer, assessment_repo, revoked, status, detail):
+    from fastapi.testclient import TestClient
+
+    from app.core import security
+    from app.main import app
+    from app.repositories.assessments import get_assessment_repository
+
+    async def lookup(uid):
+        return time.time() + 60 if revoked else None
+
+    verifier = make_verifier(Certs(issuer), revocation_lookup=lookup)
+    monkeypatch.setattr(security, "get_token_verifier", lambda: verifier)
+    app.dependency_overrides[get_assessment_repository] = lambda: assessment_repo
+    try:
+        response = TestClient(app).get(
+            "/api/v1/assessments/", headers={"Authorization": f"Bearer {issuer.mint('alice')}"}
+        )
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == status
+    if detail:
+        assert response.json()["detail"] == detail